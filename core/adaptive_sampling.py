@@ -258,6 +258,11 @@ class AdaptiveSamplingController:
         # Estado del controlador
         self.enabled = False
         self.frame_counter = 0
+        
+        # FPS real de la fuente (p.ej. modo solo keyframes); los intervalos
+        # configurados están pensados para reference_fps
+        self.reference_fps = 30.0
+        self.source_fps = None
         self.processed_frames = 0
         self.skipped_frames = 0
         
@@ -278,6 +283,24 @@ class AdaptiveSamplingController:
         with self.lock:
             self.enabled = False
     
+    def set_source_fps(self, fps: Optional[float], reference_fps: float = 30.0):
+        """Informa el FPS real entregado por el lector para escalar los intervalos"""
+        with self.lock:
+            self.reference_fps = reference_fps
+            self.source_fps = fps if fps and fps > 0 else None
+    
+    def _scale_interval(self, interval: int) -> int:
+        """Convierte un intervalo en frames a @reference_fps al FPS real de la fuente"""
+        if not self.source_fps or self.source_fps >= self.reference_fps:
+            return interval
+        return max(1, int(round(interval * self.source_fps / self.reference_fps)))
+    
+    def get_effective_detection_fps(self) -> Optional[float]:
+        """FPS de detección resultante con el intervalo actual"""
+        with self.lock:
+            fps = self.source_fps or self.reference_fps
+            return fps / self.get_current_interval()
+    
     def should_process_frame(self, detections: List[Dict] = None, has_movement: bool = True) -> bool:
         """Determina si se debe procesar el frame actual"""
         
@@ -286,7 +309,7 @@ class AdaptiveSamplingController:
             
             if not self.enabled:
                 # Modo fijo - usar intervalo base
-                should_process = (self.frame_counter % self.config.base_interval) == 0
+                should_process = (self.frame_counter % self._scale_interval(self.config.base_interval)) == 0
                 if should_process:
                     self.processed_frames += 1
                 else:
@@ -304,7 +327,7 @@ class AdaptiveSamplingController:
             current_interval = self.interval_calculator.update_interval(target_interval)
             
             # Determinar si procesar
-            should_process = (self.frame_counter % current_interval) == 0
+            should_process = (self.frame_counter % self._scale_interval(current_interval)) == 0
             
             if should_process:
                 self.processed_frames += 1
@@ -335,9 +358,9 @@ class AdaptiveSamplingController:
         """Obtiene el intervalo actual"""
         with self.lock:
             if self.enabled:
-                return self.interval_calculator.current_interval
+                return self._scale_interval(self.interval_calculator.current_interval)
             else:
-                return self.config.base_interval
+                return self._scale_interval(self.config.base_interval)
     
     def get_activity_score(self) -> float:
         """Obtiene la puntuación de actividad actual"""
@@ -365,6 +388,8 @@ class AdaptiveSamplingController:
                 'efficiency_percent': efficiency,
                 'runtime_seconds': runtime,
                 'is_stable': self.interval_calculator.is_stable(),
+                'source_fps': self.source_fps,
+                'effective_detection_fps': self.get_effective_detection_fps(),
                 'config': asdict(self.config)
             }
             
@@ -3,6 +3,7 @@ from deep_sort_realtime.deepsort_tracker import DeepSort
 import torch
 import time
 from logging_utils import get_logger
+from tracker_config import get_tracker_config
 
 logger = get_logger(__name__)
 
@@ -25,22 +26,44 @@ def _iou(boxA, boxB):
     return interArea / union
 
 class AdvancedTracker:
-    """Wrapper around DeepSort tracker maintaining history of track centers."""
+    """Wrapper around DeepSort tracker maintaining history of track centers.
 
-    MOVEMENT_HISTORY_STEPS = 7
-    MOVEMENT_THRESHOLD = 5.0
-    MOVEMENT_SMOOTHING_FRAMES = 5
+    Tracking parameters come from ``tracker_config.get_tracker_config``. The
+    profile of ``model_key`` is the default for every track; ``class_models``
+    maps detection class ids to model keys so each track uses the profile of
+    its own class (``lost_ttl``, ``movement_threshold``, velocity prediction).
+    Explicit keyword arguments override the loaded profile.
+    """
 
-    def __init__(self, max_age=30, n_init=3, conf_threshold=0.25, device="cpu", lost_ttl=5):
+    def __init__(self, max_age=None, n_init=None, conf_threshold=None, device="cpu", lost_ttl=None,
+                 model_key=None, class_models=None, config_override=None):
         use_gpu = device != "cpu" and torch.cuda.is_available()
 
+        self.config = get_tracker_config(model_key, config_override)
+        self.class_models = dict(class_models or {})
+        self._class_profiles = {
+            cls: get_tracker_config(mk, config_override)
+            for cls, mk in self.class_models.items()
+        }
+
+        if max_age is None:
+            max_age = self.config["max_age"]
+        if n_init is None:
+            n_init = self.config["n_init"]
+        if conf_threshold is None:
+            conf_threshold = self.config["conf_threshold"]
+        # lost_ttl explícito fija el valor para todas las clases
+        self._lost_ttl_override = lost_ttl
+        if lost_ttl is None:
+            lost_ttl = self.config["lost_ttl"]
+
         self.tracker = DeepSort(
             max_age=max_age,
             n_init=n_init,
             embedder='mobilenet',
             embedder_gpu=use_gpu,
             half=use_gpu,
-            nms_max_overlap=1.0,
+            nms_max_overlap=self.config["nms_max_overlap"],
             bgr=True
         )
         self.track_history = defaultdict(list)  # track_id -> list of (cx, cy)
@@ -50,9 +73,104 @@ class AdvancedTracker:
         self.last_result = {}  # track_id -> last returned result dict
         self.lost_counts = defaultdict(int)  # track_id -> frames since last seen
         self.lost_ttl = lost_ttl
+        self.velocities = {}  # track_id -> smoothed (vx, vy) in px/frame
+        self.last_confirmed = {}  # track_id -> frame index of last confirmed update
+
+        self.movement_history_steps = self.config["movement_history_steps"]
+        self.movement_smoothing_frames = self.config["movement_smoothing_frames"]
+
+        performance = self.config.get("performance", {})
+        self.max_tracks = performance.get("max_tracks", 100)
+        self.cleanup_interval = performance.get("cleanup_interval", 100)
+        self.frame_index = 0
+        self.evicted_tracks = 0
+
+        logger.info(
+            "AdvancedTracker: model_key=%s max_age=%s n_init=%s lost_ttl=%s max_tracks=%s cleanup_interval=%s",
+            model_key, max_age, n_init, lost_ttl, self.max_tracks, self.cleanup_interval,
+        )
+
+    def _profile_for(self, cls):
+        """Perfil de configuración aplicable a una clase detectada."""
+        return self._class_profiles.get(cls, self.config)
+
+    def _lost_ttl_for(self, cls):
+        if self._lost_ttl_override is not None:
+            return self._lost_ttl_override
+        return self._profile_for(cls)["lost_ttl"]
+
+    def _forget(self, tid):
+        """Eliminar todo el estado asociado a un track."""
+        self.track_history.pop(tid, None)
+        self.track_meta.pop(tid, None)
+        self.moving_flags.pop(tid, None)
+        self.last_result.pop(tid, None)
+        self.lost_counts.pop(tid, None)
+        self.velocities.pop(tid, None)
+        self.last_confirmed.pop(tid, None)
+
+    def _update_velocity(self, tid, centers, profile):
+        if not profile["enable_velocity_prediction"] or len(centers) < 2:
+            return
+        vx = centers[-1][0] - centers[-2][0]
+        vy = centers[-1][1] - centers[-2][1]
+        prev = self.velocities.get(tid)
+        if prev is not None:
+            alpha = profile["velocity_smoothing_factor"]
+            vx = alpha * prev[0] + (1 - alpha) * vx
+            vy = alpha * prev[1] + (1 - alpha) * vy
+        self.velocities[tid] = (vx, vy)
+
+    def _predict_lost(self, tid, result, lost_frames, profile):
+        """Desplazar la última caja de un track perdido según su velocidad."""
+        velocity = self.velocities.get(tid)
+        if not profile["enable_velocity_prediction"] or velocity is None:
+            return result
+        dx = velocity[0] * lost_frames
+        dy = velocity[1] * lost_frames
+        dist = (dx ** 2 + dy ** 2) ** 0.5
+        max_dist = profile["max_prediction_distance"]
+        if dist > max_dist > 0:
+            scale = max_dist / dist
+            dx *= scale
+            dy *= scale
+        x1, y1, x2, y2 = result['bbox']
+        predicted = dict(result)
+        predicted['bbox'] = [x1 + dx, y1 + dy, x2 + dx, y2 + dy]
+        predicted['predicted'] = True
+        return predicted
+
+    def _enforce_max_tracks(self) -> set:
+        """Desalojar los tracks confirmados hace más tiempo si se supera max_tracks; devuelve sus ids."""
+        excess = len(self.last_result) - self.max_tracks
+        if self.max_tracks <= 0 or excess <= 0:
+            return set()
+        oldest = sorted(self.last_result, key=lambda tid: self.last_confirmed.get(tid, -1))[:excess]
+        for tid in oldest:
+            self._forget(tid)
+        evicted = set(oldest)
+        inner = getattr(self.tracker, 'tracker', None)
+        if inner is not None and hasattr(inner, 'tracks'):
+            inner.tracks = [t for t in inner.tracks if t.track_id not in evicted]
+        self.evicted_tracks += len(oldest)
+        logger.info("Evicted %d tracks over max_tracks=%d: %s", len(oldest), self.max_tracks, oldest)
+        return evicted
+
+    def _cleanup_sweep(self):
+        """Purgar estado huérfano de tracks que ya no están en last_result."""
+        alive = set(self.last_result)
+        stale = (
+            set(self.track_history) | set(self.track_meta) | set(self.moving_flags)
+            | set(self.lost_counts) | set(self.velocities) | set(self.last_confirmed)
+        ) - alive
+        for tid in stale:
+            self._forget(tid)
+        if stale:
+            logger.debug("Cleanup sweep removed state for %d stale tracks", len(stale))
 
     def update(self, detections, frame=None):
         start_time = time.time()
+        self.frame_index += 1
 
         formatted = []
         for det in detections:
@@ -91,24 +209,27 @@ class AdvancedTracker:
                 conf = 0.0
             if conf < self.conf_threshold:
                 continue
+            profile = self._profile_for(cls)
             cx = (bbox[0] + bbox[2]) / 2
             cy = (bbox[1] + bbox[3]) / 2
             centers = self.track_history[track_id]
             centers.append((cx, cy))
             if len(centers) > 30:
                 centers.pop(0)
+            self._update_velocity(track_id, centers, profile)
             moving = None
 
-            if len(centers) >= self.MOVEMENT_HISTORY_STEPS + 1:
-                window = centers[-self.MOVEMENT_HISTORY_STEPS - 1:-1]
-                mean_cx = sum(p[0] for p in window) / self.MOVEMENT_HISTORY_STEPS
-                mean_cy = sum(p[1] for p in window) / self.MOVEMENT_HISTORY_STEPS
+            steps = self.movement_history_steps
+            if len(centers) >= steps + 1:
+                window = centers[-steps - 1:-1]
+                mean_cx = sum(p[0] for p in window) / steps
+                mean_cy = sum(p[1] for p in window) / steps
                 dist_sq = (cx - mean_cx) ** 2 + (cy - mean_cy) ** 2
 
-                instant = dist_sq ** 0.5 > self.MOVEMENT_THRESHOLD
+                instant = dist_sq ** 0.5 > profile["movement_threshold"]
                 flags = self.moving_flags[track_id]
                 flags.append(instant)
-                if len(flags) > self.MOVEMENT_SMOOTHING_FRAMES:
+                if len(flags) > self.movement_smoothing_frames:
                     flags.pop(0)
                 moving = sum(flags) > len(flags) // 2
 
@@ -124,19 +245,18 @@ class AdvancedTracker:
             active_ids.add(track_id)
             self.last_result[track_id] = result
             self.lost_counts[track_id] = 0
+            self.last_confirmed[track_id] = self.frame_index
 
         for tid in list(self.last_result.keys()):
             if tid not in active_ids:
                 self.lost_counts[tid] += 1
-                if self.lost_counts[tid] <= self.lost_ttl:
-                    results.append(self.last_result[tid])
+                last = self.last_result[tid]
+                if self.lost_counts[tid] <= self._lost_ttl_for(last.get('cls')):
+                    profile = self._profile_for(last.get('cls'))
+                    results.append(self._predict_lost(tid, last, self.lost_counts[tid], profile))
                 else:
                     logger.info(f"Track {tid}: Removed after {self.lost_counts[tid]} lost frames")
-                    self.track_history.pop(tid, None)
-                    self.track_meta.pop(tid, None)
-                    self.moving_flags.pop(tid, None)
-                    self.last_result.pop(tid, None)
-                    self.lost_counts.pop(tid, None)
+                    self._forget(tid)
 
         # Cleanup ghost tracks
         ghost_tracks = []
@@ -160,11 +280,14 @@ class AdvancedTracker:
             logger.info(f"Removed {len(ghost_tracks)} ghost tracks: {ghost_tracks}")
             for tid_str, reason in ghost_tracks:
                 tid = int(tid_str)
-                self.track_history.pop(tid, None)
-                self.track_meta.pop(tid, None)
-                self.moving_flags.pop(tid, None)
-                self.last_result.pop(tid, None)
-                self.lost_counts.pop(tid, None)
+                self._forget(tid)
+
+        # Los desalojados ya no existen en DeepSort: no devolverlos en este frame
+        evicted = self._enforce_max_tracks()
+        if evicted:
+            results = [r for r in results if r['id'] not in evicted]
+        if self.cleanup_interval and self.frame_index % self.cleanup_interval == 0:
+            self._cleanup_sweep()
 
         end_time = time.time()
         elapsed_ms = (end_time - start_time) * 1000
@@ -0,0 +1,220 @@
+"""
+Selección de la mejor toma por track.
+
+En lugar de capturar el primer frame cuyo promedio de confianza supera el
+umbral (y recapturar con cada mejora de 0.10), cada track acumula puntuaciones
+durante toda su vida y se guarda una sola captura: la mejor, cuando el track
+termina (``track_timeout`` segundos sin verse) o al cumplir ``max_dwell``
+segundos de permanencia (luego empieza una ventana nueva).
+
+La puntuación combina confianza, tamaño de la caja, nitidez (varianza del
+Laplaciano sobre el recorte reducido a escala de grises) y distancia al borde
+del frame (objetos cortados puntúan bajo). Solo se conservan los ``top_k``
+mejores recortes por track; ``previo`` puntúa sin recortar y descarta el frame
+si ni con nitidez perfecta entraría en el top-k, así la mayoría de frames no
+cuestan ni una copia.
+"""
+
+import heapq
+import itertools
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+
+from core.capture_writer import calcular_recorte
+
+# Pesos por defecto de cada componente (suman 1)
+PESOS = {'confianza': 0.4, 'tamano': 0.2, 'nitidez': 0.25, 'borde': 0.15}
+
+NITIDEZ_LADO = 96          # lado mayor del recorte gris para el Laplaciano
+NITIDEZ_REFERENCIA = 400.0  # varianza del Laplaciano que puntúa 1.0
+TAMANO_REFERENCIA = 0.3    # caja con lado medio >= 30% del frame puntúa 1.0
+BORDE_REFERENCIA = 0.03    # margen (fracción del lado menor) que puntúa 1.0
+
+
+def nitidez(imagen, bbox_local=None) -> float:
+    """Varianza del Laplaciano (0-1 en escala log) de la caja dentro de ``imagen``"""
+    if bbox_local is not None:
+        x1, y1, x2, y2 = (int(v) for v in bbox_local)
+        imagen = imagen[max(0, y1):y2, max(0, x1):x2]
+    if imagen is None or imagen.size == 0:
+        return 0.0
+    h, w = imagen.shape[:2]
+    escala = NITIDEZ_LADO / max(h, w)
+    if escala < 1.0:
+        imagen = cv2.resize(imagen, (max(1, int(w * escala)), max(1, int(h * escala))),
+                            interpolation=cv2.INTER_AREA)
+    gris = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY) if imagen.ndim == 3 else imagen
+    varianza = float(cv2.Laplacian(gris, cv2.CV_64F).var())
+    return min(1.0, math.log1p(varianza) / math.log1p(NITIDEZ_REFERENCIA))
+
+
+def puntuacion_geometrica(bbox, frame_shape, confianza: float,
+                          pesos: Dict[str, float] = PESOS) -> Tuple[float, Dict[str, float]]:
+    """Parte de la puntuación que no necesita píxeles: confianza, tamaño y borde"""
+    fh, fw = frame_shape[:2]
+    x1, y1, x2, y2 = (float(v) for v in bbox[:4])
+    lado = math.sqrt(max(0.0, (x2 - x1) * (y2 - y1)) / float(fw * fh))
+    margen = min(x1, y1, fw - x2, fh - y2) / float(min(fw, fh))
+    componentes = {
+        'confianza': max(0.0, min(1.0, float(confianza))),
+        'tamano': min(1.0, lado / TAMANO_REFERENCIA),
+        'borde': max(0.0, min(1.0, margen / BORDE_REFERENCIA)),
+    }
+    return sum(pesos[k] * v for k, v in componentes.items()), componentes
+
+
+@dataclass
+class Candidato:
+    """Recorte candidato de un track"""
+    puntuacion: float
+    ts: float
+    crop: Any
+    bbox: Tuple[int, int, int, int]
+    region: Tuple[int, int, int, int]
+    cls: int
+    confianza: float
+    componentes: Dict[str, float]
+    meta: Dict = field(default_factory=dict)
+
+
+class _Track:
+    __slots__ = ('inicio', 'visto', 'frames', 'heap')
+
+    def __init__(self, ts: float):
+        self.inicio = ts
+        self.visto = ts
+        self.frames = 0
+        self.heap: List = []  # (puntuacion, seq, Candidato), el peor arriba
+
+    def peor(self) -> float:
+        return self.heap[0][0] if self.heap else 0.0
+
+
+class BestShotSelector:
+    """
+    Buffer de los ``top_k`` mejores recortes por track.
+
+    Uso por detección: ``previo`` (sin píxeles) y, si no devuelve None,
+    ``agregar`` con el frame de captura. ``recolectar`` devuelve las tomas a
+    guardar de los tracks terminados o con permanencia cumplida.
+    """
+
+    def __init__(self, top_k: int = 3, max_dwell: float = 30.0, track_timeout: float = 3.0,
+                 min_confianza: float = 0.5, pesos: Optional[Dict[str, float]] = None):
+        self.top_k = max(1, int(top_k))
+        self.max_dwell = max_dwell
+        self.track_timeout = track_timeout
+        self.min_confianza = min_confianza
+        self.pesos = dict(pesos or PESOS)
+        self._tracks: Dict[Any, _Track] = {}
+        self._seq = itertools.count()
+        self.stats = {
+            'observaciones': 0,
+            'bajo_umbral': 0,
+            'descartes_previos': 0,
+            'recortes': 0,
+            'emitidas': 0,
+            'emitidas_fin': 0,
+            'emitidas_permanencia': 0,
+            'avg_puntuacion': 0.0,
+            'avg_nitidez_ms': 0.0,
+        }
+
+    def previo(self, track_id, bbox, frame_shape, confianza: float, ts: Optional[float] = None):
+        """
+        Registrar la observación y devolver la puntuación geométrica si el frame
+        puede entrar en el top-k del track (None = no hace falta recortar).
+        """
+        ts = ts or time.time()
+        track = self._tracks.get(track_id)
+        if track is None:
+            track = self._tracks[track_id] = _Track(ts)
+        track.visto = ts
+        track.frames += 1
+        self.stats['observaciones'] += 1
+        if confianza < self.min_confianza:
+            self.stats['bajo_umbral'] += 1
+            return None
+        base, componentes = puntuacion_geometrica(bbox, frame_shape, confianza, self.pesos)
+        if len(track.heap) >= self.top_k and base + self.pesos['nitidez'] <= track.peor():
+            self.stats['descartes_previos'] += 1
+            return None
+        return base, componentes
+
+    def agregar(self, track_id, previo, frame, bbox, cls, confianza: float,
+                ts: Optional[float] = None, meta: Optional[Dict] = None) -> bool:
+        """Medir nitidez y, solo si entra en el top-k, copiar el recorte"""
+        track = self._tracks.get(track_id)
+        if track is None or frame is None:
+            return False
+        region = calcular_recorte(bbox, frame.shape)
+        if region is None:
+            return False
+        start = time.perf_counter()
+        valor_nitidez = nitidez(frame, bbox)  # vista del frame, sin copia
+        self.stats['avg_nitidez_ms'] += 0.2 * ((time.perf_counter() - start) * 1000 - self.stats['avg_nitidez_ms'])
+
+        base, componentes = previo
+        puntuacion = base + self.pesos['nitidez'] * valor_nitidez
+        if len(track.heap) >= self.top_k and puntuacion <= track.peor():
+            return False
+        x1, y1, x2, y2 = region
+        candidato = Candidato(
+            puntuacion=puntuacion, ts=ts or time.time(), crop=frame[y1:y2, x1:x2].copy(),
+            bbox=tuple(int(v) for v in bbox[:4]), region=region, cls=cls, confianza=float(confianza),
+            componentes={**componentes, 'nitidez': valor_nitidez}, meta=dict(meta or {}),
+        )
+        entrada = (puntuacion, next(self._seq), candidato)
+        if len(track.heap) >= self.top_k:
+            heapq.heapreplace(track.heap, entrada)
+        else:
+            heapq.heappush(track.heap, entrada)
+        self.stats['recortes'] += 1
+        return True
+
+    def recolectar(self, now: Optional[float] = None) -> List[Tuple[Any, Candidato, str]]:
+        """(track_id, mejor candidato, motivo) listos para guardar; motivo 'fin' o 'permanencia'"""
+        now = now or time.time()
+        listas = []
+        for track_id, track in list(self._tracks.items()):
+            if now - track.visto >= self.track_timeout:
+                del self._tracks[track_id]
+                listas.extend(self._emitir(track_id, track, 'fin'))
+            elif now - track.inicio >= self.max_dwell and track.heap:
+                listas.extend(self._emitir(track_id, track, 'permanencia'))
+                track.inicio = now
+        return listas
+
+    def terminar(self, track_id) -> List[Tuple[Any, Candidato, str]]:
+        """El tracker dio el track por perdido: emitir ya su mejor toma"""
+        track = self._tracks.pop(track_id, None)
+        return self._emitir(track_id, track, 'fin') if track is not None else []
+
+    def vaciar(self) -> List[Tuple[Any, Candidato, str]]:
+        """Emitir todo lo pendiente (cierre de la cámara)"""
+        listas = []
+        for track_id in list(self._tracks):
+            listas.extend(self.terminar(track_id))
+        return listas
+
+    def _emitir(self, track_id, track: _Track, motivo: str) -> List[Tuple[Any, Candidato, str]]:
+        if not track.heap:
+            return []
+        mejor = max(track.heap)[2]
+        track.heap = []
+        stats = self.stats
+        stats['emitidas'] += 1
+        stats[f'emitidas_{motivo}'] += 1
+        stats['avg_puntuacion'] += 0.2 * (mejor.puntuacion - stats['avg_puntuacion'])
+        return [(track_id, mejor, motivo)]
+
+    def tracks_pendientes(self) -> List[Any]:
+        return list(self._tracks)
+
+    def get_stats(self) -> Dict:
+        buffer_bytes = sum(c[2].crop.nbytes for t in self._tracks.values() for c in t.heap)
+        return {**self.stats, 'tracks': len(self._tracks), 'buffer_bytes': buffer_bytes}
@@ -1,7 +1,24 @@
-import requests
-from requests.auth import HTTPDigestAuth
+from concurrent.futures import ThreadPoolExecutor
 
-def verificar_configuracion_grilla(ip, usuario, contrasena):
+from core.lapi_client import get_lapi_client
+
+ENDPOINTS_GRILLA = [
+    "System/FunctionList",
+    "Channels/0/Alarm/MotionDetection",
+    "Channels/0/Alarm/MotionDetection/Areas/Grid",
+    "Channels/0/Alarm/MotionDetection/WeekPlan",
+    "Channels/0/Smart/IntrusionDetection",
+    "Channels/0/Smart/IntrusionDetection/Areas",
+    "Channels/0/Smart/IntrusionDetection/WeekPlan",
+    "Channels/0/Smart/CrossLineDetection",
+    "Channels/0/Smart/CrossLineDetection/Areas",
+    "Channels/0/Smart/CrossLineDetection/WeekPlan",
+    "Media/Snapshot",
+    "PTZ/AbsoluteMove",
+    "PTZ/GotoPreset"
+]
+
+def verificar_configuracion_grilla(ip, usuario, contrasena, usar_cache=True):
     resultados = []
 
     def agregar_resultado(endpoint, estado, detalle, extra=None):
@@ -14,11 +31,16 @@ def verificar_configuracion_grilla(ip, usuario, contrasena):
             item.update(extra)
         resultados.append(item)
 
+    # Sesión keep-alive por dispositivo: el digest se negocia una vez por hilo
+    cliente = get_lapi_client(ip, usuario, contrasena)
+
     try:
-        url_info = f"http://{ip}/LAPI/V1.0/System/DeviceInfo"
-        response = requests.get(url_info, auth=HTTPDigestAuth(usuario, contrasena), timeout=5)
-        r_json = response.json()
-        data = r_json.get("Response", {}).get("Data", {})
+        r = cliente.get("System/DeviceInfo", use_cache=usar_cache)
+        if r["status"] != 200 or r["json"] is None:
+            texto = r["text"].strip().replace("\n", " ")[:200]
+            agregar_resultado("System/DeviceInfo", "❌", f"HTTP {r['status']}: {texto}")
+            return resultados
+        data = r["json"].get("Response", {}).get("Data", {})
         modelo = data.get("DeviceModel", data.get("Model", "Desconocido"))
         serial = data.get("SerialNumber", "?")
         agregar_resultado("System/DeviceInfo", "✅", f"Modelo {modelo}, Serial {serial}")
@@ -26,43 +48,38 @@ def verificar_configuracion_grilla(ip, usuario, contrasena):
         agregar_resultado("System/DeviceInfo", "❌", str(e))
         return resultados
 
-    endpoints = [
-        "System/FunctionList",
-        "Channels/0/Alarm/MotionDetection",
-        "Channels/0/Alarm/MotionDetection/Areas/Grid",
-        "Channels/0/Alarm/MotionDetection/WeekPlan",
-        "Channels/0/Smart/IntrusionDetection",
-        "Channels/0/Smart/IntrusionDetection/Areas",
-        "Channels/0/Smart/IntrusionDetection/WeekPlan",
-        "Channels/0/Smart/CrossLineDetection",
-        "Channels/0/Smart/CrossLineDetection/Areas",
-        "Channels/0/Smart/CrossLineDetection/WeekPlan",
-        "Media/Snapshot",
-        "PTZ/AbsoluteMove",
-        "PTZ/GotoPreset"
-    ]
-
-    for endpoint in endpoints:
-        url = f"http://{ip}/LAPI/V1.0/{endpoint}"
-        try:
-            r = requests.get(url, auth=HTTPDigestAuth(usuario, contrasena), timeout=5)
-            try:
-                json_data = r.json()
-                detalle = "JSON válido"
-                extra = {}
-                if endpoint.endswith("/MotionDetection/Areas/Grid"):
-                    grid_data = json_data.get("Response", {}).get("Data", {}).get("GridArea", {})
-                    extra = {
-                        "filas": grid_data.get("Rows"),
-                        "columnas": grid_data.get("Columns"),
-                        "area": grid_data.get("Area", [])
-                    }
-                    detalle += f" – Área recibida ({extra['filas']}x{extra['columnas']})"
-                agregar_resultado(endpoint, "✅", detalle, extra)
-            except Exception:
-                texto = r.text.strip().replace("\n", " ")[:200]
-                agregar_resultado(endpoint, "⚠️", f"No JSON: {texto}...")
-        except Exception as e:
-            agregar_resultado(endpoint, "❌", str(e))
+    # Resto de endpoints en paralelo; los resultados mantienen el orden de la lista
+    respuestas = cliente.get_many(ENDPOINTS_GRILLA, use_cache=usar_cache)
+    for endpoint, r in respuestas.items():
+        if isinstance(r, Exception):
+            agregar_resultado(endpoint, "❌", str(r))
+            continue
+        json_data = r["json"]
+        if json_data is None:
+            texto = r["text"].strip().replace("\n", " ")[:200]
+            agregar_resultado(endpoint, "⚠️", f"No JSON: {texto}...")
+            continue
+        detalle = "JSON válido"
+        extra = {}
+        if endpoint.endswith("/MotionDetection/Areas/Grid"):
+            grid_data = json_data.get("Response", {}).get("Data", {}).get("GridArea", {})
+            extra = {
+                "filas": grid_data.get("Rows"),
+                "columnas": grid_data.get("Columns"),
+                "area": grid_data.get("Area", [])
+            }
+            detalle += f" – Área recibida ({extra['filas']}x{extra['columnas']})"
+        agregar_resultado(endpoint, "✅", detalle, extra)
 
     return resultados
+
+def verificar_configuracion_sitio(camaras, max_workers=16, usar_cache=True):
+    """
+    Verificar varias cámaras en paralelo. ``camaras`` es una lista de dicts con
+    ip/usuario/contrasena; devuelve ``{ip: resultados}``.
+    """
+    def verificar(cam):
+        return verificar_configuracion_grilla(cam["ip"], cam.get("usuario", "admin"), cam.get("contrasena", ""), usar_cache)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip((cam["ip"] for cam in camaras), executor.map(verificar, camaras)))
@@ -0,0 +1,270 @@
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import time
+from urllib.parse import urlsplit, unquote
+
+from core.rtsp_builder import generar_rtsp
+from logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+ONVIF_PATH = "/onvif/device_service"
+LAPI_PATH = "/LAPI/V1.0/System/DeviceInfo"
+
+# GetSystemDateAndTime no requiere autenticación en ONVIF
+ONVIF_BODY = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope">'
+    '<s:Body><GetSystemDateAndTime xmlns="http://www.onvif.org/ver10/device/wsdl"/></s:Body>'
+    '</s:Envelope>'
+)
+
+
+def _ms(start):
+    return round((time.monotonic() - start) * 1000, 1)
+
+
+def _parse_response(raw):
+    """(status, headers) de una respuesta RTSP/HTTP"""
+    lines = raw.decode("latin-1", errors="replace").split("\r\n")
+    parts = lines[0].split(" ", 2)
+    status = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    return status, headers
+
+
+def _digest_header(method, uri, usuario, contrasena, challenge):
+    """Cabecera Authorization Digest (RFC 2617) para RTSP y HTTP"""
+    params = dict(re.findall(r'(\w+)="?([^",]*)"?', challenge))
+    realm, nonce = params.get("realm", ""), params.get("nonce", "")
+    ha1 = hashlib.md5(f"{usuario}:{realm}:{contrasena}".encode()).hexdigest()
+    ha2 = hashlib.md5(f"{method}:{uri}".encode()).hexdigest()
+    header = f'Digest username="{usuario}", realm="{realm}", nonce="{nonce}", uri="{uri}"'
+    if "auth" in params.get("qop", "").split(","):
+        cnonce = os.urandom(8).hex()
+        response = hashlib.md5(f"{ha1}:{nonce}:00000001:{cnonce}:auth:{ha2}".encode()).hexdigest()
+        header += f', qop=auth, nc=00000001, cnonce="{cnonce}"'
+    else:
+        response = hashlib.md5(f"{ha1}:{nonce}:{ha2}".encode()).hexdigest()
+    header += f', response="{response}"'
+    if "opaque" in params:
+        header += f', opaque="{params["opaque"]}"'
+    return header
+
+
+def _auth_header(method, uri, usuario, contrasena, challenge):
+    if challenge.lower().startswith("digest"):
+        return _digest_header(method, uri, usuario, contrasena, challenge)
+    token = base64.b64encode(f"{usuario}:{contrasena}".encode()).decode()
+    return f"Basic {token}"
+
+
+async def _read_headers(reader, timeout):
+    """Leer hasta el fin de cabeceras (el cuerpo no interesa)"""
+    return await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+
+
+async def _read_rtsp_response(reader, timeout):
+    """Respuesta RTSP completa: se descarta el cuerpo para dejar la sesión alineada"""
+    status, headers = _parse_response(await _read_headers(reader, timeout))
+    length = int(headers.get("content-length", 0) or 0)
+    if length:
+        await asyncio.wait_for(reader.readexactly(length), timeout)
+    return status, headers
+
+
+async def probe_tcp(host, port, timeout=2.0):
+    """Conexión TCP: (ok, latencia_ms, error)"""
+    start = time.monotonic()
+    try:
+        _reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except Exception as e:
+        return False, _ms(start), str(e) or type(e).__name__
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+    return True, _ms(start), None
+
+
+async def probe_rtsp(rtsp_url, timeout=3.0):
+    """
+    Handshake RTSP ``OPTIONS`` + ``DESCRIBE`` sobre un socket, sin decodificar.
+
+    Si ``DESCRIBE`` responde 401 y la URL trae credenciales se reintenta con
+    autenticación Digest/Basic. Un 401 final indica credenciales inválidas
+    (el servicio RTSP responde igualmente).
+    """
+    parts = urlsplit(rtsp_url)
+    host, port = parts.hostname, parts.port or 554
+    usuario, contrasena = unquote(parts.username or ""), unquote(parts.password or "")
+    uri = f"rtsp://{host}:{port}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else "")
+    result = {"ok": False, "status": None, "error": None, "latency_ms": None, "auth": None}
+    start = time.monotonic()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        cseq = 0
+
+        async def request(method, extra=""):
+            nonlocal cseq
+            cseq += 1
+            writer.write(
+                f"{method} {uri} RTSP/1.0\r\nCSeq: {cseq}\r\nUser-Agent: camera-prober\r\n{extra}\r\n".encode()
+            )
+            await writer.drain()
+            return await _read_rtsp_response(reader, timeout)
+
+        status, _headers = await request("OPTIONS")
+        status, headers = await request("DESCRIBE", "Accept: application/sdp\r\n")
+        if status == 401 and usuario and "www-authenticate" in headers:
+            result["auth"] = headers["www-authenticate"].split(" ", 1)[0]
+            auth = _auth_header("DESCRIBE", uri, usuario, contrasena, headers["www-authenticate"])
+            status, headers = await request("DESCRIBE", f"Accept: application/sdp\r\nAuthorization: {auth}\r\n")
+        result["status"] = status
+        result["ok"] = status == 200
+        if status == 401:
+            result["error"] = "Credenciales RTSP inválidas"
+        elif status != 200:
+            result["error"] = f"RTSP {status}"
+    except Exception as e:
+        result["error"] = str(e) or type(e).__name__
+    finally:
+        result["latency_ms"] = _ms(start)
+        if writer is not None:
+            writer.close()
+    return result
+
+
+async def probe_http(host, port, path, method="GET", body=None, usuario=None, contrasena=None,
+                     timeout=3.0, content_type="application/json"):
+    """
+    Petición HTTP mínima a ``path``. Con credenciales se responde al 401 con
+    Digest/Basic; sin ellas, un 401 basta para saber que el endpoint existe.
+    """
+    result = {"ok": False, "status": None, "error": None, "latency_ms": None}
+    start = time.monotonic()
+    payload = body.encode() if body else b""
+
+    async def request(extra=""):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        try:
+            head = (
+                f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+            )
+            if payload:
+                head += f"Content-Type: {content_type}\r\n"
+            writer.write(f"{head}{extra}\r\n".encode() + payload)
+            await writer.drain()
+            return _parse_response(await _read_headers(reader, timeout))
+        finally:
+            writer.close()
+
+    try:
+        status, headers = await request()
+        if status == 401 and usuario and "www-authenticate" in headers:
+            auth = _auth_header(method, path, usuario, contrasena or "", headers["www-authenticate"])
+            status, headers = await request(f"Authorization: {auth}\r\n")
+        result["status"] = status
+        result["ok"] = status is not None and status < 500 and status != 404
+    except Exception as e:
+        result["error"] = str(e) or type(e).__name__
+    result["latency_ms"] = _ms(start)
+    return result
+
+
+class CameraProber:
+    """
+    Sondeo asíncrono de salud de cámaras.
+
+    Por cámara: puerto RTSP por TCP, handshake ``OPTIONS``/``DESCRIBE`` y los
+    endpoints HTTP ONVIF y LAPI, todo en paralelo. ``concurrency`` limita las
+    cámaras sondeadas a la vez y ``per_host`` las conexiones simultáneas a una
+    misma IP (varios canales de un NVR). Cada cámara tiene un tiempo máximo
+    ``host_timeout``; lo que no responda a tiempo se marca como error.
+    """
+
+    def __init__(self, concurrency=64, per_host=2, timeout=2.0, host_timeout=5.0,
+                 check_onvif=True, check_lapi=True):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.host_timeout = host_timeout
+        self.check_onvif = check_onvif
+        self.check_lapi = check_lapi
+
+    async def probe_camera(self, cam_data):
+        ip = cam_data.get("ip")
+        # ``puerto`` es el HTTP/ONVIF de la cámara; el RTSP va aparte (554 como en generar_rtsp)
+        http_port = int(cam_data.get("http_port", cam_data.get("puerto", 80)))
+        usuario = cam_data.get("usuario")
+        contrasena = cam_data.get("contrasena")
+        rtsp_url = cam_data.get("rtsp") or (generar_rtsp(cam_data) if ip else None)
+        rtsp_port = int(cam_data.get("puerto_rtsp") or (rtsp_url and urlsplit(rtsp_url).port) or 554)
+
+        result = {"ip": ip, "canal": cam_data.get("canal"), "ok": False}
+        start = time.monotonic()
+
+        tasks = {"port": probe_tcp(ip, rtsp_port, self.timeout)}
+        if rtsp_url:
+            tasks["rtsp"] = probe_rtsp(rtsp_url, self.timeout)
+        if self.check_onvif:
+            tasks["onvif"] = probe_http(
+                ip, int(cam_data.get("onvif_port", http_port)), ONVIF_PATH, method="POST",
+                body=ONVIF_BODY, timeout=self.timeout, content_type="application/soap+xml",
+            )
+        if self.check_lapi:
+            tasks["lapi"] = probe_http(
+                ip, http_port, LAPI_PATH, usuario=usuario, contrasena=contrasena, timeout=self.timeout,
+            )
+
+        try:
+            values = await asyncio.wait_for(asyncio.gather(*tasks.values()), self.host_timeout)
+        except asyncio.TimeoutError:
+            result["error"] = f"Timeout de {self.host_timeout}s"
+            result["elapsed_ms"] = _ms(start)
+            return result
+
+        for name, value in zip(tasks, values):
+            if name == "port":
+                ok, latency, error = value
+                result["port"] = {"ok": ok, "latency_ms": latency, "error": error}
+            else:
+                result[name] = value
+        result["ok"] = result["port"]["ok"] and result.get("rtsp", {}).get("ok", True)
+        result["elapsed_ms"] = _ms(start)
+        return result
+
+    async def probe_all(self, cameras, on_result=None):
+        """Sondear todas las cámaras; ``on_result`` se llama a medida que terminan"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        host_limits = {}
+
+        async def run(cam_data):
+            host_sem = host_limits.setdefault(cam_data.get("ip"), asyncio.Semaphore(self.per_host))
+            async with semaphore, host_sem:
+                try:
+                    result = await self.probe_camera(cam_data)
+                except Exception as e:
+                    result = {"ip": cam_data.get("ip"), "canal": cam_data.get("canal"), "ok": False, "error": str(e)}
+            if on_result:
+                on_result(cam_data, result)
+            return result
+
+        return await asyncio.gather(*(run(cam) for cam in cameras))
+
+    def probe_all_sync(self, cameras, on_result=None):
+        """Versión bloqueante para threads de trabajo (sin event loop propio)"""
+        start = time.monotonic()
+        results = asyncio.run(self.probe_all(cameras, on_result))
+        logger.info("Sondeadas %d cámaras en %.0f ms", len(results), _ms(start))
+        return results
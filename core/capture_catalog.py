@@ -0,0 +1,543 @@
+"""
+Catálogo SQLite de capturas.
+
+Cada captura guardada se registra como una fila (ruta, instante, clase,
+cámara, track, confianza, bbox...) en ``capturas/catalogo.db`` en modo WAL.
+El resumen del día cuenta y pagina con consultas indexadas (``LIMIT``/
+``OFFSET``) en lugar de listar carpetas, hacer ``stat`` de cada archivo y abrir
+un JSON por clic.
+
+Las inserciones se acumulan en memoria y un hilo las escribe en transacciones
+por lotes (``batch_size`` filas o cada ``flush_interval`` segundos). Las
+capturas previas al catálogo (JPG + JSON) se importan una sola vez al crear la
+base.
+
+``subscribe`` publica cada captura registrada ("captura agregada") en cuanto
+se encola, para que el resumen se actualice por inserción (``CaptureDayIndex``)
+sin volver a consultar ni recorrer carpetas. Las miniaturas de la galería
+(capturas y fotogramas de portada de videos) se guardan como JPEG pequeños en
+la tabla ``miniaturas``.
+"""
+
+import bisect
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_DB_PATH = os.path.join("capturas", "catalogo.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS capturas (
+    id INTEGER PRIMARY KEY,
+    ruta TEXT NOT NULL UNIQUE,
+    ts REAL NOT NULL,
+    fecha TEXT NOT NULL,
+    hora TEXT,
+    carpeta TEXT NOT NULL,
+    cls INTEGER,
+    modelo TEXT,
+    camara TEXT,
+    track_id TEXT,
+    confianza REAL,
+    bbox TEXT,
+    region TEXT,
+    coordenadas_ptz TEXT,
+    formato TEXT,
+    bytes INTEGER,
+    escala REAL
+);
+CREATE INDEX IF NOT EXISTS idx_capturas_ts ON capturas(ts);
+CREATE INDEX IF NOT EXISTS idx_capturas_fecha_carpeta ON capturas(fecha, carpeta, ts);
+CREATE INDEX IF NOT EXISTS idx_capturas_camara_ts ON capturas(camara, ts);
+CREATE INDEX IF NOT EXISTS idx_capturas_track ON capturas(track_id);
+CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT);
+CREATE TABLE IF NOT EXISTS miniaturas (ruta TEXT PRIMARY KEY, miniatura BLOB NOT NULL);
+"""
+
+_COLUMNAS = ('ruta', 'ts', 'fecha', 'hora', 'carpeta', 'cls', 'modelo', 'camara', 'track_id',
+             'confianza', 'bbox', 'region', 'coordenadas_ptz', 'formato', 'bytes', 'escala')
+_JSON_COLUMNAS = ('bbox', 'region', 'coordenadas_ptz')
+
+_INSERT = (
+    f"INSERT OR REPLACE INTO capturas ({', '.join(_COLUMNAS)}) "
+    f"VALUES ({', '.join('?' for _ in _COLUMNAS)})"
+)
+
+
+class WalDatabase:
+    """Base SQLite en modo WAL: crea el esquema y da una conexión por hilo"""
+
+    def __init__(self, db_path: str, schema: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        directorio = os.path.dirname(db_path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(schema)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión propia de cada hilo (sqlite3 no comparte conexiones entre hilos)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+class BatchedWalDatabase(WalDatabase):
+    """
+    ``WalDatabase`` con escritura por lotes: las subclases acumulan filas en
+    ``_pending`` (bajo ``_cond``) e implementan ``flush``; un hilo lo llama al
+    juntar ``batch_size`` filas o cada ``flush_interval`` segundos.
+    """
+
+    nombre_hilo = "sqlite-writer"
+
+    def __init__(self, db_path: str, schema: str, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[tuple] = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = True
+        super().__init__(db_path, schema)
+
+    def _ensure_thread(self):
+        """Arrancar el hilo de escritura (llamar con ``_cond`` tomado)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.nombre_hilo, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._running and len(self._pending) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                running = self._running
+            self.flush()
+            self._mantenimiento()
+            if not running:
+                return
+
+    def flush(self):
+        raise NotImplementedError
+
+    def _mantenimiento(self):
+        """Trabajo periódico del hilo de escritura tras cada lote (opcional)"""
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self.flush()
+
+
+class CaptureCatalog(BatchedWalDatabase):
+    """Índice de capturas con escritura por lotes y consultas paginadas"""
+
+    nombre_hilo = "capture-catalog"
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, batch_size: int = 64,
+                 flush_interval: float = 0.5):
+        self._pending_miniaturas: Dict[str, bytes] = {}
+        self._subscribers: List[Callable[[Dict], None]] = []
+        self.stats = {
+            'inserted': 0,
+            'batches': 0,
+            'errors': 0,
+            'last_batch_ms': 0.0,
+        }
+        super().__init__(db_path, _SCHEMA, batch_size, flush_interval)
+
+    # ===== ESCRITURA =====
+
+    def subscribe(self, callback: Callable[[Dict], None]):
+        """``callback(registro)`` por cada captura agregada (se llama desde el hilo que la agrega)"""
+        with self._cond:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[Dict], None]):
+        with self._cond:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def add(self, registro: Dict):
+        """
+        Encolar una captura (claves de ``_COLUMNAS``; ``ruta`` obligatoria).
+        ``miniatura`` (bytes JPEG) opcional se guarda en la misma transacción.
+        """
+        registro = dict(registro)
+        miniatura = registro.pop('miniatura', None)
+        row = self._to_row(registro)
+        with self._cond:
+            self._pending.append(row)
+            if miniatura:
+                self._pending_miniaturas[row[0]] = miniatura
+            self._ensure_thread()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+            subscribers = list(self._subscribers)
+        if subscribers:
+            evento = dict(zip(_COLUMNAS, row))
+            for callback in subscribers:
+                try:
+                    callback(evento)
+                except Exception as e:
+                    logger.warning("Suscriptor del catálogo de capturas falló: %s", e)
+
+    def _to_row(self, registro: Dict) -> tuple:
+        ts = registro.get('ts') or time.time()
+        momento = datetime.fromtimestamp(ts)
+        valores = {
+            'fecha': momento.strftime("%Y-%m-%d"),
+            'hora': momento.strftime("%H:%M:%S"),
+            **registro,
+            'ts': ts,
+        }
+        if valores.get('carpeta') is None:
+            valores['carpeta'] = _carpeta_de_ruta(valores['ruta'])
+        for columna in _JSON_COLUMNAS:
+            if valores.get(columna) is not None and not isinstance(valores[columna], str):
+                valores[columna] = json.dumps(valores[columna], default=_json_default)
+        if valores.get('track_id') is not None:
+            valores['track_id'] = str(valores['track_id'])
+        if valores.get('camara') is not None:
+            valores['camara'] = str(valores['camara'])
+        return tuple(valores.get(columna) for columna in _COLUMNAS)
+
+    def guardar_miniatura(self, ruta: str, miniatura: bytes):
+        """Encolar la miniatura de un archivo (p. ej. portada de un video)"""
+        with self._cond:
+            self._pending_miniaturas[ruta] = miniatura
+            self._ensure_thread()
+
+    def flush(self):
+        """Escribir ahora las filas pendientes en una sola transacción"""
+        with self._cond:
+            rows, self._pending = self._pending, []
+            miniaturas = self._pending_miniaturas
+            self._pending_miniaturas = {}
+        if not rows and not miniaturas:
+            return
+        start = time.perf_counter()
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany(_INSERT, rows)
+                conn.executemany("INSERT OR REPLACE INTO miniaturas VALUES (?, ?)", miniaturas.items())
+        except sqlite3.Error as e:
+            self.stats['errors'] += 1
+            logger.warning("Catálogo de capturas: error insertando %d filas: %s", len(rows), e)
+            return
+        self.stats['inserted'] += len(rows)
+        self.stats['batches'] += 1
+        self.stats['last_batch_ms'] = (time.perf_counter() - start) * 1000
+
+    def eliminar(self, ruta: str):
+        self.flush()
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM capturas WHERE ruta = ?", (ruta,))
+            conn.execute("DELETE FROM miniaturas WHERE ruta = ?", (ruta,))
+
+    def eliminar_varias(self, rutas: Iterable[str]):
+        """Borrar filas y miniaturas de ``rutas`` en una transacción (retención)"""
+        rutas = [(ruta,) for ruta in rutas]
+        self.flush()
+        conn = self._connection()
+        with conn:
+            conn.executemany("DELETE FROM capturas WHERE ruta = ?", rutas)
+            conn.executemany("DELETE FROM miniaturas WHERE ruta = ?", rutas)
+
+    # ===== CONSULTAS =====
+
+    def contar_por_carpeta(self, fecha: str, carpetas: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT carpeta, COUNT(*) AS n FROM capturas WHERE fecha = ? GROUP BY carpeta", (fecha,)
+        ).fetchall()
+        conteos = {row['carpeta']: row['n'] for row in rows}
+        if carpetas is None:
+            return conteos
+        return {carpeta: conteos.get(carpeta, 0) for carpeta in carpetas}
+
+    def _filtro(self, fecha: Optional[str], carpetas: Optional[Iterable[str]],
+                camara: Optional[str]):
+        condiciones, params = [], []
+        if fecha is not None:
+            condiciones.append("fecha = ?")
+            params.append(fecha)
+        if carpetas is not None:
+            carpetas = list(carpetas)
+            condiciones.append(f"carpeta IN ({', '.join('?' for _ in carpetas)})")
+            params.extend(carpetas)
+        if camara is not None:
+            condiciones.append("camara = ?")
+            params.append(str(camara))
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        return where, params
+
+    def contar(self, fecha: Optional[str] = None, carpetas: Optional[Iterable[str]] = None,
+               camara: Optional[str] = None) -> int:
+        where, params = self._filtro(fecha, carpetas, camara)
+        return self._connection().execute(f"SELECT COUNT(*) FROM capturas {where}", params).fetchone()[0]
+
+    def pagina(self, fecha: Optional[str] = None, carpetas: Optional[Iterable[str]] = None,
+               camara: Optional[str] = None, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """Capturas más recientes primero"""
+        where, params = self._filtro(fecha, carpetas, camara)
+        rows = self._connection().execute(
+            f"SELECT * FROM capturas {where} ORDER BY ts DESC LIMIT ? OFFSET ?",
+            (*params, int(limit), int(offset))
+        ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def obtener(self, ruta: str) -> Optional[Dict]:
+        row = self._connection().execute("SELECT * FROM capturas WHERE ruta = ?", (ruta,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def entradas(self, fecha: str, carpetas: Optional[Iterable[str]] = None) -> List[Tuple[float, str, str]]:
+        """(ts, ruta, carpeta) de todas las capturas de un día, para ``CaptureDayIndex``"""
+        self.flush()
+        where, params = self._filtro(fecha, carpetas, None)
+        return [tuple(row) for row in self._connection().execute(
+            f"SELECT ts, ruta, carpeta FROM capturas {where}", params
+        )]
+
+    def obtener_miniaturas(self, rutas: Iterable[str]) -> Dict[str, bytes]:
+        """Miniaturas disponibles (pendientes de escribir o ya en la base) para ``rutas``"""
+        rutas = list(rutas)
+        with self._cond:
+            encontradas = {r: self._pending_miniaturas[r] for r in rutas if r in self._pending_miniaturas}
+        faltantes = [r for r in rutas if r not in encontradas]
+        conn = self._connection()
+        for inicio in range(0, len(faltantes), 500):
+            bloque = faltantes[inicio:inicio + 500]
+            encontradas.update(conn.execute(
+                f"SELECT ruta, miniatura FROM miniaturas WHERE ruta IN ({', '.join('?' for _ in bloque)})",
+                bloque
+            ).fetchall())
+        return encontradas
+
+    def por_track(self, track_id, limit: int = 50) -> List[Dict]:
+        rows = self._connection().execute(
+            "SELECT * FROM capturas WHERE track_id = ? ORDER BY ts DESC LIMIT ?", (str(track_id), int(limit))
+        ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def por_track_en_rango(self, track_id, camara: Optional[str], desde: float, hasta: float) -> List[Dict]:
+        """
+        Capturas de un track de ``camara`` en [desde, hasta] (enlace desde la
+        línea de tiempo de detecciones). Los ids de track son por cámara: las
+        capturas sin cámara solo se devuelven si no hay ninguna de ``camara``.
+        """
+        self.flush()
+        if camara is None:
+            rows = self._connection().execute(
+                "SELECT * FROM capturas WHERE track_id = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+                (str(track_id), desde, hasta)
+            ).fetchall()
+            return [self._to_dict(row) for row in rows]
+        rows = self._connection().execute(
+            "SELECT * FROM capturas WHERE track_id = ? AND (camara = ? OR camara IS NULL) "
+            "AND ts BETWEEN ? AND ? ORDER BY ts",
+            (str(track_id), str(camara), desde, hasta)
+        ).fetchall()
+        propias = [row for row in rows if row['camara'] is not None]
+        return [self._to_dict(row) for row in (propias or rows)]
+
+    def mas_antiguas(self, limit: int = 500, antes_de: Optional[float] = None) -> List[Tuple[float, str, Optional[int]]]:
+        """(ts, ruta, bytes) de las capturas más antiguas, para la retención"""
+        self.flush()
+        where, params = ("WHERE ts < ?", [antes_de]) if antes_de is not None else ("", [])
+        return [tuple(row) for row in self._connection().execute(
+            f"SELECT ts, ruta, bytes FROM capturas {where} ORDER BY ts LIMIT ?", (*params, int(limit))
+        )]
+
+    def bytes_totales(self) -> int:
+        """Suma de ``bytes`` registrados (las capturas importadas sin tamaño no cuentan)"""
+        self.flush()
+        return self._connection().execute("SELECT COALESCE(SUM(bytes), 0) FROM capturas").fetchone()[0]
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        registro = dict(row)
+        for columna in _JSON_COLUMNAS:
+            if registro.get(columna):
+                try:
+                    registro[columna] = json.loads(registro[columna])
+                except ValueError:
+                    pass
+        return registro
+
+    # ===== IMPORTACIÓN DE CAPTURAS ANTERIORES =====
+
+    def importar_existentes(self, base: str = "capturas") -> int:
+        """Registrar una sola vez las capturas con JSON lateral previas al catálogo"""
+        conn = self._connection()
+        if conn.execute("SELECT valor FROM meta WHERE clave = 'importado'").fetchone():
+            return 0
+        total = 0
+        for carpeta_dir in glob.glob(os.path.join(base, "*", "*")):
+            if not os.path.isdir(carpeta_dir):
+                continue
+            rows = []
+            for entry in os.scandir(carpeta_dir):
+                nombre, extension = os.path.splitext(entry.name)
+                if extension.lower() not in (".jpg", ".webp", ".avif"):
+                    continue
+                # La carpeta de fecha manda sobre el mtime (copias, restauraciones)
+                st = entry.stat()
+                registro = {'ruta': entry.path, 'ts': st.st_mtime, 'bytes': st.st_size,
+                            'fecha': os.path.basename(carpeta_dir),
+                            'formato': extension.lstrip('.').replace('jpg', 'jpeg')}
+                sidecar = os.path.join(carpeta_dir, f"{nombre}.json")
+                if os.path.exists(sidecar):
+                    try:
+                        with open(sidecar, "r", encoding="utf-8") as f:
+                            registro.update(_desde_sidecar(json.load(f)))
+                    except Exception as e:
+                        logger.debug("Metadata ilegible %s: %s", sidecar, e)
+                rows.append(self._to_row(registro))
+            if rows:
+                with conn:
+                    conn.executemany(_INSERT, rows)
+                total += len(rows)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('importado', ?)", (str(time.time()),))
+        if total:
+            logger.info("Catálogo de capturas: %d capturas existentes importadas", total)
+        return total
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            pending = len(self._pending)
+        return {**self.stats, 'pending': pending}
+
+
+def _json_default(valor):
+    """Escalares numpy (coordenadas de la detección) a tipos nativos"""
+    return valor.item() if hasattr(valor, 'item') else str(valor)
+
+
+def _carpeta_de_ruta(ruta: str) -> str:
+    """``capturas/<carpeta>/<fecha>/<archivo>`` -> ``<carpeta>``"""
+    partes = os.path.normpath(ruta).split(os.sep)
+    return partes[-3] if len(partes) >= 3 else "otros"
+
+
+def _desde_sidecar(data: Dict) -> Dict:
+    extra = {'hora': data['hora']} if data.get('hora') else {}
+    return {
+        **extra,
+        'modelo': data.get('modelo'),
+        'confianza': data.get('confianza'),
+        'bbox': data.get('coordenadas_frame_original'),
+        'region': data.get('coordenadas_padding_aplicado'),
+        'coordenadas_ptz': data.get('coordenadas_ptz'),
+        'bytes': data.get('bytes'),
+        'escala': data.get('escala'),
+    }
+
+
+class CaptureDayIndex:
+    """
+    Índice en memoria de las capturas de un día: conteos por carpeta y rutas
+    ordenadas de la más reciente a la más antigua. Se carga una vez desde el
+    catálogo y luego se actualiza por inserción con los eventos de ``subscribe``.
+    """
+
+    def __init__(self, fecha: str, carpetas: Iterable[str]):
+        self.fecha = fecha
+        self.carpetas = tuple(carpetas)
+        self.conteos: Dict[str, int] = {carpeta: 0 for carpeta in self.carpetas}
+        self._orden: List[Tuple[float, str]] = []  # (-ts, ruta)
+        self._rutas: Dict[str, Tuple[float, str]] = {}
+
+    @classmethod
+    def desde_catalogo(cls, catalogo: CaptureCatalog, fecha: str, carpetas: Iterable[str]) -> 'CaptureDayIndex':
+        indice = cls(fecha, carpetas)
+        entradas = catalogo.entradas(fecha, indice.carpetas)
+        for ts, ruta, carpeta in entradas:
+            indice._rutas[ruta] = (-ts, carpeta)
+            indice.conteos[carpeta] = indice.conteos.get(carpeta, 0) + 1
+        indice._orden = sorted((-ts, ruta) for ts, ruta, _ in entradas)
+        return indice
+
+    @property
+    def total(self) -> int:
+        return len(self._orden)
+
+    def contiene(self, ruta: str) -> bool:
+        return ruta in self._rutas
+
+    def agregar(self, registro: Dict) -> bool:
+        """Insertar una captura; False si no es de este día/carpetas o ya estaba"""
+        ruta, carpeta = registro.get('ruta'), registro.get('carpeta')
+        if registro.get('fecha') != self.fecha or carpeta not in self.carpetas or ruta in self._rutas:
+            return False
+        clave = (-float(registro.get('ts') or time.time()), ruta)
+        bisect.insort(self._orden, clave)
+        self._rutas[ruta] = (clave[0], carpeta)
+        self.conteos[carpeta] += 1
+        return True
+
+    def eliminar(self, ruta: str) -> bool:
+        entrada = self._rutas.pop(ruta, None)
+        if entrada is None:
+            return False
+        clave, carpeta = (entrada[0], ruta), entrada[1]
+        posicion = bisect.bisect_left(self._orden, clave)
+        if posicion < len(self._orden) and self._orden[posicion] == clave:
+            del self._orden[posicion]
+        self.conteos[carpeta] = max(0, self.conteos.get(carpeta, 0) - 1)
+        return True
+
+    def pagina(self, offset: int, limit: int) -> List[str]:
+        return [ruta for _, ruta in self._orden[offset:offset + limit]]
+
+
+def metadata_para_ui(registro: Dict) -> Dict:
+    """Fila del catálogo con las claves del antiguo JSON lateral (diálogo de detalle)"""
+    return {
+        "fecha": registro.get("fecha") or "❓",
+        "hora": registro.get("hora") or "❓",
+        "modelo": registro.get("modelo") or "❓",
+        "coordenadas_frame_original": registro.get("bbox") or "No disponibles",
+        "coordenadas_ptz": registro.get("coordenadas_ptz") or "No disponibles",
+        "confianza": str(registro["confianza"]) if registro.get("confianza") is not None else "No disponible",
+        "camara": registro.get("camara"),
+        "track_id": registro.get("track_id"),
+    }
+
+
+_catalog: Optional[CaptureCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_capture_catalog(db_path: str = DEFAULT_DB_PATH) -> CaptureCatalog:
+    """Catálogo compartido del proceso; la primera vez importa las capturas existentes"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = CaptureCatalog(db_path)
+            try:
+                _catalog.importar_existentes(os.path.dirname(db_path) or ".")
+            except Exception as e:
+                logger.warning("No se pudieron importar capturas existentes: %s", e)
+        return _catalog
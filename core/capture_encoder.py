@@ -0,0 +1,219 @@
+"""
+Codificadores de imagen para las capturas de alerta.
+
+``cv2.imwrite`` con parámetros por defecto codifica a calidad 95 con la ruta
+lenta de OpenCV. Aquí el formato es intercambiable: JPEG con libjpeg-turbo
+(PyTurboJPEG) si está instalado, JPEG de OpenCV como respaldo y WebP/AVIF para
+archivo. Calidad y submuestreo de croma se configuran por preset o a mano.
+También genera las miniaturas JPEG de la galería del resumen.
+"""
+
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+
+from logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    from turbojpeg import TJPF_BGR, TJSAMP_420, TJSAMP_422, TJSAMP_444, TurboJPEG
+    TURBOJPEG_AVAILABLE = True
+except ImportError:
+    TURBOJPEG_AVAILABLE = False
+
+SUBMUESTREOS = ('444', '422', '420')
+
+# formato, calidad, submuestreo de croma y lado máximo del recorte guardado
+PRESETS: Dict[str, Dict] = {
+    'alta': {'formato': 'jpeg', 'calidad': 95, 'submuestreo': '444', 'max_lado': None},
+    'normal': {'formato': 'jpeg', 'calidad': 90, 'submuestreo': '420', 'max_lado': None},
+    'compacta': {'formato': 'jpeg', 'calidad': 75, 'submuestreo': '420', 'max_lado': 960},
+    'archivo': {'formato': 'webp', 'calidad': 80, 'submuestreo': '420', 'max_lado': 1280},
+}
+
+
+class CaptureEncoder:
+    """Convierte una imagen BGR (numpy) en los bytes del archivo"""
+
+    formato = 'jpeg'
+    extension = '.jpg'
+
+    def __init__(self, calidad: int = 90, submuestreo: str = '420'):
+        if submuestreo not in SUBMUESTREOS:
+            raise ValueError(f"submuestreo debe ser uno de {SUBMUESTREOS}")
+        self.calidad = max(1, min(100, int(calidad)))
+        self.submuestreo = submuestreo
+
+    def encode(self, image) -> bytes:
+        raise NotImplementedError
+
+    def describe(self) -> Dict:
+        return {
+            'encoder': type(self).__name__,
+            'formato': self.formato,
+            'calidad': self.calidad,
+            'submuestreo': self.submuestreo,
+        }
+
+
+class TurboJPEGEncoder(CaptureEncoder):
+    """JPEG con libjpeg-turbo; lanza ``RuntimeError`` si la librería no carga"""
+
+    _shared = None
+
+    def __init__(self, calidad: int = 90, submuestreo: str = '420'):
+        super().__init__(calidad, submuestreo)
+        if not TURBOJPEG_AVAILABLE:
+            raise RuntimeError("PyTurboJPEG no está instalado")
+        if TurboJPEGEncoder._shared is None:
+            try:
+                TurboJPEGEncoder._shared = TurboJPEG()
+            except Exception as e:
+                raise RuntimeError(f"libturbojpeg no disponible: {e}") from e
+        self._jpeg = TurboJPEGEncoder._shared
+        self._subsample = {'444': TJSAMP_444, '422': TJSAMP_422, '420': TJSAMP_420}[submuestreo]
+
+    def encode(self, image) -> bytes:
+        return self._jpeg.encode(image, quality=self.calidad, pixel_format=TJPF_BGR,
+                                 jpeg_subsample=self._subsample)
+
+
+class OpenCVJPEGEncoder(CaptureEncoder):
+    """JPEG con ``cv2.imencode``"""
+
+    def __init__(self, calidad: int = 90, submuestreo: str = '420'):
+        super().__init__(calidad, submuestreo)
+        self._params = [cv2.IMWRITE_JPEG_QUALITY, self.calidad]
+        # IMWRITE_JPEG_SAMPLING_FACTOR existe desde OpenCV 4.5.5
+        factor = getattr(cv2, f'IMWRITE_JPEG_SAMPLING_FACTOR_{submuestreo}', None)
+        if hasattr(cv2, 'IMWRITE_JPEG_SAMPLING_FACTOR') and factor is not None:
+            self._params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, factor]
+
+    def encode(self, image) -> bytes:
+        ok, buffer = cv2.imencode('.jpg', image, self._params)
+        if not ok:
+            raise RuntimeError("cv2.imencode falló (jpeg)")
+        return buffer.tobytes()
+
+
+class OpenCVWebPEncoder(CaptureEncoder):
+    """WebP con pérdida (submuestreo fijo 4:2:0 en libwebp)"""
+
+    formato = 'webp'
+    extension = '.webp'
+
+    def __init__(self, calidad: int = 80, submuestreo: str = '420'):
+        super().__init__(calidad, submuestreo)
+        if not cv2.haveImageWriter('.webp'):
+            raise RuntimeError("OpenCV compilado sin soporte WebP")
+
+    def encode(self, image) -> bytes:
+        ok, buffer = cv2.imencode('.webp', image, [cv2.IMWRITE_WEBP_QUALITY, self.calidad])
+        if not ok:
+            raise RuntimeError("cv2.imencode falló (webp)")
+        return buffer.tobytes()
+
+
+class OpenCVAVIFEncoder(CaptureEncoder):
+    """AVIF (OpenCV >= 4.10 compilado con libavif)"""
+
+    formato = 'avif'
+    extension = '.avif'
+
+    def __init__(self, calidad: int = 60, submuestreo: str = '420'):
+        super().__init__(calidad, submuestreo)
+        if not hasattr(cv2, 'IMWRITE_AVIF_QUALITY') or not cv2.haveImageWriter('.avif'):
+            raise RuntimeError("OpenCV sin soporte AVIF")
+
+    def encode(self, image) -> bytes:
+        ok, buffer = cv2.imencode('.avif', image, [cv2.IMWRITE_AVIF_QUALITY, self.calidad])
+        if not ok:
+            raise RuntimeError("cv2.imencode falló (avif)")
+        return buffer.tobytes()
+
+
+# Orden de preferencia por formato; si uno no está disponible se prueba el siguiente
+_CADENAS = {
+    'jpeg': (TurboJPEGEncoder, OpenCVJPEGEncoder),
+    'webp': (OpenCVWebPEncoder, TurboJPEGEncoder, OpenCVJPEGEncoder),
+    'avif': (OpenCVAVIFEncoder, OpenCVWebPEncoder, TurboJPEGEncoder, OpenCVJPEGEncoder),
+}
+
+
+def create_capture_encoder(formato: Optional[str] = None, calidad: Optional[int] = None,
+                           submuestreo: Optional[str] = None,
+                           preset: Optional[str] = None) -> CaptureEncoder:
+    """
+    Codificador para ``formato`` (jpeg, webp, avif). Los valores no indicados
+    salen del ``preset`` (por defecto ``normal``). Si el formato no está
+    disponible se degrada a WebP o JPEG y se avisa en el log.
+    """
+    base = PRESETS[preset or 'normal']
+    formato = formato or base['formato']
+    if formato not in _CADENAS:
+        raise ValueError(f"formato debe ser uno de {tuple(_CADENAS)}")
+    calidad = calidad if calidad is not None else base['calidad']
+    submuestreo = submuestreo or base['submuestreo']
+
+    for encoder_cls in _CADENAS[formato]:
+        try:
+            encoder = encoder_cls(calidad, submuestreo)
+        except RuntimeError as e:
+            logger.debug("%s no disponible: %s", encoder_cls.__name__, e)
+            continue
+        if encoder.formato != formato:
+            logger.warning("Formato %s no disponible, usando %s", formato, encoder.formato)
+        return encoder
+    raise RuntimeError("Ningún codificador de imagen disponible")
+
+
+def reducir_a_max_lado(image, max_lado: Optional[int]) -> Tuple[object, float]:
+    """Reducir (INTER_AREA) para que el lado mayor no supere ``max_lado``; devuelve (imagen, escala)"""
+    if not max_lado:
+        return image, 1.0
+    h, w = image.shape[:2]
+    escala = max_lado / max(h, w)
+    if escala >= 1.0:
+        return image, 1.0
+    size = (max(1, int(round(w * escala))), max(1, int(round(h * escala))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), escala
+
+
+def codificar(encoder: CaptureEncoder, image) -> Tuple[bytes, float]:
+    """Codificar y medir: devuelve (bytes, ms)"""
+    start = time.perf_counter()
+    data = encoder.encode(image)
+    return data, (time.perf_counter() - start) * 1000
+
+
+# ===== MINIATURAS DE LA GALERÍA =====
+
+MINIATURA_LADO = 120
+EXTENSIONES_VIDEO = ('.mp4', '.avi', '.mkv', '.mov')
+
+
+def generar_miniatura(image, lado: int = MINIATURA_LADO, calidad: int = 80) -> Optional[bytes]:
+    """JPEG pequeño (lado mayor = ``lado``) para la galería del resumen"""
+    if image is None or image.size == 0:
+        return None
+    reducida, _ = reducir_a_max_lado(image, lado)
+    ok, buffer = cv2.imencode('.jpg', reducida, [cv2.IMWRITE_JPEG_QUALITY, calidad])
+    return buffer.tobytes() if ok else None
+
+
+def miniatura_de_archivo(ruta: str, lado: int = MINIATURA_LADO) -> Optional[bytes]:
+    """Miniatura de una imagen o fotograma de portada de un video (decodificado con OpenCV)"""
+    if ruta.lower().endswith(EXTENSIONES_VIDEO):
+        cap = cv2.VideoCapture(ruta)
+        try:
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            if total > 10:
+                # Evitar el primer fotograma (suele salir negro o incompleto)
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 10)
+            ok, frame = cap.read()
+        finally:
+            cap.release()
+        return generar_miniatura(frame, lado) if ok else None
+    return generar_miniatura(cv2.imread(ruta), lado)
@@ -0,0 +1,425 @@
+"""
+Escritura de capturas de alerta en un pool fijo de hilos.
+
+Antes cada captura aprobada creaba un ``ImageSaverThread`` (un QThread) que
+guardaba una referencia al frame completo, el mismo buffer que el lector del
+stream sigue reescribiendo. Aquí el recorte con padding se calcula y se copia
+al encolar, de modo que la cola solo retiene los píxeles que se van a guardar,
+y un número fijo de hilos escribe la imagen y la registra en el catálogo
+SQLite (``core.capture_catalog``); sin catálogo se escribe el JSON lateral.
+
+La cola es acotada: si el disco va lento, ``submit`` espera como mucho
+``put_timeout`` y luego aplica la política de descarte (``drop_oldest`` o
+``drop_newest``), contando cada descarte. La reducción a ``max_lado`` y la
+codificación (``core.capture_encoder``) se hacen en los hilos del pool.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import cv2
+
+from core.capture_catalog import CaptureCatalog, get_capture_catalog
+from core.capture_encoder import (
+    PRESETS,
+    CaptureEncoder,
+    codificar,
+    create_capture_encoder,
+    generar_miniatura,
+    reducir_a_max_lado,
+)
+from logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+MIN_CROP_WIDTH = 300
+MIN_CROP_HEIGHT = 300
+PADDING_PERCENTAGE = 0.15
+
+
+def _expandir_eje(inicio: int, fin: int, minimo: int, limite: int) -> Tuple[int, int]:
+    """Ensanchar [inicio, fin) hasta ``minimo`` sin salir de [0, limite)"""
+    if fin - inicio >= minimo:
+        return inicio, fin
+    faltante = minimo - (fin - inicio)
+    inicio -= faltante // 2
+    fin += faltante - faltante // 2
+    if inicio < 0:
+        fin = min(limite, fin - inicio)
+        inicio = 0
+    if fin > limite:
+        inicio = max(0, inicio - (fin - limite))
+        fin = limite
+    if fin - inicio < minimo:
+        # Expansión unilateral si aún es pequeño
+        if inicio == 0 and fin < limite:
+            fin = min(limite, inicio + minimo)
+        elif fin == limite and inicio > 0:
+            inicio = max(0, fin - minimo)
+    return inicio, fin
+
+
+def calcular_recorte(bbox, frame_shape, padding: float = PADDING_PERCENTAGE,
+                     min_width: int = MIN_CROP_WIDTH,
+                     min_height: int = MIN_CROP_HEIGHT) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Región (x1, y1, x2, y2) a recortar para un bbox: padding proporcional,
+    tamaño mínimo y ajuste a los bordes del frame. Si el resultado es inválido
+    se usa el bbox original recortado al frame; None si tampoco es válido.
+    """
+    x1, y1, x2, y2 = map(int, bbox)
+    if x1 >= x2 or y1 >= y2:
+        return None
+    frame_h, frame_w = frame_shape[:2]
+
+    padding_w = int((x2 - x1) * padding)
+    padding_h = int((y2 - y1) * padding)
+    final_x1, final_x2 = max(0, x1 - padding_w), min(frame_w, x2 + padding_w)
+    final_y1, final_y2 = max(0, y1 - padding_h), min(frame_h, y2 + padding_h)
+
+    final_x1, final_x2 = _expandir_eje(final_x1, final_x2, min_width, frame_w)
+    final_y1, final_y2 = _expandir_eje(final_y1, final_y2, min_height, frame_h)
+
+    if final_y1 >= final_y2 or final_x1 >= final_x2:
+        final_x1, final_y1 = max(0, x1), max(0, y1)
+        final_x2, final_y2 = min(frame_w, x2), min(frame_h, y2)
+        if final_y1 >= final_y2 or final_x1 >= final_x2:
+            return None
+    return final_x1, final_y1, final_x2, final_y2
+
+
+def recortar(frame, bbox) -> Optional[Tuple[Any, Tuple[int, int, int, int]]]:
+    """Copia de la región a guardar para ``bbox`` y la región; None si el bbox no es válido"""
+    region = calcular_recorte(bbox, frame.shape)
+    if region is None:
+        return None
+    x1, y1, x2, y2 = region
+    return frame[y1:y2, x1:x2].copy(), region
+
+
+def carpeta_captura(cls, modelo: str) -> str:
+    """Carpeta base de ``capturas/`` según clase y modelo"""
+    if cls == 0 and modelo == "Embarcaciones":
+        return "embarcaciones"
+    if cls == 0:
+        return "personas"
+    if cls == 2:
+        return "autos"
+    if cls == 8:
+        return "barcos"
+    return "otros"
+
+
+def escribir_captura(crop, bbox, region, cls, coordenadas, modelo, confianza,
+                     encoder: Optional[CaptureEncoder] = None,
+                     max_lado: Optional[int] = None,
+                     camara=None, track_id=None,
+                     catalogo: Optional[CaptureCatalog] = None) -> Optional[Dict]:
+    """
+    Reducir ``crop`` a ``max_lado``, dibujar el bbox (``crop`` es un recorte
+    propio) y guardar ``capturas/<carpeta>/<fecha>/<nombre><ext>``. Los
+    metadatos van al ``catalogo`` o, si no hay, a un JSON lateral. Devuelve
+    ``{'ruta', 'bytes', 'encode_ms', 'formato'}`` o None si no se pudo escribir.
+    """
+    encoder = encoder or create_capture_encoder()
+    crop, escala = reducir_a_max_lado(crop, max_lado)
+
+    final_x1, final_y1, final_x2, final_y2 = region
+    x1, y1, x2, y2 = map(int, bbox)
+    crop_h, crop_w = crop.shape[:2]
+    rect_x1, rect_y1 = max(0, int((x1 - final_x1) * escala)), max(0, int((y1 - final_y1) * escala))
+    rect_x2, rect_y2 = min(crop_w, int((x2 - final_x1) * escala)), min(crop_h, int((y2 - final_y1) * escala))
+    if rect_x1 < rect_x2 and rect_y1 < rect_y2:
+        cv2.rectangle(crop, (rect_x1, rect_y1), (rect_x2, rect_y2), (0, 255, 0), 2)
+
+    now = datetime.now()
+    fecha = now.strftime("%Y-%m-%d")
+    hora = now.strftime("%H-%M-%S")
+    carpeta = carpeta_captura(cls, modelo)
+    ruta = os.path.join("capturas", carpeta, fecha)
+    os.makedirs(ruta, exist_ok=True)
+    nombre = f"{fecha}_{hora}_{uuid.uuid4().hex[:6]}"
+    path_final = os.path.join(ruta, f"{nombre}{encoder.extension}")
+
+    try:
+        data, encode_ms = codificar(encoder, crop)
+        with open(path_final, "wb") as f:
+            f.write(data)
+    except Exception as e:
+        logger.warning("No se pudo escribir la captura %s: %s", path_final, e)
+        return None
+    resultado = {'ruta': path_final, 'bytes': len(data), 'encode_ms': encode_ms, 'formato': encoder.formato}
+
+    if catalogo is not None:
+        catalogo.add({
+            'ruta': path_final, 'ts': now.timestamp(), 'fecha': fecha,
+            'hora': hora.replace("-", ":"), 'carpeta': carpeta, 'cls': int(cls),
+            'modelo': modelo, 'camara': camara, 'track_id': track_id,
+            'confianza': float(confianza) if confianza is not None else None,
+            'bbox': list(bbox), 'region': list(region), 'coordenadas_ptz': coordenadas,
+            'formato': encoder.formato, 'bytes': len(data), 'escala': round(escala, 4),
+            'miniatura': generar_miniatura(crop),
+        })
+        return resultado
+
+    metadata = {
+        "fecha": fecha, "hora": hora.replace("-", ":"), "modelo": modelo,
+        "coordenadas_frame_original": bbox,
+        "coordenadas_padding_aplicado": tuple(region),
+        "coordenadas_ptz": coordenadas,
+        "confianza": confianza,
+        "formato": encoder.formato,
+        "escala": round(escala, 4),
+        "bytes": len(data),
+    }
+    try:
+        with open(os.path.join(ruta, f"{nombre}.json"), "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, separators=(",", ":"))
+    except Exception as e:
+        logger.warning("Error guardando metadata para %s: %s", path_final, e)
+    return resultado
+
+
+@dataclass
+class CaptureJob:
+    """Recorte ya copiado, listo para escribir"""
+    crop: Any
+    bbox: Tuple[int, int, int, int]
+    region: Tuple[int, int, int, int]
+    cls: int
+    coordenadas: Any
+    modelo: str
+    confianza: float
+    camara: Optional[str] = None
+    track_id: Any = None
+    enqueued_at: float = field(default_factory=time.time)
+
+
+class CaptureWriterPool:
+    """
+    Pool de ``workers`` hilos con cola acotada a ``max_queue`` trabajos.
+
+    ``submit`` nunca retiene el frame recibido: copia solo la región a guardar.
+    Con la cola llena espera hasta ``put_timeout`` segundos (contrapresión) y
+    luego descarta según ``drop_policy``: ``drop_oldest`` (por defecto, se
+    conserva la captura más reciente) o ``drop_newest``. ``encoder`` y
+    ``max_lado`` se cambian en caliente con ``configurar_codificacion``.
+    Con ``catalogo`` cada captura escrita se registra allí (sin JSON lateral).
+    """
+
+    DROP_POLICIES = ('drop_oldest', 'drop_newest')
+
+    def __init__(self, workers: int = 2, max_queue: int = 32, put_timeout: float = 0.02,
+                 drop_policy: str = 'drop_oldest', encoder: Optional[CaptureEncoder] = None,
+                 max_lado: Optional[int] = None, catalogo: Optional[CaptureCatalog] = None):
+        if drop_policy not in self.DROP_POLICIES:
+            raise ValueError(f"drop_policy debe ser uno de {self.DROP_POLICIES}")
+        self.workers = max(1, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        self.put_timeout = put_timeout
+        self.drop_policy = drop_policy
+        self.encoder = encoder or create_capture_encoder()
+        self.max_lado = max_lado
+        self.catalogo = catalogo
+        self._queue: Deque[CaptureJob] = deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = False
+        self._busy = 0
+        self.stats = {
+            'submitted': 0,
+            'written': 0,
+            'errors': 0,
+            'invalid': 0,
+            'dropped_oldest': 0,
+            'dropped_newest': 0,
+            'max_queue_depth': 0,
+            'queued_bytes': 0,
+            'last_write_ms': 0.0,
+            'avg_write_ms': 0.0,
+            'max_write_ms': 0.0,
+            'avg_queue_wait_ms': 0.0,
+            'avg_encode_ms': 0.0,
+            'max_encode_ms': 0.0,
+            'avg_bytes': 0.0,
+            'total_bytes': 0,
+        }
+
+    def configurar_codificacion(self, preset: Optional[str] = None, formato: Optional[str] = None,
+                                calidad: Optional[int] = None, submuestreo: Optional[str] = None,
+                                max_lado: Optional[int] = None):
+        """
+        Cambiar formato/calidad/submuestreo y lado máximo de las próximas
+        capturas. ``max_lado`` sin indicar toma el del preset (None = sin reducir).
+        """
+        encoder = create_capture_encoder(formato, calidad, submuestreo, preset)
+        if max_lado is None and preset:
+            max_lado = PRESETS[preset]['max_lado']
+        with self._cond:
+            self.encoder = encoder
+            self.max_lado = max_lado
+        logger.info("Capturas: %s, max_lado=%s", encoder.describe(), max_lado)
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+            self._threads = [
+                threading.Thread(target=self._run, name=f"capture-writer-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        """Detener los hilos tras vaciar la cola"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=timeout)
+        self._threads = []
+
+    def submit(self, frame, bbox, cls, coordenadas, modelo, confianza,
+               camara=None, track_id=None) -> bool:
+        """
+        Encolar la captura de ``bbox`` en ``frame``. Devuelve False si el bbox
+        no produce un recorte válido o si la propia captura se descartó.
+        """
+        if frame is None or bbox is None:
+            return False
+        recorte = recortar(frame, bbox)
+        if recorte is None:
+            self.stats['invalid'] += 1
+            return False
+        crop, region = recorte
+        return self.submit_recorte(crop, bbox, region, cls, coordenadas, modelo, confianza,
+                                   camara=camara, track_id=track_id)
+
+    def submit_recorte(self, crop, bbox, region, cls, coordenadas, modelo, confianza,
+                       camara=None, track_id=None) -> bool:
+        """
+        Encolar un recorte ya copiado (``recortar``); ``bbox`` y ``region`` en
+        coordenadas del frame original. El pool pasa a ser dueño de ``crop``.
+        """
+        job = CaptureJob(
+            crop=crop,
+            bbox=tuple(int(v) for v in bbox),
+            region=tuple(int(v) for v in region),
+            cls=cls,
+            coordenadas=coordenadas,
+            modelo=modelo,
+            confianza=confianza,
+            camara=camara,
+            track_id=track_id,
+        )
+
+        with self._cond:
+            if not self._running:
+                self.start()
+            self.stats['submitted'] += 1
+            if len(self._queue) >= self.max_queue:
+                # Contrapresión: dar una oportunidad breve a los escritores
+                self._cond.wait_for(lambda: len(self._queue) < self.max_queue, self.put_timeout)
+            if len(self._queue) >= self.max_queue:
+                if self.drop_policy == 'drop_newest':
+                    self.stats['dropped_newest'] += 1
+                    return False
+                dropped = self._queue.popleft()
+                self.stats['queued_bytes'] -= dropped.crop.nbytes
+                self.stats['dropped_oldest'] += 1
+            self._queue.append(job)
+            self.stats['queued_bytes'] += job.crop.nbytes
+            self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], len(self._queue))
+            self._cond.notify_all()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and self._running:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                job = self._queue.popleft()
+                self.stats['queued_bytes'] -= job.crop.nbytes
+                self._busy += 1
+                encoder, max_lado = self.encoder, self.max_lado
+                # Hay hueco: despertar a un submit en espera
+                self._cond.notify_all()
+
+            start = time.perf_counter()
+            try:
+                result = escribir_captura(job.crop, job.bbox, job.region, job.cls,
+                                          job.coordenadas, job.modelo, job.confianza,
+                                          encoder=encoder, max_lado=max_lado,
+                                          camara=job.camara, track_id=job.track_id,
+                                          catalogo=self.catalogo)
+            except Exception as e:
+                result = None
+                logger.warning("Error escribiendo captura: %s", e)
+            write_ms = (time.perf_counter() - start) * 1000
+            with self._cond:
+                self._busy -= 1
+                self._record_write(result, write_ms, time.time() - job.enqueued_at)
+
+    def _record_write(self, result: Optional[Dict], write_ms: float, total_s: float):
+        stats = self.stats
+        if result is None:
+            stats['errors'] += 1
+            return
+        stats['written'] += 1
+        stats['total_bytes'] += result['bytes']
+        stats['max_encode_ms'] = max(stats['max_encode_ms'], result['encode_ms'])
+        stats['last_write_ms'] = write_ms
+        stats['max_write_ms'] = max(stats['max_write_ms'], write_ms)
+        queue_wait_ms = max(0.0, total_s * 1000 - write_ms)
+        if stats['written'] == 1:
+            stats['avg_write_ms'] = write_ms
+            stats['avg_queue_wait_ms'] = queue_wait_ms
+            stats['avg_encode_ms'] = result['encode_ms']
+            stats['avg_bytes'] = float(result['bytes'])
+        else:
+            stats['avg_write_ms'] += 0.2 * (write_ms - stats['avg_write_ms'])
+            stats['avg_queue_wait_ms'] += 0.2 * (queue_wait_ms - stats['avg_queue_wait_ms'])
+            stats['avg_encode_ms'] += 0.2 * (result['encode_ms'] - stats['avg_encode_ms'])
+            stats['avg_bytes'] += 0.2 * (result['bytes'] - stats['avg_bytes'])
+
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            return {
+                **self.stats,
+                'queue_depth': len(self._queue),
+                'in_progress': self._busy,
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'drop_policy': self.drop_policy,
+                'encoder': self.encoder.describe(),
+                'max_lado': self.max_lado,
+            }
+
+
+_pool: Optional[CaptureWriterPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_capture_writer() -> CaptureWriterPool:
+    """Pool de escritura compartido por todos los gestores de alertas"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = CaptureWriterPool(catalogo=get_capture_catalog())
+        return _pool.start()
@@ -0,0 +1,307 @@
+"""
+Almacén de eventos de detección para búsquedas en la línea de tiempo.
+
+Las salidas del tracker (``id``, ``cls``, ``conf``, ``bbox``, ``centers``) se
+muestrean por track a ``muestras_por_segundo`` y se guardan en
+``capturas/detecciones.db`` (SQLite WAL, escritura por lotes con la misma base
+que el catálogo de capturas, ``BatchedWalDatabase``). Las coordenadas se normalizan a 0-1 con el tamaño del frame, así
+una celda de la grilla (fila, columna) es un rectángulo fijo aunque cambie la
+resolución de detección.
+
+Un índice R-tree sobre (tiempo, x, y) resuelve los filtros de región; sin
+región se usan los índices (camara, ts) y (cls, ts). ``buscar`` agrupa las
+muestras en segmentos de track (cortados tras ``max_gap`` segundos sin
+muestras) y enlaza las capturas del catálogo del mismo track y cámara en ese
+intervalo. Las consultas se limitan a las ``limit`` muestras más recientes; si
+el límite corta el resultado, ``buscar`` lo indica con ``truncado``.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from logging_utils import get_logger
+from core.capture_catalog import BatchedWalDatabase
+
+logger = get_logger(__name__)
+
+DEFAULT_DB_PATH = os.path.join("capturas", "detecciones.db")
+GRILLA_DEFECTO = (18, 22)  # filas, columnas de GrillaWidget
+
+# El R-tree guarda float32: el tiempo se indexa relativo a esta base (resolución
+# de unos segundos, que el filtro exacto sobre ``ts`` corrige)
+_TS_BASE = 1.7e9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS detecciones (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camara TEXT NOT NULL,
+    track_id TEXT NOT NULL,
+    cls INTEGER,
+    conf REAL,
+    x1 REAL, y1 REAL, x2 REAL, y2 REAL,
+    cx REAL, cy REAL,
+    moving INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_detecciones_camara_ts ON detecciones(camara, ts);
+CREATE INDEX IF NOT EXISTS idx_detecciones_cls_ts ON detecciones(cls, ts);
+CREATE INDEX IF NOT EXISTS idx_detecciones_ts ON detecciones(ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS detecciones_rtree USING rtree(
+    id, t_min, t_max, x_min, x_max, y_min, y_max
+);
+"""
+
+_COLUMNAS = ('ts', 'camara', 'track_id', 'cls', 'conf', 'x1', 'y1', 'x2', 'y2', 'cx', 'cy', 'moving')
+
+
+def region_de_celda(fila: int, columna: int, grilla: Tuple[int, int] = GRILLA_DEFECTO) -> Tuple[float, float, float, float]:
+    """Rectángulo normalizado (x1, y1, x2, y2) de una celda de la grilla"""
+    filas, columnas = grilla
+    return (columna / columnas, fila / filas, (columna + 1) / columnas, (fila + 1) / filas)
+
+
+class DetectionStore(BatchedWalDatabase):
+    """Muestras de tracks con escritura por lotes y consultas por tiempo, clase, cámara y región"""
+
+    nombre_hilo = "detection-store"
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, muestras_por_segundo: float = 2.0,
+                 batch_size: int = 256, flush_interval: float = 1.0, dias: Optional[float] = 30):
+        self.intervalo = 1.0 / muestras_por_segundo if muestras_por_segundo else 0.0
+        self.dias = dias
+        self._ultima_muestra: Dict[Tuple[str, str], float] = {}
+        self._ultima_purga = 0.0
+        self.stats = {
+            'received': 0,
+            'sampled': 0,
+            'inserted': 0,
+            'batches': 0,
+            'errors': 0,
+            'purged': 0,
+            'last_batch_ms': 0.0,
+            'last_query_ms': 0.0,
+            'truncated_queries': 0,
+        }
+        super().__init__(db_path, _SCHEMA, batch_size, flush_interval)
+
+    # ===== ESCRITURA =====
+
+    def configurar(self, muestras_por_segundo: float):
+        """Cambiar la frecuencia de muestreo por track (0 = guardar todas)"""
+        self.intervalo = 1.0 / muestras_por_segundo if muestras_por_segundo else 0.0
+
+    def registrar(self, camara: str, resultados: Iterable[Dict], frame_size: Tuple[int, int],
+                  ts: Optional[float] = None):
+        """
+        Encolar la salida del tracker de un frame. ``frame_size`` es (ancho, alto)
+        del frame donde están los bbox. Las cajas predichas de tracks perdidos no
+        se guardan, y cada track se muestrea como mucho cada ``1/muestras_por_segundo`` s.
+        """
+        ts = ts or time.time()
+        w, h = frame_size
+        if not w or not h:
+            return
+        camara = str(camara)
+        filas = []
+        for r in resultados:
+            self.stats['received'] += 1
+            track_id = r.get('id', r.get('track_id'))
+            if track_id is None or r.get('predicted') or (isinstance(track_id, int) and track_id < 0):
+                continue
+            clave = (camara, str(track_id))
+            if ts - self._ultima_muestra.get(clave, 0.0) < self.intervalo:
+                continue
+            self._ultima_muestra[clave] = ts
+            x1, y1, x2, y2 = (float(v) for v in r['bbox'][:4])
+            centers = r.get('centers')
+            cx, cy = centers[-1] if centers else ((x1 + x2) / 2, (y1 + y2) / 2)
+            filas.append((ts, camara, str(track_id), r.get('cls'), float(r.get('conf') or 0.0),
+                          x1 / w, y1 / h, x2 / w, y2 / h, float(cx) / w, float(cy) / h,
+                          int(bool(r.get('moving')))))
+        if not filas:
+            return
+        self.stats['sampled'] += len(filas)
+        with self._cond:
+            self._pending.extend(filas)
+            self._ensure_thread()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def flush(self):
+        """Escribir las muestras pendientes (tabla y R-tree) en una transacción"""
+        with self._cond:
+            filas, self._pending = self._pending, []
+        if not filas:
+            return
+        start = time.perf_counter()
+        try:
+            conn = self._connection()
+            with conn:
+                for fila in filas:
+                    cursor = conn.execute(
+                        f"INSERT INTO detecciones ({', '.join(_COLUMNAS)}) "
+                        f"VALUES ({', '.join('?' for _ in _COLUMNAS)})", fila
+                    )
+                    t = fila[0] - _TS_BASE
+                    conn.execute(
+                        "INSERT INTO detecciones_rtree VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (cursor.lastrowid, t, t, fila[5], fila[7], fila[6], fila[8])
+                    )
+        except sqlite3.Error as e:
+            self.stats['errors'] += 1
+            logger.warning("Detecciones: error insertando %d muestras: %s", len(filas), e)
+            return
+        self.stats['inserted'] += len(filas)
+        self.stats['batches'] += 1
+        self.stats['last_batch_ms'] = (time.perf_counter() - start) * 1000
+
+    def _mantenimiento(self):
+        """Olvidar tracks inactivos y purgar muestras viejas (una vez por hora)"""
+        now = time.time()
+        if now - self._ultima_purga < 3600:
+            return
+        self._ultima_purga = now
+        limite = now - max(60.0, self.intervalo * 10)
+        for clave in [c for c, t in list(self._ultima_muestra.items()) if t < limite]:
+            self._ultima_muestra.pop(clave, None)
+        if self.dias:
+            self.purgar(now - self.dias * 86400)
+
+    def purgar(self, antes_de: float) -> int:
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute(
+                    "DELETE FROM detecciones_rtree WHERE id IN (SELECT id FROM detecciones WHERE ts < ?)",
+                    (antes_de,)
+                )
+                borradas = conn.execute("DELETE FROM detecciones WHERE ts < ?", (antes_de,)).rowcount
+        except sqlite3.Error as e:
+            logger.warning("Detecciones: error purgando: %s", e)
+            return 0
+        self.stats['purged'] += borradas
+        return borradas
+
+    # ===== CONSULTAS =====
+
+    def muestras(self, desde: float, hasta: float, clases: Optional[Iterable[int]] = None,
+                 camara: Optional[str] = None, region: Optional[Tuple[float, float, float, float]] = None,
+                 por_bbox: bool = False, limit: int = 50000) -> Tuple[List[Dict], bool]:
+        """
+        (muestras, truncado): las ``limit`` muestras más recientes en [desde, hasta],
+        ordenadas por cámara, track y tiempo, y si quedaron muestras más antiguas
+        fuera. ``region`` (x1, y1, x2, y2 normalizados) filtra por el centro del
+        objeto; con ``por_bbox`` basta con que la caja toque la región.
+        """
+        # Con región el R-tree es el filtro selectivo: el "+" impide que SQLite
+        # prefiera los índices (cls, ts)/(camara, ts) y recorra todo el intervalo
+        d = "+d." if region is not None else "d."
+        condiciones = [f"{d}ts BETWEEN ? AND ?"]
+        params: List = [desde, hasta]
+        if region is not None:
+            rx1, ry1, rx2, ry2 = region
+            origen = "detecciones_rtree r JOIN detecciones d ON d.id = r.id"
+            condiciones += ["r.t_max >= ?", "r.t_min <= ?",
+                            "r.x_max >= ?", "r.x_min <= ?", "r.y_max >= ?", "r.y_min <= ?"]
+            params += [desde - _TS_BASE, hasta - _TS_BASE, rx1, rx2, ry1, ry2]
+            if not por_bbox:
+                condiciones += ["d.cx BETWEEN ? AND ?", "d.cy BETWEEN ? AND ?"]
+                params += [rx1, rx2, ry1, ry2]
+        else:
+            origen = "detecciones d"
+        if clases is not None:
+            clases = list(clases)
+            condiciones.append(f"{d}cls IN ({', '.join('?' for _ in clases)})")
+            params += clases
+        if camara is not None:
+            condiciones.append(f"{d}camara = ?")
+            params.append(str(camara))
+        # El límite se aplica por tiempo (lo más reciente primero) y se pide una
+        # fila de más para saber si cortó; el orden por track se hace aquí
+        rows = self._connection().execute(
+            f"SELECT d.* FROM {origen} WHERE {' AND '.join(condiciones)} "
+            f"ORDER BY d.ts DESC LIMIT ?",
+            (*params, int(limit) + 1)
+        ).fetchall()
+        truncado = len(rows) > limit
+        muestras = [dict(row) for row in rows[:limit]]
+        muestras.sort(key=lambda m: (m['camara'], m['track_id'], m['ts']))
+        return muestras, truncado
+
+    def buscar(self, desde: float, hasta: float, clases: Optional[Iterable[int]] = None,
+               camara: Optional[str] = None, region: Optional[Tuple[float, float, float, float]] = None,
+               celda: Optional[Tuple[int, int]] = None, grilla: Tuple[int, int] = GRILLA_DEFECTO,
+               por_bbox: bool = False, max_gap: float = 10.0, catalogo=None,
+               limit: int = 50000) -> Dict:
+        """
+        ``{'segmentos', 'truncado'}``: segmentos de track que cumplen los filtros,
+        más recientes primero, y si el límite de ``limit`` muestras dejó fuera las
+        más antiguas del intervalo (el segmento más viejo puede estar incompleto).
+        ``celda`` (fila, columna) equivale a la región de esa celda en ``grilla``.
+        Con ``catalogo`` cada segmento incluye sus ``capturas`` (mismo track,
+        cámara e intervalo).
+        """
+        start = time.perf_counter()
+        if celda is not None:
+            region = region_de_celda(celda[0], celda[1], grilla)
+        self.flush()
+        muestras, truncado = self.muestras(desde, hasta, clases, camara, region, por_bbox, limit)
+        if truncado:
+            self.stats['truncated_queries'] += 1
+        segmentos = _agrupar(muestras, max_gap)
+        if catalogo is not None:
+            for segmento in segmentos:
+                segmento['capturas'] = _capturas_de(catalogo, segmento)
+        segmentos.sort(key=lambda s: s['inicio'], reverse=True)
+        self.stats['last_query_ms'] = (time.perf_counter() - start) * 1000
+        return {'segmentos': segmentos, 'truncado': truncado}
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            pending = len(self._pending)
+        return {**self.stats, 'pending': pending, 'tracks_activos': len(self._ultima_muestra)}
+
+
+def _agrupar(muestras: List[Dict], max_gap: float) -> List[Dict]:
+    """Muestras ordenadas por (camara, track, ts) -> segmentos continuos de cada track"""
+    segmentos = []
+    actual = None
+    for m in muestras:
+        if (actual is None or m['camara'] != actual['camara'] or m['track_id'] != actual['track_id']
+                or m['ts'] - actual['fin'] > max_gap):
+            actual = {'camara': m['camara'], 'track_id': m['track_id'], 'inicio': m['ts'],
+                      'fin': m['ts'], 'conf_max': 0.0, 'bbox': None, 'puntos': [], '_clases': Counter()}
+            segmentos.append(actual)
+        actual['fin'] = m['ts']
+        actual['puntos'].append((m['ts'], m['cx'], m['cy']))
+        actual['_clases'][m['cls']] += 1
+        if m['conf'] >= actual['conf_max']:
+            actual['conf_max'] = m['conf']
+            actual['bbox'] = (m['x1'], m['y1'], m['x2'], m['y2'])
+    for segmento in segmentos:
+        segmento['cls'] = segmento.pop('_clases').most_common(1)[0][0]
+        segmento['muestras'] = len(segmento['puntos'])
+    return segmentos
+
+
+def _capturas_de(catalogo, segmento: Dict, margen: float = 5.0) -> List[Dict]:
+    """Capturas del mismo track y cámara en el intervalo del segmento"""
+    return catalogo.por_track_en_rango(segmento['track_id'], segmento['camara'],
+                                       segmento['inicio'] - margen, segmento['fin'] + margen)
+
+
+_store: Optional[DetectionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_detection_store(db_path: str = DEFAULT_DB_PATH) -> DetectionStore:
+    """Almacén de detecciones compartido del proceso"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DetectionStore(db_path)
+        return _store
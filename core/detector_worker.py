@@ -48,7 +48,7 @@ def iou(boxA, boxB):
 class DetectorWorker(QThread):
     result_ready = pyqtSignal(list, str, int)
 
-    def __init__(self, model_key="Personas", parent=None, frame_interval=1, confidence=0.5, imgsz=640, device=None, track=True, lost_ttl=5):
+    def __init__(self, model_key="Personas", parent=None, frame_interval=1, confidence=0.5, imgsz=640, device=None, track=True, lost_ttl=None):
         super().__init__(parent)
         self.model_key = model_key
         if device is None:
@@ -119,6 +119,7 @@ class DetectorWorker(QThread):
                 conf_threshold=self.confidence,
                 device=self.device,
                 lost_ttl=self.lost_ttl,
+                model_key=self.model_key,
             )
         else:
             self.tracker = None
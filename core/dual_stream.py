@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import deque
+
+from core.rtsp_builder import generar_rtsp
+from logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+def urls_dual_stream(cam_data, rtsp_url=None):
+    """
+    Devuelve (url_sub, url_main) para el modo de doble stream.
+
+    ``rtsp_sub`` / ``rtsp_main`` en cam_data tienen prioridad; si no existen
+    se generan con ``generar_rtsp`` usando los perfiles 'sub' y 'main'.
+    """
+    url_main = cam_data.get("rtsp_main") or rtsp_url or cam_data.get("rtsp")
+    url_sub = cam_data.get("rtsp_sub")
+    if "ip" in cam_data:
+        perfil_sub = cam_data.get("perfil_deteccion", "sub")
+        if not url_sub:
+            url_sub = generar_rtsp({**cam_data, "resolucion": perfil_sub})
+        if not url_main:
+            url_main = generar_rtsp({**cam_data, "resolucion": "main"})
+    return url_sub, url_main
+
+
+def mapear_bbox(bbox, origen_size, destino_size):
+    """Escalar un bbox (x1, y1, x2, y2) entre dos resoluciones (w, h)."""
+    ow, oh = origen_size
+    dw, dh = destino_size
+    if not ow or not oh:
+        return tuple(int(v) for v in bbox)
+    sx = dw / ow
+    sy = dh / oh
+    x1, y1, x2, y2 = bbox[:4]
+    return (
+        max(0, min(int(x1 * sx), dw - 1)),
+        max(0, min(int(y1 * sy), dh - 1)),
+        max(0, min(int(x2 * sx), dw - 1)),
+        max(0, min(int(y2 * sy), dh - 1)),
+    )
+
+
+class MainStreamGrabber:
+    """
+    Lector del stream principal (alta resolución) que solo se conecta bajo demanda.
+
+    La detección y la visualización usan el sub-stream; cuando ``GestorAlertas``
+    necesita un recorte de calidad llama a ``obtener_frame``. La conexión se
+    hace en un hilo propio y nunca en el del llamador: ``precalentar`` (con la
+    primera detección) la lanza por adelantado y ``obtener_frame`` devuelve
+    None mientras llega el primer frame. Luego se mantiene un buffer corto de
+    frames recientes. Tras ``idle_timeout`` segundos sin peticiones ni
+    precalentamientos el lector se libera.
+    """
+
+    def __init__(self, rtsp_url, buffer_seconds=2.0, idle_timeout=30.0, reader_factory=None,
+                 retry_interval=10.0):
+        self.rtsp_url = rtsp_url
+        self.buffer_seconds = buffer_seconds
+        self.idle_timeout = idle_timeout
+        self.retry_interval = retry_interval
+        self._retry_after = 0.0
+        self.reader_factory = reader_factory or self._default_reader
+        self.reader = None
+        self.thread = None
+        self.running = False
+        self._attaching = False
+        self._closed = False
+        self.buffer = deque()  # (timestamp, frame)
+        self.last_request = 0.0
+        self.frame_size = None  # (w, h) del stream principal
+        self._lock = threading.Lock()
+        self.stats = {
+            'attaches': 0,
+            'attach_failures': 0,
+            'requests': 0,
+            'hits': 0,
+            'misses': 0,
+        }
+
+    @staticmethod
+    def _default_reader(rtsp_url):
+        from ffmpeg_rtsp_bridge import FFmpegRTSPReader
+        # Sin width/height: resolución nativa obtenida con ffprobe (en el hilo del lector)
+        return FFmpegRTSPReader(rtsp_url)
+
+    def is_attached(self):
+        return self.running
+
+    def precalentar(self):
+        """Conectar en segundo plano si no lo está y renovar el plazo de inactividad (no bloquea)"""
+        self.last_request = time.time()
+        with self._lock:
+            if self.running or self._attaching or self._closed or time.time() < self._retry_after:
+                return
+            self._attaching = True
+        threading.Thread(target=self._attach, daemon=True).start()
+
+    def _attach(self):
+        """Crear e iniciar el lector fuera del lock (la fábrica puede tardar)"""
+        reader = None
+        try:
+            reader = self.reader_factory(self.rtsp_url)
+            if not reader.start():
+                logger.warning("MainStreamGrabber: no se pudo iniciar el stream principal")
+                reader = None
+        except Exception as e:
+            logger.error("MainStreamGrabber: error conectando stream principal: %s", e)
+            reader = None
+        with self._lock:
+            self._attaching = False
+            closed = self._closed
+            if reader is None:
+                self.stats['attach_failures'] += 1
+                self._retry_after = time.time() + self.retry_interval
+                return
+            if not closed:
+                self.reader = reader
+                self.running = True
+                self.stats['attaches'] += 1
+                self.thread = threading.Thread(target=self._loop, daemon=True)
+                self.thread.start()
+        if closed:
+            # release() llegó mientras se conectaba
+            reader.release()
+            return
+        logger.info("MainStreamGrabber: stream principal conectado bajo demanda")
+
+    def _loop(self):
+        while self.running and self.reader is not None:
+            ret, frame = self.reader.read()
+            now = time.time()
+            if ret and frame is not None:
+                self.frame_size = (frame.shape[1], frame.shape[0])
+                with self._lock:
+                    self.buffer.append((now, frame))
+                    while self.buffer and now - self.buffer[0][0] > self.buffer_seconds:
+                        self.buffer.popleft()
+            if now - self.last_request > self.idle_timeout:
+                logger.info("MainStreamGrabber: %.0fs sin peticiones, liberando stream principal", self.idle_timeout)
+                break
+        self._detach()
+
+    def _detach(self):
+        with self._lock:
+            self.running = False
+            reader, self.reader = self.reader, None
+            self.buffer.clear()
+        if reader is not None:
+            try:
+                reader.release()
+            except Exception:
+                pass
+
+    def obtener_frame(self, timestamp=None):
+        """
+        Frame del stream principal más cercano a ``timestamp`` (o el último).
+        Devuelve None si el stream aún no está conectado (la conexión sigue en
+        segundo plano).
+        """
+        self.stats['requests'] += 1
+        self.precalentar()
+        with self._lock:
+            if not self.buffer:
+                self.stats['misses'] += 1
+                return None
+            if timestamp is None:
+                frame = self.buffer[-1][1]
+            else:
+                frame = min(self.buffer, key=lambda item: abs(item[0] - timestamp))[1]
+        self.stats['hits'] += 1
+        return frame
+
+    def release(self):
+        self._closed = True
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+            self.thread = None
+        self._detach()
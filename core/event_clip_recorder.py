@@ -0,0 +1,407 @@
+"""
+Clips de evento por copia de stream (sin recodificar).
+
+``VideoSaverThread`` guarda una lista de frames BGR decodificados y los vuelve
+a codificar con ``mp4v``: 10 s de pre-roll a 1080p son ~1.8 GB por cámara.
+``EventClipRecorder`` mantiene en cambio los paquetes ya codificados del RTSP
+(H.264/H.265 tal cual llegan), agrupados por GOP: el buffer siempre empieza en
+un keyframe y cubre al menos ``pre_roll`` segundos, con un tope en bytes.
+
+Al dispararse una alerta el hilo de demux vuelca el buffer y sigue copiando
+paquetes en vivo hasta ``post_roll`` segundos después del último disparo; el
+resultado es un MP4 que empieza en keyframe. No hay decodificación: el coste
+es el demux del stream y la memoria queda en decenas de MB por cámara.
+
+Solo se graba la pista de video.
+"""
+
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import av
+    AV_AVAILABLE = True
+except ImportError:
+    AV_AVAILABLE = False
+
+CARPETA_CLIPS = os.path.join("capturas", "videos")
+
+
+class _GOP:
+    """Paquetes desde un keyframe hasta el siguiente"""
+    __slots__ = ('inicio', 'paquetes', 'bytes')
+
+    def __init__(self, inicio: float):
+        self.inicio = inicio
+        self.paquetes: List = []
+        self.bytes = 0
+
+
+class PacketRingBuffer:
+    """
+    Buffer de paquetes codificados agrupados por GOP.
+
+    Se descartan GOPs completos por delante mientras el siguiente siga
+    cubriendo ``segundos``, o mientras se supere ``max_bytes``; el GOP en
+    curso nunca se descarta. Los paquetes anteriores al primer keyframe no se
+    guardan (no se pueden decodificar).
+    """
+
+    def __init__(self, segundos: float, max_bytes: int):
+        self.segundos = segundos
+        self.max_bytes = max_bytes
+        self.gops: deque = deque()
+        self.bytes = 0
+        self.ultimo = 0.0
+
+    def agregar(self, paquete, ts: float) -> bool:
+        if paquete.is_keyframe:
+            self.gops.append(_GOP(ts))
+        elif not self.gops:
+            return False
+        gop = self.gops[-1]
+        gop.paquetes.append(paquete)
+        gop.bytes += paquete.size
+        self.bytes += paquete.size
+        self.ultimo = ts
+        self._recortar()
+        return True
+
+    def _recortar(self):
+        gops = self.gops
+        while len(gops) > 1 and (self.ultimo - gops[1].inicio >= self.segundos
+                                 or self.bytes > self.max_bytes):
+            self.bytes -= gops.popleft().bytes
+
+    def desde(self, ts: float) -> List:
+        """Paquetes desde el último keyframe anterior o igual a ``ts`` (o el más antiguo)"""
+        inicio = 0
+        for i, gop in enumerate(self.gops):
+            if gop.inicio > ts:
+                break
+            inicio = i
+        return [p for gop in list(self.gops)[inicio:] for p in gop.paquetes]
+
+    def duracion(self) -> float:
+        return self.ultimo - self.gops[0].inicio if self.gops else 0.0
+
+    def limpiar(self):
+        self.gops.clear()
+        self.bytes = 0
+        self.ultimo = 0.0
+
+
+def _agregar_stream(salida, plantilla):
+    """Stream de salida con los parámetros del de entrada (API de PyAV >= 14 y anterior)"""
+    if hasattr(salida, 'add_stream_from_template'):
+        return salida.add_stream_from_template(plantilla)
+    return salida.add_stream(template=plantilla)
+
+
+class _Clip:
+    """Clip en escritura: el contenedor se abre en el hilo de demux"""
+    __slots__ = ('ruta', 'disparo', 'fin', 'limite', 'eventos', 'salida', 'stream',
+                 'offset', 'ultimo_dts', 'paquetes', 'bytes')
+
+    def __init__(self, ruta: str, disparo: float, fin: float, limite: float):
+        self.ruta = ruta
+        self.disparo = disparo
+        self.fin = fin
+        self.limite = limite
+        self.eventos: List[Dict] = []
+        self.salida = None
+        self.stream = None
+        self.offset = None
+        self.ultimo_dts = None
+        self.paquetes = 0
+        self.bytes = 0
+
+
+class EventClipRecorder:
+    """
+    Grabador de clips de evento de una cámara.
+
+    Abre su propia conexión RTSP (solo demux) con la misma reconexión con
+    backoff que ``PyAVRTSPReader``. ``trigger`` no bloquea: marca el clip y el
+    hilo de demux lo escribe. Un disparo durante un clip en curso extiende el
+    post-roll hasta ``max_clip`` segundos de duración total.
+    """
+
+    def __init__(self, rtsp_url, pre_roll=10.0, post_roll=5.0, max_clip=60.0,
+                 max_buffer_mb=48, output_dir=CARPETA_CLIPS, nombre=None,
+                 open_timeout=10.0, read_timeout=5.0, backoff_initial=1.0, backoff_max=30.0):
+        self.rtsp_url = rtsp_url
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.max_clip = max_clip
+        self.output_dir = output_dir
+        self.nombre = nombre
+        self.open_timeout = open_timeout
+        self.read_timeout = read_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+
+        self.buffer = PacketRingBuffer(pre_roll, int(max_buffer_mb * 1024 * 1024))
+        self.container = None
+        self.running = False
+        self.thread = None
+        self._clip: Optional[_Clip] = None
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'state': 'stopped',
+            'codec': None,
+            'packets': 0,
+            'keyframes': 0,
+            'reconnects': 0,
+            'last_disconnect_reason': None,
+            'clips': 0,
+            'clip_errors': 0,
+            'triggers': 0,
+            'extended': 0,
+            'last_clip': None,
+            'avg_clip_bytes': 0.0,
+            'avg_gop_seconds': 0.0,
+        }
+        self._ultimo_keyframe = None
+
+    # ===== CONEXIÓN =====
+
+    def start(self) -> bool:
+        if self.running:
+            return True
+        if self.thread is not None and self.thread.is_alive():
+            # El hilo de un release() anterior aún está cerrando su clip
+            logger.warning("Clips %s: el hilo anterior aún no terminó", self.nombre)
+            return False
+        if not AV_AVAILABLE:
+            logger.warning("PyAV no está instalado: clips de evento desactivados")
+            return False
+        self.running = True
+        self.stats['state'] = 'connecting'
+        self.thread = threading.Thread(target=self._run, name=f"clips-{self.nombre or 'cam'}",
+                                       daemon=True)
+        self.thread.start()
+        return True
+
+    def _open(self):
+        container = av.open(
+            self.rtsp_url,
+            options={'rtsp_transport': 'tcp'},
+            timeout=(self.open_timeout, self.read_timeout),
+        )
+        stream = container.streams.video[0]
+        self.stats['codec'] = stream.codec_context.name
+        self.container = container
+        return container, stream
+
+    def _close(self):
+        container, self.container = self.container, None
+        if container is not None:
+            try:
+                container.close()
+            except Exception:
+                pass
+
+    def _run(self):
+        """Supervisor: demux y reconexión con backoff"""
+        attempt = 0
+        while self.running:
+            packets_before = self.stats['packets']
+            try:
+                container, stream = self._open()
+                reason = self._demux(container, stream)
+            except Exception as e:
+                reason = f"error: {e}"
+
+            # Los timestamps no continúan tras reconectar: cerrar el clip y vaciar el buffer
+            self._cerrar_clip()
+            self.buffer.limpiar()
+            self._ultimo_keyframe = None
+            self._close()
+            if not self.running:
+                break
+
+            self.stats['state'] = 'reconnecting'
+            self.stats['last_disconnect_reason'] = reason
+            if self.stats['packets'] > packets_before:
+                attempt = 0
+            delay = min(self.backoff_max, self.backoff_initial * (2 ** attempt))
+            delay = random.uniform(delay / 2, delay)
+            attempt += 1
+            logger.info("Clips %s: reconectando en %.1fs (motivo: %s)", self.nombre, delay, reason)
+
+            deadline = time.time() + delay
+            while self.running and time.time() < deadline:
+                time.sleep(0.1)
+            if self.running:
+                self.stats['reconnects'] += 1
+                self.stats['state'] = 'connecting'
+
+        self.stats['state'] = 'stopped'
+
+    def _demux(self, container, stream) -> str:
+        for paquete in container.demux(stream):
+            if not self.running:
+                return 'stopped'
+            if paquete.dts is None:  # paquete de vaciado al final del stream
+                continue
+            now = time.time()
+            self.stats['packets'] += 1
+            if self.stats['state'] != 'streaming':
+                self.stats['state'] = 'streaming'
+            if paquete.is_keyframe:
+                self._nota_keyframe(now)
+
+            self.buffer.agregar(paquete, now)
+
+            clip = self._clip
+            if clip is not None:
+                if clip.salida is None:
+                    if self.buffer.gops:
+                        self._abrir_clip(clip, stream)
+                else:
+                    self._escribir(clip, paquete)
+                if now >= clip.fin:
+                    self._cerrar_clip()
+        return 'eof'
+
+    def _nota_keyframe(self, now: float):
+        if self._ultimo_keyframe is not None:
+            gop = now - self._ultimo_keyframe
+            self.stats['avg_gop_seconds'] += 0.2 * (gop - self.stats['avg_gop_seconds'])
+        self._ultimo_keyframe = now
+        self.stats['keyframes'] += 1
+
+    # ===== CLIPS =====
+
+    def trigger(self, evento: Optional[Dict] = None) -> Optional[str]:
+        """
+        Pedir un clip para el instante actual. Devuelve la ruta final del MP4
+        (la del clip en curso si se extiende) o None si no está conectado.
+        """
+        if not self.running:
+            return None
+        now = time.time()
+        with self._lock:
+            self.stats['triggers'] += 1
+            clip = self._clip
+            if clip is not None:
+                clip.fin = min(clip.limite, max(clip.fin, now + self.post_roll))
+                self.stats['extended'] += 1
+            else:
+                clip = _Clip(self._ruta_clip(now), now, now + self.post_roll,
+                             now - self.pre_roll + self.max_clip)
+                self._clip = clip
+            if evento:
+                clip.eventos.append(evento)
+            return clip.ruta
+
+    def _ruta_clip(self, ts: float) -> str:
+        momento = datetime.fromtimestamp(ts)
+        fecha = momento.strftime("%Y-%m-%d")
+        carpeta = os.path.join(self.output_dir, fecha)
+        os.makedirs(carpeta, exist_ok=True)
+        prefijo = f"{self.nombre}_" if self.nombre else ""
+        return os.path.join(carpeta, f"{prefijo}{fecha}_{momento.strftime('%H-%M-%S')}_{uuid.uuid4().hex[:6]}.mp4")
+
+    def _abrir_clip(self, clip: _Clip, stream):
+        """Abrir el MP4 y volcar el pre-roll (desde el keyframe previo al disparo)"""
+        try:
+            # Se escribe con otra extensión para que el resumen no liste clips a medias
+            clip.salida = av.open(clip.ruta + '.part', 'w', format='mp4',
+                                  options={'movflags': 'faststart'})
+            clip.stream = _agregar_stream(clip.salida, stream)
+        except Exception as e:
+            logger.warning("Clips %s: no se pudo abrir %s: %s", self.nombre, clip.ruta, e)
+            self.stats['clip_errors'] += 1
+            with self._lock:
+                self._clip = None
+            return
+        for paquete in self.buffer.desde(clip.disparo - self.pre_roll):
+            self._escribir(clip, paquete)
+
+    def _escribir(self, clip: _Clip, paquete):
+        dts = paquete.dts
+        if clip.offset is None:
+            clip.offset = dts
+        dts -= clip.offset
+        # El muxer MP4 exige dts estrictamente creciente
+        if clip.ultimo_dts is not None and dts <= clip.ultimo_dts:
+            return
+        # Copia: el original sigue en el buffer (puede entrar en otro clip) y mux
+        # reescribe los tiempos del paquete a la base del stream de salida
+        copia = av.Packet(bytes(paquete))
+        copia.dts = dts
+        copia.pts = paquete.pts - clip.offset if paquete.pts is not None else dts
+        copia.time_base = paquete.time_base
+        copia.is_keyframe = paquete.is_keyframe
+        copia.stream = clip.stream
+        try:
+            clip.salida.mux(copia)
+        except Exception as e:
+            logger.debug("Clips %s: paquete descartado: %s", self.nombre, e)
+            return
+        clip.ultimo_dts = dts
+        clip.paquetes += 1
+        clip.bytes += paquete.size
+
+    def _cerrar_clip(self):
+        with self._lock:
+            clip, self._clip = self._clip, None
+        if clip is None or clip.salida is None:
+            return
+        try:
+            clip.salida.close()
+            if clip.paquetes:
+                os.replace(clip.ruta + '.part', clip.ruta)
+            else:
+                os.remove(clip.ruta + '.part')
+        except Exception as e:
+            logger.warning("Clips %s: error cerrando %s: %s", self.nombre, clip.ruta, e)
+            self.stats['clip_errors'] += 1
+            return
+        if not clip.paquetes:
+            return
+        stats = self.stats
+        stats['clips'] += 1
+        stats['avg_clip_bytes'] += 0.2 * (clip.bytes - stats['avg_clip_bytes'])
+        stats['last_clip'] = clip.ruta
+        logger.info("Clips %s: %s (%d paquetes, %.1f MB, %d eventos)", self.nombre, clip.ruta,
+                    clip.paquetes, clip.bytes / 1e6, len(clip.eventos))
+
+    # ===== ESTADO =====
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['buffer_bytes'] = self.buffer.bytes
+        stats['buffer_seconds'] = round(self.buffer.duracion(), 2)
+        stats['buffer_gops'] = len(self.buffer.gops)
+        stats['recording'] = self._clip is not None
+        return stats
+
+    def isOpened(self) -> bool:
+        return self.running
+
+    def release(self):
+        """
+        Detener sin esperar al hilo de demux (se llama desde la GUI): el hilo
+        sale con su próximo paquete o al vencer ``read_timeout`` y es él quien
+        cierra el clip en curso, vacía el buffer y cierra el contenedor. Desde
+        aquí solo se limpia si el hilo ya terminó.
+        """
+        self.running = False
+        if self.thread is None or not self.thread.is_alive():
+            self._cerrar_clip()
+            self.buffer.limpiar()
+            self._close()
@@ -1,54 +1,94 @@
 import os
+import time
 import uuid
 import cv2
-from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import deque
 
-# Importación robusta de ImageSaverThread con manejo de errores
+from core.dual_stream import mapear_bbox
+from core.rate_limiter import BYTES_CAPTURA_DEFECTO, TTLMap, get_rate_limiter
+
+# Pool compartido de escritura de capturas (recorte copiado al encolar)
 try:
-    from gui.image_saver import ImageSaverThread
-    IMAGESAVER_AVAILABLE = True
-    print("✅ ImageSaverThread importado correctamente en gestor_alertas optimizado")
+    from core.capture_writer import get_capture_writer
+    from core.best_shot import BestShotSelector
+    CAPTURE_WRITER_AVAILABLE = True
 except ImportError as e:
-    print(f"❌ Error importando ImageSaverThread: {e}")
-    IMAGESAVER_AVAILABLE = False
-    # Fallback: crear una clase mock
-    from PyQt6.QtCore import QThread
-    class ImageSaverThread(QThread):
-        def __init__(self, *args, **kwargs):
-            super().__init__()
-            print("⚠️ Usando ImageSaverThread mock - revisar importaciones")
-        def run(self):
-            print("⚠️ ImageSaverThread mock ejecutado")
+    print(f"❌ Error importando capture_writer: {e}")
+    CAPTURE_WRITER_AVAILABLE = False
 
 # Configuración de debug para logs detallados
 DEBUG_LOGS = False  # Cambiar a True solo para debugging
 
+# Estado por track: expira tras este tiempo sin verse (y nunca antes de 2x min_time_between_captures)
+TRACK_TTL = 120
+MAX_TRACKS = 2000
+
 class GestorAlertas:
     def __init__(self, cam_id, filas, columnas):
         self.cam_id = cam_id
+        # Cámara con la que se etiquetan capturas y clips: la misma que usa el
+        # almacén de detecciones, para enlazar ambos (ver set_camara)
+        self.camara = str(cam_id)
         self.filas = filas
         self.columnas = columnas
         self.box_streak = 0
         self.deteccion_bote_streak = 0
-        self.capturas_realizadas = 0
-        self.max_capturas = 3
-        self.ultimo_reset = datetime.now()
+        self.capturas_realizadas = 0  # total de capturas encoladas (estadística)
+        self.max_capturas = 3  # capturas por minuto por clase (token bucket de esta cámara)
         self.temporal = set()
-        self.hilos_guardado = []
         self.ultimas_posiciones = {}
+
+        # Límite por (cámara, clase) y presupuesto global de disco, compartido entre cámaras
+        self.limitador = get_rate_limiter()
+        self.capturas_limitadas = 0
         
         # VARIABLES PARA CONTROL OPTIMIZADO DE CAPTURAS
-        self.track_capture_history = {}  # track_id -> {"captured": bool, "best_conf": float, "last_capture_time": datetime}
         self.confidence_threshold = 0.70  # Umbral mínimo de confianza para captura
         self.min_time_between_captures = 30  # Segundos mínimos entre capturas del mismo track
-        self.track_confidence_buffer = defaultdict(list)  # track_id -> [conf1, conf2, ...] para promedio
+        # Los ids legacy_/unknown_ cambian cada frame: las entradas caducan solas (TTLMap)
+        ttl = max(TRACK_TTL, 2 * self.min_time_between_captures)
+        self.track_capture_history = TTLMap(ttl, MAX_TRACKS)  # track_id -> {"captured", "best_conf", "last_capture_time" (monotonic)}
+        self.track_confidence_buffer = TTLMap(ttl, MAX_TRACKS, factory=lambda: deque(maxlen=5))  # últimas confianzas
 
-    def procesar_detecciones(self, boxes, last_frame, log_callback, cam_data):
-        if datetime.now() - self.ultimo_reset > timedelta(minutes=1):
-            self.capturas_realizadas = 0
-            self.ultimo_reset = datetime.now()
+        # 'mejor_toma': una captura por track con el mejor frame de su vida (BestShotSelector)
+        # 'umbral': captura al superar confidence_threshold (comportamiento anterior)
+        self.modo_captura = 'mejor_toma' if CAPTURE_WRITER_AVAILABLE else 'umbral'
+        self.best_shot = BestShotSelector() if CAPTURE_WRITER_AVAILABLE else None
+
+        # Doble stream: frames de alta resolución para recortes (MainStreamGrabber)
+        self.main_stream = None
+        # Clips de evento por copia de stream (EventClipRecorder): un disparo por track
+        self.event_recorder = None
+        self.tracks_con_clip = TTLMap(ttl, MAX_TRACKS)
+
+    def set_camara(self, camara):
+        """Usar el identificador de cámara del visualizador (el del almacén de detecciones)"""
+        if camara:
+            self.camara = str(camara)
+
+    def set_main_stream(self, main_stream):
+        """Asignar el lector bajo demanda del stream principal para capturas"""
+        self.main_stream = main_stream
 
+    def set_event_recorder(self, event_recorder):
+        """Asignar el grabador de clips de evento de la cámara"""
+        self.event_recorder = event_recorder
+
+    def _frame_para_captura(self, frame, bbox):
+        """
+        Devuelve (frame, bbox) para guardar: el frame del stream principal con el
+        bbox escalado si está disponible, o el frame de detección en su defecto.
+        """
+        if self.main_stream is None or frame is None:
+            return frame, bbox
+        frame_main = self.main_stream.obtener_frame()
+        if frame_main is None:
+            return frame, bbox
+        h, w = frame.shape[:2]
+        hm, wm = frame_main.shape[:2]
+        return frame_main, mapear_bbox(bbox, (w, h), (wm, hm))
+
+    def procesar_detecciones(self, boxes, last_frame, log_callback, cam_data):
         hay_persona = hay_bote = hay_auto = hay_embarcacion = False
         boxes_personas, boxes_botes, boxes_autos, boxes_embarcaciones = [], [], [], []
 
@@ -57,6 +97,9 @@ class GestorAlertas:
         # Solo log si hay detecciones para procesar
         if len(boxes) > 0:
             log_callback(f"GestorAlertas: Procesando {len(boxes)} detecciones")
+            if self.main_stream is not None:
+                # Conectar el stream principal antes de necesitar el recorte (no bloquea)
+                self.main_stream.precalentar()
 
         for box in boxes:
             # Soportar ambos formatos: (x1,y1,x2,y2,cls) y (x1,y1,x2,y2,cls,cx,cy,track_id,conf)
@@ -138,6 +181,9 @@ class GestorAlertas:
                 index = fila * self.columnas + columna
                 self.temporal.add(index)
 
+        # Tracks terminados o con permanencia cumplida: guardar su mejor toma
+        self.recolectar_mejores_tomas(log_callback)
+
     def _ha_habido_movimiento(self, clase, cx, cy, umbral=25):
         cx_prev, cy_prev = self.ultimas_posiciones.get(clase, (None, None))
         if cx_prev is None:
@@ -157,7 +203,7 @@ class GestorAlertas:
         2. Si ya se capturó antes
         3. Tiempo mínimo entre capturas del mismo track
         """
-        now = datetime.now()
+        now = time.monotonic()
         
         # Obtener historial del track
         track_history = self.track_capture_history.get(track_id, {
@@ -167,10 +213,8 @@ class GestorAlertas:
         })
         
         # Agregar confianza al buffer para promedio
-        conf_buffer = self.track_confidence_buffer[track_id]
+        conf_buffer = self.track_confidence_buffer[track_id]  # deque de las últimas 5 detecciones
         conf_buffer.append(confidence)
-        if len(conf_buffer) > 5:  # Mantener solo las últimas 5 detecciones
-            conf_buffer.pop(0)
         
         # Calcular confianza promedio
         avg_confidence = sum(conf_buffer) / len(conf_buffer)
@@ -183,7 +227,7 @@ class GestorAlertas:
         
         # Si ya se capturó este track, verificar tiempo mínimo
         if track_history["captured"] and track_history["last_capture_time"]:
-            time_since_last = (now - track_history["last_capture_time"]).total_seconds()
+            time_since_last = now - track_history["last_capture_time"]
             if time_since_last < self.min_time_between_captures:
                 if DEBUG_LOGS:  # Solo mostrar en modo debug
                     log_callback(f"🔶 Track {track_id}: Solo han pasado {time_since_last:.1f}s desde última captura")
@@ -202,7 +246,7 @@ class GestorAlertas:
 
     def _update_track_capture_history(self, track_id, confidence):
         """Actualiza el historial de capturas del track"""
-        now = datetime.now()
+        now = time.monotonic()
         self.track_capture_history[track_id] = {
             "captured": True,
             "best_conf": max(confidence, self.track_capture_history.get(track_id, {}).get("best_conf", 0.0)),
@@ -220,15 +264,10 @@ class GestorAlertas:
         if DEBUG_LOGS:
             log_callback(f"GestorAlertas._guardar_optimizado: Evaluando {len(boxes)} detecciones de tipo '{tipo}'")
         
-        if self.capturas_realizadas >= self.max_capturas:
-            if DEBUG_LOGS:
-                log_callback(f"🔶 Límite de capturas alcanzado ({self.capturas_realizadas}/{self.max_capturas})")
-            return
-        
-        # VERIFICACIÓN DE DISPONIBILIDAD DE IMAGESAVER
-        if not IMAGESAVER_AVAILABLE:
-            log_callback(f"⚠️ ImageSaverThread no disponible - saltando captura de {tipo}")
+        if not CAPTURE_WRITER_AVAILABLE:
+            log_callback(f"⚠️ Escritor de capturas no disponible - saltando captura de {tipo}")
             return
+        writer = get_capture_writer()
         
         for box_data in boxes:
             if len(box_data) >= 7:  # Con track_id
@@ -238,6 +277,11 @@ class GestorAlertas:
                 track_id = f"unknown_{cls}_{cx}_{cy}"  # ID temporal
                 confidence = cam_data.get("confianza", 0.5)  # Confianza por defecto
             
+            if frame is not None and self._usa_mejor_toma(track_id):
+                self._observar_mejor_toma(frame, (x1, y1, x2, y2), cls, (cx, cy), track_id,
+                                          confidence, tipo, cam_data, log_callback)
+                continue
+
             if frame is not None:
                 # Verificar movimiento (criterio existente)
                 if not self._ha_habido_movimiento(cls, cx, cy):
@@ -249,10 +293,10 @@ class GestorAlertas:
                 if not self._should_capture_track(track_id, confidence, log_callback):
                     continue
 
-                if self.capturas_realizadas >= self.max_capturas:
+                if not self._permitir_captura(cls, writer):
                     if DEBUG_LOGS:
-                        log_callback(f"🔶 Límite de capturas alcanzado durante procesamiento")
-                    break
+                        log_callback(f"🔶 Track {track_id}: Límite de capturas de la clase {cls} alcanzado")
+                    continue
 
                 modelos_cam = cam_data.get("modelos") or [cam_data.get("modelo", "desconocido")]
                 modelo = modelos_cam[0] if modelos_cam else "desconocido"
@@ -260,19 +304,13 @@ class GestorAlertas:
                 if DEBUG_LOGS:
                     log_callback(f"GestorAlertas._guardar_optimizado: Capturando track {track_id}, cls={cls}, conf={confidence:.2f}, modelo={modelo}, tipo={tipo}")
 
-                # CREACIÓN PROTEGIDA DE IMAGESAVERTHREAD
+                # El pool copia solo el recorte; no se retiene el frame
                 try:
-                    hilo = ImageSaverThread(
-                        frame=frame,
-                        bbox=(x1, y1, x2, y2),
-                        cls=cls,
-                        coordenadas=(cx, cy),
-                        modelo=modelo,
-                        confianza=confidence
-                    )
-                    hilo.finished.connect(lambda h=hilo: self._eliminar_hilo(h))
-                    self.hilos_guardado.append(hilo)
-                    hilo.start()
+                    frame_captura, bbox_captura = self._frame_para_captura(frame, (x1, y1, x2, y2))
+                    if not writer.submit(frame_captura, bbox_captura, cls, (cx, cy), modelo, confidence,
+                                         camara=self.camara, track_id=track_id):
+                        log_callback(f"⚠️ Captura descartada - Track {track_id} (cola de escritura llena o bbox inválido)")
+                        continue
 
                     # Actualizar historial y contadores
                     self._update_track_capture_history(track_id, confidence)
@@ -280,14 +318,84 @@ class GestorAlertas:
                     
                     # Solo mostrar log importante: captura realizada
                     log_callback(f"📸 Captura realizada - Track {track_id} - {tipo[:-1].capitalize()} (conf: {confidence:.2f})")
+                    self._disparar_clip(cls, track_id, confidence, log_callback)
                     if DEBUG_LOGS:
-                        log_callback(f"🖼️ Total capturas: {self.capturas_realizadas}/{self.max_capturas}")
+                        log_callback(f"🖼️ Total capturas: {self.capturas_realizadas}")
                 
                 except Exception as e:
-                    error_msg = f"❌ Error creando ImageSaverThread para track {track_id}: {e}"
+                    error_msg = f"❌ Error encolando captura para track {track_id}: {e}"
                     print(error_msg)
                     log_callback(error_msg)
 
+    def _usa_mejor_toma(self, track_id):
+        """Los ids sintéticos (legacy_/unknown_) cambian con la posición: van por umbral"""
+        if self.modo_captura != 'mejor_toma' or self.best_shot is None:
+            return False
+        return not (isinstance(track_id, str) and track_id.startswith(('legacy_', 'unknown_')))
+
+    def _observar_mejor_toma(self, frame, bbox, cls, centro, track_id, confidence, tipo, cam_data, log_callback):
+        """Puntuar la detección y guardar el recorte solo si entra en el top-k del track"""
+        previo = self.best_shot.previo(track_id, bbox, frame.shape, confidence)
+        if previo is None:
+            return
+        modelos_cam = cam_data.get("modelos") or [cam_data.get("modelo", "desconocido")]
+        modelo = modelos_cam[0] if modelos_cam else "desconocido"
+        try:
+            # El frame principal solo se pide cuando el candidato puede entrar
+            frame_captura, bbox_captura = self._frame_para_captura(frame, bbox)
+            if self.best_shot.agregar(track_id, previo, frame_captura, bbox_captura, cls, confidence,
+                                      meta={'coordenadas': centro, 'modelo': modelo, 'tipo': tipo}):
+                self._disparar_clip(cls, track_id, confidence, log_callback)
+        except Exception as e:
+            error_msg = f"❌ Error evaluando mejor toma para track {track_id}: {e}"
+            print(error_msg)
+            log_callback(error_msg)
+
+    def _emitir_tomas(self, tomas, log_callback):
+        """Encolar en el pool la mejor toma de cada track emitido por el selector"""
+        if not tomas:
+            return
+        writer = get_capture_writer()
+        for track_id, cand, motivo in tomas:
+            meta = cand.meta
+            if not self._permitir_captura(cand.cls, writer):
+                if DEBUG_LOGS:
+                    log_callback(f"🔶 Mejor toma limitada - Track {track_id} (clase {cand.cls})")
+                continue
+            if not writer.submit_recorte(cand.crop, cand.bbox, cand.region, cand.cls, meta['coordenadas'],
+                                         meta['modelo'], cand.confianza, camara=self.camara, track_id=track_id):
+                log_callback(f"⚠️ Mejor toma descartada - Track {track_id} (cola de escritura llena)")
+                continue
+            self._update_track_capture_history(track_id, cand.confianza)
+            self.capturas_realizadas += 1
+            tipo = meta.get('tipo', '')
+            log_callback(f"📸 Mejor toma - Track {track_id} - {tipo[:-1].capitalize()} "
+                         f"(conf: {cand.confianza:.2f}, puntuación: {cand.puntuacion:.2f}, {motivo})")
+
+    def _permitir_captura(self, cls, writer):
+        """Token bucket de (cámara, clase) y presupuesto global, con el tamaño medio real de las capturas"""
+        bytes_estimados = writer.stats.get('avg_bytes') or BYTES_CAPTURA_DEFECTO
+        if self.limitador.permitir(self.cam_id, cls, bytes_estimados):
+            return True
+        self.capturas_limitadas += 1
+        return False
+
+    def _disparar_clip(self, cls, track_id, confidence, log_callback):
+        """Pedir (o extender) el clip de evento con la primera captura aceptada del track; no bloquea"""
+        if self.event_recorder is None or track_id in self.tracks_con_clip:
+            return
+        ruta = self.event_recorder.trigger({
+            'cls': cls,
+            'track_id': track_id,
+            'confianza': float(confidence),
+            'camara': self.camara,
+        })
+        if ruta is None:
+            return  # grabador sin conexión: se reintenta con la próxima captura
+        self.tracks_con_clip[track_id] = True
+        if DEBUG_LOGS:
+            log_callback(f"🎬 Clip de evento: {ruta}")
+
     def _guardar(self, boxes, frame, log_callback, tipo, cam_data):
         """Método original mantenido para compatibilidad (ahora usa la versión optimizada)"""
         # Convertir formato si es necesario
@@ -304,14 +412,24 @@ class GestorAlertas:
         
         self._guardar_optimizado(boxes_with_track, frame, log_callback, tipo, cam_data)
 
-    def _eliminar_hilo(self, hilo):
-        if hilo in self.hilos_guardado:
-            self.hilos_guardado.remove(hilo)
+    def get_estadisticas_capturas(self):
+        """Profundidad de cola, descartes y latencia de escritura del pool de capturas"""
+        if not CAPTURE_WRITER_AVAILABLE:
+            return {}
+        stats = get_capture_writer().get_stats()
+        if self.best_shot is not None:
+            stats['mejor_toma'] = self.best_shot.get_stats()
+        stats['limitador'] = {
+            **self.limitador.get_stats(),
+            'limitadas_camara': self.capturas_limitadas,
+            'tracks_en_memoria': len(self.track_capture_history),
+        }
+        return stats
 
     def limpiar_historial_tracks(self, tracks_activos):
         """
-        Limpia el historial de tracks que ya no están activos
-        Llamar periódicamente para evitar acumulación de memoria
+        Limpia ya el historial de tracks que no están activos. Es opcional: las
+        entradas caducan solas tras TRACK_TTL segundos sin verse.
         """
         tracks_a_eliminar = []
         for track_id in self.track_capture_history.keys():
@@ -321,11 +439,79 @@ class GestorAlertas:
         for track_id in tracks_a_eliminar:
             self.track_capture_history.pop(track_id, None)
             self.track_confidence_buffer.pop(track_id, None)
+        for track_id in self.tracks_con_clip.keys():
+            if track_id not in tracks_activos:
+                self.tracks_con_clip.pop(track_id, None)
+
+        # El tracker ya los dio por perdidos: no esperar al timeout del selector
+        if self.best_shot is not None:
+            for track_id in self.best_shot.tracks_pendientes():
+                if track_id not in tracks_activos:
+                    self._emitir_tomas(self.best_shot.terminar(track_id), print)
+
+    def recolectar_mejores_tomas(self, log_callback=print, now=None):
+        """
+        Guardar la mejor toma de los tracks terminados (sin verse ``track_timeout``
+        segundos) o con la permanencia cumplida. Se llama con cada lote de
+        detecciones y también por temporizador, para que un track que termina
+        cuando la escena queda vacía no espere a la próxima detección.
+        """
+        if self.best_shot is not None:
+            self._emitir_tomas(self.best_shot.recolectar(now), log_callback)
+
+    def vaciar_mejores_tomas(self, log_callback=print):
+        """Guardar las tomas pendientes de todos los tracks (al detener la cámara)"""
+        if self.best_shot is not None:
+            self._emitir_tomas(self.best_shot.vaciar(), log_callback)
 
     def configurar_capturas(self, confidence_threshold=0.70, min_time_between=30, max_capturas=3):
         """
-        Permite configurar los parámetros de captura
+        Permite configurar los parámetros de captura. ``max_capturas`` es el
+        límite de capturas por minuto de cada clase en esta cámara, tanto en
+        modo 'umbral' como en 'mejor_toma'.
         """
         self.confidence_threshold = confidence_threshold
         self.min_time_between_captures = min_time_between
-        self.max_capturas = max_capturas
\ No newline at end of file
+        ttl = max(TRACK_TTL, 2 * min_time_between)
+        self.track_capture_history.ttl = ttl
+        self.track_confidence_buffer.ttl = ttl
+        self.configurar_limites(por_minuto=max_capturas, rafaga=max_capturas)
+
+    def configurar_limites(self, por_minuto=None, rafaga=None, cls=None):
+        """Token bucket de esta cámara (o de una de sus clases): capturas por minuto y ráfaga"""
+        if por_minuto is not None and cls is None:
+            self.max_capturas = por_minuto
+        self.limitador.configurar(camara=self.cam_id, cls=cls, por_minuto=por_minuto, rafaga=rafaga)
+
+    def configurar_presupuesto_disco(self, mb_por_segundo=None, rafaga_mb=None):
+        """Presupuesto global de escritura de capturas (compartido por todas las cámaras)"""
+        mb = 1024 * 1024
+        self.limitador.configurar_presupuesto(
+            None if mb_por_segundo is None else mb_por_segundo * mb,
+            None if rafaga_mb is None else rafaga_mb * mb,
+        )
+
+    def configurar_mejor_toma(self, top_k=3, max_dwell=30, track_timeout=3, min_confianza=0.5, activo=True):
+        """
+        Selección de la mejor toma por track. Con ``activo=False`` se vuelve al
+        modo 'umbral' (configurar_capturas). El límite por minuto de
+        configurar_capturas/configurar_limites rige en ambos modos: cada mejor
+        toma emitida también consume un token de su clase.
+        """
+        if self.best_shot is None:
+            return
+        if not activo:
+            self.vaciar_mejores_tomas()
+        self.modo_captura = 'mejor_toma' if activo else 'umbral'
+        self.best_shot.top_k = max(1, int(top_k))
+        self.best_shot.max_dwell = max_dwell
+        self.best_shot.track_timeout = track_timeout
+        self.best_shot.min_confianza = min_confianza
+
+    def configurar_codificacion(self, preset=None, formato=None, calidad=None, submuestreo=None, max_lado=None):
+        """
+        Formato de las capturas (jpeg/webp/avif), calidad, submuestreo de croma
+        y lado máximo. Afecta al pool compartido, es decir, a todas las cámaras.
+        """
+        if CAPTURE_WRITER_AVAILABLE:
+            get_capture_writer().configurar_codificacion(preset, formato, calidad, submuestreo, max_lado)
\ No newline at end of file
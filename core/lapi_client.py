@@ -0,0 +1,138 @@
+import base64
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPDigestAuth
+
+
+def decodificar_grid_base64(grid_b64):
+    """
+    Decodifica la cadena Base64 del campo 'Grid' y devuelve un array de bits (0 o 1),
+    el bit más significativo de cada byte primero.
+    """
+    grid_bytes = np.frombuffer(base64.b64decode(grid_b64), dtype=np.uint8)
+    return np.unpackbits(grid_bytes)
+
+
+class LAPIResponse(dict):
+    """Resultado de ``LAPIClient.get``: ``text`` se decodifica solo si se pide"""
+
+    def __missing__(self, key):
+        if key != "text":
+            raise KeyError(key)
+        text = self["content"].decode(self.get("encoding") or "utf-8", "replace")
+        self["text"] = text
+        return text
+
+
+def _parece_json(response):
+    """Evitar parsear (y detectar charset de) respuestas binarias como Media/Snapshot"""
+    if "json" in response.headers.get("Content-Type", "").lower():
+        return True
+    return response.content[:64].lstrip()[:1] in (b"{", b"[")
+
+
+class LAPIClient:
+    """
+    Cliente LAPI de un dispositivo con conexiones keep-alive y caché.
+
+    Usa una ``requests.Session`` con un pool de ``max_workers`` conexiones y un
+    único ``HTTPDigestAuth``: tras el primer 401 de cada hilo el nonce se
+    reutiliza y las siguientes peticiones se autentican sin ida y vuelta extra.
+    ``get_many`` consulta varios endpoints en paralelo con un pool de hilos
+    persistente (así cada hilo conserva su nonce). Solo las respuestas 2xx se
+    guardan ``cache_ttl`` segundos: un 401 o un error se vuelve a consultar.
+    """
+
+    BASE_PATH = "/LAPI/V1.0"
+
+    def __init__(self, ip, usuario, contrasena, timeout=5, max_workers=8, cache_ttl=30.0):
+        self.ip = ip
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.session = requests.Session()
+        self.session.auth = HTTPDigestAuth(usuario, contrasena)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"lapi-{ip}")
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def url(self, endpoint):
+        return f"http://{self.ip}{self.BASE_PATH}/{endpoint.lstrip('/')}"
+
+    def get(self, endpoint, use_cache=True):
+        """
+        GET de un endpoint LAPI. Devuelve un dict con ``status``, ``json``
+        (None si la respuesta no es JSON), ``content`` y ``text`` (decodificado
+        al primer acceso); las excepciones de red se propagan.
+        """
+        now = time.time()
+        if use_cache and self.cache_ttl:
+            with self._lock:
+                cached = self._cache.get(endpoint)
+            if cached and now - cached[0] < self.cache_ttl:
+                return cached[1]
+
+        response = self.session.get(self.url(endpoint), timeout=self.timeout)
+        json_data = None
+        if _parece_json(response):
+            try:
+                json_data = response.json()
+            except ValueError:
+                pass
+        result = LAPIResponse(
+            status=response.status_code, json=json_data,
+            content=response.content, encoding=response.encoding,
+        )
+        if 200 <= response.status_code < 300:
+            with self._lock:
+                self._cache[endpoint] = (time.time(), result)
+        return result
+
+    def get_many(self, endpoints, use_cache=True):
+        """
+        Consultar varios endpoints en paralelo. Devuelve ``{endpoint: resultado}``
+        en el orden pedido; el resultado es la excepción si la petición falló.
+        """
+        def fetch(endpoint):
+            try:
+                return self.get(endpoint, use_cache)
+            except Exception as e:
+                return e
+
+        endpoints = list(endpoints)
+        return dict(zip(endpoints, self.executor.map(fetch, endpoints)))
+
+    def invalidate(self, endpoint=None):
+        with self._lock:
+            if endpoint is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(endpoint, None)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_lapi_client(ip, usuario, contrasena, **kwargs):
+    """Cliente compartido por dispositivo (se recrea si cambian las credenciales)"""
+    with _clients_lock:
+        client = _clients.get(ip)
+        auth = client.session.auth if client else None
+        if client is None or (auth.username, auth.password) != (usuario, contrasena):
+            if client is not None:
+                client.close()
+            client = LAPIClient(ip, usuario, contrasena, **kwargs)
+            _clients[ip] = client
+        return client
@@ -1,26 +1,20 @@
-import requests
-from requests.auth import HTTPDigestAuth
-import base64
-
-def decodificar_grid_base64(grid_b64):
-    """
-    Decodifica la cadena Base64 del campo 'Grid' y devuelve una lista de bits (0 o 1).
-    """
-    grid_bytes = base64.b64decode(grid_b64)
-    bits = []
-    for byte in grid_bytes:
-        for i in range(8):
-            bits.append((byte >> (7 - i)) & 1)
-    return bits
+from core.lapi_client import decodificar_grid_base64, get_lapi_client
 
 def escanear_grillas(ip, usuario, contrasena, max_canales=8):
     print(f"📡 Escaneando {ip} para detectar grillas activas...\n")
 
-    for canal in range(max_canales):
-        url = f"http://{ip}/LAPI/V1.0/Channels/{canal}/Alarm/MotionDetection/Areas/Grid"
+    cliente = get_lapi_client(ip, usuario, contrasena)
+    endpoints = [f"Channels/{canal}/Alarm/MotionDetection/Areas/Grid" for canal in range(max_canales)]
+    respuestas = cliente.get_many(endpoints, use_cache=False)
+
+    for canal, endpoint in enumerate(endpoints):
         try:
-            response = requests.get(url, auth=HTTPDigestAuth(usuario, contrasena), timeout=5)
-            data = response.json()
+            r = respuestas[endpoint]
+            if isinstance(r, Exception):
+                raise r
+            data = r["json"]
+            if data is None:
+                raise ValueError(f"Respuesta no JSON (HTTP {r['status']})")
             response_data = data.get("Response", {})
 
             print(f"🟦 Canal {canal} - Código: {response_data.get('ResponseCode')}")
@@ -30,10 +24,10 @@ def escanear_grillas(ip, usuario, contrasena, max_canales=8):
 
             if grid_b64:
                 bits = decodificar_grid_base64(grid_b64)
-                activadas = sum(bits)
+                activadas = int(bits.sum())
                 print(f"✅ Grid encontrada: {len(bits)} celdas totales")
                 print(f"🟩 Celdas activadas: {activadas}")
-                print(f"🧪 Primeros 50 bits: {bits[:50]}")
+                print(f"🧪 Primeros 50 bits: {bits[:50].tolist()}")
             else:
                 print("⚠️ No se encontró el campo 'Grid' o está vacío.")
 
@@ -10,7 +10,6 @@ Características:
 """
 
 import time
-import threading
 from enum import Enum
 from typing import Optional, Dict, List, Tuple, Callable, Any
 from dataclasses import dataclass, field
@@ -18,36 +17,15 @@ from datetime import datetime
 import math
 import logging
 
-# ===== CORRECCIÓN: Definir ObjectPosition y TrackingState localmente =====
-@dataclass
-class ObjectPosition:
-    """Representa la posición de un objeto detectado en el frame"""
-    cx: float          # Centro X normalizado (0-1)
-    cy: float          # Centro Y normalizado (0-1) 
-    width: float       # Ancho normalizado (0-1)
-    height: float      # Altura normalizada (0-1)
-    confidence: float  # Confianza de detección (0-1)
-    timestamp: float = field(default_factory=time.time)
-    frame_w: int = 1920    # Ancho del frame en píxeles
-    frame_h: int = 1080    # Alto del frame en píxeles
-    object_class: str = "unknown"
-    
-    def to_pixels(self) -> tuple:
-        """Convertir coordenadas normalizadas a píxeles"""
-        x1 = int((self.cx - self.width/2) * self.frame_w)
-        y1 = int((self.cy - self.height/2) * self.frame_h)
-        x2 = int((self.cx + self.width/2) * self.frame_w)
-        y2 = int((self.cy + self.height/2) * self.frame_h)
-        return (x1, y1, x2, y2)
-    
-    def get_area(self) -> float:
-        """Obtener área del objeto en píxeles cuadrados"""
-        return (self.width * self.frame_w) * (self.height * self.frame_h)
-    
-    def distance_to_center(self) -> float:
-        """Calcular distancia al centro del frame (0-1)"""
-        return math.sqrt((self.cx - 0.5)**2 + (self.cy - 0.5)**2)
+from core.onvif_cache import get_onvif_session
+from core.ptz_command_actor import get_ptz_actor
+from core.ptz_engine import (
+    ObjectPosition, ControlStrategy, TargetSelector, PriorityTargetSelector,
+    create_control_strategy, get_ptz_engine
+)
+from core.ptz_state_service import get_ptz_state_service, release_ptz_state_service
 
+# ===== CORRECCIÓN: ObjectPosition es el tipo de entrada del motor PTZ; TrackingState local =====
 class TrackingState(Enum):
     """Estados del sistema de seguimiento PTZ"""
     IDLE = "idle"
@@ -139,6 +117,17 @@ class MultiObjectConfig:
 
     # Mover mediante AbsoluteMove en lugar de ContinuousMove
     use_absolute_move: bool = False
+
+    # === CONTROL PREDICTIVO ===
+    control_mode: str = "proportional"   # "proportional" o "predictive"
+    pid_kp: float = 1.6                  # Ganancia proporcional
+    pid_ki: float = 0.3                  # Ganancia integral
+    pid_kd: float = 0.15                 # Ganancia derivativa
+    max_speed_rate: float = 2.0          # Cambio máximo de velocidad por segundo
+    control_deadband: float = 0.03       # Error (normalizado) sin corrección
+    detection_latency: float = 0.3       # Captura + inferencia no medibles (segundos)
+    max_prediction_time: float = 1.0     # Horizonte máximo de predicción (segundos)
+    speed_quantum: float = 0.02          # Paso de cuantización de velocidades
     
     # === CONFIGURACIÓN AVANZADA ===
     prediction_enabled: bool = True      # Habilitar predicción de movimiento
@@ -155,6 +144,8 @@ class MultiObjectConfig:
             assert self.alternating_enabled or self.secondary_follow_time > 0
             assert self.min_zoom_level <= self.max_zoom_level
             assert 0 < self.max_objects_to_track <= 10
+            assert self.control_mode in ("proportional", "predictive")
+            assert self.control_deadband >= 0 and self.max_prediction_time >= 0
             return True
         except AssertionError:
             return False
@@ -328,7 +319,9 @@ class MultiObjectPTZTracker:
     """Tracker PTZ avanzado para seguimiento multi-objeto con zoom inteligente"""
     
     def __init__(self, ip: str, port: int, username: str, password: str, 
-                 basic_config=None, multi_config: MultiObjectConfig = None):
+                 basic_config=None, multi_config: MultiObjectConfig = None,
+                 target_selector: TargetSelector = None,
+                 control_strategy: ControlStrategy = None):
         self.ip = ip
         self.port = port
         self.username = username
@@ -343,12 +336,26 @@ class MultiObjectPTZTracker:
         # Estado del sistema
         self.state = TrackingState.IDLE
         self.tracking_active = False
-        self.tracking_thread = None
+        # El paso de control lo ejecuta el hilo único del motor PTZ
+        self.engine = get_ptz_engine()
+        self.control_interval = 0.1  # 10 FPS de control
         
         # Conexión PTZ
         self.camera = None
         self.ptz_service = None
         self.profile_token = None
+        self.onvif_session = None
+        self.state_service = None
+        self.last_command_time = 0.0
+        self.last_state_time = 0.0
+        # Preset inicial en curso: el lazo no manda movimientos hasta que la cámara se detiene
+        self.preset_sent_time = None
+        self.preset_settle_timeout = 10.0
+        self.preset_min_travel = 0.5
+        # Los comandos SOAP se envían desde el hilo del actor, no desde el lazo
+        self.command_actor = get_ptz_actor(f"{ip}:{port}")
+        self.target_selector = target_selector or PriorityTargetSelector()
+        self.control_strategy = control_strategy or create_control_strategy(self.multi_config)
         
         # Estado multi-objeto
         self.tracked_objects: Dict[int, TrackedObject] = {}
@@ -396,8 +403,15 @@ class MultiObjectPTZTracker:
         
         print(f"✅ MultiObjectPTZTracker creado para {ip}:{port}")
     
-    def start_tracking(self) -> bool:
-        """Iniciar el seguimiento multi-objeto"""
+    def start_tracking(self, preset_token: Optional[str] = None) -> bool:
+        """
+        Iniciar el seguimiento multi-objeto
+
+        Con ``preset_token`` la cámara se envía primero al preset por el actor
+        de comandos; ``step`` no manda movimientos hasta que el servicio de
+        estado la ve detenida (o vence ``preset_settle_timeout``), porque un
+        ContinuousMove abortaría el GotoPreset en la propia cámara.
+        """
         if self.tracking_active:
             print("⚠️ El seguimiento ya está activo")
             return False
@@ -410,6 +424,17 @@ class MultiObjectPTZTracker:
                 print("❌ No se pudo conectar a la cámara PTZ")
                 return False
             
+            if preset_token:
+                print(f"📍 Moviendo a preset {preset_token}")
+                self.preset_sent_time = time.time()
+                self.last_command_time = self.preset_sent_time
+                self.command_actor.submit(
+                    self.onvif_session.call, 'GotoPreset', PresetToken=str(preset_token)
+                )
+                self.state_service.notify_command()
+            else:
+                self.preset_sent_time = None
+            
             # Inicializar variables de seguimiento
             self.tracking_active = True
             self.state = TrackingState.TRACKING
@@ -418,9 +443,8 @@ class MultiObjectPTZTracker:
             self.current_target_id = None
             self.session_start_time = time.time()
             
-            # Iniciar hilo de seguimiento
-            self.tracking_thread = threading.Thread(target=self._tracking_loop, daemon=True)
-            self.tracking_thread.start()
+            # Registrar en el motor PTZ compartido
+            self.engine.register(self, self.control_interval)
             
             print("✅ Seguimiento multi-objeto iniciado exitosamente")
             return True
@@ -429,6 +453,7 @@ class MultiObjectPTZTracker:
             print(f"❌ Error iniciando seguimiento: {e}")
             self.tracking_active = False
             self.state = TrackingState.ERROR
+            self._release_state_service()
             return False
 
     def stop_tracking(self):
@@ -442,12 +467,11 @@ class MultiObjectPTZTracker:
         self.tracking_active = False
         self.state = TrackingState.IDLE
         
-        # Esperar que termine el hilo
-        if hasattr(self, 'tracking_thread') and self.tracking_thread and self.tracking_thread.is_alive():
-            self.tracking_thread.join(timeout=2.0)
+        self.engine.unregister(self)
         
         # Detener movimiento PTZ
         self._stop_ptz_movement()
+        self._release_state_service()
         
         # Limpiar estado
         self.current_target_id = None
@@ -455,52 +479,51 @@ class MultiObjectPTZTracker:
         
         print("✅ Seguimiento detenido")
 
-    def update_detections(self, detections: list) -> bool:
-        """Actualizar con nuevas detecciones"""
+    def update_detections(self, detections: list, frame_size: tuple = None) -> bool:
+        """
+        Publicar nuevas detecciones en el motor PTZ.
+
+        Acepta ``ObjectPosition`` o diccionarios en cualquiera de los formatos
+        de ``ObjectPosition.from_detection``; ``frame_size`` es (ancho, alto).
+        """
         if not self.tracking_active:
             return False
         
         try:
-            current_time = time.time()
-            
-            # Convertir detecciones a ObjectPosition
             new_positions = []
             for det in detections:
-                if det.get('confidence', 0) < self.multi_config.min_confidence_threshold:
+                pos = ObjectPosition.from_detection(det, frame_size)
+                if pos is None or pos.confidence < self.multi_config.min_confidence_threshold:
                     continue
                 
-                pos = ObjectPosition(
-                    cx=det['cx'],
-                    cy=det['cy'],
-                    width=det['width'],
-                    height=det['height'],
-                    confidence=det['confidence'],
-                    timestamp=current_time,
-                    frame_w=det.get('frame_w', 1920),
-                    frame_h=det.get('frame_h', 1080),
-                    object_class=det.get('class', 'unknown')
-                )
-                
                 # Filtrar por tamaño
                 size_ratio = pos.width * pos.height
                 if (size_ratio >= self.multi_config.min_object_size and 
                     size_ratio <= self.multi_config.max_object_size):
                     new_positions.append(pos)
             
-            # Procesar nuevas posiciones
-            self._update_tracked_objects(new_positions)
             self.total_detections_processed += len(detections)
-            
-            return True
+            # Se procesan en el hilo del motor; un lote nuevo reemplaza al pendiente
+            return self.engine.submit(self, new_positions)
             
         except Exception as e:
             print(f"❌ Error actualizando detecciones: {e}")
             return False
 
+    def on_detections(self, positions: List[ObjectPosition]):
+        """Detecciones entregadas por el motor PTZ"""
+        self._update_tracked_objects(positions)
+
+    def _release_state_service(self):
+        """Dejar de usar el servicio de estado (se detiene si nadie más lo usa)"""
+        if self.state_service is not None:
+            self.state_service.unsubscribe(self._on_ptz_state)
+            release_ptz_state_service(self.state_service)
+            self.state_service = None
+
     def _test_ptz_connection(self) -> bool:
         """Verificar conexión PTZ - MÉTODO MEJORADO"""
         try:
-            from onvif import ONVIFCamera
             import socket
 
             print(f"🔗 Probando conexión PTZ a {self.ip}:{self.port}")
@@ -514,24 +537,23 @@ class MultiObjectPTZTracker:
                 print(f"❌ No se puede conectar a {self.ip}:{self.port}")
                 return False
 
-            self.camera = ONVIFCamera(
+            # Sesión ONVIF compartida (WSDL y perfiles cacheados, reconexión perezosa)
+            self.onvif_session = get_onvif_session(
                 self.ip,
                 self.port,
                 self.username,
                 self.password,
                 wsdl_dir='wsdl/'
-            )
+            ).connect()
 
-            self.ptz_service = self.camera.create_ptz_service()
+            self.camera = self.onvif_session.cam
+            self.ptz_service = self.onvif_session.ptz
+            self.profile_token = self.onvif_session.profile_token
 
-            media_service = self.camera.create_media_service()
-            profiles = media_service.GetProfiles()
-
-            if not profiles:
-                print("❌ No se encontraron perfiles de cámara")
-                return False
-
-            self.profile_token = profiles[0].token
+            # Posición real publicada por el servicio de estado compartido
+            self._release_state_service()
+            self.state_service = get_ptz_state_service(self.onvif_session)
+            self.state_service.subscribe(self._on_ptz_state)
             print(f"✅ Conexión PTZ exitosa (perfil: {self.profile_token})")
 
             # Obtener posición inicial si es posible
@@ -543,39 +565,42 @@ class MultiObjectPTZTracker:
             print(f"❌ Error en conexión PTZ: {e}")
             return False
 
-    def _tracking_loop(self):
-        """Bucle principal de seguimiento"""
-        print("🔄 Iniciando bucle de seguimiento...")
+    def _preset_en_curso(self, current_time: float) -> bool:
+        """True mientras la cámara sigue yendo al preset inicial"""
+        if self.preset_sent_time is None:
+            return False
+        elapsed = current_time - self.preset_sent_time
+        settled = elapsed >= self.preset_settle_timeout
+        if not settled and elapsed >= self.preset_min_travel and self.state_service is not None:
+            # Un estado posterior al arranque del movimiento y ya sin movimiento
+            state = self.state_service.get_state()
+            settled = (state is not None and not state.moving
+                       and state.timestamp >= self.preset_sent_time + self.preset_min_travel)
+        if settled:
+            self.preset_sent_time = None
+        return not settled
+
+    def step(self, current_time: float):
+        """Paso de control ejecutado por el motor PTZ"""
+        if not self.tracking_active:
+            return
         
-        while self.tracking_active:
-            try:
-                current_time = time.time()
-                
-                # Verificar si hay objetos para seguir
-                if self.tracked_objects:
-                    # Seleccionar objetivo si no hay uno
-                    if not self.current_target_id or self.current_target_id not in self.tracked_objects:
-                        self._select_new_target()
-                    
-                    # Ejecutar seguimiento del objetivo actual
-                    if self.current_target_id:
-                        self._execute_tracking()
-                    
-                    # Verificar alternancia de objetivos
-                    if self.multi_config.alternating_enabled:
-                        self._check_target_switching(current_time)
-                
-                # Limpiar objetos perdidos
-                self._cleanup_lost_objects(current_time)
-                
-                # Dormir un poco
-                time.sleep(0.1)  # 10 FPS de control
-                
-            except Exception as e:
-                print(f"❌ Error en bucle de seguimiento: {e}")
-                time.sleep(0.5)
+        # Verificar si hay objetos para seguir (sin mover la cámara mientras va al preset)
+        if self.tracked_objects and not self._preset_en_curso(current_time):
+            # Seleccionar objetivo si no hay uno
+            if not self.current_target_id or self.current_target_id not in self.tracked_objects:
+                self._select_new_target()
+            
+            # Ejecutar seguimiento del objetivo actual
+            if self.current_target_id:
+                self._execute_tracking()
+            
+            # Verificar alternancia de objetivos
+            if self.multi_config.alternating_enabled:
+                self._check_target_switching(current_time)
         
-        print("🛑 Bucle de seguimiento terminado")
+        # Limpiar objetos perdidos
+        self._cleanup_lost_objects(current_time)
 
     def _update_tracked_objects(self, new_positions: List[ObjectPosition]):
         """Actualizar objetos being tracked"""
@@ -623,13 +648,13 @@ class MultiObjectPTZTracker:
         # Calcular prioridades
         self._update_object_priorities()
         
-        # Obtener objeto con mayor prioridad
-        best_obj_id = max(self.tracked_objects.keys(), 
-                         key=lambda oid: self.tracked_objects[oid].priority_score)
+        # Objetivo según la estrategia de selección
+        best_obj_id = self.target_selector.select(self.tracked_objects, self.current_target_id)
         
-        if best_obj_id != self.current_target_id:
+        if best_obj_id is not None and best_obj_id != self.current_target_id:
             old_target = self.current_target_id
             self.current_target_id = best_obj_id
+            self.control_strategy.reset()
             
             # Marcar como objetivo principal
             for obj_id, obj in self.tracked_objects.items():
@@ -670,10 +695,9 @@ class MultiObjectPTZTracker:
             if not current_pos:
                 return
             
-            # Calcular comandos PTZ (simulación)
-            pan_speed, tilt_speed = self._calculate_ptz_movement(current_pos)
+            # Calcular comandos PTZ
+            pan_speed, tilt_speed = self.control_strategy.compute(target_obj, current_pos, self)
             
-            # Simular envío de comando PTZ
             self._send_ptz_command(pan_speed, tilt_speed)
             
             self.successful_tracks += 1
@@ -682,14 +706,27 @@ class MultiObjectPTZTracker:
             print(f"❌ Error ejecutando seguimiento: {e}")
             self.failed_tracks += 1
 
+    def _on_ptz_state(self, state):
+        """Actualizar la posición conocida con la reportada por la cámara"""
+        # Un estado anterior al último comando no refleja todavía ese movimiento
+        if state.timestamp < self.last_command_time:
+            return
+        self.control_strategy.note_ptz_state(state)
+        self.current_pan_position = state.pan
+        self.current_tilt_position = state.tilt
+        self.current_zoom_position = state.zoom
+        self.last_state_time = state.timestamp
+
     def _query_current_position(self):
         """Consultar la posición PTZ actual si es posible."""
-        if not self.ptz_service or not hasattr(self.ptz_service, 'GetStatus'):
+        if self.state_service is not None:
+            state = self.state_service.get_state(max_age=self.state_service.slow_interval * 2)
+            if state is not None:
+                return {'pan': state.pan, 'tilt': state.tilt, 'zoom': state.zoom}
+        if self.onvif_session is None:
             return None
         try:
-            req = self.ptz_service.create_type('GetStatus')
-            req.ProfileToken = self.profile_token
-            status = self.ptz_service.GetStatus(req)
+            status = self.onvif_session.call('GetStatus')
             if hasattr(status, 'Position'):
                 self.current_pan_position = float(status.Position.PanTilt.x)
                 self.current_tilt_position = float(status.Position.PanTilt.y)
@@ -703,68 +740,30 @@ class MultiObjectPTZTracker:
             pass
         return None
 
-    def _calculate_ptz_movement(self, target_pos: ObjectPosition) -> tuple:
-        """Calcular velocidades de pan y tilt necesarias"""
-        # Centro del frame como referencia
-        center_x, center_y = 0.5, 0.5
-        
-        # Calcular error
-        error_x = target_pos.cx - center_x
-        error_y = target_pos.cy - center_y
-        
-        # Calcular velocidades (factor de ganancia 2.0)
-        pan_speed = error_x * 2.0
-        tilt_speed = -error_y * 2.0  # Invertir Y para tilt
-        
-        # Aplicar límites
-        pan_speed = max(-self.multi_config.max_pan_speed, 
-                       min(self.multi_config.max_pan_speed, pan_speed))
-        tilt_speed = max(-self.multi_config.max_tilt_speed, 
-                        min(self.multi_config.max_tilt_speed, tilt_speed))
-        
-        return pan_speed, tilt_speed
-
     def _send_ptz_command(self, pan_speed: float, tilt_speed: float):
-        """Enviar comando PTZ a la cámara."""
+        """Publicar comando PTZ en el actor de la cámara (no bloquea el lazo)."""
         try:
             if self.multi_config.use_absolute_move:
                 new_pan = max(-1.0, min(1.0, self.current_pan_position + pan_speed))
                 new_tilt = max(-1.0, min(1.0, self.current_tilt_position + tilt_speed))
-                if self.ptz_service and hasattr(self.ptz_service, 'AbsoluteMove'):
-                    req = self.ptz_service.create_type('AbsoluteMove')
-                    req.ProfileToken = self.profile_token
-                    req.Position = {
-                        'PanTilt': {'x': new_pan, 'y': new_tilt},
-                        'Zoom': {'x': self.current_zoom_position}
-                    }
-                    self.ptz_service.AbsoluteMove(req)
-                elif self.camera and hasattr(self.camera, 'absolute_move'):
-                    self.camera.absolute_move(new_pan, new_tilt, self.current_zoom_position)
-                else:
-                    # Fallback a movimiento continuo
-                    if self.ptz_service and hasattr(self.ptz_service, 'ContinuousMove'):
-                        req = self.ptz_service.create_type('ContinuousMove')
-                        req.ProfileToken = self.profile_token
-                        req.Velocity = {
-                            'PanTilt': {'x': pan_speed, 'y': tilt_speed},
-                            'Zoom': {'x': 0.0}
-                        }
-                        self.ptz_service.ContinuousMove(req)
-                    elif self.camera and hasattr(self.camera, 'continuous_move'):
-                        self.camera.continuous_move(pan_speed, tilt_speed)
+                self.command_actor.submit(
+                    self._absolute_move, new_pan, new_tilt, self.current_zoom_position,
+                    pan_speed, tilt_speed
+                )
+                # Estimación hasta que el servicio de estado confirme la posición
                 self.current_pan_position = new_pan
                 self.current_tilt_position = new_tilt
             else:
-                if self.ptz_service and hasattr(self.ptz_service, 'ContinuousMove'):
-                    req = self.ptz_service.create_type('ContinuousMove')
-                    req.ProfileToken = self.profile_token
-                    req.Velocity = {
-                        'PanTilt': {'x': pan_speed, 'y': tilt_speed},
-                        'Zoom': {'x': 0.0}
-                    }
-                    self.ptz_service.ContinuousMove(req)
-                elif self.camera and hasattr(self.camera, 'continuous_move'):
-                    self.camera.continuous_move(pan_speed, tilt_speed)
+                # Velocidades iguales a las ya enviadas no generan otro ContinuousMove
+                self.command_actor.submit(
+                    self._continuous_move, pan_speed, tilt_speed,
+                    dedup_key=('continuous', round(pan_speed, 3), round(tilt_speed, 3))
+                )
+
+            self.last_command_time = time.time()
+            self.control_strategy.note_command(pan_speed, tilt_speed, self.last_command_time)
+            if self.state_service is not None:
+                self.state_service.notify_command()
 
             if abs(pan_speed) > 0.01 or abs(tilt_speed) > 0.01:
                 print(f"📡 PTZ comando: Pan={pan_speed:.2f}, Tilt={tilt_speed:.2f}")
@@ -772,6 +771,30 @@ class MultiObjectPTZTracker:
         except Exception as e:
             print(f"❌ Error enviando comando PTZ: {e}")
 
+    def _absolute_move(self, pan: float, tilt: float, zoom: float,
+                       pan_speed: float, tilt_speed: float):
+        """AbsoluteMove ONVIF (se ejecuta en el hilo del actor)"""
+        if self.onvif_session is not None:
+            self.onvif_session.call('AbsoluteMove', Position={
+                'PanTilt': {'x': pan, 'y': tilt},
+                'Zoom': {'x': zoom}
+            })
+        elif self.camera and hasattr(self.camera, 'absolute_move'):
+            self.camera.absolute_move(pan, tilt, zoom)
+        else:
+            # Fallback a movimiento continuo
+            self._continuous_move(pan_speed, tilt_speed)
+
+    def _continuous_move(self, pan_speed: float, tilt_speed: float):
+        """ContinuousMove ONVIF (se ejecuta en el hilo del actor)"""
+        if self.onvif_session is not None:
+            self.onvif_session.call('ContinuousMove', Velocity={
+                'PanTilt': {'x': pan_speed, 'y': tilt_speed},
+                'Zoom': {'x': 0.0}
+            })
+        elif self.camera and hasattr(self.camera, 'continuous_move'):
+            self.camera.continuous_move(pan_speed, tilt_speed)
+
     def _stop_ptz_movement(self):
         """Detener movimiento PTZ"""
         try:
@@ -810,6 +833,7 @@ class MultiObjectPTZTracker:
             
             old_target = self.current_target_id
             self.current_target_id = next_target
+            self.control_strategy.reset()
             
             # Actualizar flags
             for obj_id, obj in self.tracked_objects.items():
@@ -853,7 +877,7 @@ class MultiObjectPTZTracker:
         
         # Información de objetos rastreados
         objects_info = {}
-        for obj_id, obj in self.tracked_objects.items():
+        for obj_id, obj in list(self.tracked_objects.items()):
             current_pos = obj.get_current_position()
             objects_info[obj_id] = {
                 'position': {
@@ -893,6 +917,15 @@ class MultiObjectPTZTracker:
                 'pan_speed': self.current_pan_speed,
                 'tilt_speed': self.current_tilt_speed
             },
+            'ptz_commands': self.command_actor.get_stats(),
+            'ptz_controller': self.control_strategy.get_stats(),
+            'ptz_engine': self.engine.get_stats(),
+            'ptz_position': {
+                'pan': self.current_pan_position,
+                'tilt': self.current_tilt_position,
+                'zoom': self.current_zoom_position,
+                'age': current_time - self.last_state_time if self.last_state_time else None
+            },
             'statistics': {
                 'session_duration': current_time - self.session_start_time,
                 'total_detections': self.total_detections_processed,
@@ -983,13 +1016,20 @@ class MultiObjectPTZTracker:
 # ===== FUNCIONES DE UTILIDAD =====
 
 def create_multi_object_tracker(ip: str, port: int, username: str, password: str,
-                               config_name: str = "maritime_standard") -> MultiObjectPTZTracker:
+                               config_name="maritime_standard",
+                               target_selector: TargetSelector = None,
+                               control_strategy: ControlStrategy = None) -> MultiObjectPTZTracker:
     """Crear tracker multi-objeto con configuración predefinida.
 
     Cada entrada del diccionario de presets puede incluir el parámetro
     ``use_absolute_move`` para determinar si el tracker utilizará movimientos
-    absolutos en lugar de continuos.
+    absolutos en lugar de continuos. ``config_name`` también puede ser un
+    ``MultiObjectConfig`` ya construido.
     """
+    if isinstance(config_name, MultiObjectConfig):
+        return MultiObjectPTZTracker(ip, port, username, password, multi_config=config_name,
+                                     target_selector=target_selector,
+                                     control_strategy=control_strategy)
 
     # Configuraciones predefinidas
     presets = {
@@ -1049,7 +1089,9 @@ def create_multi_object_tracker(ip: str, port: int, username: str, password: str
 
     cfg_dict = presets.get(config_name, presets['maritime_standard'])
     config = MultiObjectConfig(**cfg_dict)
-    return MultiObjectPTZTracker(ip, port, username, password, multi_config=config)
+    return MultiObjectPTZTracker(ip, port, username, password, multi_config=config,
+                                 target_selector=target_selector,
+                                 control_strategy=control_strategy)
 
 def get_preset_config(config_name: str) -> Optional[MultiObjectConfig]:
     """Obtener configuración predefinida"""
@@ -1059,7 +1101,8 @@ def get_preset_config(config_name: str) -> Optional[MultiObjectConfig]:
             primary_follow_time=3.0,
             secondary_follow_time=2.0,
             movement_weight=0.5,
-            zoom_speed=0.5
+            zoom_speed=0.5,
+            control_mode="predictive"
         ),
         'surveillance_precise': MultiObjectConfig(
             primary_follow_time=8.0,
@@ -0,0 +1,162 @@
+"""
+Caché de sesiones ONVIF del proceso.
+
+Crear un ``ONVIFCamera`` descarga y parsea los WSDL y consulta perfiles y
+configuración: cientos de ms por instancia. Las sesiones se comparten por
+(ip, puerto, usuario), se conectan al primer uso y se reconectan de forma
+perezosa tras un error. Cada operación PTZ reutiliza un objeto de petición
+plantilla al que solo se le cambian los campos, de modo que un movimiento
+cuesta un único round-trip SOAP.
+"""
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import requests
+    from zeep.transports import Transport
+    SHARED_TRANSPORT_AVAILABLE = True
+except ImportError:
+    SHARED_TRANSPORT_AVAILABLE = False
+
+
+class ONVIFSession:
+    """Conexión ONVIF de una cámara con peticiones plantilla por operación"""
+
+    def __init__(self, ip: str, puerto: int, usuario: str, contrasena: str,
+                 wsdl_dir: Optional[str] = None, operation_timeout: float = 5.0):
+        self.ip = ip
+        self.puerto = int(puerto)
+        self.usuario = usuario
+        self.contrasena = contrasena
+        self.wsdl_dir = wsdl_dir
+        self.operation_timeout = operation_timeout
+        self.cam = None
+        self.media = None
+        self.ptz = None
+        self.profiles = None
+        self.profile_token = None
+        self._templates: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        # Un lock por operación: protege su plantilla durante la petición SOAP
+        self._op_locks: Dict[str, threading.Lock] = {}
+        self.stats = {
+            'connects': 0,
+            'calls': 0,
+            'errors': 0,
+            'last_error': None,
+        }
+
+    @property
+    def connected(self) -> bool:
+        return self.ptz is not None
+
+    def connect(self):
+        """Conectar si no hay sesión activa (lanza la excepción si falla)"""
+        with self._lock:
+            if self.ptz is not None:
+                return self
+            from onvif import ONVIFCamera
+
+            kwargs = {'wsdl_dir': self.wsdl_dir} if self.wsdl_dir else {}
+            if SHARED_TRANSPORT_AVAILABLE:
+                # Un único requests.Session (keep-alive) para todos los servicios
+                kwargs['transport'] = Transport(
+                    session=requests.Session(), operation_timeout=self.operation_timeout
+                )
+            try:
+                cam = ONVIFCamera(self.ip, self.puerto, self.usuario, self.contrasena, **kwargs)
+            except TypeError:
+                # Versiones de onvif sin parámetro ``transport``
+                kwargs.pop('transport', None)
+                cam = ONVIFCamera(self.ip, self.puerto, self.usuario, self.contrasena, **kwargs)
+            media = cam.create_media_service()
+            ptz = cam.create_ptz_service()
+            profiles = media.GetProfiles()
+            if not profiles:
+                raise Exception("No se encontraron profiles en la cámara")
+            self.cam, self.media, self.profiles = cam, media, profiles
+            self.profile_token = profiles[0].token
+            self._templates.clear()
+            self.ptz = ptz
+            self.stats['connects'] += 1
+            logger.info("Sesión ONVIF %s:%s conectada", self.ip, self.puerto)
+            return self
+
+    def invalidate(self):
+        """Descartar la conexión; la próxima llamada reconecta"""
+        with self._lock:
+            self.cam = self.media = self.ptz = None
+            self._templates.clear()
+
+    def _template(self, operation: str):
+        req = self._templates.get(operation)
+        if req is None:
+            req = self.ptz.create_type(operation)
+            req.ProfileToken = self.profile_token
+            self._templates[operation] = req
+        return req
+
+    def call(self, operation: str, **fields):
+        """
+        Ejecutar una operación PTZ (``ContinuousMove``, ``AbsoluteMove``,
+        ``GetStatus``, ``Stop``...) con la petición plantilla de la sesión.
+
+        Los campos se asignan en cada llamada; un campo en ``None`` se limpia
+        para que no quede el valor de una llamada anterior.
+
+        El round-trip SOAP se hace fuera del lock de la sesión, solo con el de
+        su operación: el sondeo de ``GetStatus`` no retrasa a los movimientos.
+        """
+        try:
+            with self._lock:
+                self.connect()
+                req = self._template(operation)
+                metodo = getattr(self.ptz, operation)
+                op_lock = self._op_locks.setdefault(operation, threading.Lock())
+            with op_lock:
+                for name, value in fields.items():
+                    setattr(req, name, value)
+                result = metodo(req)
+        except Exception as e:
+            self.stats['errors'] += 1
+            self.stats['last_error'] = str(e)
+            self.invalidate()
+            raise
+        self.stats['calls'] += 1
+        return result
+
+
+_sessions: Dict[Tuple[str, int, str], ONVIFSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_onvif_session(ip: str, puerto: int, usuario: str, contrasena: str,
+                      wsdl_dir: Optional[str] = None) -> ONVIFSession:
+    """Sesión compartida por (ip, puerto, usuario); se recrea si cambia la contraseña"""
+    key = (ip, int(puerto), usuario)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None or session.contrasena != contrasena:
+            session = ONVIFSession(ip, puerto, usuario, contrasena, wsdl_dir=wsdl_dir)
+            _sessions[key] = session
+        return session
+
+
+def get_session_stats() -> Dict[str, Dict[str, Any]]:
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+    return {f"{s.ip}:{s.puerto}": {**s.stats, 'connected': s.connected} for s in sessions}
+
+
+def invalidate_session(ip: str, puerto: int, usuario: Optional[str] = None):
+    """Forzar reconexión de las sesiones de una cámara"""
+    with _sessions_lock:
+        sessions = [s for (i, p, u), s in _sessions.items()
+                    if i == ip and p == int(puerto) and (usuario is None or u == usuario)]
+    for session in sessions:
+        session.invalidate()
@@ -0,0 +1,131 @@
+"""
+Actor de comandos PTZ por cámara.
+
+Los lazos de seguimiento no deben bloquearse en llamadas SOAP/ONVIF: publican
+el comando en un buzón de una sola posición y un hilo dedicado por cámara lo
+envía. Si llega un comando nuevo antes de que se envíe el anterior, el viejo
+se descarta (coalescencia), de modo que la cámara nunca recibe movimientos
+obsoletos encolados.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+from logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class PTZCommandActor:
+    """
+    Hilo único por cámara con buzón "último comando gana".
+
+    ``submit`` nunca bloquea. ``dedup_key`` identifica comandos equivalentes
+    (p. ej. ``('continuous', pan, tilt, zoom)``): si coincide con el último
+    enviado con éxito el comando se omite, salvo que hayan pasado
+    ``refresh_interval`` segundos (algunas cámaras cortan ContinuousMove por
+    timeout). Una excepción o un retorno ``False`` cuentan como error y, igual
+    que un comando sin clave, anulan la deduplicación.
+    """
+
+    def __init__(self, name: str, refresh_interval: float = 2.0):
+        self.name = name
+        self.refresh_interval = refresh_interval
+        self._pending = None  # (func, args, kwargs, dedup_key, submitted_at)
+        self._cond = threading.Condition()
+        self._last_key: Optional[Hashable] = None
+        self._last_sent_time = 0.0
+        self._running = True
+        self.stats = {
+            'submitted': 0,
+            'sent': 0,
+            'coalesced': 0,
+            'deduplicated': 0,
+            'errors': 0,
+            'last_latency_ms': 0.0,
+            'avg_latency_ms': 0.0,
+            'max_latency_ms': 0.0,
+            'last_queue_delay_ms': 0.0,
+            'last_error': None,
+        }
+        self._thread = threading.Thread(target=self._run, name=f"ptz-actor-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, func: Callable, *args, dedup_key: Optional[Hashable] = None, **kwargs):
+        """Publicar un comando; reemplaza al pendiente si aún no se envió"""
+        with self._cond:
+            if not self._running:
+                return
+            self.stats['submitted'] += 1
+            if self._pending is not None:
+                self.stats['coalesced'] += 1
+            self._pending = (func, args, kwargs, dedup_key, time.time())
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and self._running:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                func, args, kwargs, dedup_key, submitted_at = self._pending
+                self._pending = None
+
+            now = time.time()
+            if (dedup_key is not None and dedup_key == self._last_key
+                    and now - self._last_sent_time < self.refresh_interval):
+                self.stats['deduplicated'] += 1
+                continue
+
+            self.stats['last_queue_delay_ms'] = (now - submitted_at) * 1000
+            start = time.perf_counter()
+            try:
+                if func(*args, **kwargs) is False:
+                    raise RuntimeError(f"{getattr(func, '__name__', 'comando')} devolvió False")
+            except Exception as e:
+                self._last_key = None
+                self.stats['errors'] += 1
+                self.stats['last_error'] = str(e)
+                logger.warning("PTZ %s: error enviando comando: %s", self.name, e)
+                continue
+            self._record_latency((time.perf_counter() - start) * 1000)
+            self._last_key = dedup_key
+            self._last_sent_time = time.time()
+
+    def _record_latency(self, latency_ms: float):
+        stats = self.stats
+        stats['sent'] += 1
+        stats['last_latency_ms'] = latency_ms
+        stats['max_latency_ms'] = max(stats['max_latency_ms'], latency_ms)
+        # Media móvil exponencial del round-trip
+        if stats['sent'] == 1:
+            stats['avg_latency_ms'] = latency_ms
+        else:
+            stats['avg_latency_ms'] += 0.2 * (latency_ms - stats['avg_latency_ms'])
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats)
+
+    def stop(self, timeout: float = 2.0):
+        """Detener el hilo; un comando pendiente (p. ej. Stop) se envía antes de salir"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+
+
+_actors: Dict[str, PTZCommandActor] = {}
+_actors_lock = threading.Lock()
+
+
+def get_ptz_actor(camera_id: str) -> PTZCommandActor:
+    """Actor compartido por cámara (un solo hilo de comandos por dispositivo)"""
+    with _actors_lock:
+        actor = _actors.get(camera_id)
+        if actor is None or not actor._running:
+            actor = PTZCommandActor(camera_id)
+            _actors[camera_id] = actor
+        return actor
@@ -1,8 +1,9 @@
 import time
 import numpy as np
-from onvif import ONVIFCamera
 from typing import Optional
 
+from core.onvif_cache import get_onvif_session
+
 # Movimiento actual
 current_pan_speed = 0.0
 current_tilt_speed = 0.0
@@ -19,49 +20,63 @@ deteccion_confirmada_streak = 0
 
 
 class PTZCameraONVIF:
-    """Wrapper sencillo para enviar comandos PTZ vía ONVIF."""
+    """Wrapper sencillo para enviar comandos PTZ vía ONVIF.
+
+    La conexión se toma de la caché de sesiones (``core.onvif_cache``): crear
+    varias instancias para la misma cámara no vuelve a descargar WSDL ni
+    perfiles, y tras un error la sesión se reconecta en la siguiente llamada.
+    """
 
     def __init__(self, ip: str, puerto: int, usuario: str, contrasena: str):
-        self.cam = ONVIFCamera(ip, int(puerto), usuario, contrasena)
-        self.media = self.cam.create_media_service()
-        self.ptz = self.cam.create_ptz_service()
-        self.profile_token = self.media.GetProfiles()[0].token
+        self.session = get_onvif_session(ip, puerto, usuario, contrasena).connect()
+
+    @property
+    def cam(self):
+        return self.session.connect().cam
+
+    @property
+    def media(self):
+        return self.session.connect().media
+
+    @property
+    def ptz(self):
+        return self.session.connect().ptz
+
+    @property
+    def profile_token(self):
+        return self.session.connect().profile_token
 
 
     def goto_preset(self, preset_token: str):
         """Mover la cámara a un preset específico."""
-        req = self.ptz.create_type('GotoPreset')
-        req.ProfileToken = self.profile_token
-        req.PresetToken = str(preset_token)
-        self.ptz.GotoPreset(req)
+        self.session.call('GotoPreset', PresetToken=str(preset_token))
 
 
     def continuous_move(self, pan_speed: float, tilt_speed: float, zoom_speed: float = 0.0):
-        req = self.ptz.create_type('ContinuousMove')
-        req.ProfileToken = self.profile_token
-        req.Velocity = {
+        self.session.call('ContinuousMove', Velocity={
             'PanTilt': {'x': pan_speed, 'y': tilt_speed},
             'Zoom': {'x': zoom_speed}
-        }
-        self.ptz.ContinuousMove(req)
+        })
 
     def absolute_move(self, pan: float, tilt: float, zoom: float, speed: Optional[float] = None):
         """Mover la cámara a una posición absoluta."""
-        req = self.ptz.create_type('AbsoluteMove')
-        req.ProfileToken = self.profile_token
-        req.Position = {
-            'PanTilt': {'x': max(-1.0, min(1.0, pan)), 'y': max(-1.0, min(1.0, tilt))},
-            'Zoom': {'x': max(0.0, min(1.0, zoom))}
-        }
-        if speed is not None:
-            req.Speed = {
+        self.session.call(
+            'AbsoluteMove',
+            Position={
+                'PanTilt': {'x': max(-1.0, min(1.0, pan)), 'y': max(-1.0, min(1.0, tilt))},
+                'Zoom': {'x': max(0.0, min(1.0, zoom))}
+            },
+            Speed={
                 'PanTilt': {'x': speed, 'y': speed},
                 'Zoom': {'x': speed}
-            }
-        self.ptz.AbsoluteMove(req)
+            } if speed is not None else None
+        )
+
+    def get_status(self):
+        return self.session.call('GetStatus')
 
     def stop(self):
-        self.ptz.Stop({'ProfileToken': self.profile_token})
+        self.session.call('Stop')
 
 
 def track_object_continuous(ip, puerto, usuario, contrasena, cx, cy, frame_w, frame_h):
@@ -4,9 +4,14 @@ import numpy as np
 import json
 import os
 from datetime import datetime
-from onvif import ONVIFCamera
 from typing import Optional, Dict, Any, Tuple
 
+from core.onvif_cache import get_onvif_session
+from core.ptz_command_actor import get_ptz_actor
+from core.ptz_state_service import (
+    find_ptz_state_service, get_ptz_state_service, release_ptz_state_service
+)
+
 class PTZCameraEnhanced:
     """Clase mejorada para control PTZ con funcionalidades avanzadas"""
     
@@ -37,23 +42,24 @@ class PTZCameraEnhanced:
         self.move_timeout = 30.0
         self.position_tolerance = 0.01
         
+        # Hilo de comandos no bloqueantes (métodos *_async)
+        self.command_actor = get_ptz_actor(f"{ip}:{puerto}")
+        
         # Inicializar conexión
         self._initialize_connection()
         
     def _initialize_connection(self):
         """Inicializa la conexión ONVIF"""
         try:
-            self.cam = ONVIFCamera(self.ip, self.puerto, self.usuario, self.contrasena)
-            self.media = self.cam.create_media_service()
-            self.ptz = self.cam.create_ptz_service()
-            
-            # Obtener profiles disponibles
-            self.profiles = self.media.GetProfiles()
-            if not self.profiles:
-                raise Exception("No se encontraron profiles en la cámara")
-                
+            # Sesión compartida: WSDL y perfiles se obtienen una sola vez por cámara
+            self.session = get_onvif_session(self.ip, self.puerto, self.usuario, self.contrasena).connect()
+            self.cam = self.session.cam
+            self.media = self.session.media
+            self.ptz = self.session.ptz
+            self.profiles = self.session.profiles
+            
             # Usar el primer profile por defecto
-            self.profile_token = self.profiles[0].token
+            self.profile_token = self.session.profile_token
             
             # Verificar capacidades PTZ
             self._check_ptz_capabilities()
@@ -160,17 +166,14 @@ class PTZCameraEnhanced:
             tilt_speed = max(-1.0, min(1.0, tilt_speed))
             zoom_speed = max(-1.0, min(1.0, zoom_speed))
             
-            req = self.ptz.create_type('ContinuousMove')
-            req.ProfileToken = self.profile_token
-            req.Velocity = {
-                'PanTilt': {'x': pan_speed, 'y': tilt_speed},
-                'Zoom': {'x': zoom_speed}
-            }
-            
-            if duration is not None:
-                req.Timeout = f"PT{duration}S"
-            
-            self.ptz.ContinuousMove(req)
+            self.session.call(
+                'ContinuousMove',
+                Velocity={
+                    'PanTilt': {'x': pan_speed, 'y': tilt_speed},
+                    'Zoom': {'x': zoom_speed}
+                },
+                Timeout=f"PT{duration}S" if duration is not None else None
+            )
             
             # Registrar movimiento
             self._log_movement("continuous_move", {
@@ -208,17 +211,15 @@ class PTZCameraEnhanced:
             pan = max(-1.0, min(1.0, pan))
             tilt = max(-1.0, min(1.0, tilt))
 
-            req = self.ptz.create_type('AbsoluteMove')
-            req.ProfileToken = self.profile_token
-            req.Position = {
+            position = {
                 'PanTilt': {'x': pan, 'y': tilt}
             }
 
             if zoom is not None:
                 zoom = max(0.0, min(1.0, zoom))
-                req.Position['Zoom'] = {'x': zoom}
+                position['Zoom'] = {'x': zoom}
 
-            req.Speed = {
+            move_speed = {
                 'PanTilt': {
                     'x': max(0.1, min(1.0, speed)),
                     'y': max(0.1, min(1.0, speed))
@@ -226,9 +227,9 @@ class PTZCameraEnhanced:
             }
 
             if zoom is not None:
-                req.Speed['Zoom'] = {'x': max(0.1, min(1.0, speed))}
+                move_speed['Zoom'] = {'x': max(0.1, min(1.0, speed))}
 
-            self.ptz.AbsoluteMove(req)
+            self.session.call('AbsoluteMove', Position=position, Speed=move_speed)
             
             # Actualizar posición conocida
             self.last_position = {"pan": pan, "tilt": tilt, "zoom": zoom}
@@ -303,12 +304,7 @@ class PTZCameraEnhanced:
             bool: True si el comando fue exitoso
         """
         try:
-            req = self.ptz.create_type('Stop')
-            req.ProfileToken = self.profile_token
-            req.PanTilt = stop_pan_tilt
-            req.Zoom = stop_zoom
-            
-            self.ptz.Stop(req)
+            self.session.call('Stop', PanTilt=stop_pan_tilt, Zoom=stop_zoom)
             
             # Registrar parada
             self._log_movement("stop", {"pan_tilt": stop_pan_tilt, "zoom": stop_zoom})
@@ -319,6 +315,30 @@ class PTZCameraEnhanced:
             print(f"❌ Error deteniendo movimiento: {e}")
             return False
 
+    def continuous_move_async(self, pan_speed: float, tilt_speed: float, zoom_speed: float = 0.0):
+        """
+        Versión no bloqueante de ``continuous_move`` para lazos de seguimiento.
+        
+        El comando se coalesce con los pendientes y se omite si las velocidades
+        no cambiaron respecto al último enviado.
+        """
+        self.command_actor.submit(
+            self.continuous_move, pan_speed, tilt_speed, zoom_speed,
+            dedup_key=('continuous', round(pan_speed, 3), round(tilt_speed, 3), round(zoom_speed, 3))
+        )
+
+    def absolute_move_async(self, pan: float, tilt: float, zoom: Optional[float] = None, speed: float = 0.5):
+        """Versión no bloqueante de ``absolute_move`` (gana la última posición pedida)"""
+        self.command_actor.submit(self.absolute_move, pan, tilt, zoom, speed)
+
+    def stop_async(self):
+        """Versión no bloqueante de ``stop``; reemplaza cualquier movimiento pendiente"""
+        self.command_actor.submit(self.stop, dedup_key=('stop',))
+
+    def get_command_stats(self) -> Dict[str, Any]:
+        """Latencia y contadores de los comandos enviados por el actor"""
+        return self.command_actor.get_stats()
+
     def get_position(self) -> Optional[Dict[str, float]]:
         """
         Obtiene la posición actual de la cámara
@@ -329,11 +349,15 @@ class PTZCameraEnhanced:
         if not self.connected or not self.ptz:
             return None
 
+        # Estado reciente del servicio compartido (si un tracker lo mantiene activo): sin consulta SOAP
+        service = find_ptz_state_service(self.session)
+        state = service.get_state(max_age=service.slow_interval * 2) if service is not None else None
+        if state is not None:
+            self.last_position = {"pan": state.pan, "tilt": state.tilt, "zoom": state.zoom}
+            return self.last_position.copy()
+
         try:
-            req = self.ptz.create_type('GetStatus')
-            req.ProfileToken = self.profile_token
-            
-            status = self.ptz.GetStatus(req)
+            status = self.session.call('GetStatus')
             
             if hasattr(status, 'Position'):
                 position = {
@@ -445,10 +469,7 @@ class PTZCameraEnhanced:
             Dict con información de estado o None si hay error
         """
         try:
-            req = self.ptz.create_type('GetStatus')
-            req.ProfileToken = self.profile_token
-            
-            status = self.ptz.GetStatus(req)
+            status = self.session.call('GetStatus')
             
             result = {
                 "position": None,
@@ -485,13 +506,18 @@ class PTZCameraEnhanced:
     def move_to_position_smooth(self, target_pan: float, target_tilt: float, target_zoom: float, 
                                steps: int = 10, delay: float = 0.1) -> bool:
         """
-        Movimiento suave a una posición específica mediante pasos intermedios
+        Movimiento suave a una posición específica
+        
+        Se envía un único AbsoluteMove a velocidad normalizada fija y se espera
+        la llegada, como mucho ``steps * delay`` segundos, con la posición
+        publicada por el servicio de estado PTZ. Si la cámara aún no ha llegado
+        al vencer el plazo el movimiento sigue en curso y se devuelve True.
         
         Args:
             target_pan: Posición objetivo de pan
             target_tilt: Posición objetivo de tilt
             target_zoom: Posición objetivo de zoom
-            steps: Número de pasos intermedios
+            steps: Número de pasos intermedios (junto con ``delay`` fija la espera máxima)
             delay: Retardo entre pasos (segundos)
             
         Returns:
@@ -504,24 +530,24 @@ class PTZCameraEnhanced:
                 # Si no podemos obtener la posición, usar la última conocida
                 current_pos = self.last_position
             
-            # Calcular pasos intermedios
-            pan_step = (target_pan - current_pos["pan"]) / steps
-            tilt_step = (target_tilt - current_pos["tilt"]) / steps
-            zoom_step = (target_zoom - current_pos["zoom"]) / steps
-            
-            # Ejecutar movimiento paso a paso
-            for i in range(steps):
-                intermediate_pan = current_pos["pan"] + (pan_step * (i + 1))
-                intermediate_tilt = current_pos["tilt"] + (tilt_step * (i + 1))
-                intermediate_zoom = current_pos["zoom"] + (zoom_step * (i + 1))
-                
-                success = self.absolute_move(intermediate_pan, intermediate_tilt, intermediate_zoom, 0.3)
-                if not success:
-                    return False
-                    
-                time.sleep(delay)
+            # Velocidad ONVIF normalizada (0.1-1.0), la misma que usaban los pasos intermedios
+            if not self.absolute_move(target_pan, target_tilt, target_zoom, 0.3):
+                return False
             
-            print(f"✅ Movimiento suave completado a ({target_pan:.2f}, {target_tilt:.2f}, {target_zoom:.2f})")
+            service = get_ptz_state_service(self.session)
+            try:
+                reached = service.wait_for_position(
+                    target_pan, target_tilt, target_zoom,
+                    tolerance=self.position_tolerance,
+                    timeout=max(steps * delay, 0.1)
+                )
+            finally:
+                release_ptz_state_service(service)
+            
+            if reached:
+                print(f"✅ Movimiento suave completado a ({target_pan:.2f}, {target_tilt:.2f}, {target_zoom:.2f})")
+            else:
+                print(f"⏳ Movimiento suave en curso hacia ({target_pan:.2f}, {target_tilt:.2f}, {target_zoom:.2f})")
             return True
             
         except Exception as e:
@@ -658,6 +684,7 @@ class PTZCameraEnhanced:
         """
         try:
             print(f"🔄 Reiniciando conexión PTZ a {self.ip}")
+            get_onvif_session(self.ip, self.puerto, self.usuario, self.contrasena).invalidate()
             self._initialize_connection()
             return True
         except Exception as e:
@@ -0,0 +1,344 @@
+"""
+Motor PTZ único del proceso.
+
+Un solo hilo planificador atiende a todas las cámaras PTZ: entrega a cada
+tracker registrado sus detecciones pendientes y ejecuta su paso de control al
+ritmo que pida (``control_interval``). Los comandos ONVIF salen por el actor de
+cada cámara, así que un paso nunca bloquea a las demás.
+
+Las detecciones entran una sola vez como ``ObjectPosition``;
+``ObjectPosition.from_detection`` acepta los formatos de diccionario usados en
+la aplicación. Si llega un lote nuevo antes de procesar el anterior, gana el
+más reciente. La selección de objetivo y el cálculo de velocidades son
+estrategias intercambiables (``TargetSelector`` y ``ControlStrategy``).
+"""
+
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.ptz_predictive_controller import PredictivePTZController
+from logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class ObjectPosition:
+    """Representa la posición de un objeto detectado en el frame"""
+    cx: float          # Centro X normalizado (0-1)
+    cy: float          # Centro Y normalizado (0-1)
+    width: float       # Ancho normalizado (0-1)
+    height: float      # Altura normalizada (0-1)
+    confidence: float  # Confianza de detección (0-1)
+    timestamp: float = field(default_factory=time.time)
+    frame_w: int = 1920    # Ancho del frame en píxeles
+    frame_h: int = 1080    # Alto del frame en píxeles
+    object_class: str = "unknown"
+    track_id: Optional[int] = None
+
+    @classmethod
+    def from_detection(cls, det: Dict, frame_size: Optional[Tuple[int, int]] = None
+                       ) -> Optional['ObjectPosition']:
+        """
+        Crear desde un diccionario de detección. Formatos aceptados:
+        ``bbox`` [x1, y1, x2, y2], ``x1``..``y2``, ``cx``/``cy``/``width``/``height``
+        (normalizados o en píxeles) y ``x``/``y`` (centro en píxeles).
+        ``frame_size`` es (ancho, alto); si falta se usan ``frame_w``/``frame_h``.
+        Devuelve None si la detección no tiene coordenadas reconocibles.
+        """
+        if isinstance(det, cls):
+            return det
+        frame_w = int(det.get('frame_w') or (frame_size[0] if frame_size else 1920))
+        frame_h = int(det.get('frame_h') or (frame_size[1] if frame_size else 1080))
+
+        bbox = det.get('bbox')
+        if bbox is None and 'x1' in det:
+            bbox = (det['x1'], det['y1'], det['x2'], det['y2'])
+        if bbox is not None and len(bbox) == 4:
+            x1, y1, x2, y2 = (float(v) for v in bbox)
+            cx, cy, width, height = (x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1
+        elif 'cx' in det:
+            cx, cy = float(det['cx']), float(det['cy'])
+            width, height = float(det.get('width', 0.0)), float(det.get('height', 0.0))
+        elif 'x' in det:
+            cx, cy = float(det['x']), float(det['y'])
+            width, height = float(det.get('width', 0.0)), float(det.get('height', 0.0))
+        else:
+            return None
+
+        # Coordenadas en píxeles -> normalizadas
+        if max(abs(cx), abs(cy), width, height) > 1.0:
+            cx, width = cx / frame_w, width / frame_w
+            cy, height = cy / frame_h, height / frame_h
+
+        return cls(
+            cx=cx, cy=cy, width=width, height=height,
+            confidence=float(det.get('confidence', det.get('conf', 0.0))),
+            timestamp=det.get('timestamp') or time.time(),
+            frame_w=frame_w,
+            frame_h=frame_h,
+            object_class=str(det.get('class', det.get('class_name', 'unknown'))),
+            track_id=det.get('track_id'),
+        )
+
+    def to_pixels(self) -> tuple:
+        """Convertir coordenadas normalizadas a píxeles"""
+        x1 = int((self.cx - self.width/2) * self.frame_w)
+        y1 = int((self.cy - self.height/2) * self.frame_h)
+        x2 = int((self.cx + self.width/2) * self.frame_w)
+        y2 = int((self.cy + self.height/2) * self.frame_h)
+        return (x1, y1, x2, y2)
+
+    def get_area(self) -> float:
+        """Obtener área del objeto en píxeles cuadrados"""
+        return (self.width * self.frame_w) * (self.height * self.frame_h)
+
+    def distance_to_center(self) -> float:
+        """Calcular distancia al centro del frame (0-1)"""
+        return math.sqrt((self.cx - 0.5)**2 + (self.cy - 0.5)**2)
+
+
+# ===== ESTRATEGIAS DE SELECCIÓN DE OBJETIVO =====
+
+class TargetSelector:
+    """Elige el objetivo entre los objetos rastreados (``{id: TrackedObject}``)"""
+
+    def select(self, objects: Dict[int, Any], current_id: Optional[int]) -> Optional[int]:
+        raise NotImplementedError
+
+
+class PriorityTargetSelector(TargetSelector):
+    """Mayor ``priority_score`` (confianza, movimiento, tamaño y proximidad)"""
+
+    def select(self, objects, current_id):
+        if not objects:
+            return None
+        return max(objects, key=lambda oid: objects[oid].priority_score)
+
+
+class ConfidenceTargetSelector(TargetSelector):
+    """Mayor confianza media"""
+
+    def select(self, objects, current_id):
+        if not objects:
+            return None
+        return max(objects, key=lambda oid: objects[oid].get_average_confidence())
+
+
+# ===== ESTRATEGIAS DE CONTROL =====
+
+class ControlStrategy:
+    """
+    Calcula velocidades ``(pan, tilt)`` para centrar el objetivo.
+
+    ``compute`` recibe el ``TrackedObject``, su última ``ObjectPosition`` y el
+    tracker (para consultar configuración, posición o estadísticas del actor).
+    """
+
+    def compute(self, target, position: ObjectPosition, tracker) -> Tuple[float, float]:
+        raise NotImplementedError
+
+    def reset(self):
+        """Cambio de objetivo"""
+
+    def note_command(self, pan_speed: float, tilt_speed: float, sent_at: float):
+        """Comando publicado en el actor"""
+
+    def note_ptz_state(self, state):
+        """Estado reportado por ``PTZStateService``"""
+
+    def get_stats(self) -> Optional[Dict]:
+        return None
+
+
+class ProportionalControl(ControlStrategy):
+    """Controlador proporcional sobre el último centro conocido"""
+
+    def __init__(self, gain: float = 2.0, max_pan_speed: float = 0.8, max_tilt_speed: float = 0.8):
+        self.gain = gain
+        self.max_pan_speed = max_pan_speed
+        self.max_tilt_speed = max_tilt_speed
+
+    def compute(self, target, position, tracker):
+        pan_speed = (position.cx - 0.5) * self.gain
+        tilt_speed = -(position.cy - 0.5) * self.gain  # Invertir Y para tilt
+        pan_speed = max(-self.max_pan_speed, min(self.max_pan_speed, pan_speed))
+        tilt_speed = max(-self.max_tilt_speed, min(self.max_tilt_speed, tilt_speed))
+        return pan_speed, tilt_speed
+
+
+class PredictiveControl(ControlStrategy):
+    """PID sobre la posición predicha con compensación de latencia"""
+
+    def __init__(self, controller: PredictivePTZController):
+        self.controller = controller
+
+    def compute(self, target, position, tracker):
+        actor = getattr(tracker, 'command_actor', None)
+        return self.controller.compute(
+            position.cx, position.cy,
+            getattr(target, 'velocity_x', 0.0), getattr(target, 'velocity_y', 0.0),
+            position.timestamp, actor.stats if actor is not None else None
+        )
+
+    def reset(self):
+        self.controller.reset()
+
+    def note_command(self, pan_speed, tilt_speed, sent_at):
+        self.controller.note_command(pan_speed, tilt_speed, sent_at)
+
+    def note_ptz_state(self, state):
+        self.controller.note_ptz_state(state.moving, state.timestamp)
+
+    def get_stats(self):
+        return self.controller.get_stats()
+
+
+def create_control_strategy(config) -> ControlStrategy:
+    """Estrategia de control según ``MultiObjectConfig.control_mode``"""
+    if getattr(config, 'control_mode', 'proportional') == 'predictive':
+        return PredictiveControl(PredictivePTZController.from_config(config))
+    return ProportionalControl(2.0, config.max_pan_speed, config.max_tilt_speed)
+
+
+# ===== PLANIFICADOR =====
+
+class _Client:
+    __slots__ = ('tracker', 'interval', 'next_due', 'steps', 'errors')
+
+    def __init__(self, tracker, interval: float):
+        self.tracker = tracker
+        self.interval = interval
+        self.next_due = 0.0
+        self.steps = 0
+        self.errors = 0
+
+
+class PTZEngine:
+    """
+    Hilo planificador compartido por todas las cámaras PTZ.
+
+    Un tracker registrado debe ofrecer ``step(now)`` y, si recibe
+    detecciones por ``submit``, ``on_detections(positions)``. Ambos se
+    ejecutan siempre en el hilo del motor.
+    """
+
+    def __init__(self, default_interval: float = 0.1):
+        self.default_interval = default_interval
+        self._clients: Dict[int, _Client] = {}
+        self._pending: Dict[int, List[ObjectPosition]] = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self.stats = {
+            'ticks': 0,
+            'steps': 0,
+            'detections_delivered': 0,
+            'batches_coalesced': 0,
+            'errors': 0,
+            'avg_step_ms': 0.0,
+        }
+
+    def register(self, tracker, interval: Optional[float] = None):
+        interval = interval or getattr(tracker, 'control_interval', None) or self.default_interval
+        with self._cond:
+            self._clients[id(tracker)] = _Client(tracker, interval)
+            self._ensure_thread()
+            self._cond.notify()
+
+    def unregister(self, tracker):
+        with self._cond:
+            self._clients.pop(id(tracker), None)
+            self._pending.pop(id(tracker), None)
+
+    def is_registered(self, tracker) -> bool:
+        return id(tracker) in self._clients
+
+    def submit(self, tracker, positions: List[ObjectPosition]) -> bool:
+        """Publicar detecciones para un tracker registrado (no bloquea)"""
+        with self._cond:
+            if id(tracker) not in self._clients:
+                return False
+            if id(tracker) in self._pending:
+                self.stats['batches_coalesced'] += 1
+            self._pending[id(tracker)] = positions
+            self._cond.notify()
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="ptz-engine", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    if not self._clients:
+                        self._cond.wait()
+                        continue
+                    timeout = min(c.next_due for c in self._clients.values()) - time.time()
+                    if timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                pending, self._pending = self._pending, {}
+                clients = list(self._clients.items())
+
+            self.stats['ticks'] += 1
+            for key, client in clients:
+                positions = pending.get(key)
+                if positions is not None:
+                    self._call(client, client.tracker.on_detections, positions)
+                    self.stats['detections_delivered'] += len(positions)
+
+            now = time.time()
+            for key, client in clients:
+                if client.next_due > now or key not in self._clients:
+                    continue
+                client.next_due = now + client.interval
+                start = time.perf_counter()
+                self._call(client, client.tracker.step, now)
+                self._record_step((time.perf_counter() - start) * 1000)
+                client.steps += 1
+
+    def _call(self, client: _Client, func, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            client.errors += 1
+            self.stats['errors'] += 1
+            logger.warning("Motor PTZ: error en %s: %s", type(client.tracker).__name__, e)
+
+    def _record_step(self, step_ms: float):
+        stats = self.stats
+        stats['steps'] += 1
+        stats['avg_step_ms'] += 0.05 * (step_ms - stats['avg_step_ms'])
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            clients = [
+                {
+                    'tracker': type(c.tracker).__name__,
+                    'ip': getattr(c.tracker, 'ip', None) or getattr(c.tracker, 'camera_ip', None),
+                    'interval': c.interval,
+                    'steps': c.steps,
+                    'errors': c.errors,
+                }
+                for c in self._clients.values()
+            ]
+        return {**self.stats, 'clients': clients}
+
+
+_engine: Optional[PTZEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_ptz_engine() -> PTZEngine:
+    """Motor PTZ compartido del proceso (el hilo arranca con el primer tracker)"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = PTZEngine()
+        return _engine
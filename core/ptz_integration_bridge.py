@@ -1,10 +1,10 @@
 # core/ptz_integration_bridge.py
 """
 Bridge de integración PTZ para conectar con enhanced_ptz_multi_object_dialog.py
-Este archivo proporciona la capa de conexión entre los sistemas PTZ y la UI
+Este archivo proporciona la capa de conexión entre los sistemas PTZ y la UI.
+Los trackers multi-objeto corren en el motor PTZ único (``core.ptz_engine``).
 """
 
-import threading
 import time
 import json
 import os
@@ -13,6 +13,9 @@ from typing import Optional, Dict, List, Any, Callable
 from dataclasses import dataclass
 from datetime import datetime
 
+from core.ptz_command_actor import get_ptz_actor
+from core.ptz_engine import ObjectPosition
+
 # === CONFIGURACIÓN DE IMPORTS CONDICIONALES ===
 # Intentar importar sistemas PTZ con fallbacks
 
@@ -220,28 +223,19 @@ class PTZIntegrationBridge:
             # Procesar detecciones según el tipo de tracker
             if session.tracker:
                 if hasattr(session.tracker, 'update_detections'):
-                    # Tracker multi-objeto
+                    # Tracker multi-objeto: convierte y publica en el motor PTZ
                     session.tracker.update_detections(detections, frame_size)
                     session.detection_count += len(detections)
                 elif hasattr(session.tracker, 'track_object_continuous'):
-                    # Tracker básico - usar la primera detección
-                    if detections:
-                        best_detection = max(detections, key=lambda x: x.get('confidence', 0))
-                        # Convertir a formato esperado por tracker básico
-                        x1 = int(best_detection['x1'])
-                        y1 = int(best_detection['y1'])
-                        x2 = int(best_detection['x2'])
-                        y2 = int(best_detection['y2'])
-                        
-                        # Ejecutar tracking en hilo separado para no bloquear
-                        def track_async():
-                            try:
-                                session.tracker.track_object_continuous((x1, y1, x2, y2), frame_size)
-                            except Exception as e:
-                                print(f"Error en tracking básico: {e}")
+                    # Tracker básico - usar la detección de mayor confianza
+                    positions = [p for p in (ObjectPosition.from_detection(d, frame_size) for d in detections) if p]
+                    if positions:
+                        best = max(positions, key=lambda p: p.confidence)
                         
-                        thread = threading.Thread(target=track_async, daemon=True)
-                        thread.start()
+                        # Hilo de comandos de la cámara: solo se ejecuta el lote más reciente
+                        get_ptz_actor(f"{session.ip}:{session.port}").submit(
+                            session.tracker.track_object_continuous, best.to_pixels(), frame_size
+                        )
                         
                         session.detection_count += 1
             
@@ -0,0 +1,213 @@
+"""
+Control PTZ predictivo con compensación de latencia.
+
+Entre la captura de un frame y el momento en que la cámara empieza a moverse
+pasan cientos de ms (detección, lazo de seguimiento, envío SOAP, respuesta del
+motor). Un controlador proporcional sobre el último centro conocido corrige
+sobre una posición ya vieja y, con objetivos rápidos, se pasa y oscila.
+
+``PredictivePTZController`` proyecta el objetivo con su velocidad hasta el
+instante estimado de llegada del comando y aplica un PID por eje con
+anti-windup, zona muerta, limitación de variación y cuantización de la salida
+(velocidades repetidas se deduplican en el actor de comandos). La latencia se
+mide en marcha: antigüedad de la detección, espera en el buzón del actor y
+tiempo hasta que el servicio de estado ve la cámara moverse.
+"""
+
+import time
+from typing import Dict, Optional, Tuple
+
+
+class PIDAxis:
+    """
+    PID de un eje con salida acotada.
+
+    Anti-windup por integración condicional: el integrador no acumula mientras
+    la salida está saturada en el mismo sentido del error, y además se acota a
+    ``integral_limit``. La derivada se filtra (``derivative_smoothing``) para no
+    amplificar el ruido de la detección. ``max_rate`` limita el cambio de la
+    salida por segundo.
+    """
+
+    def __init__(self, kp: float, ki: float, kd: float, output_limit: float,
+                 integral_limit: float = 0.5, max_rate: float = 2.0,
+                 derivative_smoothing: float = 0.5):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.output_limit = output_limit
+        self.integral_limit = integral_limit
+        self.max_rate = max_rate
+        self.derivative_smoothing = derivative_smoothing
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.last_error: Optional[float] = None
+        self.output = 0.0
+
+    def update(self, error: float, dt: float) -> float:
+        dt = max(dt, 1e-3)
+        if self.last_error is not None:
+            raw = (error - self.last_error) / dt
+            self.derivative += (1.0 - self.derivative_smoothing) * (raw - self.derivative)
+        self.last_error = error
+
+        unclamped = self.kp * error + self.ki * self.integral + self.kd * self.derivative
+        saturated = abs(unclamped) >= self.output_limit and unclamped * error > 0
+        if not saturated:
+            self.integral += error * dt
+            self.integral = max(-self.integral_limit, min(self.integral_limit, self.integral))
+
+        output = self.kp * error + self.ki * self.integral + self.kd * self.derivative
+        output = max(-self.output_limit, min(self.output_limit, output))
+
+        # Limitar la variación respecto a la salida anterior
+        max_step = self.max_rate * dt
+        output = max(self.output - max_step, min(self.output + max_step, output))
+        self.output = output
+        return output
+
+    def settle(self, dt: float) -> float:
+        """Objetivo dentro de la zona muerta: frenar sin saltos y vaciar el integrador"""
+        self.integral *= 0.5
+        self.last_error = None
+        self.derivative = 0.0
+        max_step = self.max_rate * max(dt, 1e-3)
+        self.output = max(0.0, abs(self.output) - max_step) * (1 if self.output > 0 else -1)
+        return self.output
+
+
+class PredictivePTZController:
+    """
+    Controlador de pan/tilt sobre la posición predicha del objetivo.
+
+    ``compute`` recibe el centro normalizado, su velocidad (unidades de frame
+    por segundo) y la marca de tiempo de la detección; devuelve las
+    velocidades ``(pan, tilt)``. ``note_command`` y ``note_ptz_state`` alimentan
+    la medición de latencia de actuación.
+    """
+
+    def __init__(self, kp: float = 1.6, ki: float = 0.3, kd: float = 0.15,
+                 max_pan_speed: float = 0.8, max_tilt_speed: float = 0.8,
+                 max_rate: float = 2.0, deadband: float = 0.03,
+                 detection_latency: float = 0.3, max_prediction_time: float = 1.0,
+                 speed_quantum: float = 0.02, latency_smoothing: float = 0.2):
+        self.pan = PIDAxis(kp, ki, kd, max_pan_speed, max_rate=max_rate)
+        self.tilt = PIDAxis(kp, ki, kd, max_tilt_speed, max_rate=max_rate)
+        self.deadband = deadband
+        self.detection_latency = detection_latency
+        self.max_prediction_time = max_prediction_time
+        self.speed_quantum = speed_quantum
+        self.latency_smoothing = latency_smoothing
+        self.actuation_latency: Optional[float] = None
+        self._motion_pending_since: Optional[float] = None
+        self._last_command_moving = False
+        self._last_update: Optional[float] = None
+        self.stats = {
+            'updates': 0,
+            'in_deadband': 0,
+            'latency_ms': 0.0,
+            'actuation_latency_ms': None,
+            'actuation_samples': 0,
+            'last_error': (0.0, 0.0),
+        }
+
+    @classmethod
+    def from_config(cls, config) -> 'PredictivePTZController':
+        """Crear a partir de un ``MultiObjectConfig``"""
+        return cls(
+            kp=config.pid_kp, ki=config.pid_ki, kd=config.pid_kd,
+            max_pan_speed=config.max_pan_speed, max_tilt_speed=config.max_tilt_speed,
+            max_rate=config.max_speed_rate, deadband=config.control_deadband,
+            detection_latency=config.detection_latency,
+            max_prediction_time=config.max_prediction_time,
+            speed_quantum=config.speed_quantum,
+        )
+
+    def reset(self):
+        """Nuevo objetivo: descartar integradores y derivadas"""
+        self.pan.reset()
+        self.tilt.reset()
+        self._last_update = None
+
+    def estimate_latency(self, detection_time: float, command_stats: Optional[Dict] = None,
+                         now: Optional[float] = None) -> float:
+        """
+        Segundos desde la captura hasta que el comando mueve la cámara.
+
+        ``detection_latency`` cubre captura + inferencia (invisibles para el
+        tracker); el resto se mide: antigüedad de la detección, espera y
+        round-trip en el actor, y respuesta del motor observada por el servicio
+        de estado cuando hay muestras.
+        """
+        now = now or time.time()
+        latency = self.detection_latency + max(0.0, now - detection_time)
+        if command_stats:
+            latency += command_stats.get('last_queue_delay_ms', 0.0) / 1000.0
+            if self.actuation_latency is None:
+                latency += command_stats.get('avg_latency_ms', 0.0) / 1000.0
+        if self.actuation_latency is not None:
+            latency += self.actuation_latency
+        return min(latency, self.max_prediction_time)
+
+    def compute(self, cx: float, cy: float, velocity_x: float, velocity_y: float,
+                detection_time: float, command_stats: Optional[Dict] = None) -> Tuple[float, float]:
+        now = time.time()
+        dt = now - self._last_update if self._last_update is not None else 0.1
+        self._last_update = now
+
+        latency = self.estimate_latency(detection_time, command_stats, now)
+        predicted_x = min(1.0, max(0.0, cx + velocity_x * latency))
+        predicted_y = min(1.0, max(0.0, cy + velocity_y * latency))
+        error_x = predicted_x - 0.5
+        error_y = predicted_y - 0.5
+
+        self.stats['updates'] += 1
+        self.stats['latency_ms'] = latency * 1000
+        self.stats['last_error'] = (round(error_x, 4), round(error_y, 4))
+
+        if abs(error_x) < self.deadband and abs(error_y) < self.deadband:
+            self.stats['in_deadband'] += 1
+            pan_speed = self.pan.settle(dt)
+            tilt_speed = -self.tilt.settle(dt)
+        else:
+            pan_speed = self.pan.update(error_x, dt)
+            tilt_speed = -self.tilt.update(error_y, dt)  # Invertir Y para tilt
+        return self._quantize(pan_speed), self._quantize(tilt_speed)
+
+    def _quantize(self, speed: float) -> float:
+        if not self.speed_quantum:
+            return speed
+        return round(round(speed / self.speed_quantum) * self.speed_quantum, 4)
+
+    def note_command(self, pan_speed: float, tilt_speed: float, sent_at: Optional[float] = None):
+        """Comando publicado: si arranca desde reposo, medir cuándo empieza a moverse"""
+        moving_cmd = abs(pan_speed) > 0 or abs(tilt_speed) > 0
+        if not moving_cmd:
+            self._motion_pending_since = None
+        elif not self._last_command_moving:
+            self._motion_pending_since = sent_at or time.time()
+        self._last_command_moving = moving_cmd
+
+    def note_ptz_state(self, moving: bool, timestamp: float):
+        """Estado reportado por la cámara (``PTZStateService``)"""
+        started = self._motion_pending_since
+        if started is None or not moving or timestamp < started:
+            return
+        sample = timestamp - started
+        self._motion_pending_since = None
+        if sample > self.max_prediction_time:
+            return
+        if self.actuation_latency is None:
+            self.actuation_latency = sample
+        else:
+            self.actuation_latency += self.latency_smoothing * (sample - self.actuation_latency)
+        self.stats['actuation_samples'] += 1
+        self.stats['actuation_latency_ms'] = self.actuation_latency * 1000
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['integral'] = (self.pan.integral, self.tilt.integral)
+        return stats
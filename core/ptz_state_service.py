@@ -0,0 +1,274 @@
+"""
+Servicio compartido de estado PTZ por cámara.
+
+Un único hilo por cámara consulta ``GetStatus`` a ritmo adaptativo: rápido
+mientras la cámara se mueve o tras un comando, lento en reposo. Si el equipo
+publica eventos ONVIF del controlador PTZ, en reposo se espera al evento en
+lugar de sondear. El estado (pan/tilt/zoom con marca de tiempo) se publica a
+todos los suscriptores, así ningún tracker hace su propia consulta bloqueante.
+
+Cada ``get_ptz_state_service`` cuenta como un usuario del servicio y debe
+emparejarse con ``release_ptz_state_service``: al soltar el último se detiene
+el hilo de sondeo de esa cámara.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from core.onvif_cache import ONVIFSession
+from logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class PTZState:
+    """Posición PTZ reportada por la cámara"""
+    pan: float
+    tilt: float
+    zoom: float
+    moving: bool
+    timestamp: float
+
+    def distance_to(self, pan: float, tilt: float, zoom: Optional[float] = None) -> float:
+        distance = max(abs(self.pan - pan), abs(self.tilt - tilt))
+        if zoom is not None:
+            distance = max(distance, abs(self.zoom - zoom))
+        return distance
+
+
+class PTZStateService:
+    """
+    Sondeo adaptativo de ``GetStatus`` sobre una ``ONVIFSession``.
+
+    ``notify_command()`` (llamado por quien envía movimientos) pasa al ritmo
+    rápido de inmediato; tras ``idle_after`` segundos sin cambios de posición
+    se vuelve al ritmo lento.
+    """
+
+    def __init__(self, session: ONVIFSession, fast_interval: float = 0.1,
+                 slow_interval: float = 1.0, idle_after: float = 1.5,
+                 position_epsilon: float = 0.001, use_events: bool = True):
+        self.session = session
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.idle_after = idle_after
+        self.position_epsilon = position_epsilon
+        self.use_events = use_events
+        self.state: Optional[PTZState] = None
+        self._subscribers: List[Callable[[PTZState], None]] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._changed = threading.Condition()
+        self._last_activity = 0.0
+        self._pullpoint = None
+        self.running = False
+        self.thread = None
+        self.stats = {
+            'polls': 0,
+            'errors': 0,
+            'events': 0,
+            'events_enabled': False,
+            'last_poll_ms': 0.0,
+        }
+
+    def start(self):
+        if self.running:
+            return self
+        self.running = True
+        self.thread = threading.Thread(
+            target=self._run, name=f"ptz-state-{self.session.ip}", daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self, wait: bool = True):
+        self.running = False
+        self._wakeup.set()
+        if wait and self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+        self.thread = None
+
+    def subscribe(self, callback: Callable[[PTZState], None]):
+        with self._lock:
+            self._subscribers.append(callback)
+        if self.state is not None:
+            callback(self.state)
+
+    def unsubscribe(self, callback: Callable[[PTZState], None]):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def notify_command(self):
+        """Se envió un movimiento: sondear rápido desde ya"""
+        self._last_activity = time.time()
+        self._wakeup.set()
+
+    def get_state(self, max_age: Optional[float] = None) -> Optional[PTZState]:
+        state = self.state
+        if state is None or (max_age is not None and time.time() - state.timestamp > max_age):
+            return None
+        return state
+
+    def wait_for_position(self, pan: float, tilt: float, zoom: Optional[float] = None,
+                          tolerance: float = 0.01, timeout: float = 10.0) -> bool:
+        """Bloquear hasta que la cámara llegue a la posición (o ``timeout``)"""
+        self.notify_command()
+        deadline = time.time() + timeout
+        with self._changed:
+            while True:
+                state = self.state
+                if state is not None and state.distance_to(pan, tilt, zoom) <= tolerance:
+                    return True
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+
+    def _interval(self) -> float:
+        state = self.state
+        moving = state is not None and state.moving
+        if moving or time.time() - self._last_activity < self.idle_after:
+            return self.fast_interval
+        return self.slow_interval
+
+    def _run(self):
+        if self.use_events:
+            self._setup_events()
+        while self.running:
+            self._poll()
+            interval = self._interval()
+            if interval == self.slow_interval and self._pullpoint is not None:
+                # En reposo: esperar un evento PTZ en lugar de sondear
+                if self._pull_events(interval):
+                    self._last_activity = time.time()
+                continue
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+
+    def _poll(self):
+        start = time.perf_counter()
+        try:
+            status = self.session.call('GetStatus')
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.debug("GetStatus %s falló: %s", self.session.ip, e)
+            return
+        self.stats['polls'] += 1
+        self.stats['last_poll_ms'] = (time.perf_counter() - start) * 1000
+        position = getattr(status, 'Position', None)
+        if position is None:
+            return
+
+        pan = float(position.PanTilt.x)
+        tilt = float(position.PanTilt.y)
+        zoom = float(position.Zoom.x) if getattr(position, 'Zoom', None) is not None else 0.0
+        move_status = getattr(status, 'MoveStatus', None)
+        moving = False
+        if move_status is not None:
+            moving = any(
+                str(getattr(move_status, axis, 'IDLE') or 'IDLE').upper() not in ('IDLE', 'UNKNOWN')
+                for axis in ('PanTilt', 'Zoom')
+            )
+        previous = self.state
+        if previous is not None and previous.distance_to(pan, tilt, zoom) > self.position_epsilon:
+            moving = True
+            self._last_activity = time.time()
+
+        state = PTZState(pan, tilt, zoom, moving, time.time())
+        with self._changed:
+            self.state = state
+            self._changed.notify_all()
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(state)
+            except Exception as e:
+                logger.warning("Suscriptor de estado PTZ falló: %s", e)
+
+    def _setup_events(self):
+        """Suscripción PullPoint a eventos del controlador PTZ, si el equipo los ofrece"""
+        try:
+            events = self.session.connect().cam.create_events_service()
+            properties = events.GetEventProperties()
+            if 'PTZController' not in str(getattr(properties, 'TopicSet', '')):
+                return
+            events.CreatePullPointSubscription()
+            self._pullpoint = self.session.cam.create_pullpoint_service()
+            self.stats['events_enabled'] = True
+            logger.info("Eventos PTZ ONVIF activos para %s", self.session.ip)
+        except Exception as e:
+            self._pullpoint = None
+            logger.debug("Eventos PTZ no disponibles en %s: %s", self.session.ip, e)
+
+    def _pull_events(self, timeout: float) -> bool:
+        try:
+            reply = self._pullpoint.PullMessages({
+                'Timeout': f"PT{max(1, int(timeout))}S",
+                'MessageLimit': 10,
+            })
+        except Exception as e:
+            logger.debug("PullMessages %s falló, volviendo a sondeo: %s", self.session.ip, e)
+            self._pullpoint = None
+            self.stats['events_enabled'] = False
+            return False
+        messages = getattr(reply, 'NotificationMessage', None) or []
+        ptz_messages = [m for m in messages if 'PTZ' in str(getattr(m, 'Topic', ''))]
+        self.stats['events'] += len(ptz_messages)
+        return bool(ptz_messages)
+
+
+_services: Dict[int, PTZStateService] = {}
+_refs: Dict[int, int] = {}
+_services_lock = threading.Lock()
+
+
+def get_ptz_state_service(session: ONVIFSession) -> PTZStateService:
+    """
+    Servicio compartido (e iniciado) para la sesión ONVIF de una cámara.
+
+    Suma un usuario: liberar con ``release_ptz_state_service`` al terminar.
+    """
+    stale = None
+    with _services_lock:
+        key = id(session)
+        service = _services.get(key)
+        if service is None or service.session is not session:
+            stale = service
+            service = PTZStateService(session)
+            _services[key] = service
+            _refs[key] = 0
+        _refs[key] += 1
+        service.start()
+    if stale is not None:
+        stale.stop(wait=False)
+    return service
+
+
+def find_ptz_state_service(session: ONVIFSession) -> Optional[PTZStateService]:
+    """Servicio ya activo para la sesión, sin sumar usuario (None si no hay)"""
+    with _services_lock:
+        service = _services.get(id(session))
+        if service is None or service.session is not session:
+            return None
+        return service
+
+
+def release_ptz_state_service(service: PTZStateService):
+    """Soltar un usuario; con el último se detiene el hilo de sondeo"""
+    with _services_lock:
+        key = id(service.session)
+        if _services.get(key) is not service:
+            return
+        _refs[key] -= 1
+        if _refs[key] > 0:
+            return
+        del _services[key]
+        del _refs[key]
+    # Sin join: quien suelta puede ser el hilo de la GUI y un GetStatus en
+    # curso no debe bloquearlo; el hilo termina tras su consulta actual
+    service.stop(wait=False)
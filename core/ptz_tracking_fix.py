@@ -11,6 +11,8 @@ import numpy as np
 from typing import Dict, List, Tuple, Optional, Any
 from datetime import datetime
 
+from core.ptz_command_actor import get_ptz_actor
+
 # Importar calibración
 try:
     from core.ptz_calibration_system import get_calibration_for_camera, track_object_calibrated
@@ -25,6 +27,13 @@ try:
 except ImportError:
     PTZ_BASIC_AVAILABLE = False
 
+# Motor PTZ multi-objeto
+try:
+    from core.multi_object_ptz_system import MultiObjectPTZTracker, MultiObjectConfig
+    MULTI_OBJECT_AVAILABLE = True
+except ImportError:
+    MULTI_OBJECT_AVAILABLE = False
+
 class FixedPTZTracker:
     """Tracker PTZ corregido con mejor manejo de errores"""
     
@@ -38,6 +47,8 @@ class FixedPTZTracker:
         self.tracking_active = False
         self.last_movement_time = 0
         self.movement_lock = threading.Lock()
+        # Los movimientos se ejecutan en el hilo del actor; los pendientes se coalescen
+        self.command_actor = get_ptz_actor(f"{ip}:{port}")
         
         # Estadísticas
         self.successful_moves = 0
@@ -106,13 +117,10 @@ class FixedPTZTracker:
         """Detener seguimiento"""
         self.tracking_active = False
         
-        # Detener movimiento actual
+        # Detener movimiento actual (reemplaza cualquier movimiento pendiente)
         if self.camera:
-            try:
-                self.camera.stop()
-                self._log("⏹️ Movimiento detenido")
-            except:
-                pass
+            self.command_actor.submit(self.camera.stop, dedup_key=('stop',))
+            self._log("⏹️ Movimiento detenido")
         
         self._log("🛑 Seguimiento detenido")
         self._log(f"📊 Estadísticas: {self.successful_moves} exitosos, {self.failed_moves} fallidos")
@@ -151,22 +159,27 @@ class FixedPTZTracker:
             if current_time - self.last_movement_time < self.config['min_movement_interval']:
                 return False
             
-            # Ejecutar movimiento
-            success = self._execute_movement(center_x, center_y, frame_w, frame_h)
-            
-            if success:
-                self.successful_moves += 1
-                self.last_movement_time = current_time
-            else:
-                self.failed_moves += 1
-            
-            return success
+            # Publicar movimiento sin bloquear: si llega otra detección antes
+            # de enviarse, solo se ejecuta la más reciente
+            self.command_actor.submit(self._run_movement, center_x, center_y, frame_w, frame_h)
+            self.last_movement_time = current_time
+            return True
             
         except Exception as e:
             self._log(f"❌ Error en seguimiento: {e}")
             self.failed_moves += 1
             return False
     
+    def _run_movement(self, center_x: float, center_y: float,
+                      frame_w: int, frame_h: int) -> bool:
+        """Ejecutar un movimiento en el hilo del actor y contabilizar el resultado"""
+        success = self._execute_movement(center_x, center_y, frame_w, frame_h)
+        if success:
+            self.successful_moves += 1
+        else:
+            self.failed_moves += 1
+        return success
+    
     def _execute_movement(self, center_x: float, center_y: float, 
                          frame_w: int, frame_h: int) -> bool:
         """Ejecutar movimiento PTZ con diferentes métodos"""
@@ -265,19 +278,21 @@ class FixedPTZTracker:
             'failed_moves': self.failed_moves,
             'total_detections': self.total_detections,
             'success_rate': (self.successful_moves / max(1, self.total_detections)) * 100,
+            'ptz_commands': self.command_actor.get_stats(),
             'ip': self.ip
         }
 
 class FixedMultiObjectTracker:
-    """Tracker multi-objeto corregido"""
+    """
+    Tracker multi-objeto corregido.
+
+    Adaptador sobre ``MultiObjectPTZTracker``: la asociación de objetos, la
+    alternancia por prioridad y el control corren en el motor PTZ único.
+    """
     
     def __init__(self, camera_data: Dict):
         self.camera_data = camera_data
         self.tracker = None
-        self.active_objects = {}
-        self.current_target = None
-        self.last_switch_time = 0
-        self.switch_interval = 5.0  # Cambiar objetivo cada 5 segundos
         
         # Configuración
         self.config = {
@@ -292,24 +307,36 @@ class FixedMultiObjectTracker:
             }
         }
     
+    def _multi_config(self) -> 'MultiObjectConfig':
+        weights = self.config['priority_weights']
+        return MultiObjectConfig(
+            alternating_enabled=True,
+            primary_follow_time=self.config['switch_interval'],
+            secondary_follow_time=self.config['switch_interval'],
+            min_confidence_threshold=self.config['min_confidence'],
+            max_objects_to_track=self.config['max_objects'],
+            confidence_weight=weights['confidence'],
+            size_weight=weights['size'],
+            movement_weight=weights['movement'],
+            proximity_weight=weights['center_proximity']
+        )
+    
     def initialize(self) -> bool:
         """Inicializar tracker multi-objeto"""
+        if not MULTI_OBJECT_AVAILABLE:
+            self._log("❌ Sistema multi-objeto no disponible")
+            return False
+        
         try:
-            ip = self.camera_data.get('ip')
-            port = self.camera_data.get('puerto', 80)
-            username = self.camera_data.get('usuario')
-            password = self.camera_data.get('contrasena')
-            
-            # Crear tracker corregido
-            self.tracker = FixedPTZTracker(ip, port, username, password)
-            
-            # Conectar
-            if self.tracker.connect():
-                self._log("✅ Tracker multi-objeto inicializado")
-                return True
-            else:
-                self._log("❌ Error inicializando tracker")
-                return False
+            self.tracker = MultiObjectPTZTracker(
+                self.camera_data.get('ip'),
+                int(self.camera_data.get('puerto', 80)),
+                self.camera_data.get('usuario'),
+                self.camera_data.get('contrasena'),
+                multi_config=self._multi_config()
+            )
+            self._log("✅ Tracker multi-objeto inicializado")
+            return True
                 
         except Exception as e:
             self._log(f"❌ Error en inicialización: {e}")
@@ -323,9 +350,6 @@ class FixedMultiObjectTracker:
         
         success = self.tracker.start_tracking()
         if success:
-            self.active_objects.clear()
-            self.current_target = None
-            self.last_switch_time = time.time()
             self._log("🚀 Seguimiento multi-objeto iniciado")
         
         return success
@@ -335,8 +359,6 @@ class FixedMultiObjectTracker:
         if self.tracker:
             self.tracker.stop_tracking()
         
-        self.active_objects.clear()
-        self.current_target = None
         self._log("🛑 Seguimiento multi-objeto detenido")
     
     def update_tracking(self, detections: List[Dict], frame_size: Tuple[int, int]) -> bool:
@@ -344,156 +366,15 @@ class FixedMultiObjectTracker:
         if not self.tracker or not self.tracker.tracking_active:
             return False
         
-        try:
-            # Filtrar detecciones válidas
-            valid_detections = self._filter_detections(detections)
-            
-            if not valid_detections:
-                self._log("⚠️ No hay detecciones válidas")
-                return False
-            
-            # Actualizar objetos activos
-            self._update_active_objects(valid_detections)
-            
-            # Seleccionar objetivo actual
-            target_detection = self._select_target()
-            
-            if target_detection:
-                # Ejecutar seguimiento
-                success = self.tracker.track_object(target_detection, frame_size)
-                
-                if success:
-                    self._log(f"✅ Siguiendo {target_detection.get('class', 'objeto')} "
-                             f"(conf: {target_detection.get('confidence', 0):.2f})")
-                else:
-                    self._log("❌ Error en seguimiento")
-                
-                return success
-            else:
-                self._log("⚠️ No hay objetivo válido")
-                return False
-                
-        except Exception as e:
-            self._log(f"❌ Error en actualización: {e}")
-            return False
-    
-    def _filter_detections(self, detections: List[Dict]) -> List[Dict]:
-        """Filtrar detecciones válidas"""
-        filtered = []
-        
-        for detection in detections:
-            # Verificar confianza mínima
-            confidence = detection.get('confidence', 0)
-            if confidence < self.config['min_confidence']:
-                continue
-            
-            # Verificar bbox válido
-            bbox = detection.get('bbox', [])
-            if len(bbox) != 4:
-                continue
-            
-            x1, y1, x2, y2 = bbox
-            if x2 <= x1 or y2 <= y1:
-                continue
-            
-            # Verificar tamaño mínimo
-            width = x2 - x1
-            height = y2 - y1
-            if width < 10 or height < 10:
-                continue
-            
-            filtered.append(detection)
-        
-        return filtered[:self.config['max_objects']]
+        return self.tracker.update_detections(detections, frame_size)
     
-    def _update_active_objects(self, detections: List[Dict]):
-        """Actualizar lista de objetos activos"""
-        current_time = time.time()
-        
-        # Limpiar objetos antiguos
-        self.active_objects = {k: v for k, v in self.active_objects.items() 
-                              if current_time - v.get('last_seen', 0) < 3.0}
-        
-        # Agregar/actualizar objetos actuales
-        for i, detection in enumerate(detections):
-            obj_id = f"obj_{i}"
-            
-            bbox = detection['bbox']
-            center_x = (bbox[0] + bbox[2]) / 2
-            center_y = (bbox[1] + bbox[3]) / 2
-            
-            self.active_objects[obj_id] = {
-                'detection': detection,
-                'center': (center_x, center_y),
-                'last_seen': current_time,
-                'confidence': detection.get('confidence', 0),
-                'class': detection.get('class', 'unknown')
-            }
-    
-    def _select_target(self) -> Optional[Dict]:
-        """Seleccionar objetivo basado en prioridades"""
-        if not self.active_objects:
-            return None
-        
-        current_time = time.time()
-        
-        # Verificar si es tiempo de cambiar objetivo
-        should_switch = (
-            self.current_target is None or
-            self.current_target not in self.active_objects or
-            current_time - self.last_switch_time > self.config['switch_interval']
-        )
-        
-        if should_switch:
-            # Calcular prioridades
-            priorities = {}
-            for obj_id, obj_data in self.active_objects.items():
-                priority = self._calculate_priority(obj_data)
-                priorities[obj_id] = priority
-            
-            # Seleccionar el de mayor prioridad
-            if priorities:
-                self.current_target = max(priorities, key=priorities.get)
-                self.last_switch_time = current_time
-                
-                target_class = self.active_objects[self.current_target]['class']
-                self._log(f"🎯 Nuevo objetivo: {target_class} (prioridad: {priorities[self.current_target]:.2f})")
-        
-        # Retornar detección del objetivo actual
-        if self.current_target and self.current_target in self.active_objects:
-            return self.active_objects[self.current_target]['detection']
-        
-        return None
+    @property
+    def active_objects(self) -> Dict:
+        return self.tracker.tracked_objects if self.tracker else {}
     
-    def _calculate_priority(self, obj_data: Dict) -> float:
-        """Calcular prioridad de un objeto"""
-        weights = self.config['priority_weights']
-        
-        # Factor confianza
-        confidence_factor = obj_data['confidence']
-        
-        # Factor tamaño (objetos más grandes tienen mayor prioridad)
-        bbox = obj_data['detection']['bbox']
-        area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
-        size_factor = min(area / 50000, 1.0)  # Normalizar
-        
-        # Factor movimiento (simplificado - usar confianza como proxy)
-        movement_factor = confidence_factor
-        
-        # Factor proximidad al centro (objetos cerca del centro tienen menor prioridad)
-        center_x, center_y = obj_data['center']
-        frame_center_dist = ((center_x - 960)**2 + (center_y - 540)**2)**0.5
-        proximity_factor = 1.0 - min(frame_center_dist / 1000, 1.0)
-        
-        # Calcular prioridad total
-        priority = (
-            weights['confidence'] * confidence_factor +
-            weights['size'] * size_factor +
-            weights['movement'] * movement_factor +
-            weights['center_proximity'] * proximity_factor
-        )
-        
-        return priority
+    @property
+    def current_target(self) -> Optional[int]:
+        return self.tracker.current_target_id if self.tracker else None
     
     def _log(self, message: str):
         """Log con identificación"""
@@ -510,7 +391,7 @@ class FixedMultiObjectTracker:
         }
         
         if self.tracker:
-            status.update(self.tracker.get_status())
+            status['tracker'] = self.tracker.get_status()
         
         return status
 
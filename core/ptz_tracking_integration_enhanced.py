@@ -6,16 +6,17 @@ Sistema de integración PTZ mejorado que conecta:
 - Integración con detección YOLO/OpenCV
 - Gestión de múltiples cámaras PTZ
 - Configuración persistente
+
+Es un adaptador sobre el motor PTZ único (``core.ptz_engine``): no crea hilos
+propios; cada sesión es un ``MultiObjectPTZTracker`` registrado en el motor.
 """
 
-import threading
 import time
 import json
 import os
 from typing import Optional, Dict, Any, Callable, List
 from dataclasses import dataclass, asdict
 from datetime import datetime
-import queue
 import logging
 
 # Importar sistemas PTZ
@@ -24,6 +25,7 @@ try:
         MultiObjectPTZTracker, MultiObjectConfig, TrackingMode, 
         create_multi_object_tracker
     )
+    from core.ptz_engine import ObjectPosition, get_ptz_engine
     MULTI_OBJECT_AVAILABLE = True
 except ImportError:
     print("⚠️ Sistema multi-objeto PTZ no disponible")
@@ -46,7 +48,6 @@ class CameraSession:
     username: str
     password: str
     tracker: Optional[MultiObjectPTZTracker] = None
-    thread: Optional[threading.Thread] = None
     active: bool = False
     preset_token: Optional[str] = None
     config: Optional[MultiObjectConfig] = None
@@ -61,7 +62,6 @@ class PTZTrackingSystemEnhanced:
     def __init__(self, config_file: str = "ptz_enhanced_config.json"):
         self.config_file = config_file
         self.sessions: Dict[str, CameraSession] = {}
-        self.detection_queue = queue.Queue(maxsize=1000)
         self.running = True
         
         # Configuraciones predefinidas
@@ -146,15 +146,11 @@ class PTZTrackingSystemEnhanced:
             'uptime_start': time.time()
         }
         
-        # Cargar configuración
-        self._load_system_config()
-        
-        # Iniciar hilo de procesamiento
-        self.processing_thread = threading.Thread(target=self._detection_processing_loop, daemon=True)
-        self.processing_thread.start()
-        
         # Configurar logging
         self._setup_logging()
+        
+        # Cargar configuración
+        self._load_system_config()
     
     def _setup_logging(self):
         """Configurar sistema de logging"""
@@ -233,16 +229,16 @@ class PTZTrackingSystemEnhanced:
             session.tracker.on_target_switched = lambda old, new: self._on_tracker_target_switched(camera_id, old, new)
             session.tracker.on_zoom_changed = lambda zoom, speed: self._on_tracker_zoom_changed(camera_id, zoom, speed)
             
-            # Iniciar hilo de seguimiento
-            session.thread = threading.Thread(
-                target=self._session_tracking_loop,
-                args=(camera_id, session),
-                daemon=True
-            )
+            # El tracker manda el preset y no mueve la cámara hasta que llega
+            if preset_token:
+                self.logger.info(f"[{camera_id}] Moviendo a preset {preset_token}")
+            if not session.tracker.start_tracking(preset_token):
+                self.logger.error(f"[{camera_id}] No se pudo iniciar el seguimiento")
+                self._emit_event('on_error', camera_id, "No se pudo iniciar el seguimiento")
+                return False
             
             session.active = True
             self.sessions[camera_id] = session
-            session.thread.start()
             
             # Actualizar estadísticas
             self.global_stats['total_sessions'] += 1
@@ -274,10 +270,6 @@ class PTZTrackingSystemEnhanced:
             if session.tracker:
                 session.tracker.stop_tracking()
             
-            # Esperar que termine el hilo
-            if session.thread and session.thread.is_alive():
-                session.thread.join(timeout=5.0)
-            
             # Remover de sesiones activas
             del self.sessions[camera_id]
             
@@ -320,24 +312,18 @@ class PTZTrackingSystemEnhanced:
                 }
             ]
         """
-        if camera_id not in self.sessions:
+        session = self.sessions.get(camera_id)
+        if session is None or not session.active or not session.tracker:
             return False
         
         try:
-            # Agregar a cola de procesamiento
-            detection_data = {
-                'camera_id': camera_id,
-                'detections': detections,
-                'timestamp': time.time()
-            }
-            
-            # Usar put_nowait para no bloquear
-            try:
-                self.detection_queue.put_nowait(detection_data)
-                return True
-            except queue.Full:
-                self.logger.warning(f"Cola de detecciones llena para {camera_id}")
+            # El tracker convierte una sola vez y publica en el motor (no bloquea)
+            if not session.tracker.update_detections(detections):
                 return False
+            session.detection_count += len(detections)
+            session.last_detection_time = time.time()
+            self.global_stats['total_detections'] += len(detections)
+            return True
                 
         except Exception as e:
             self.logger.error(f"Error actualizando detecciones para {camera_id}: {e}")
@@ -391,16 +377,20 @@ class PTZTrackingSystemEnhanced:
                         if hasattr(box, 'id') and box.id is not None:
                             track_id = int(box.id[0])
                         
-                        detection = {
-                            'bbox': bbox,
-                            'confidence': confidence,
-                            'class': class_name,
-                            'track_id': track_id,
-                            'frame_w': frame_shape[1],
-                            'frame_h': frame_shape[0]
-                        }
-                        
-                        detections.append(detection)
+                        # Directamente al tipo de entrada del motor PTZ
+                        frame_h, frame_w = frame_shape[0], frame_shape[1]
+                        x1, y1, x2, y2 = bbox
+                        detections.append(ObjectPosition(
+                            cx=(x1 + x2) / 2 / frame_w,
+                            cy=(y1 + y2) / 2 / frame_h,
+                            width=(x2 - x1) / frame_w,
+                            height=(y2 - y1) / frame_h,
+                            confidence=confidence,
+                            frame_w=frame_w,
+                            frame_h=frame_h,
+                            object_class=class_name,
+                            track_id=track_id
+                        ))
                         
                     except Exception as e:
                         self.logger.warning(f"Error procesando detección {i}: {e}")
@@ -436,12 +426,12 @@ class PTZTrackingSystemEnhanced:
         }
         
         if session.tracker:
-            tracker_stats = session.tracker.get_tracking_stats()
+            tracker_stats = session.tracker.get_status()
             status.update({
                 'tracking_stats': tracker_stats,
-                'current_target': tracker_stats.get('current_target'),
-                'total_objects': tracker_stats.get('total_objects', 0),
-                'current_zoom': tracker_stats.get('current_zoom', 0.5)
+                'current_target': tracker_stats['current_target']['id'],
+                'total_objects': len(tracker_stats['objects']),
+                'current_zoom': tracker_stats['zoom']['current_level']
             })
         
         return status
@@ -455,98 +445,9 @@ class PTZTrackingSystemEnhanced:
             'total_switches': self.global_stats['total_switches'],
             'system_uptime': time.time() - self.global_stats['uptime_start'],
             'available_configs': list(self.predefined_configs.keys()),
-            'queue_size': self.detection_queue.qsize()
+            'ptz_engine': get_ptz_engine().get_stats() if MULTI_OBJECT_AVAILABLE else None
         }
     
-    def _session_tracking_loop(self, camera_id: str, session: CameraSession):
-        """Loop principal de seguimiento para una sesión"""
-        try:
-            tracker = session.tracker
-            if not tracker:
-                return
-            
-            # Ir al preset inicial
-            if session.preset_token:
-                self.logger.info(f"[{camera_id}] Moviendo a preset {session.preset_token}")
-                if not tracker.goto_preset_and_track(session.preset_token, True):
-                    self.logger.error(f"[{camera_id}] Error yendo a preset {session.preset_token}")
-                    session.active = False
-                    return
-            else:
-                tracker.start_tracking()
-            
-            self.logger.info(f"[{camera_id}] Seguimiento iniciado")
-            
-            # Loop principal
-            while session.active and tracker.tracking_active:
-                try:
-                    time.sleep(0.033)  # ~30 FPS
-                except Exception as e:
-                    self.logger.error(f"[{camera_id}] Error en loop: {e}")
-                    time.sleep(1)
-            
-        except Exception as e:
-            self.logger.error(f"[{camera_id}] Error crítico en seguimiento: {e}")
-        finally:
-            session.active = False
-            if session.tracker:
-                session.tracker.stop_tracking()
-    
-    def _detection_processing_loop(self):
-        """Loop de procesamiento de detecciones"""
-        while self.running:
-            try:
-                # Obtener detección de la cola (timeout para permitir salida limpia)
-                detection_data = self.detection_queue.get(timeout=1.0)
-                
-                camera_id = detection_data['camera_id']
-                detections = detection_data['detections']
-                
-                if camera_id in self.sessions:
-                    session = self.sessions[camera_id]
-                    if session.active and session.tracker:
-                        # Convertir formato para el tracker
-                        converted_detections = self._convert_detections_format(detections)
-                        
-                        # Actualizar tracker
-                        session.tracker.update_multi_object_tracking(converted_detections)
-                        
-                        # Actualizar estadísticas
-                        session.detection_count += len(detections)
-                        session.last_detection_time = time.time()
-                        self.global_stats['total_detections'] += len(detections)
-                
-                self.detection_queue.task_done()
-                
-            except queue.Empty:
-                continue
-            except Exception as e:
-                self.logger.error(f"Error procesando detecciones: {e}")
-    
-    def _convert_detections_format(self, detections: List[Dict]) -> List[Dict]:
-        """Convertir formato de detecciones para el tracker"""
-        converted = []
-        
-        for det in detections:
-            if 'bbox' in det and len(det['bbox']) == 4:
-                x1, y1, x2, y2 = det['bbox']
-                
-                converted_det = {
-                    'cx': (x1 + x2) / 2,
-                    'cy': (y1 + y2) / 2,
-                    'width': x2 - x1,
-                    'height': y2 - y1,
-                    'confidence': det.get('confidence', 0.0),
-                    'frame_w': det.get('frame_w', 1920),
-                    'frame_h': det.get('frame_h', 1080),
-                    'class': det.get('class', 'object'),
-                    'track_id': det.get('track_id')
-                }
-                
-                converted.append(converted_det)
-        
-        return converted
-    
     def _get_config_name(self, config: MultiObjectConfig) -> str:
         """Obtener nombre de configuración"""
         for name, predefined_config in self.predefined_configs.items():
@@ -641,10 +542,6 @@ class PTZTrackingSystemEnhanced:
         # Detener todas las sesiones
         self.stop_all_sessions()
         
-        # Esperar que termine el hilo de procesamiento
-        if self.processing_thread.is_alive():
-            self.processing_thread.join(timeout=5.0)
-        
         # Guardar configuración
         self.save_system_config()
         
@@ -0,0 +1,283 @@
+"""
+Limitación de capturas por cámara y clase con token buckets.
+
+Cada par (cámara, clase) tiene su propio bucket (capturas por minuto con una
+ráfaga máxima), y un bucket global en bytes acota la escritura a disco de
+todas las cámaras juntas: un día con mucho movimiento no puede saturar el
+disco ni el pool de escritura. Todo usa ``time.monotonic`` (inmune a cambios
+de hora del sistema) y los buckets se rellenan de forma perezosa al
+consultarlos, sin hilos ni timers.
+
+``TTLMap`` guarda estado por track con expiración automática: las entradas
+que no se tocan en ``ttl`` segundos desaparecen solas y ``max_items`` acota
+el tamaño aunque los ids cambien en cada frame.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+# Por defecto: 3 capturas por minuto por (cámara, clase), como el antiguo max_capturas
+POR_MINUTO_DEFECTO = 3.0
+RAFAGA_DEFECTO = 3
+# Presupuesto global de escritura a disco
+BYTES_POR_SEGUNDO_DEFECTO = 1 * 1024 * 1024
+RAFAGA_BYTES_DEFECTO = 8 * 1024 * 1024
+# Estimación de una captura antes de conocer su tamaño codificado
+BYTES_CAPTURA_DEFECTO = 64 * 1024
+
+_FALTA = object()
+
+
+class TokenBucket:
+    """Bucket de ``capacidad`` tokens que se rellena a ``tasa`` tokens/segundo"""
+
+    __slots__ = ('tasa', 'capacidad', 'tokens', 'ultimo')
+
+    def __init__(self, tasa: float, capacidad: float, now: Optional[float] = None):
+        self.tasa = float(tasa)
+        self.capacidad = float(capacidad)
+        self.tokens = float(capacidad)
+        self.ultimo = time.monotonic() if now is None else now
+
+    def _rellenar(self, now: float):
+        if now > self.ultimo:
+            self.tokens = min(self.capacidad, self.tokens + (now - self.ultimo) * self.tasa)
+        self.ultimo = now
+
+    def disponible(self, now: Optional[float] = None) -> float:
+        self._rellenar(time.monotonic() if now is None else now)
+        return self.tokens
+
+    def puede(self, n: float = 1.0, now: Optional[float] = None) -> bool:
+        return self.disponible(now) >= n
+
+    def consumir(self, n: float = 1.0, now: Optional[float] = None) -> bool:
+        """Consumir ``n`` tokens si hay; False (sin consumir) si no"""
+        if self.disponible(now) < n:
+            return False
+        self.tokens -= n
+        return True
+
+    def espera(self, n: float = 1.0, now: Optional[float] = None) -> float:
+        """Segundos hasta que haya ``n`` tokens (inf si nunca cabrán)"""
+        faltan = n - self.disponible(now)
+        if faltan <= 0:
+            return 0.0
+        if n > self.capacidad or self.tasa <= 0:
+            return float('inf')
+        return faltan / self.tasa
+
+    def configurar(self, tasa: float, capacidad: float):
+        self._rellenar(time.monotonic())
+        self.tasa = float(tasa)
+        self.capacidad = float(capacidad)
+        self.tokens = min(self.tokens, self.capacidad)
+
+
+class TTLMap:
+    """
+    Diccionario con expiración por inactividad y tamaño máximo (LRU).
+
+    Leer o escribir una clave renueva su plazo. Las expiradas se eliminan de
+    forma amortizada en cada escritura (se revisa desde la más antigua, que
+    es la primera del OrderedDict), así que no hace falta limpiar a mano.
+    """
+
+    def __init__(self, ttl: float, max_items: int = 10000,
+                 factory: Optional[Callable[[], Any]] = None):
+        self.ttl = float(ttl)
+        self.max_items = max(1, int(max_items))
+        self.factory = factory
+        self._datos: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self.expiradas = 0
+        self.desalojadas = 0
+
+    def _purgar(self, now: float):
+        datos = self._datos
+        while datos:
+            clave, (visto, _) = next(iter(datos.items()))
+            if now - visto < self.ttl:
+                break
+            del datos[clave]
+            self.expiradas += 1
+
+    def get(self, clave, defecto=None, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        entrada = self._datos.get(clave)
+        if entrada is None:
+            return defecto
+        if now - entrada[0] >= self.ttl:
+            del self._datos[clave]
+            self.expiradas += 1
+            return defecto
+        self._datos[clave] = (now, entrada[1])
+        self._datos.move_to_end(clave)
+        return entrada[1]
+
+    def set(self, clave, valor, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        self._purgar(now)
+        self._datos[clave] = (now, valor)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.max_items:
+            self._datos.popitem(last=False)
+            self.desalojadas += 1
+
+    def __getitem__(self, clave):
+        valor = self.get(clave, _FALTA)
+        if valor is _FALTA:
+            if self.factory is None:
+                raise KeyError(clave)
+            valor = self.factory()
+            self.set(clave, valor)
+        return valor
+
+    def __setitem__(self, clave, valor):
+        self.set(clave, valor)
+
+    def __contains__(self, clave) -> bool:
+        return self.get(clave, _FALTA) is not _FALTA
+
+    def __len__(self) -> int:
+        return len(self._datos)
+
+    def __iter__(self) -> Iterator:
+        return iter(list(self._datos))
+
+    def keys(self):
+        return list(self._datos)
+
+    def pop(self, clave, defecto=None):
+        entrada = self._datos.pop(clave, None)
+        return defecto if entrada is None else entrada[1]
+
+    def purgar(self, now: Optional[float] = None) -> int:
+        """Eliminar ya las expiradas; devuelve cuántas quedan"""
+        self._purgar(time.monotonic() if now is None else now)
+        return len(self._datos)
+
+    def clear(self):
+        self._datos.clear()
+
+
+class CaptureRateLimiter:
+    """
+    Buckets por (cámara, clase) más un presupuesto global de bytes a disco.
+
+    ``permitir`` solo consume tokens si ambos buckets tienen saldo, así una
+    captura rechazada por el presupuesto global no gasta cupo de su cámara.
+    """
+
+    def __init__(self, por_minuto: float = POR_MINUTO_DEFECTO, rafaga: int = RAFAGA_DEFECTO,
+                 bytes_por_segundo: float = BYTES_POR_SEGUNDO_DEFECTO,
+                 rafaga_bytes: float = RAFAGA_BYTES_DEFECTO):
+        self.por_minuto = por_minuto
+        self.rafaga = rafaga
+        # (camara, cls) -> (por_minuto, rafaga); cls o camara None = comodín
+        self._limites: Dict[Tuple[Any, Any], Tuple[float, int]] = {}
+        self._buckets: Dict[Tuple[Any, Any], TokenBucket] = {}
+        self._global = TokenBucket(bytes_por_segundo, rafaga_bytes)
+        self._lock = threading.Lock()
+        self.stats = {
+            'permitidas': 0,
+            'rechazadas_clase': 0,
+            'rechazadas_global': 0,
+            'bytes_reservados': 0,
+        }
+
+    def _limite(self, camara, cls) -> Tuple[float, int]:
+        for clave in ((camara, cls), (camara, None), (None, cls)):
+            if clave in self._limites:
+                return self._limites[clave]
+        return self.por_minuto, self.rafaga
+
+    def _bucket(self, camara, cls, now: float) -> TokenBucket:
+        clave = (camara, cls)
+        bucket = self._buckets.get(clave)
+        if bucket is None:
+            por_minuto, rafaga = self._limite(camara, cls)
+            bucket = self._buckets[clave] = TokenBucket(por_minuto / 60.0, rafaga, now)
+        return bucket
+
+    def configurar(self, camara=None, cls=None, por_minuto: Optional[float] = None,
+                   rafaga: Optional[int] = None):
+        """
+        Límite de capturas por minuto para una cámara, una clase o el par;
+        sin ``camara`` ni ``cls`` cambia el valor por defecto de todos.
+        """
+        with self._lock:
+            if camara is None and cls is None:
+                self.por_minuto = self.por_minuto if por_minuto is None else por_minuto
+                self.rafaga = self.rafaga if rafaga is None else rafaga
+            else:
+                actual = self._limite(camara, cls)
+                self._limites[(camara, cls)] = (
+                    actual[0] if por_minuto is None else por_minuto,
+                    actual[1] if rafaga is None else rafaga,
+                )
+            for (cam, c), bucket in self._buckets.items():
+                if (camara is None or cam == camara) and (cls is None or c == cls):
+                    tasa, capacidad = self._limite(cam, c)
+                    bucket.configurar(tasa / 60.0, capacidad)
+
+    def configurar_presupuesto(self, bytes_por_segundo: Optional[float] = None,
+                               rafaga_bytes: Optional[float] = None):
+        """Presupuesto global de escritura a disco (todas las cámaras)"""
+        with self._lock:
+            self._global.configurar(
+                self._global.tasa if bytes_por_segundo is None else bytes_por_segundo,
+                self._global.capacidad if rafaga_bytes is None else rafaga_bytes,
+            )
+
+    def permitir(self, camara, cls, bytes_estimados: float = BYTES_CAPTURA_DEFECTO) -> bool:
+        """Reservar una captura de ``camara``/``cls`` y sus bytes estimados"""
+        now = time.monotonic()
+        bytes_estimados = min(float(bytes_estimados), self._global.capacidad)
+        with self._lock:
+            bucket = self._bucket(camara, cls, now)
+            if not bucket.puede(1.0, now):
+                self.stats['rechazadas_clase'] += 1
+                return False
+            if not self._global.consumir(bytes_estimados, now):
+                self.stats['rechazadas_global'] += 1
+                if self.stats['rechazadas_global'] % 100 == 1:
+                    logger.warning("Presupuesto global de escritura agotado (%d capturas rechazadas)",
+                                   self.stats['rechazadas_global'])
+                return False
+            bucket.consumir(1.0, now)
+            self.stats['permitidas'] += 1
+            self.stats['bytes_reservados'] += int(bytes_estimados)
+            return True
+
+    def disponible(self, camara, cls) -> float:
+        """Capturas que admitiría ahora el bucket de ``camara``/``cls``"""
+        with self._lock:
+            return self._bucket(camara, cls, time.monotonic()).disponible()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                'buckets': len(self._buckets),
+                'presupuesto_bytes': int(self._global.disponible()),
+                'bytes_por_segundo': self._global.tasa,
+            }
+
+
+_limiter: Optional[CaptureRateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> CaptureRateLimiter:
+    """Limitador compartido: el presupuesto de disco es global a todas las cámaras"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = CaptureRateLimiter()
+        return _limiter
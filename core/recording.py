@@ -0,0 +1,473 @@
+"""
+Grabación continua por cámara y política de retención.
+
+``FFmpegSegmentRecorder`` (bridge FFmpeg) escribe segmentos por copia de
+stream en ``grabaciones/<camara>/``; cada segmento terminado se registra en
+``SegmentIndex`` (SQLite, ``grabaciones/segmentos.db``) con su intervalo
+[inicio, fin), de modo que ``buscar(camara, ts)`` devuelve el archivo y el
+desplazamiento para reproducir un instante sin recorrer carpetas.
+
+``RetentionJob`` corre en segundo plano y aplica, en este orden:
+
+1. Antigüedad: segmentos de cada cámara más viejos que sus días de
+   retención, y capturas/clips más viejos que ``dias_capturas``.
+2. Cuota: mientras grabaciones + capturas superen ``cuota_gb`` o el disco
+   de grabaciones tenga menos de ``min_libre_gb`` libres, borra lo más
+   antiguo primero, mezclando segmentos, capturas y clips de evento por fecha.
+
+Todo es opcional salvo la antigüedad de los segmentos: sin ``min_libre_gb``
+no hay mínimo de espacio libre, y capturas y clips solo se borran si se fija
+``dias_capturas`` o ``cuota_gb``.
+
+Se borran archivos completos: el segmento en curso nunca está en el índice.
+"""
+
+import glob
+import heapq
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    from ffmpeg_rtsp_bridge import FFmpegSegmentRecorder, segment_start_time
+    FFMPEG_RECORDER_AVAILABLE = True
+except ImportError as e:
+    logger.warning("Grabación continua no disponible: %s", e)
+    FFMPEG_RECORDER_AVAILABLE = False
+
+from core.capture_catalog import WalDatabase, get_capture_catalog
+
+DEFAULT_RECORDINGS_DIR = "grabaciones"
+DEFAULT_CAPTURES_DIR = "capturas"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS segmentos (
+    id INTEGER PRIMARY KEY,
+    ruta TEXT NOT NULL UNIQUE,
+    camara TEXT NOT NULL,
+    inicio REAL NOT NULL,
+    fin REAL NOT NULL,
+    bytes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_segmentos_camara_inicio ON segmentos(camara, inicio);
+CREATE INDEX IF NOT EXISTS idx_segmentos_inicio ON segmentos(inicio);
+"""
+
+GB = 1024 ** 3
+
+
+class SegmentIndex(WalDatabase):
+    """Índice de segmentos por cámara e intervalo de tiempo"""
+
+    def __init__(self, db_path: str = os.path.join(DEFAULT_RECORDINGS_DIR, "segmentos.db")):
+        super().__init__(db_path, _SCHEMA)
+
+    def agregar(self, camara: str, segmento: Dict):
+        """``segmento``: ruta, inicio, fin (epoch) y bytes"""
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO segmentos (ruta, camara, inicio, fin, bytes) VALUES (?, ?, ?, ?, ?)",
+                (segmento['ruta'], str(camara), segmento['inicio'], segmento['fin'], int(segmento['bytes']))
+            )
+
+    def sincronizar(self, camara: str, directorio: str) -> int:
+        """Registrar segmentos en disco que no estén en el índice (p. ej. tras un cierre abrupto)"""
+        conn = self._connection()
+        conocidos = {row[0] for row in conn.execute(
+            "SELECT ruta FROM segmentos WHERE camara = ?", (str(camara),))}
+        nuevos = []
+        for entry in os.scandir(directorio) if os.path.isdir(directorio) else ():
+            if entry.name.startswith('.') or entry.path in conocidos:
+                continue
+            inicio = segment_start_time(entry.path)
+            st = entry.stat()
+            if inicio is None or not st.st_size:
+                continue
+            nuevos.append((entry.path, str(camara), inicio, max(inicio, st.st_mtime), st.st_size))
+        if nuevos:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO segmentos (ruta, camara, inicio, fin, bytes) VALUES (?, ?, ?, ?, ?)",
+                    nuevos
+                )
+        return len(nuevos)
+
+    def buscar(self, camara: str, ts: float) -> Optional[Dict]:
+        """Segmento que contiene ``ts`` con ``offset`` (segundos desde su inicio), o None"""
+        row = self._connection().execute(
+            "SELECT * FROM segmentos WHERE camara = ? AND inicio <= ? ORDER BY inicio DESC LIMIT 1",
+            (str(camara), ts)
+        ).fetchone()
+        if row is None or row['fin'] <= ts:
+            return None
+        return {**dict(row), 'offset': ts - row['inicio']}
+
+    def rango(self, camara: str, desde: float, hasta: float) -> List[Dict]:
+        """Segmentos que se solapan con [desde, hasta), en orden"""
+        rows = self._connection().execute(
+            "SELECT * FROM segmentos WHERE camara = ? AND inicio < ? AND fin > ? ORDER BY inicio",
+            (str(camara), hasta, desde)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def camaras(self) -> List[str]:
+        return [row[0] for row in self._connection().execute("SELECT DISTINCT camara FROM segmentos")]
+
+    def mas_antiguos(self, limit: int = 500, camara: Optional[str] = None,
+                     antes_de: Optional[float] = None) -> List[tuple]:
+        """(inicio, ruta, bytes) de los segmentos más antiguos"""
+        condiciones, params = [], []
+        if camara is not None:
+            condiciones.append("camara = ?")
+            params.append(str(camara))
+        if antes_de is not None:
+            condiciones.append("fin < ?")
+            params.append(antes_de)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        return [tuple(row) for row in self._connection().execute(
+            f"SELECT inicio, ruta, bytes FROM segmentos {where} ORDER BY inicio LIMIT ?", (*params, int(limit))
+        )]
+
+    def bytes_totales(self, camara: Optional[str] = None) -> int:
+        if camara is None:
+            row = self._connection().execute("SELECT COALESCE(SUM(bytes), 0) FROM segmentos").fetchone()
+        else:
+            row = self._connection().execute(
+                "SELECT COALESCE(SUM(bytes), 0) FROM segmentos WHERE camara = ?", (str(camara),)).fetchone()
+        return row[0]
+
+    def eliminar(self, rutas: Iterable[str]):
+        conn = self._connection()
+        with conn:
+            conn.executemany("DELETE FROM segmentos WHERE ruta = ?", [(ruta,) for ruta in rutas])
+
+
+def _borrar_archivo(ruta: str) -> Optional[int]:
+    """
+    Borrar un archivo (y su JSON lateral si existe). Devuelve los bytes
+    liberados (0 si ya no estaba) o None si el archivo sigue en disco.
+    """
+    liberados = 0
+    for archivo in (ruta, os.path.splitext(ruta)[0] + ".json"):
+        try:
+            tamano = os.path.getsize(archivo)
+            os.remove(archivo)
+            liberados += tamano
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            logger.warning("Retención: no se pudo borrar %s: %s", archivo, e)
+            if archivo == ruta:
+                return None
+    return liberados
+
+
+def _borrar_archivos(items: List[tuple]) -> Tuple[List[str], int]:
+    """(rutas borradas o ya ausentes, bytes liberados) de items (ts, ruta, bytes)"""
+    borradas, liberados = [], 0
+    for _, ruta, _ in items:
+        tamano = _borrar_archivo(ruta)
+        if tamano is not None:
+            borradas.append(ruta)
+            liberados += tamano
+    return borradas, liberados
+
+
+class RetentionJob:
+    """
+    Aplica antigüedad y cuota cada ``intervalo`` segundos.
+
+    ``dias_por_camara`` fija la retención de segmentos de cada cámara; las
+    demás usan ``dias_defecto`` (None = sin límite de antigüedad).
+
+    ``min_libre_gb`` se mide en el disco de ``recordings_dir``; si borrar no
+    sube el espacio libre de ese disco (p. ej. capturas en otro volumen) la
+    pasada se detiene en lugar de seguir vaciando.
+    """
+
+    def __init__(self, index: SegmentIndex, catalogo=None, recordings_dir: str = DEFAULT_RECORDINGS_DIR,
+                 captures_dir: str = DEFAULT_CAPTURES_DIR, cuota_gb: Optional[float] = None,
+                 min_libre_gb: Optional[float] = None, dias_defecto: Optional[float] = 30,
+                 dias_capturas: Optional[float] = None, intervalo: float = 300.0, lote: int = 200):
+        self.index = index
+        self.catalogo = catalogo
+        self.recordings_dir = recordings_dir
+        self.captures_dir = captures_dir
+        self.cuota_gb = cuota_gb
+        self.min_libre_gb = min_libre_gb
+        self.dias_defecto = dias_defecto
+        self.dias_capturas = dias_capturas
+        self.dias_por_camara: Dict[str, float] = {}
+        self.intervalo = intervalo
+        self.lote = lote
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {
+            'runs': 0,
+            'deleted_segments': 0,
+            'deleted_captures': 0,
+            'deleted_clips': 0,
+            'freed_bytes': 0,
+            'last_run_ms': 0.0,
+            'last_run': None,
+            'errors': 0,
+        }
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="retencion", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.warning("Retención: error: %s", e)
+            self._stop.wait(self.intervalo)
+
+    def run_once(self):
+        start = time.perf_counter()
+        now = time.time()
+        self._aplicar_antiguedad(now)
+        self._aplicar_cuota()
+        self.stats['runs'] += 1
+        self.stats['last_run'] = now
+        self.stats['last_run_ms'] = (time.perf_counter() - start) * 1000
+
+    # ===== ANTIGÜEDAD =====
+
+    def _aplicar_antiguedad(self, now: float):
+        for camara in set(self.index.camaras()) | set(self.dias_por_camara):
+            dias = self.dias_por_camara.get(camara, self.dias_defecto)
+            if dias is None:
+                continue
+            limite = now - dias * 86400
+            while not self._stop.is_set():
+                segmentos = self.index.mas_antiguos(self.lote, camara=camara, antes_de=limite)
+                # Sin avance (archivos en uso): se reintenta en la próxima pasada
+                if not segmentos or not self._borrar_segmentos(segmentos):
+                    break
+
+        if self.dias_capturas is None:
+            return
+        limite = now - self.dias_capturas * 86400
+        if self.catalogo is not None:
+            while not self._stop.is_set():
+                capturas = self.catalogo.mas_antiguas(self.lote, antes_de=limite)
+                if not capturas or not self._borrar_capturas(capturas):
+                    break
+        self._borrar_clips([c for c in self._clips() if c[0] < limite])
+
+    # ===== CUOTA =====
+
+    @property
+    def _gestiona_capturas(self) -> bool:
+        """Capturas y clips solo entran en la retención si se pidió explícitamente"""
+        return self.dias_capturas is not None or self.cuota_gb is not None
+
+    def _libre(self) -> Optional[int]:
+        if self.min_libre_gb is None:
+            return None
+        try:
+            return shutil.disk_usage(self.recordings_dir).free
+        except OSError:
+            return None
+
+    def _exceso(self, libre: Optional[int]) -> Tuple[int, int]:
+        """Bytes a liberar por la cuota y por el espacio libre mínimo"""
+        por_cuota = por_libre = 0
+        if self.cuota_gb is not None:
+            usado = self.index.bytes_totales() + sum(c[2] for c in self._clips())
+            if self.catalogo is not None:
+                usado += self.catalogo.bytes_totales()
+            por_cuota = usado - int(self.cuota_gb * GB)
+        if self.min_libre_gb is not None and libre is not None:
+            por_libre = int(self.min_libre_gb * GB) - libre
+        return por_cuota, por_libre
+
+    def _aplicar_cuota(self):
+        libre = self._libre()
+        por_cuota, por_libre = self._exceso(libre)
+        while max(por_cuota, por_libre) > 0 and not self._stop.is_set():
+            exceso = max(por_cuota, por_libre)
+            # Lo más antiguo primero, sea segmento, captura o clip
+            fuentes = [[(*s, 'segmento') for s in self.index.mas_antiguos(self.lote)]]
+            if self._gestiona_capturas:
+                fuentes.append([(*c, 'clip') for c in self._clips()[:self.lote]])
+                if self.catalogo is not None:
+                    fuentes.append([(*c, 'captura') for c in self.catalogo.mas_antiguas(self.lote)])
+            elegidos = {'segmento': [], 'captura': [], 'clip': []}
+            pendiente = exceso
+            for ts, ruta, tamano, tipo in heapq.merge(*fuentes, key=lambda c: c[0]):
+                if pendiente <= 0:
+                    break
+                elegidos[tipo].append((ts, ruta, tamano))
+                pendiente -= tamano or 0
+            if not any(elegidos.values()):
+                logger.warning("Retención: faltan %.1f GB por liberar y no queda nada que borrar", exceso / GB)
+                return
+            borrados = (self._borrar_segmentos(elegidos['segmento'])
+                        + self._borrar_capturas(elegidos['captura'])
+                        + self._borrar_clips(elegidos['clip']))
+            # Los archivos en uso conservan su fila y volverían a elegirse primero
+            if not borrados:
+                logger.warning("Retención: no se pudo liberar espacio (¿archivos en uso?)")
+                return
+            libre_antes, libre = libre, self._libre()
+            por_cuota, por_libre = self._exceso(libre)
+            if por_cuota <= 0 < por_libre and libre_antes is not None and libre <= libre_antes:
+                # Lo borrado no estaba en el disco medido: seguir solo vaciaría otros volúmenes
+                logger.warning("Retención: borrar no libera espacio en %s (%.1f GB libres), se detiene",
+                               self.recordings_dir, libre / GB)
+                return
+
+    # ===== BORRADO =====
+
+    # Solo se quitan del índice las filas cuyo archivo se borró o ya no estaba:
+    # uno abierto (p. ej. en Windows) se reintenta en la próxima pasada.
+    # Cada método devuelve cuántos archivos borró.
+
+    def _borrar_segmentos(self, segmentos: List[tuple]) -> int:
+        if not segmentos:
+            return 0
+        borradas, liberados = _borrar_archivos(segmentos)
+        if borradas:
+            self.index.eliminar(borradas)
+        self.stats['deleted_segments'] += len(borradas)
+        self.stats['freed_bytes'] += liberados
+        return len(borradas)
+
+    def _borrar_capturas(self, capturas: List[tuple]) -> int:
+        if not capturas:
+            return 0
+        borradas, liberados = _borrar_archivos(capturas)
+        if borradas:
+            self.catalogo.eliminar_varias(borradas)
+        self.stats['deleted_captures'] += len(borradas)
+        self.stats['freed_bytes'] += liberados
+        return len(borradas)
+
+    def _borrar_clips(self, clips: List[tuple]) -> int:
+        borradas, liberados = _borrar_archivos(clips)
+        self.stats['deleted_clips'] += len(borradas)
+        self.stats['freed_bytes'] += liberados
+        return len(borradas)
+
+    def _clips(self) -> List[tuple]:
+        """(mtime, ruta, bytes) de los clips de evento, más antiguos primero"""
+        clips = []
+        for ruta in glob.glob(os.path.join(self.captures_dir, "videos", "*", "*.mp4")):
+            try:
+                st = os.stat(ruta)
+            except OSError:
+                continue
+            clips.append((st.st_mtime, ruta, st.st_size))
+        clips.sort()
+        return clips
+
+
+class RecordingManager:
+    """Grabadores por cámara, índice de segmentos y trabajo de retención del proceso"""
+
+    def __init__(self, recordings_dir: str = DEFAULT_RECORDINGS_DIR, catalogo=None):
+        self.recordings_dir = recordings_dir
+        self.index = SegmentIndex(os.path.join(recordings_dir, "segmentos.db"))
+        self.retention = RetentionJob(self.index, catalogo, recordings_dir=recordings_dir)
+        self._recorders: Dict[str, 'FFmpegSegmentRecorder'] = {}
+        self._lock = threading.Lock()
+
+    def iniciar(self, camara: str, rtsp_url: str, segment_seconds: int = 300, formato: str = 'mkv',
+                retencion_dias: Optional[float] = None) -> bool:
+        """Empezar a grabar ``camara`` (si ya graba no hace nada)"""
+        if not FFMPEG_RECORDER_AVAILABLE:
+            return False
+        camara = str(camara)
+        with self._lock:
+            if camara in self._recorders:
+                return True
+            directorio = os.path.join(self.recordings_dir, camara)
+            try:
+                self.index.sincronizar(camara, directorio)
+            except Exception as e:
+                logger.warning("Grabación %s: no se pudo sincronizar el índice: %s", camara, e)
+            recorder = FFmpegSegmentRecorder(
+                rtsp_url, directorio, segment_seconds=segment_seconds, formato=formato,
+                nombre=camara, on_segment=lambda segmento: self.index.agregar(camara, segmento),
+            )
+            if not recorder.start():
+                return False
+            self._recorders[camara] = recorder
+            if retencion_dias is not None:
+                self.retention.dias_por_camara[camara] = retencion_dias
+        self.retention.start()
+        return True
+
+    def detener(self, camara: str):
+        with self._lock:
+            recorder = self._recorders.pop(str(camara), None)
+        if recorder is not None:
+            recorder.release()
+
+    def detener_todas(self):
+        for camara in list(self._recorders):
+            self.detener(camara)
+        self.retention.stop()
+
+    def configurar_retencion(self, cuota_gb: Optional[float] = None, min_libre_gb: Optional[float] = None,
+                             dias_defecto: Optional[float] = None, dias_capturas: Optional[float] = None,
+                             intervalo: Optional[float] = None):
+        """Cambiar solo los parámetros indicados"""
+        retention = self.retention
+        if cuota_gb is not None:
+            retention.cuota_gb = cuota_gb
+        if min_libre_gb is not None:
+            retention.min_libre_gb = min_libre_gb
+        if dias_defecto is not None:
+            retention.dias_defecto = dias_defecto
+        if dias_capturas is not None:
+            retention.dias_capturas = dias_capturas
+        if intervalo is not None:
+            retention.intervalo = intervalo
+
+    def buscar(self, camara: str, ts: float) -> Optional[Dict]:
+        return self.index.buscar(camara, ts)
+
+    def rango(self, camara: str, desde: float, hasta: float) -> List[Dict]:
+        return self.index.rango(camara, desde, hasta)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            recorders = {camara: r.get_stats() for camara, r in self._recorders.items()}
+        return {
+            'recorders': recorders,
+            'retention': dict(self.retention.stats),
+            'bytes': self.index.bytes_totales(),
+        }
+
+
+_manager: Optional[RecordingManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_recording_manager() -> RecordingManager:
+    """Gestor de grabación compartido del proceso"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = RecordingManager(catalogo=get_capture_catalog())
+        return _manager
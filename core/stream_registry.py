@@ -0,0 +1,520 @@
+import queue
+import threading
+import time
+
+import cv2
+
+from logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+# Espera máxima a que un lector nuevo entregue su primer frame antes de reemplazar al actual
+ESPERA_APERTURA = 30.0
+
+
+def stream_key(cam_data, perfil=None, nativa=False):
+    """
+    Clave (ip, canal, perfil) de una sesión RTSP.
+
+    Sin ``perfil`` explícito se usa la ``resolucion`` configurada y el canal
+    por defecto es el mismo que usa ``generar_rtsp``: la clave identifica la
+    URL, no la decodificación, y todos los consumidores de una cámara la
+    construyen igual.
+
+    ``nativa=True`` da una sesión aparte para consumidores a resolución
+    nativa (vista secundaria, capturas del stream principal): así no obligan
+    a decodificar a tamaño completo la sesión escalada de la detección.
+    """
+    key = (
+        cam_data.get("ip"),
+        str(cam_data.get("canal", "2")),
+        (perfil or cam_data.get("resolucion", "main")).lower(),
+    )
+    return key + ("nativa",) if nativa else key
+
+
+def requisitos(size=None, fps=None, keyframes_only=False):
+    """Salida que necesita un suscriptor: ``size`` (w, h) o None = nativa, ``fps`` o None = todos"""
+    return {
+        'size': tuple(size) if size else None,
+        'fps': fps or None,
+        'keyframes_only': bool(keyframes_only),
+    }
+
+
+def combinar_requisitos(lista):
+    """Salida mínima del lector que satisface a todos los suscriptores"""
+    lista = list(lista)
+    if not lista:
+        return requisitos()
+    sizes = [r['size'] for r in lista]
+    fps = [r['fps'] for r in lista]
+    return requisitos(
+        size=None if None in sizes else max(sizes, key=lambda s: s[0] * s[1]),
+        fps=None if None in fps else max(fps),
+        keyframes_only=all(r['keyframes_only'] for r in lista),
+    )
+
+
+def fabrica_lector(reader_cls, rtsp_url, decima=True, **kwargs):
+    """
+    ``reader_factory`` para ``subscribe``: crea ``reader_cls`` con la salida
+    pedida (``decima=False`` para lectores sin parámetro ``fps``).
+    """
+    def crear(req):
+        size = req['size'] or (None, None)
+        extra = {'fps': req['fps']} if decima else {}
+        return reader_cls(rtsp_url, width=size[0], height=size[1],
+                          keyframes_only=req['keyframes_only'], **extra, **kwargs)
+    return crear
+
+
+def _cubre(actual, requerido):
+    """True si un lector con salida ``actual`` sirve para ``requerido``"""
+    if actual['keyframes_only'] and not requerido['keyframes_only']:
+        return False
+    if actual['size'] is not None:
+        if requerido['size'] is None:
+            return False
+        if actual['size'][0] * actual['size'][1] < requerido['size'][0] * requerido['size'][1]:
+            return False
+    if actual['fps'] is not None and (requerido['fps'] is None or actual['fps'] < requerido['fps']):
+        return False
+    return True
+
+
+class StreamSubscription:
+    """
+    Handle de un consumidor sobre un stream compartido.
+
+    Expone la misma interfaz que los lectores (``start``, ``read``,
+    ``isOpened``, ``release``, ``stats``/``get_stats``) para poder usarse en
+    su lugar. Cada suscriptor tiene su propia cola corta: si no consume a
+    tiempo se descartan sus frames más antiguos sin frenar a los demás.
+
+    ``reader_factory(requisitos)`` crea el lector del backend del suscriptor
+    con la salida pedida; el suscriptor recibe los frames a su ``size`` y
+    limitados a su ``fps`` aunque el lector compartido entregue más.
+
+    Los frames se comparten entre suscriptores: deben tratarse como solo
+    lectura (copiar antes de dibujar sobre ellos).
+    """
+
+    def __init__(self, registry, key, reader_factory, name=None, maxsize=2,
+                 size=None, fps=None, keyframes_only=False):
+        self.registry = registry
+        self.key = key
+        self.reader_factory = reader_factory
+        self.name = name or f"sub-{id(self):x}"
+        self.requisitos = requisitos(size, fps, keyframes_only)
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stream = None
+        self.frames_received = 0
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.last_read_time = None
+        self._ultimo_push = 0.0
+        self._fps_window_start = None
+        self._fps_window_frames = 0
+        self.effective_fps = 0.0
+
+    @property
+    def size(self):
+        return self.requisitos['size']
+
+    def start(self):
+        if self.stream is not None:
+            return True
+        self.stream = self.registry._attach(self)
+        return self.stream is not None
+
+    def _acepta(self, now):
+        """Limitar al FPS pedido (con un 10% de margen para no perder frames por jitter)"""
+        fps = self.requisitos['fps']
+        if fps and now - self._ultimo_push < 0.9 / fps:
+            return False
+        self._ultimo_push = now
+        return True
+
+    def _push(self, frame, timestamp):
+        self.frames_received += 1
+        self._contar(timestamp)
+        try:
+            self.queue.put_nowait((timestamp, frame))
+        except queue.Full:
+            try:
+                self.queue.get_nowait()
+                self.frames_dropped += 1
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait((timestamp, frame))
+            except queue.Full:
+                self.frames_dropped += 1
+
+    def _contar(self, now, window=5.0):
+        if self._fps_window_start is None:
+            self._fps_window_start = now
+            self._fps_window_frames = 0
+        self._fps_window_frames += 1
+        elapsed = now - self._fps_window_start
+        if elapsed >= window:
+            self.effective_fps = self._fps_window_frames / elapsed
+            self._fps_window_start = now
+            self._fps_window_frames = 0
+
+    def read(self, timeout=1.0):
+        if not self.isOpened():
+            return False, None
+        try:
+            _timestamp, frame = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return False, None
+        self.frames_read += 1
+        self.last_read_time = time.time()
+        return True, frame
+
+    def isOpened(self):
+        """Abierto mientras la sesión conecta o reparte frames (False si su apertura falló)"""
+        return self.stream is not None and not self.stream.fallido
+
+    def release(self):
+        stream, self.stream = self.stream, None
+        if stream is not None:
+            self.registry._detach(self, stream)
+        while not self.queue.empty():
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+    @property
+    def reader(self):
+        return self.stream.reader if self.stream else None
+
+    @property
+    def stats(self):
+        """Estadísticas del lector compartido con el FPS que recibe este suscriptor"""
+        reader = self.reader
+        stats = dict(getattr(reader, 'stats', {})) if reader else {}
+        if self.effective_fps:
+            stats['effective_fps'] = self.effective_fps
+        return stats
+
+    def lag_stats(self):
+        """Retraso de este suscriptor respecto al stream"""
+        pending = self.queue.qsize()
+        oldest_age = 0.0
+        if pending:
+            try:
+                oldest_age = time.time() - self.queue.queue[0][0]
+            except IndexError:
+                pass
+        return {
+            'subscriber': self.name,
+            'subscribers': self.stream.subscriber_count() if self.stream else 0,
+            'frames_received': self.frames_received,
+            'frames_read': self.frames_read,
+            'frames_dropped': self.frames_dropped,
+            'pending_frames': pending,
+            'lag_seconds': oldest_age,
+        }
+
+    def get_stats(self):
+        reader = self.reader
+        if reader is not None and hasattr(reader, 'get_stats'):
+            stats = reader.get_stats()
+        else:
+            stats = dict(getattr(reader, 'stats', {})) if reader else {}
+        if self.effective_fps:
+            stats['effective_fps'] = self.effective_fps
+        stats.update(self.lag_stats())
+        return stats
+
+
+class SharedStream:
+    """
+    Una sesión RTSP (un lector) repartiendo frames a varios suscriptores.
+
+    El lector se abre con la salida combinada de los suscriptores (la mayor
+    resolución y FPS pedidos); si llega uno que necesita más, o se va el que
+    lo necesitaba, se abre un lector nuevo y se reemplaza al anterior cuando
+    ya entregó su primer frame, sin cortar a los demás.
+
+    Aperturas y reemplazos los hace el hilo de configuración de la sesión
+    (``solicitar``): quien se suscribe, normalmente la GUI, nunca espera a
+    la cámara.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.reader = None
+        self.requisitos = None
+        self.subscribers = []
+        self.running = False
+        self.fallido = False
+        self.thread = None
+        self.frames = 0
+        self.opened_at = time.time()
+        self.reconfiguraciones = 0
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._cond = threading.Condition()
+        self._factory = None
+        self._cerrado = False
+        self._worker = None
+
+    def solicitar(self, reader_factory):
+        """
+        Pedir que el lector se abra (o se reemplace) con la salida combinada
+        de los suscriptores del momento; las solicitudes pendientes se funden.
+        """
+        with self._cond:
+            if self._cerrado:
+                return
+            self._factory = reader_factory
+            self._cond.notify()
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._configurar, name=f"stream-cfg-{self.key[0]}", daemon=True
+                )
+                self._worker.start()
+
+    def _configurar(self):
+        while True:
+            with self._cond:
+                while self._factory is None and not self._cerrado:
+                    self._cond.wait()
+                if self._cerrado:
+                    return
+                factory, self._factory = self._factory, None
+            req = self.requisitos_suscriptores()
+            if self.reader is None:
+                self._abrir(factory, req)
+            elif self.running and req != self.requisitos:
+                self._reemplazar(factory, req)
+
+    def _abrir(self, reader_factory, req):
+        try:
+            reader = reader_factory(req)
+            ok = reader.start()
+        except Exception as e:
+            logger.error("Error abriendo stream %s: %s", self.key, e)
+            reader, ok = None, False
+        with self._lock:
+            if ok and not self._cerrado:
+                self.reader, self.requisitos = reader, req
+                self.running = True
+                self.thread = threading.Thread(target=self._fan_out, daemon=True)
+                self.thread.start()
+            else:
+                self.fallido = not ok
+        if ok and not self.running:
+            reader.release()  # se cerró mientras se abría
+        elif ok:
+            logger.info("Stream %s abierto con %s", self.key, req)
+        else:
+            logger.error("No se pudo abrir el stream %s", self.key)
+        self._ready.set()
+
+    def wait_ready(self, timeout=ESPERA_APERTURA):
+        return self._ready.wait(timeout) and self.running
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self.subscribers)
+
+    def add(self, subscription):
+        with self._lock:
+            self.subscribers.append(subscription)
+
+    def remove(self, subscription):
+        with self._lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+            return len(self.subscribers)
+
+    def requisitos_suscriptores(self):
+        with self._lock:
+            return combinar_requisitos(s.requisitos for s in self.subscribers)
+
+    def _reemplazar(self, reader_factory, req):
+        """Abrir un lector con salida ``req`` y cambiarlo por el actual cuando ya entrega frames"""
+        try:
+            nuevo = reader_factory(req)
+            if not nuevo.start():
+                logger.warning("Stream %s: no se pudo reabrir con %s", self.key, req)
+                return False
+        except Exception as e:
+            logger.warning("Stream %s: error reabriendo con %s: %s", self.key, req, e)
+            return False
+        # Los lectores arrancan sin esperar a la cámara: cambiar antes del
+        # primer frame dejaría a los suscriptores sin imagen mientras conecta
+        deadline = time.time() + ESPERA_APERTURA
+        listo = False
+        while self.running and not listo and time.time() < deadline:
+            ret, frame = nuevo.read()
+            listo = ret and frame is not None
+        with self._lock:
+            if listo and self.running:
+                viejo, self.reader, self.requisitos = self.reader, nuevo, req
+            else:
+                viejo = nuevo  # sin frames a tiempo o sesión cerrada mientras tanto
+        if viejo is nuevo:
+            if self.running:
+                logger.warning("Stream %s: el lector con %s no entregó frames, se mantiene el actual",
+                               self.key, req)
+            nuevo.release()
+            return False
+        self.reconfiguraciones += 1
+        logger.info("Stream %s reabierto con %s", self.key, req)
+        try:
+            viejo.release()
+        except Exception as e:
+            logger.warning("Error liberando lector anterior de %s: %s", self.key, e)
+        return True
+
+    def _fan_out(self):
+        while self.running:
+            reader = self.reader
+            if not reader.isOpened():
+                if reader is self.reader:
+                    break
+                continue  # se reemplazó el lector
+            ret, frame = reader.read()
+            if not ret or frame is None:
+                continue
+            self.frames += 1
+            now = time.time()
+            with self._lock:
+                subscribers = list(self.subscribers)
+            escalados = {}  # un resize por tamaño pedido, compartido entre suscriptores
+            fuente = (frame.shape[1], frame.shape[0])
+            for subscription in subscribers:
+                if not subscription._acepta(now):
+                    continue
+                size = subscription.size
+                salida = frame
+                if size is not None and size != fuente:
+                    if size not in escalados:
+                        escalados[size] = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                    salida = escalados[size]
+                subscription._push(salida, now)
+        self.running = False
+
+    def stop(self):
+        with self._cond:
+            self._cerrado = True
+            self._cond.notify()
+        with self._lock:
+            self.running = False
+        reader = self.reader
+        if reader is not None:
+            try:
+                reader.release()
+            except Exception as e:
+                logger.warning("Error liberando stream %s: %s", self.key, e)
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+        self.thread = None
+
+    def get_stats(self):
+        with self._lock:
+            subscribers = list(self.subscribers)
+        # lag_stats consulta subscriber_count: fuera del lock
+        lags = [s.lag_stats() for s in subscribers]
+        return {
+            'key': self.key,
+            'rtsp_url': getattr(self.reader, 'rtsp_url', None),
+            'running': self.running,
+            'frames': self.frames,
+            'requisitos': self.requisitos,
+            'reconfiguraciones': self.reconfiguraciones,
+            'uptime_seconds': time.time() - self.opened_at,
+            'subscribers': lags,
+        }
+
+
+class StreamRegistry:
+    """
+    Registro de sesiones RTSP del proceso, indexado por (ip, canal, perfil).
+
+    Varios widgets que muestran la misma cámara comparten una única sesión
+    aunque usen backends o resoluciones distintos: el primer suscriptor abre
+    el lector con su ``reader_factory`` y el último en salir la cierra. La
+    sesión se publica al momento y su hilo de configuración abre el lector,
+    así ni el suscriptor ni las demás cámaras esperan a una cámara caída.
+    """
+
+    def __init__(self):
+        self.streams = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, key, reader_factory, name=None, maxsize=2,
+                  size=None, fps=None, keyframes_only=False):
+        """Crear un handle sin conectar; la sesión se abre en ``start()``"""
+        return StreamSubscription(self, key, reader_factory, name=name, maxsize=maxsize,
+                                  size=size, fps=fps, keyframes_only=keyframes_only)
+
+    def _attach(self, subscription):
+        key = subscription.key
+        with self._lock:
+            stream = self.streams.get(key)
+            if stream is not None and stream._ready.is_set() and not stream.running:
+                # Sesión caída: se reemplaza (stop fuera del lock)
+                del self.streams[key]
+                caida, stream = stream, None
+            else:
+                caida = None
+            abrir = stream is None
+            if abrir:
+                stream = self.streams[key] = SharedStream(key)
+            stream.add(subscription)
+        if caida is not None:
+            caida.stop()
+
+        # Abrir, o ampliar si este suscriptor necesita más resolución/FPS que el
+        # lector actual: lo hace el hilo de configuración de la sesión
+        if abrir or stream.requisitos is None or not _cubre(stream.requisitos, subscription.requisitos):
+            stream.solicitar(subscription.reader_factory)
+        logger.info(
+            "Suscriptor %s unido a %s (%d activos)",
+            subscription.name, key, stream.subscriber_count(),
+        )
+        return stream
+
+    def _detach(self, subscription, stream):
+        with self._lock:
+            remaining = stream.remove(subscription)
+            if not remaining and self.streams.get(stream.key) is stream:
+                del self.streams[stream.key]
+            with stream._lock:
+                restantes = list(stream.subscribers)
+        if remaining:
+            req = combinar_requisitos(s.requisitos for s in restantes)
+            if stream.running and req != stream.requisitos:
+                # El que pedía más se fue: bajar la decodificación en segundo plano
+                stream.solicitar(restantes[0].reader_factory)
+            return
+        stream.stop()
+        logger.info("Stream %s cerrado (sin suscriptores)", stream.key)
+
+    def find_by_url(self, rtsp_url):
+        """Stream activo cuyo lector usa ``rtsp_url``, si existe"""
+        with self._lock:
+            for stream in self.streams.values():
+                if stream.running and getattr(stream.reader, 'rtsp_url', None) == rtsp_url:
+                    return stream
+        return None
+
+    def get_stats(self):
+        with self._lock:
+            streams = list(self.streams.values())
+        return [stream.get_stats() for stream in streams]
+
+
+_registry = StreamRegistry()
+
+
+def get_stream_registry():
+    return _registry
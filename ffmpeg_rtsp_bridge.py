@@ -3,94 +3,447 @@
 # CLASE FFMPEG BRIDGE - Solución cuando OpenCV no puede leer H.264
 # ========================================================================================
 
+import json
+import os
+import shutil
 import subprocess
 import cv2
 import numpy as np
+import random
 import threading
 import queue
 import time
 
+# Orden de preferencia de aceleradores de hardware en modo 'auto'
+HWACCEL_PREFERENCE = ('cuda', 'vaapi', 'qsv')
+VAAPI_DEVICE = '/dev/dri/renderD128'
+# Fragmentos (en minúsculas) de stderr que indican un fallo del decodificador por hardware
+HWACCEL_ERROR_MARKERS = (
+    'hwaccel', 'hw_frames', 'hardware', 'device creation failed', 'no device available',
+    'failed setup for format', 'cannot load', 'cuvid', 'cuda', 'vaapi', 'qsv', 'mfx',
+)
+# Fallos de hardware tras los que se queda en software definitivamente
+HWACCEL_MAX_FAILURES = 3
+
+_hwaccels_cache = None
+
+def detect_hwaccels():
+    """Aceleradores soportados por el ffmpeg instalado (cacheado por proceso)"""
+    global _hwaccels_cache
+    if _hwaccels_cache is None:
+        try:
+            out = subprocess.run(
+                ['ffmpeg', '-hide_banner', '-hwaccels'],
+                capture_output=True, text=True, timeout=5
+            ).stdout
+            lines = [l.strip() for l in out.splitlines()]
+            _hwaccels_cache = {l for l in lines if l and not l.endswith(':')}
+        except Exception:
+            _hwaccels_cache = set()
+    return _hwaccels_cache
+
+def probe_stream(rtsp_url, timeout=10):
+    """Obtener resolución, formato de pixel y fps del stream con ffprobe"""
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-rtsp_transport', 'tcp',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height,pix_fmt,avg_frame_rate,codec_name',
+        '-of', 'json',
+        rtsp_url
+    ]
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout).stdout
+        streams = json.loads(out or '{}').get('streams', [])
+    except Exception as e:
+        print(f"⚠️ ffprobe falló: {e}")
+        return None
+    if not streams:
+        return None
+    info = streams[0]
+    fps = None
+    num, _, den = str(info.get('avg_frame_rate', '0/0')).partition('/')
+    try:
+        if float(den or 1) > 0:
+            fps = float(num) / float(den or 1)
+    except ValueError:
+        pass
+    return {
+        'width': info.get('width'),
+        'height': info.get('height'),
+        'pix_fmt': info.get('pix_fmt'),
+        'codec': info.get('codec_name'),
+        'fps': fps or None,
+    }
+
 class FFmpegRTSPReader:
     """
     Lector RTSP usando FFmpeg como backend cuando OpenCV falla con H.264
+
+    El lector es supervisado: si el proceso ffmpeg termina, entrega un frame
+    incompleto o deja de producir frames durante ``stall_timeout`` segundos,
+    se mata y se relanza con backoff exponencial con jitter. El objeto lector
+    sigue siendo el mismo, por lo que los consumidores no necesitan reconectarse.
+
+    El comando se construye a partir de un perfil de capacidades: ``hwaccel``
+    ('auto', 'cuda', 'vaapi', 'qsv' o None) con fallback a software cuando
+    ffmpeg informa un error del decodificador por hardware (una cámara caída
+    no cuenta), filtros ``scale``/``fps`` para que ffmpeg haga el
+    redimensionado y la decimación, y ``-threads``. Tras un fallback se vuelve
+    a probar el hardware después de la siguiente conexión correcta. Si no se
+    indica ``width``/``height`` la resolución se obtiene con ffprobe en el
+    hilo lector: ``start()`` nunca bloquea.
+
+    Con ``keyframes_only`` solo se decodifican los I-frames (``-skip_frame
+    nokey``); el FPS real entregado se publica en ``stats['effective_fps']``.
     """
     
-    def __init__(self, rtsp_url, width=1920, height=1080):
+    def __init__(self, rtsp_url, width=None, height=None, stall_timeout=5.0,
+                 backoff_initial=1.0, backoff_max=30.0, nvidia_decode=False,
+                 hwaccel='auto', fps=None, threads=None, probe=True, keyframes_only=False):
         self.rtsp_url = rtsp_url
         self.width = width
         self.height = height
+        self.fps = fps
+        self.threads = threads
+        self.keyframes_only = keyframes_only
+        self.nvidia_decode = nvidia_decode
+        self.hwaccel_requested = hwaccel
+        self.hwaccel = None
+        self._hwaccel_preferred = None
+        self._hwaccel_failures = 0
+        self._hw_error = False
+        self._stderr_thread = None
+        self.probe = probe
+        self.source_info = None
         self.process = None
         self.frame_queue = queue.Queue(maxsize=10)
         self.running = False
         self.thread = None
-        
-    def start(self):
-        """Iniciar captura de video"""
-        if self.running:
+        self.watchdog_thread = None
+        self._process_lock = threading.Lock()
+
+        # Supervisión / reconexión
+        self.stall_timeout = stall_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.last_frame_time = None
+        self._down_since = None
+        self._stalled = False
+
+        self.stats = {
+            'command_used': None,
+            'state': 'stopped',
+            'frames': 0,
+            'reconnects': 0,
+            'stalls': 0,
+            'downtime_seconds': 0.0,
+            'last_disconnect_reason': None,
+            'last_reconnect_time': None,
+            'hwaccel': None,
+            'hwaccel_fallbacks': 0,
+            'last_error': None,
+            'source_resolution': None,
+            'source_pix_fmt': None,
+            'output_resolution': None,
+            'keyframes_only': keyframes_only,
+            'effective_fps': 0.0,
+        }
+        self._fps_window_start = None
+        self._fps_window_frames = 0
+
+    def _select_hwaccel(self):
+        """Elegir acelerador según lo pedido y lo que soporta ffmpeg"""
+        requested = (self.hwaccel_requested or '').lower()
+        if requested in ('', 'none', 'software', 'cpu'):
+            return None
+        available = detect_hwaccels()
+        if requested != 'auto':
+            return requested if requested in available else None
+        for candidate in HWACCEL_PREFERENCE:
+            if candidate == 'cuda' and not self.nvidia_decode:
+                continue
+            if candidate in available:
+                return candidate
+        return None
+
+    def _probe_source(self):
+        if self.probe and self.source_info is None:
+            self.source_info = probe_stream(self.rtsp_url)
+        info = self.source_info or {}
+        if info.get('width') and info.get('height'):
+            self.stats['source_resolution'] = f"{info['width']}x{info['height']}"
+            self.stats['source_pix_fmt'] = info.get('pix_fmt')
+        return info
+
+    def _resolve_geometry(self):
+        """Completar resolución de salida con ffprobe cuando falta (bloquea: llamar desde el hilo lector)"""
+        if self.width is not None and self.height is not None:
+            # Resolución explícita: el sondeo es solo informativo, no bloquear start()
+            if self.probe:
+                threading.Thread(target=self._probe_source, daemon=True).start()
+            self.stats['output_resolution'] = f"{self.width}x{self.height}"
             return
-            
-        # Comando FFmpeg para convertir RTSP a raw frames
-        cmd = [
-            'ffmpeg',
-            '-rtsp_transport', 'tcp',
-            '-i', self.rtsp_url,
+        info = self._probe_source()
+        src_w, src_h = info.get('width'), info.get('height')
+        if src_w and src_h:
+            if self.width is None and self.height is None:
+                self.width, self.height = src_w, src_h
+            elif self.height is None:
+                self.height = int(round(self.width * src_h / src_w / 2)) * 2
+            elif self.width is None:
+                self.width = int(round(self.height * src_w / src_h / 2)) * 2
+        if self.width is None or self.height is None:
+            # Sin ffprobe ni resolución explícita: forzar una salida conocida
+            self.width, self.height = self.width or 1920, self.height or 1080
+        self.stats['output_resolution'] = f"{self.width}x{self.height}"
+
+    def _build_command(self):
+        """Comando FFmpeg para convertir RTSP a raw frames"""
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-rtsp_transport', 'tcp']
+        if self.hwaccel:
+            cmd += ['-hwaccel', self.hwaccel]
+            if self.hwaccel == 'vaapi':
+                cmd += ['-hwaccel_device', VAAPI_DEVICE]
+        if self.threads:
+            cmd += ['-threads', str(self.threads)]
+        if self.keyframes_only:
+            # El decodificador descarta todo lo que no sea I-frame
+            cmd += ['-skip_frame', 'nokey']
+        cmd += ['-i', self.rtsp_url]
+
+        # ffmpeg decima y escala: solo se entregan los frames y la resolución usados
+        filters = []
+        if self.fps and not self.keyframes_only:
+            filters.append(f"fps={self.fps}")
+        filters.append(f"scale={self.width}:{self.height}")
+        cmd += ['-vf', ','.join(filters)]
+        if self.keyframes_only:
+            # No duplicar frames para rellenar el FPS nominal del stream
+            cmd += ['-fps_mode', 'passthrough']
+
+        cmd += [
             '-f', 'rawvideo',
             '-pix_fmt', 'bgr24',
             '-an',  # Sin audio
             '-sn',  # Sin subtítulos  
             '-'     # Output a stdout
         ]
-        
+        return cmd
+
+    def _spawn_process(self):
+        """Lanzar un nuevo proceso ffmpeg"""
+        cmd = self._build_command()
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,  # leído por _drain_stderr; sin leer llenaría el pipe y bloquearía ffmpeg
+            bufsize=10**8
+        )
+        self._hw_error = False
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, args=(process,), daemon=True)
+        self._stderr_thread.start()
+        with self._process_lock:
+            self.process = process
+        self.stats['command_used'] = ' '.join('<url>' if arg == self.rtsp_url else arg for arg in cmd)
+        self.stats['hwaccel'] = self.hwaccel or 'software'
+        self.last_frame_time = time.time()
+        return process
+
+    def _drain_stderr(self, process):
+        """Consumir stderr de ffmpeg y marcar errores del decodificador por hardware"""
         try:
-            self.process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                bufsize=10**8
-            )
-            
-            self.running = True
-            self.thread = threading.Thread(target=self._read_frames)
-            self.thread.daemon = True
-            self.thread.start()
-            
-            print(f"✅ FFmpeg bridge iniciado")
+            for raw in iter(process.stderr.readline, b''):
+                line = raw.decode('utf-8', 'replace').strip()
+                if not line:
+                    continue
+                self.stats['last_error'] = line
+                if self.hwaccel and any(m in line.lower() for m in HWACCEL_ERROR_MARKERS):
+                    self._hw_error = True
+        except Exception:
+            pass
+        finally:
+            try:
+                process.stderr.close()
+            except Exception:
+                pass
+
+    def _kill_process(self):
+        """Terminar el proceso ffmpeg actual (desbloquea la lectura de stdout)"""
+        with self._process_lock:
+            process = self.process
+            self.process = None
+        if process is None:
+            return
+        try:
+            process.kill()
+            process.wait(timeout=2)
+        except Exception:
+            pass
+        try:
+            process.stdout.close()
+        except Exception:
+            pass
+
+    def start(self):
+        """Iniciar captura de video (no bloquea: ffprobe y ffmpeg arrancan en el hilo lector)"""
+        if self.running:
             return True
-            
-        except Exception as e:
-            print(f"❌ Error iniciando FFmpeg: {e}")
+        
+        if shutil.which('ffmpeg') is None:
+            print(f"❌ Error iniciando FFmpeg: ffmpeg no encontrado en PATH")
             return False
-    
-    def _read_frames(self):
-        """Thread para leer frames desde FFmpeg"""
+        self.hwaccel = self._hwaccel_preferred = self._select_hwaccel()
+
+        self.running = True
+        self.stats['state'] = 'connecting'
+        self.thread = threading.Thread(target=self._read_frames)
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.watchdog_thread = threading.Thread(target=self._watchdog)
+        self.watchdog_thread.daemon = True
+        self.watchdog_thread.start()
+
+        print(f"✅ FFmpeg bridge iniciado")
+        return True
+
+    def _watchdog(self):
+        """Detectar streams estancados (sin frames) y forzar reconexión"""
+        while self.running:
+            time.sleep(min(1.0, self.stall_timeout / 2))
+            if self.stats['state'] not in ('streaming', 'connecting'):
+                continue
+            last = self.last_frame_time
+            if last is not None and time.time() - last > self.stall_timeout:
+                print(f"⚠️ FFmpeg sin frames durante {self.stall_timeout:.0f}s, reiniciando")
+                self.stats['stalls'] += 1
+                self._stalled = True
+                self.last_frame_time = None
+                self._kill_process()
+
+    def _read_stream(self, process):
+        """Leer frames del proceso actual hasta que falle; devuelve el motivo"""
         frame_size = self.width * self.height * 3  # BGR = 3 bytes por pixel
         
         while self.running:
+            # Leer frame raw desde FFmpeg
+            raw_frame = process.stdout.read(frame_size)
+            
+            if len(raw_frame) != frame_size:
+                print(f"⚠️ Frame incompleto: {len(raw_frame)}/{frame_size}")
+                return 'short_read'
+            
+            # Convertir a numpy array
+            frame = np.frombuffer(raw_frame, dtype=np.uint8)
+            frame = frame.reshape((self.height, self.width, 3))
+
+            self.last_frame_time = time.time()
+            self.stats['frames'] += 1
+            self._update_effective_fps(self.last_frame_time)
+            if self.stats['state'] != 'streaming':
+                self._mark_up()
+            
+            # Agregar a queue (eliminar frame viejo si está lleno)
             try:
-                # Leer frame raw desde FFmpeg
-                raw_frame = self.process.stdout.read(frame_size)
-                
-                if len(raw_frame) != frame_size:
-                    print(f"⚠️ Frame incompleto: {len(raw_frame)}/{frame_size}")
-                    break
-                
-                # Convertir a numpy array
-                frame = np.frombuffer(raw_frame, dtype=np.uint8)
-                frame = frame.reshape((self.height, self.width, 3))
-                
-                # Agregar a queue (eliminar frame viejo si está lleno)
+                self.frame_queue.put_nowait(frame)
+            except queue.Full:
                 try:
-                    self.frame_queue.put_nowait(frame)
-                except queue.Full:
-                    try:
-                        self.frame_queue.get_nowait()  # Eliminar frame viejo
-                        self.frame_queue.put_nowait(frame)  # Agregar nuevo
-                    except queue.Empty:
-                        pass
-                        
+                    self.frame_queue.get_nowait()  # Eliminar frame viejo
+                    self.frame_queue.put_nowait(frame)  # Agregar nuevo
+                except queue.Empty:
+                    pass
+        return 'stopped'
+
+    def _update_effective_fps(self, now, window=5.0):
+        """FPS realmente entregado, medido en ventanas de ``window`` segundos"""
+        if self._fps_window_start is None:
+            self._fps_window_start = now
+            self._fps_window_frames = 0
+        self._fps_window_frames += 1
+        elapsed = now - self._fps_window_start
+        if elapsed >= window:
+            self.stats['effective_fps'] = self._fps_window_frames / elapsed
+            self._fps_window_start = now
+            self._fps_window_frames = 0
+
+    def _mark_up(self):
+        self.stats['state'] = 'streaming'
+        if self._down_since is not None:
+            self.stats['downtime_seconds'] += time.time() - self._down_since
+            self._down_since = None
+            print(f"✅ FFmpeg reconectado (reconexiones: {self.stats['reconnects']})")
+
+    def _read_frames(self):
+        """Thread supervisor: lee frames y relanza ffmpeg cuando el stream cae"""
+        attempt = 0
+        process = None
+        
+        while self.running:
+            frames_before = self.stats['frames']
+            try:
+                if self.stats['output_resolution'] is None:
+                    self._resolve_geometry()
+                if process is None:
+                    process = self._spawn_process()
+                reason = self._read_stream(process)
             except Exception as e:
                 print(f"❌ Error leyendo frame: {e}")
+                reason = f"error: {e}"
+
+            self._kill_process()
+            process = None
+            if not self.running:
                 break
+            if self._stderr_thread is not None:
+                # Proceso muerto: esperar a que stderr se vacíe antes de clasificar el fallo
+                self._stderr_thread.join(timeout=1.0)
+
+            if self._down_since is None:
+                self._down_since = time.time()
+            self.stats['state'] = 'reconnecting'
+            self._fps_window_start = None
+            if self._stalled:
+                reason = 'stall'
+                self._stalled = False
+            self.stats['last_disconnect_reason'] = reason
+
+            # Una sesión que entregó frames reinicia el backoff
+            if self.stats['frames'] > frames_before:
+                attempt = 0
+                if (self.hwaccel is None and self._hwaccel_preferred
+                        and self._hwaccel_failures < HWACCEL_MAX_FAILURES):
+                    # La cámara responde: volver a intentar el hardware en la próxima sesión
+                    self.hwaccel = self._hwaccel_preferred
+            elif self.hwaccel and self._hw_error:
+                # Error del decodificador por hardware (no de red): volver a software
+                print(f"⚠️ Decodificación {self.hwaccel} falló ({self.stats['last_error']}), usando software")
+                self.hwaccel = None
+                self._hwaccel_failures += 1
+                self.stats['hwaccel_fallbacks'] += 1
+            delay = min(self.backoff_max, self.backoff_initial * (2 ** attempt))
+            delay = random.uniform(delay / 2, delay)
+            attempt += 1
+            print(f"🔄 FFmpeg reconectando en {delay:.1f}s (intento {attempt}, motivo: {reason})")
+
+            deadline = time.time() + delay
+            while self.running and time.time() < deadline:
+                time.sleep(0.1)
+            if not self.running:
+                break
+
+            self.stats['reconnects'] += 1
+            self.stats['last_reconnect_time'] = time.time()
+            self.stats['state'] = 'connecting'
+
+        self.stats['state'] = 'stopped'
+
+    def get_stats(self):
+        """Estadísticas de conexión (incluye el tiempo caído en curso)"""
+        stats = dict(self.stats)
+        if self._down_since is not None:
+            stats['downtime_seconds'] += time.time() - self._down_since
+        return stats
     
     def read(self):
         """Leer frame (compatible con cv2.VideoCapture)"""
@@ -104,20 +457,18 @@ class FFmpegRTSPReader:
             return False, None
     
     def isOpened(self):
-        """Verificar si está abierto"""
-        return self.running and self.process is not None
+        """Verificar si está abierto (sigue abierto mientras reconecta)"""
+        return self.running
     
     def release(self):
         """Liberar recursos"""
         self.running = False
-        
-        if self.process:
-            self.process.terminate()
-            self.process.wait()
-            self.process = None
+        self._kill_process()
         
         if self.thread:
             self.thread.join(timeout=2)
+        if self.watchdog_thread:
+            self.watchdog_thread.join(timeout=2)
         
         # Limpiar queue
         while not self.frame_queue.empty():
@@ -126,6 +477,288 @@ class FFmpegRTSPReader:
             except queue.Empty:
                 break
 
+# ========================================================================================
+# GRABACIÓN CONTINUA - Segmentos por copia de stream (sin decodificar)
+# ========================================================================================
+
+SEGMENT_FORMATS = {'mkv': 'matroska', 'mp4': 'mp4'}
+SEGMENT_TIME_FORMAT = '%Y%m%d_%H%M%S'
+
+class FFmpegSegmentRecorder:
+    """
+    Grabación continua de una cámara en segmentos de ``segment_seconds``.
+
+    ffmpeg copia el video tal cual llega (``-c copy``) con el muxer
+    ``segment``: un archivo por intervalo alineado al reloj, nombrado con la
+    hora de inicio. Se desactiva el vaciado por paquete (``-flush_packets 0``)
+    y en MKV se usan clusters grandes, así el disco recibe escrituras
+    secuenciales grandes en lugar de una por frame. MKV es el formato por
+    defecto porque un segmento cortado por un corte de luz sigue siendo legible.
+
+    Cada segmento terminado (leído de la lista CSV de ffmpeg) se entrega a
+    ``on_segment({'ruta', 'inicio', 'fin', 'bytes'})``. Misma supervisión que
+    ``FFmpegRTSPReader``: si el archivo en curso deja de crecer durante
+    ``stall_timeout`` segundos o ffmpeg termina, se relanza con backoff.
+    """
+
+    def __init__(self, rtsp_url, output_dir, segment_seconds=300, formato='mkv', nombre=None,
+                 on_segment=None, stall_timeout=30.0, poll_interval=2.0,
+                 backoff_initial=1.0, backoff_max=30.0):
+        if formato not in SEGMENT_FORMATS:
+            raise ValueError(f"formato debe ser uno de {tuple(SEGMENT_FORMATS)}")
+        self.rtsp_url = rtsp_url
+        self.output_dir = output_dir
+        self.segment_seconds = segment_seconds
+        self.formato = formato
+        self.prefijo = f"{nombre}_" if nombre else ""
+        self.on_segment = on_segment
+        self.stall_timeout = stall_timeout
+        self.poll_interval = poll_interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.list_path = os.path.join(output_dir, '.segmentos.csv')
+
+        self.process = None
+        self.running = False
+        self.thread = None
+        self._process_lock = threading.Lock()
+        self._entregados = set()
+
+        self.stats = {
+            'command_used': None,
+            'state': 'stopped',
+            'segments': 0,
+            'bytes': 0,
+            'reconnects': 0,
+            'stalls': 0,
+            'last_disconnect_reason': None,
+            'current_file': None,
+        }
+
+    def _build_command(self):
+        patron = os.path.join(self.output_dir, f"{self.prefijo}{SEGMENT_TIME_FORMAT}.{self.formato}")
+        cmd = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin',
+            '-rtsp_transport', 'tcp',
+            '-i', self.rtsp_url,
+            '-map', '0:v:0', '-c', 'copy', '-an', '-sn',
+            '-f', 'segment',
+            '-segment_time', str(self.segment_seconds),
+            '-segment_atclocktime', '1',
+            '-reset_timestamps', '1',
+            '-strftime', '1',
+            '-segment_format', SEGMENT_FORMATS[self.formato],
+            '-segment_list', self.list_path,
+            '-segment_list_type', 'csv',
+            '-flush_packets', '0',
+        ]
+        if self.formato == 'mkv':
+            # Clusters de hasta 5 s / 8 MB: menos escrituras y más grandes
+            cmd += ['-segment_format_options', 'cluster_time_limit=5000:cluster_size_limit=8388608']
+        cmd.append(patron)
+        return cmd
+
+    def _spawn_process(self):
+        """Lanzar ffmpeg; la lista de segmentos se reescribe en cada arranque"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        try:
+            os.remove(self.list_path)
+        except OSError:
+            pass
+        cmd = self._build_command()
+        process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        with self._process_lock:
+            self.process = process
+        self.stats['command_used'] = ' '.join('<url>' if arg == self.rtsp_url else arg for arg in cmd)
+        return process
+
+    def _kill_process(self, graceful=False):
+        """Terminar ffmpeg; ``graceful`` deja que cierre el segmento en curso"""
+        with self._process_lock:
+            process = self.process
+            self.process = None
+        if process is None:
+            return
+        try:
+            if graceful:
+                process.terminate()
+                process.wait(timeout=5)
+            else:
+                process.kill()
+                process.wait(timeout=2)
+        except Exception:
+            try:
+                process.kill()
+            except Exception:
+                pass
+
+    def start(self):
+        if self.running:
+            return True
+        try:
+            self._spawn_process()
+        except Exception as e:
+            print(f"❌ Error iniciando grabación FFmpeg: {e}")
+            return False
+        self.running = True
+        self.stats['state'] = 'connecting'
+        self.thread = threading.Thread(target=self._supervise, daemon=True)
+        self.thread.start()
+        print(f"✅ Grabación continua iniciada ({self.segment_seconds}s por segmento)")
+        return True
+
+    def _segmento_actual(self):
+        """Archivo más reciente del patrón (el que ffmpeg está escribiendo)"""
+        actual = None
+        try:
+            for entry in os.scandir(self.output_dir):
+                if (entry.name.startswith(self.prefijo) and entry.name.endswith(f".{self.formato}")
+                        and (actual is None or entry.name > actual.name)):
+                    actual = entry
+        except OSError:
+            return None
+        return actual
+
+    def _leer_lista(self):
+        """Entregar los segmentos terminados que ffmpeg agregó a la lista"""
+        try:
+            with open(self.list_path, 'r', encoding='utf-8') as f:
+                lineas = f.read().splitlines()
+        except OSError:
+            return
+        for linea in lineas:
+            nombre, _, resto = linea.partition(',')
+            if not nombre or nombre in self._entregados:
+                continue
+            try:
+                start, end = (float(v) for v in resto.split(',')[:2])
+            except ValueError:
+                continue
+            self._entregados.add(nombre)
+            self._entregar(os.path.join(self.output_dir, nombre), end - start)
+
+    def _entregar(self, ruta, duracion=None):
+        inicio = segment_start_time(ruta)
+        try:
+            st = os.stat(ruta)
+        except OSError:
+            return
+        if inicio is None or not st.st_size:
+            return
+        fin = inicio + duracion if duracion else st.st_mtime
+        self.stats['segments'] += 1
+        self.stats['bytes'] += st.st_size
+        if self.on_segment:
+            try:
+                self.on_segment({'ruta': ruta, 'inicio': inicio, 'fin': fin, 'bytes': st.st_size})
+            except Exception as e:
+                print(f"⚠️ Error registrando segmento {ruta}: {e}")
+
+    def _vigilar(self, process):
+        """Esperar a que ffmpeg termine o se estanque; devuelve el motivo"""
+        ruta, ultimo, ultimo_cambio = None, None, time.time()
+        while self.running:
+            if process.poll() is not None:
+                return f"exit {process.returncode}"
+            self._leer_lista()
+            tamano = _file_size(ruta)
+            if tamano is None or (ruta, tamano) == ultimo:
+                # Volver a listar la carpeta solo si el archivo conocido no creció
+                actual = self._segmento_actual()
+                if actual is not None:
+                    ruta, tamano = actual.path, _file_size(actual.path)
+            if tamano is not None and (ruta, tamano) != ultimo:
+                ultimo, ultimo_cambio = (ruta, tamano), time.time()
+                self.stats['current_file'] = ruta
+                if self.stats['state'] != 'recording':
+                    self.stats['state'] = 'recording'
+            if time.time() - ultimo_cambio > self.stall_timeout:
+                self.stats['stalls'] += 1
+                return 'stall'
+            time.sleep(self.poll_interval)
+        return 'stopped'
+
+    def _cerrar_sesion(self, graceful):
+        """Terminar ffmpeg y entregar el último segmento (no queda en la lista si se mató)"""
+        self._kill_process(graceful=graceful)
+        self._leer_lista()
+        actual = self._segmento_actual()
+        if actual is not None and actual.name not in self._entregados:
+            self._entregados.add(actual.name)
+            self._entregar(actual.path)
+        self.stats['current_file'] = None
+
+    def _supervise(self):
+        attempt = 0
+        process = self.process
+        while self.running:
+            segments_before = self.stats['segments']
+            bytes_seen = self.stats['bytes']
+            try:
+                if process is None:
+                    process = self._spawn_process()
+                reason = self._vigilar(process)
+            except Exception as e:
+                reason = f"error: {e}"
+            self._cerrar_sesion(graceful=not self.running)
+            process = None
+            if not self.running:
+                break
+
+            self.stats['state'] = 'reconnecting'
+            self.stats['last_disconnect_reason'] = reason
+            if self.stats['segments'] > segments_before or self.stats['bytes'] > bytes_seen:
+                attempt = 0
+            delay = min(self.backoff_max, self.backoff_initial * (2 ** attempt))
+            delay = random.uniform(delay / 2, delay)
+            attempt += 1
+            print(f"🔄 Grabación reconectando en {delay:.1f}s (intento {attempt}, motivo: {reason})")
+
+            deadline = time.time() + delay
+            while self.running and time.time() < deadline:
+                time.sleep(0.1)
+            if self.running:
+                self.stats['reconnects'] += 1
+                self.stats['state'] = 'connecting'
+
+        self.stats['state'] = 'stopped'
+
+    def get_stats(self):
+        return dict(self.stats)
+
+    def isOpened(self):
+        return self.running
+
+    def release(self):
+        """Detener cerrando el segmento en curso (SIGTERM: ffmpeg escribe el índice del archivo)"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=self.poll_interval + 8)
+            self.thread = None
+        if self.process is not None:
+            self._cerrar_sesion(graceful=True)
+
+def _file_size(ruta):
+    if ruta is None:
+        return None
+    try:
+        return os.path.getsize(ruta)
+    except OSError:
+        return None
+
+def segment_start_time(ruta):
+    """Hora de inicio (epoch) codificada en el nombre del segmento, o None"""
+    base = os.path.splitext(os.path.basename(ruta))[0]
+    try:
+        return time.mktime(time.strptime(base[-15:], SEGMENT_TIME_FORMAT))
+    except ValueError:
+        return None
+
 # ========================================================================================
 # EJEMPLO DE USO
 # ========================================================================================
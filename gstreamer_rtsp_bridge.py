@@ -1,5 +1,6 @@
 import threading
 import queue
+import time
 import numpy as np
 
 try:
@@ -10,29 +11,107 @@ except Exception as e:  # if gstreamer not installed
     raise
 
 
+# Decodificadores por hardware opcionales (se usan solo si el plugin existe)
+HW_DECODERS = {
+    'vaapi': 'vaapidecodebin',
+    'va': 'vah264dec',
+    'nvdec': 'nvh264dec',
+}
+
+
 class GStreamerRTSPReader:
-    """Lector RTSP utilizando GStreamer"""
+    """Lector RTSP utilizando GStreamer
+
+    El pipeline se construye desde la configuración: ``rtspsrc`` por TCP con
+    ``latency`` y ``drop-on-latency`` ajustables, decodificador por hardware
+    opcional (``hw_decode``), y ``videoscale``/``videorate`` con caps a la
+    resolución y FPS de detección, de modo que GStreamer solo entrega lo que
+    se usa.
 
-    def __init__(self, rtsp_url):
+    Cada buffer se copia (sin el padding de fila) a un array nuevo y se libera
+    de inmediato, sin mantener referencias a buffers de GStreamer. Los frames
+    entregados no se reutilizan: el detector y las capturas pueden retenerlos
+    el tiempo que necesiten.
+
+    Con ``keyframes_only`` los delta-units se descartan antes del decodificador,
+    de modo que solo se decodifican los I-frames.
+    """
+
+    def __init__(self, rtsp_url, keyframes_only=False, width=None, height=None, fps=None,
+                 latency=100, drop_on_latency=True, hw_decode=None):
         self.rtsp_url = rtsp_url
+        self.keyframes_only = keyframes_only
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.latency = latency
+        self.drop_on_latency = drop_on_latency
+        self.hw_decode = hw_decode
+        self.stats = {
+            'frames': 0,
+            'effective_fps': 0.0,
+            'keyframes_only': keyframes_only,
+            'decoder': None,
+            'qos_processed': 0,
+            'qos_dropped': 0,
+            'late_buffers': 0,
+        }
+        self._fps_window_start = None
+        self._fps_window_frames = 0
         self.pipeline = None
         self.appsink = None
         self.bus = None
         self.running = False
         self.thread = None
-        self.frame_queue = queue.Queue(maxsize=10)
+        # Cola corta: solo interesan los frames más recientes
+        self.frame_queue = queue.Queue(maxsize=2)
+
+    def _decoder_desc(self):
+        """Elemento(s) de decodificación según configuración y plugins disponibles"""
+        decoder = 'decodebin'
+        if self.hw_decode:
+            element = HW_DECODERS.get(self.hw_decode, self.hw_decode)
+            if Gst.ElementFactory.find(element):
+                decoder = element
+            else:
+                print(f"⚠️ Decodificador {element} no disponible, usando decodebin")
+        self.stats['decoder'] = decoder
+
+        stages = []
+        if self.keyframes_only or decoder != 'decodebin':
+            stages.append('parsebin')
+        if self.keyframes_only:
+            stages.append('identity drop-buffer-flags=delta-unit')
+        stages.append(decoder)
+        return ' ! '.join(stages)
+
+    def build_pipeline(self):
+        """Descripción del pipeline a partir de la configuración"""
+        caps = ['video/x-raw', 'format=BGR']
+        post = ['videoconvert']
+        if self.width and self.height:
+            post.append('videoscale')
+            caps += [f'width={self.width}', f'height={self.height}']
+        if self.fps and not self.keyframes_only:
+            post.append('videorate drop-only=true')
+            caps.append(f'framerate={int(self.fps)}/1')
+
+        source = (
+            f"rtspsrc location={self.rtsp_url} protocols=tcp latency={self.latency} "
+            f"drop-on-latency={'true' if self.drop_on_latency else 'false'}"
+        )
+        return (
+            f"{source} ! {self._decoder_desc()} ! {' ! '.join(post)} ! {','.join(caps)} ! "
+            "appsink name=sink max-buffers=1 drop=true qos=true"
+        )
 
     def start(self):
         if self.running:
             return True
 
         Gst.init(None)
-        pipeline_desc = (
-            f"rtspsrc location={self.rtsp_url} latency=200 ! "
-            "decodebin ! videoconvert ! video/x-raw,format=BGR ! "
-            "appsink name=sink max-buffers=1 drop=true"
-        )
         try:
+            pipeline_desc = self.build_pipeline()
             self.pipeline = Gst.parse_launch(pipeline_desc)
             self.appsink = self.pipeline.get_by_name('sink')
             self.appsink.set_property('emit-signals', False)
@@ -49,6 +128,22 @@ class GStreamerRTSPReader:
             print(f"❌ Error iniciando GStreamer pipeline: {e}")
             return False
 
+    def _handle_bus(self, timeout_ns):
+        """Procesar mensajes del bus: QoS para estadísticas, ERROR/EOS para detener"""
+        msg_types = Gst.MessageType.ERROR | Gst.MessageType.EOS | Gst.MessageType.QOS
+        msg = self.bus.timed_pop_filtered(timeout_ns, msg_types)
+        while msg:
+            if msg.type == Gst.MessageType.QOS:
+                # Cada mensaje QoS corresponde a un buffer descartado por llegar tarde
+                self.stats['late_buffers'] += 1
+                _fmt, processed, dropped = msg.parse_qos_stats()
+                self.stats['qos_processed'] = max(self.stats['qos_processed'], processed)
+                self.stats['qos_dropped'] = max(self.stats['qos_dropped'], dropped)
+            else:
+                self.running = False
+                return
+            msg = self.bus.pop_filtered(msg_types)
+
     def _read_frames(self):
         while self.running:
             sample = self.appsink.emit('try-pull-sample', Gst.SECOND // 5)
@@ -63,22 +158,41 @@ class GStreamerRTSPReader:
                 if not success:
                     continue
                 try:
-                    frame = np.frombuffer(map_info.data, np.uint8)
-                    frame = frame.reshape((height, width, 3))
-                    try:
-                        self.frame_queue.put_nowait(frame)
-                    except queue.Full:
-                        try:
-                            self.frame_queue.get_nowait()
-                            self.frame_queue.put_nowait(frame)
-                        except queue.Empty:
-                            pass
+                    frame = np.empty((height, width, 3), dtype=np.uint8)
+                    data = np.frombuffer(map_info.data, np.uint8)
+                    stride = len(data) // height  # filas con padding a múltiplo de 4
+                    src = data[:stride * height].reshape(height, stride)[:, :width * 3]
+                    np.copyto(frame.reshape(height, width * 3), src)
                 finally:
                     buf.unmap(map_info)
+                self._count_frame()
+                try:
+                    self.frame_queue.put_nowait(frame)
+                except queue.Full:
+                    try:
+                        self.frame_queue.get_nowait()
+                        self.frame_queue.put_nowait(frame)
+                    except queue.Empty:
+                        pass
+                self._handle_bus(0)
             else:
-                msg = self.bus.timed_pop_filtered(10000, Gst.MessageType.ERROR | Gst.MessageType.EOS)
-                if msg:
-                    self.running = False
+                self._handle_bus(10000)
+
+    def _count_frame(self, window=5.0):
+        now = time.time()
+        self.stats['frames'] += 1
+        if self._fps_window_start is None:
+            self._fps_window_start = now
+            self._fps_window_frames = 0
+        self._fps_window_frames += 1
+        elapsed = now - self._fps_window_start
+        if elapsed >= window:
+            self.stats['effective_fps'] = self._fps_window_frames / elapsed
+            self._fps_window_start = now
+            self._fps_window_frames = 0
+
+    def get_stats(self):
+        return dict(self.stats)
 
     def read(self):
         if not self.running:
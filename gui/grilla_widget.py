@@ -321,6 +321,7 @@ class GrillaWidget(QWidget):
             try:
                 self.registrar_log(f"🎬 [{ip}] Llamando a visualizador.start_stream()")
                 self.visualizador.start_stream(rtsp_url)
+                self._vincular_main_stream()
                 self.registrar_log(f"✅ [{ip}] start_stream() ejecutado correctamente")
                 
                 # Actualizar UI
@@ -928,6 +929,13 @@ class GrillaWidget(QWidget):
             ip = self.cam_data.get('ip', 'unknown') if self.cam_data else 'unknown'
             self.registrar_log(f"🛑 [{ip}] Deteniendo GrillaWidget...")
             
+            # Guardar las mejores tomas pendientes antes de soltar la cámara
+            if hasattr(self, '_timer_mejores_tomas'):
+                self._timer_mejores_tomas.stop()
+            alertas = getattr(self, 'alertas', None)
+            if alertas is not None and hasattr(alertas, 'vaciar_mejores_tomas'):
+                alertas.vaciar_mejores_tomas(self.registrar_log)
+            
             # Detener visualizador
             if hasattr(self, 'visualizador') and self.visualizador:
                 self.visualizador.stop()
@@ -999,6 +1007,31 @@ class GrillaWidget(QWidget):
     def configurar_alertas(self, gestor_alertas):
         """Configurar gestor de alertas"""
         self.alertas = gestor_alertas
+        self._vincular_main_stream()
+        # Las mejores tomas de tracks terminados se guardan aunque no lleguen más detecciones
+        if not hasattr(self, '_timer_mejores_tomas'):
+            self._timer_mejores_tomas = QTimer(self)
+            self._timer_mejores_tomas.timeout.connect(self._recolectar_mejores_tomas)
+        self._timer_mejores_tomas.start(1000)
+
+    def _recolectar_mejores_tomas(self):
+        alertas = getattr(self, 'alertas', None)
+        if alertas is not None and hasattr(alertas, 'recolectar_mejores_tomas'):
+            try:
+                alertas.recolectar_mejores_tomas(self.registrar_log)
+            except Exception as e:
+                self.registrar_log(f"❌ Error guardando mejores tomas: {e}")
+
+    def _vincular_main_stream(self):
+        """Dar al gestor de alertas el stream principal (doble stream) y el grabador de clips"""
+        alertas = getattr(self, 'alertas', None)
+        visualizador = getattr(self, 'visualizador', None)
+        if alertas is not None and hasattr(alertas, 'set_camara') and visualizador is not None:
+            alertas.set_camara(visualizador.camara_id())
+        if alertas is not None and hasattr(alertas, 'set_main_stream') and visualizador is not None:
+            alertas.set_main_stream(getattr(visualizador, 'main_stream', None))
+        if alertas is not None and hasattr(alertas, 'set_event_recorder') and visualizador is not None:
+            alertas.set_event_recorder(getattr(visualizador, 'event_recorder', None))
 
     def configurar_ptz(self, ptz_config):
         """Configurar sistema PTZ"""
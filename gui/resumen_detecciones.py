@@ -3,6 +3,8 @@ import requests
 import base64
 import json
 import os
+import threading
+from collections import OrderedDict
 from urllib.parse import quote
 from datetime import datetime
 
@@ -16,11 +18,18 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtMultimediaWidgets import QVideoWidget
 
 from PyQt6.QtGui import QPixmap, QImage, QMovie, QColor, QPainter, QBrush, QPen, QCursor
-from PyQt6.QtCore import Qt, QTimer, QThread, pyqtSignal, QObject, QSize, QUrl, QEventLoop
+from PyQt6.QtCore import Qt, QTimer, QThread, pyqtSignal, QObject, QSize, QUrl, QEventLoop, QFileSystemWatcher
 from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput, QMediaDevices, QMediaFormat, QMediaCaptureSession, QVideoSink
 import glob
 import shutil
 
+from core.capture_catalog import CaptureDayIndex, get_capture_catalog, metadata_para_ui
+from core.capture_encoder import MINIATURA_LADO, miniatura_de_archivo
+
+# Carpetas de capturas que se cuentan y muestran en el resumen
+CARPETAS_RESUMEN = ("personas", "autos", "barcos", "embarcaciones")
+EXTENSIONES_CAPTURA = (".jpg", ".webp", ".avif")
+
 class ImageDetailDialog(QDialog):
     image_deleted_signal = pyqtSignal(str) 
 
@@ -128,6 +137,11 @@ class ImageDetailDialog(QDialog):
                 error_messages.append("El archivo de metadatos no existía.")
             image_actually_gone = not os.path.exists(image_file_to_delete)
             metadata_actually_gone = not os.path.exists(metadata_file_to_delete)
+            if image_actually_gone:
+                try:
+                    get_capture_catalog().eliminar(image_file_to_delete)
+                except Exception as e:
+                    error_messages.append(f"No se pudo quitar la captura del catálogo: {e}")
             only_non_existence_errors = all("no existía" in msg for msg in error_messages)
             if image_actually_gone and metadata_actually_gone:
                 if not error_messages or only_non_existence_errors:
@@ -216,8 +230,16 @@ class VideoDetailDialog(QDialog):
         self.video_widget.setFixedSize(new_size, new_size)
 
 
+def listar_videos(fecha):
+    videos = glob.glob(os.path.join("capturas", "videos", fecha, "*.mp4"))
+    videos.sort(key=os.path.getmtime, reverse=True)
+    return videos
+
+
 class UpdateResumenThread(QThread):
-    datos_listos = pyqtSignal(dict, list, list)
+    """Carga completa del día: solo al abrir, al cambiar de fecha o si la verificación falla"""
+    # CaptureDayIndex, videos
+    datos_listos = pyqtSignal(object, list)
     error_ocurrido = pyqtSignal(str) 
 
     def __init__(self, parent=None):
@@ -226,89 +248,183 @@ class UpdateResumenThread(QThread):
     def run(self):
         try:
             hoy_str = datetime.now().strftime("%Y-%m-%d") 
-            conteos = {}
-            base = "capturas"
-            # CORRECCIÓN: Añadir "embarcaciones" a las carpetas a contar
-            carpetas_conteo = {
-                "personas": "Personas", 
-                "autos": "Autos", 
-                "barcos": "Barcos", 
-                "embarcaciones": "Embarcaciones"  # <- AÑADIDO
-            }
-            
-            for carpeta_key, _ in carpetas_conteo.items():
-                ruta_conteo = os.path.join(base, carpeta_key, hoy_str)
-                count = 0
-                if os.path.exists(ruta_conteo):
-                    count = len([f for f in os.listdir(ruta_conteo) if f.endswith(".jpg")])
-                conteos[carpeta_key] = count
-                print(f"UpdateResumenThread: {carpeta_key} = {count} imágenes")
-
-            imagenes_totales_sorted = []
-            for carpeta_key in carpetas_conteo.keys():
-                ruta_glob = os.path.join(base, carpeta_key, hoy_str, "*.jpg")
-                encontrados = glob.glob(ruta_glob)
-                imagenes_totales_sorted.extend(encontrados)
-
-            if imagenes_totales_sorted:
-                imagenes_totales_sorted.sort(key=os.path.getmtime, reverse=True)
-
-            ruta_videos = os.path.join(base, "videos", hoy_str, "*.mp4")
-            videos_totales_sorted = glob.glob(ruta_videos)
-            if videos_totales_sorted:
-                videos_totales_sorted.sort(key=os.path.getmtime, reverse=True)
-
-            self.datos_listos.emit(conteos, imagenes_totales_sorted, videos_totales_sorted)
+            indice = CaptureDayIndex.desde_catalogo(get_capture_catalog(), hoy_str, CARPETAS_RESUMEN)
+            self.datos_listos.emit(indice, listar_videos(hoy_str))
         except Exception as e:
             self.error_ocurrido.emit(f"Error en UpdateResumenThread: {e}")
 
-class ResumenDeteccionesWidget(QWidget):
-    log_signal = pyqtSignal(str)
+class MiniaturaWorker(QThread):
+    """
+    Entrega miniaturas desde el catálogo y genera (una sola vez) las que falten:
+    capturas anteriores al catálogo y portadas de video decodificadas con OpenCV.
+    Cada grupo ("pagina", "siguiente", "videos") conserva solo su última solicitud.
+    """
+    miniatura_lista = pyqtSignal(str, bytes)
 
-    def _video_thumbnail(self, path, size=120):
-        player = QMediaPlayer()
-        sink = QVideoSink()
-        player.setVideoSink(sink)
-
-        loop = QEventLoop()
-        captured = {"pixmap": None}
-
-        def on_frame(frame):
-            if frame.isValid():
-                image = frame.toImage()
-                if not image.isNull():
-                    captured["pixmap"] = QPixmap.fromImage(image)
-                    loop.quit()
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._solicitudes = {}
+        self._cond = threading.Condition()
+        self._activo = True
+
+    def solicitar(self, grupo, rutas):
+        with self._cond:
+            self._solicitudes[grupo] = list(rutas)
+            self._cond.notify()
+        if not self.isRunning():
+            self.start()
+
+    def detener(self):
+        with self._cond:
+            self._activo = False
+            self._cond.notify()
+
+    def _hay_solicitud_nueva(self):
+        with self._cond:
+            return bool(self._solicitudes) or not self._activo
 
-        sink.videoFrameChanged.connect(on_frame)
-        player.setSource(QUrl.fromLocalFile(path))
-        player.play()
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._solicitudes and self._activo:
+                    self._cond.wait()
+                if not self._activo:
+                    return
+                rutas = []
+                for grupo in ("pagina", "videos", "siguiente"):
+                    rutas.extend(self._solicitudes.pop(grupo, []))
+                self._solicitudes.clear()
+            try:
+                catalogo = get_capture_catalog()
+                disponibles = catalogo.obtener_miniaturas(rutas)
+            except Exception as e:
+                print(f"MiniaturaWorker: error consultando catálogo: {e}")
+                continue
+            faltantes = []
+            for ruta in rutas:
+                if ruta in disponibles:
+                    self.miniatura_lista.emit(ruta, bytes(disponibles[ruta]))
+                else:
+                    faltantes.append(ruta)
+            for ruta in faltantes:
+                if self._hay_solicitud_nueva():
+                    break  # la página cambió: atender primero lo visible
+                try:
+                    data = miniatura_de_archivo(ruta)
+                except Exception as e:
+                    print(f"MiniaturaWorker: no se pudo generar miniatura de {ruta}: {e}")
+                    data = None
+                if data is None:
+                    continue
+                catalogo.guardar_miniatura(ruta, data)
+                self.miniatura_lista.emit(ruta, data)
+
+
+class EscaneoDirectoriosWorker(QThread):
+    """
+    Lista fuera del hilo de la GUI las carpetas que avisó QFileSystemWatcher.
+    Recuerda los nombres ya vistos por carpeta (las capturas del índice y las
+    propias, marcadas al llegar su evento del catálogo) y solo emite los
+    archivos que faltan, así una escritura propia no cuesta más que un listado.
+    """
+    # [(ruta, mtime, carpeta)]
+    archivos_nuevos = pyqtSignal(list)
+    videos_listos = pyqtSignal(list)
 
-        timeout_timer = QTimer()
-        timeout_timer.setSingleShot(True)
-        timeout_timer.timeout.connect(loop.quit)
-        timeout_timer.start(1000)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pendientes = set()
+        self._vistos = {}
+        self._fecha = None
+        self._cond = threading.Condition()
+        self._activo = True
+
+    def reiniciar(self, fecha, rutas):
+        """Índice recargado: los nombres conocidos pasan a ser exactamente ``rutas``"""
+        vistos = {}
+        for ruta in rutas:
+            vistos.setdefault(os.path.dirname(ruta), set()).add(os.path.basename(ruta))
+        with self._cond:
+            self._fecha = fecha
+            self._vistos = vistos
+
+    def marcar(self, ruta):
+        with self._cond:
+            self._vistos.setdefault(os.path.dirname(ruta), set()).add(os.path.basename(ruta))
+
+    def solicitar(self, directorios):
+        with self._cond:
+            self._pendientes.update(directorios)
+            self._cond.notify()
+        if not self.isRunning():
+            self.start()
+
+    def detener(self):
+        with self._cond:
+            self._activo = False
+            self._cond.notify()
 
-        loop.exec()
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._pendientes and self._activo:
+                    self._cond.wait()
+                if not self._activo:
+                    return
+                directorios, self._pendientes = self._pendientes, set()
+                fecha = self._fecha
+            for directorio in directorios:
+                carpeta = os.path.basename(os.path.dirname(directorio))
+                if carpeta == "videos":
+                    self.videos_listos.emit(listar_videos(fecha))
+                    continue
+                try:
+                    entradas = [e for e in os.scandir(directorio)
+                                if e.name.lower().endswith(EXTENSIONES_CAPTURA)]
+                except OSError:
+                    continue
+                with self._cond:
+                    vistos = self._vistos.setdefault(directorio, set())
+                    nuevas = [e for e in entradas if e.name not in vistos]
+                    vistos.update(e.name for e in nuevas)
+                nuevos = []
+                for entry in nuevas:
+                    try:
+                        nuevos.append((entry.path, entry.stat().st_mtime, carpeta))
+                    except OSError:
+                        pass
+                if nuevos:
+                    self.archivos_nuevos.emit(nuevos)
 
-        sink.videoFrameChanged.disconnect(on_frame)
-        player.stop()
-        player.setVideoSink(None)
 
-        pixmap = captured["pixmap"]
-        if pixmap is None:
-            return None
-        return pixmap.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+class ResumenDeteccionesWidget(QWidget):
+    """
+    Resumen del día alimentado de forma incremental: los eventos "captura
+    agregada" del catálogo (y QFileSystemWatcher para archivos de otras
+    herramientas) actualizan conteos e índice por inserción. El temporizador
+    solo hace una verificación barata de conteos contra el catálogo.
+    """
+    log_signal = pyqtSignal(str)
+    captura_agregada = pyqtSignal(dict)
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setMinimumWidth(350)
         self.pagina_actual = 0
-        self.imagenes_totales = []
+        self.indice = None
+        self.callback_catalogo = None
         self.videos_totales = []
         self.items_per_page = 20
         self.last_counts = {}
 
+        # LRU de QPixmap ya decodificados y etiquetas visibles por ruta
+        self.cache_miniaturas = OrderedDict()
+        self.max_miniaturas = 300
+        self.thumbs_imagenes = {}
+        self.thumbs_videos = {}
+        self.miniatura_worker = MiniaturaWorker(self)
+        self.miniatura_worker.miniatura_lista.connect(self._on_miniatura_lista)
+
         self.layout = QVBoxLayout(self)
         self.setLayout(self.layout)
 
@@ -369,13 +485,46 @@ class ResumenDeteccionesWidget(QWidget):
         self.update_thread.error_ocurrido.connect(self._manejar_error_resumen)
         self.update_thread.finished.connect(self._on_update_thread_finished)
 
+        # Emitida desde los hilos del catálogo; Qt la entrega en el hilo de la GUI
+        self.captura_agregada.connect(self._on_captura_agregada)
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._on_directorio_cambiado)
+        self.dirs_cambiados = set()
+        self.escaneo_worker = EscaneoDirectoriosWorker(self)
+        self.escaneo_worker.archivos_nuevos.connect(self._on_archivos_nuevos)
+        self.escaneo_worker.videos_listos.connect(self._on_videos_listos)
+        self.timer_escaneo = QTimer(self)
+        self.timer_escaneo.setSingleShot(True)
+        self.timer_escaneo.timeout.connect(self._escanear_directorios)
+
+        # Agrupa repintados durante ráfagas de capturas
+        self.timer_repintado = QTimer(self)
+        self.timer_repintado.setSingleShot(True)
+        self.timer_repintado.timeout.connect(self.mostrar_pagina)
+
         self.timer_actualizacion_resumen = QTimer(self) 
-        self.timer_actualizacion_resumen.timeout.connect(self.actualizar_resumen)
-        self.timer_actualizacion_resumen.start(10000)  
+        self.timer_actualizacion_resumen.timeout.connect(self._verificar_consistencia)
+        self.timer_actualizacion_resumen.start(30000)  
 
         self.actualizar_resumen() 
 
-    def _procesar_datos_resumen(self, conteos, imagenes_totales, videos_totales):
+    def _procesar_datos_resumen(self, indice, videos_totales):
+        self.indice = indice
+        self.videos_totales = videos_totales
+        self.pagina_actual = 0
+        self.escaneo_worker.reiniciar(indice.fecha, indice.pagina(0, indice.total))
+        if self.callback_catalogo is None:
+            self.callback_catalogo = self.captura_agregada.emit
+            get_capture_catalog().subscribe(self.callback_catalogo)
+        self._vigilar_directorios()
+        self._actualizar_conteos()
+        self.mostrar_pagina()
+        self.mostrar_videos()
+
+    def _actualizar_conteos(self):
+        conteos = self.indice.conteos if self.indice is not None else {}
+
         def _maybe_update(label, key, prefix):
             valor_nuevo = conteos.get(key, 0)
             if self.last_counts.get(key) != valor_nuevo:
@@ -388,14 +537,82 @@ class ResumenDeteccionesWidget(QWidget):
         _maybe_update(self.label_barcos, 'barcos', 'Barcos')
         _maybe_update(self.label_embarcaciones, 'embarcaciones', 'Embarcaciones')
 
-        self.imagenes_totales = imagenes_totales
-        self.videos_totales = videos_totales
-        self.pagina_actual = 0
-        self.mostrar_pagina()
+    def _on_captura_agregada(self, registro):
+        if self.indice is None or not self.indice.agregar(registro):
+            return
+        self.escaneo_worker.marcar(registro['ruta'])
+        self._actualizar_conteos()
+        if self.pagina_actual == 0:
+            if not self.timer_repintado.isActive():
+                self.timer_repintado.start(300)
+        else:
+            self.btn_siguiente.setEnabled(self.indice.total > self.items_per_page * (self.pagina_actual + 1))
+
+    def _verificar_consistencia(self):
+        """Tarea periódica barata: fecha y conteos del índice contra el catálogo"""
+        if self.indice is None:
+            self.actualizar_resumen()
+            return
+        hoy_str = datetime.now().strftime("%Y-%m-%d")
+        if hoy_str != self.indice.fecha:
+            self.actualizar_resumen()
+            return
+        try:
+            catalogo = get_capture_catalog()
+            catalogo.flush()
+            conteos = catalogo.contar_por_carpeta(hoy_str, CARPETAS_RESUMEN)
+        except Exception as e:
+            self.log_signal.emit(f"Error verificando resumen: {e}")
+            return
+        if conteos != self.indice.conteos:
+            print(f"ResumenDetecciones: índice desincronizado ({self.indice.conteos} != {conteos}), recargando")
+            self.actualizar_resumen()
+        else:
+            self._vigilar_directorios()
+
+    def _directorios_del_dia(self):
+        fecha = self.indice.fecha if self.indice is not None else datetime.now().strftime("%Y-%m-%d")
+        carpetas = CARPETAS_RESUMEN + ("videos",)
+        return [os.path.join("capturas", carpeta, fecha) for carpeta in carpetas]
+
+    def _vigilar_directorios(self):
+        """Vigilar las carpetas de hoy que ya existan (se crean con la primera captura)"""
+        deseados = {d for d in self._directorios_del_dia() if os.path.isdir(d)}
+        actuales = set(self.watcher.directories())
+        if actuales - deseados:
+            self.watcher.removePaths(list(actuales - deseados))
+        if deseados - actuales:
+            self.watcher.addPaths(list(deseados - actuales))
+
+    def _on_directorio_cambiado(self, path):
+        self.dirs_cambiados.add(path)
+        if not self.timer_escaneo.isActive():
+            self.timer_escaneo.start(1000)
+
+    def _escanear_directorios(self):
+        """Pedir al worker el listado de las carpetas que cambiaron"""
+        dirs, self.dirs_cambiados = self.dirs_cambiados, set()
+        if self.indice is None or not dirs:
+            return
+        self.escaneo_worker.solicitar(dirs)
+
+    def _on_archivos_nuevos(self, archivos):
+        """Registrar archivos escritos por otras herramientas (las capturas propias ya llegan por evento)"""
+        if self.indice is None:
+            return
+        catalogo = get_capture_catalog()
+        for ruta, mtime, carpeta in archivos:
+            if self.indice.contiene(ruta):
+                continue
+            catalogo.add({
+                'ruta': ruta, 'ts': mtime, 'fecha': self.indice.fecha,
+                'carpeta': carpeta,
+                'formato': os.path.splitext(ruta)[1].lstrip('.').replace('jpg', 'jpeg'),
+            })
+
+    def _on_videos_listos(self, videos):
+        self.videos_totales = videos
         self.mostrar_videos()
-        
-        self.btn_anterior.setEnabled(self.pagina_actual > 0)
-        self.btn_siguiente.setEnabled(len(self.imagenes_totales) > self.items_per_page * (self.pagina_actual + 1))
 
     def _manejar_error_resumen(self, error_msg):
         self.log_signal.emit(f"Error actualizando resumen: {error_msg}")
@@ -418,6 +635,19 @@ class ResumenDeteccionesWidget(QWidget):
     def stop_threads(self):
         print("INFO: Deteniendo hilos y temporizadores de ResumenDeteccionesWidget...")
 
+        if self.callback_catalogo is not None:
+            get_capture_catalog().unsubscribe(self.callback_catalogo)
+            self.callback_catalogo = None
+        self.timer_escaneo.stop()
+        self.timer_repintado.stop()
+
+        if self.miniatura_worker.isRunning():
+            self.miniatura_worker.detener()
+            self.miniatura_worker.wait(2000)
+        if self.escaneo_worker.isRunning():
+            self.escaneo_worker.detener()
+            self.escaneo_worker.wait(2000)
+
         if hasattr(self, 'timer_actualizacion_resumen') and self.timer_actualizacion_resumen is not None:
             print("INFO: Deteniendo timer_actualizacion_resumen.")
             self.timer_actualizacion_resumen.stop()
@@ -441,7 +671,7 @@ class ResumenDeteccionesWidget(QWidget):
             widget = self.scroll_layout.itemAt(i).widget()
             if widget: widget.deleteLater()
 
-        if not self.imagenes_totales:
+        if self.indice is None or self.indice.total == 0:
             label = QLabel("❌ No se encontraron imágenes para hoy.") 
             self.scroll_layout.addWidget(label, 0, 0, 1, 3) 
             self.btn_anterior.setEnabled(False)
@@ -450,25 +680,64 @@ class ResumenDeteccionesWidget(QWidget):
 
         inicio = self.pagina_actual * self.items_per_page
         fin = inicio + self.items_per_page
-        pagina_imagenes = self.imagenes_totales[inicio:fin]
+        pagina_imagenes = self.indice.pagina(inicio, self.items_per_page)
 
         columnas = 3
+        self.thumbs_imagenes = {}
         for idx, path in enumerate(pagina_imagenes):
-            pixmap = QPixmap(path)
-            if pixmap.isNull(): continue
-            thumb = QLabel()
-            thumb.setFixedSize(120, 120)
-            thumb.setStyleSheet("QLabel { border: 1px solid #888; margin: 4px; } QLabel:hover { border: 2px solid #00FF00; }")
-            thumb.setCursor(QCursor(Qt.CursorShape.PointingHandCursor))
-            thumb.setPixmap(pixmap.scaled(120, 120, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
-            thumb.setToolTip(os.path.basename(path))
-            thumb.mousePressEvent = lambda e, p=path: self.mostrar_modal(p)
+            thumb = self._crear_thumb(path)
+            self.thumbs_imagenes[path] = thumb
             fila = idx // columnas
             col = idx % columnas
             self.scroll_layout.addWidget(thumb, fila, col)
+        self._solicitar_miniaturas("pagina", pagina_imagenes)
+        # Precargar la página siguiente para que el paginado sea inmediato
+        self._solicitar_miniaturas("siguiente", self.indice.pagina(fin, self.items_per_page))
         
         self.btn_anterior.setEnabled(self.pagina_actual > 0)
-        self.btn_siguiente.setEnabled(len(self.imagenes_totales) > fin)
+        self.btn_siguiente.setEnabled(self.indice.total > fin)
+
+    def _crear_thumb(self, path):
+        thumb = QLabel()
+        thumb.setFixedSize(MINIATURA_LADO, MINIATURA_LADO)
+        thumb.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        thumb.setStyleSheet("QLabel { border: 1px solid #888; margin: 4px; } QLabel:hover { border: 2px solid #00FF00; }")
+        thumb.setCursor(QCursor(Qt.CursorShape.PointingHandCursor))
+        pixmap = self._miniatura_en_cache(path)
+        if pixmap is not None:
+            thumb.setPixmap(pixmap)
+        else:
+            thumb.setText("⏳")
+        thumb.setToolTip(os.path.basename(path))
+        thumb.mousePressEvent = lambda e, p=path: self.mostrar_modal(p)
+        return thumb
+
+    def _miniatura_en_cache(self, path):
+        pixmap = self.cache_miniaturas.get(path)
+        if pixmap is not None:
+            self.cache_miniaturas.move_to_end(path)
+        return pixmap
+
+    def _solicitar_miniaturas(self, grupo, rutas):
+        faltantes = [ruta for ruta in rutas if ruta not in self.cache_miniaturas]
+        if faltantes:
+            self.miniatura_worker.solicitar(grupo, faltantes)
+
+    def _on_miniatura_lista(self, path, data):
+        pixmap = QPixmap()
+        if not pixmap.loadFromData(data):
+            return
+        self.cache_miniaturas[path] = pixmap
+        self.cache_miniaturas.move_to_end(path)
+        while len(self.cache_miniaturas) > self.max_miniaturas:
+            self.cache_miniaturas.popitem(last=False)
+        for thumbs in (self.thumbs_imagenes, self.thumbs_videos):
+            thumb = thumbs.get(path)
+            if thumb is not None:
+                try:
+                    thumb.setPixmap(pixmap)
+                except RuntimeError:
+                    thumbs.pop(path, None)  # etiqueta ya destruida
 
     def mostrar_videos(self):
         for i in reversed(range(self.scroll_videos_layout.count())):
@@ -482,22 +751,17 @@ class ResumenDeteccionesWidget(QWidget):
             return
 
         columnas = 3
+        self.thumbs_videos = {}
         for idx, path in enumerate(self.videos_totales):
-            pixmap = self._video_thumbnail(path)
-            thumb = QLabel()
-            thumb.setFixedSize(120, 120)
-            thumb.setStyleSheet("QLabel { border: 1px solid #888; margin: 4px; } QLabel:hover { border: 2px solid #00FF00; }")
-            thumb.setCursor(QCursor(Qt.CursorShape.PointingHandCursor))
-            if pixmap:
-                thumb.setPixmap(pixmap)
-            else:
+            thumb = self._crear_thumb(path)
+            if self._miniatura_en_cache(path) is None:
                 thumb.setText(os.path.basename(path))
-                thumb.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            thumb.setToolTip(os.path.basename(path))
-            thumb.mousePressEvent = lambda e, p=path: self.mostrar_modal(p)
+                thumb.setWordWrap(True)
+            self.thumbs_videos[path] = thumb
             fila = idx // columnas
             col = idx % columnas
             self.scroll_videos_layout.addWidget(thumb, fila, col)
+        self._solicitar_miniaturas("videos", self.videos_totales)
 
     def pagina_anterior(self):
         if self.pagina_actual > 0:
@@ -505,7 +769,8 @@ class ResumenDeteccionesWidget(QWidget):
             self.mostrar_pagina()
 
     def pagina_siguiente(self):
-        total_paginas = (len(self.imagenes_totales) + self.items_per_page - 1) // self.items_per_page
+        total = self.indice.total if self.indice is not None else 0
+        total_paginas = (total + self.items_per_page - 1) // self.items_per_page
         if self.pagina_actual < total_paginas - 1:
             self.pagina_actual += 1
             self.mostrar_pagina()
@@ -518,7 +783,15 @@ class ResumenDeteccionesWidget(QWidget):
             "coordenadas_ptz": "No disponibles",          
             "confianza": "No disponible"
         }
-        if os.path.exists(metadata_path):
+        registro = None
+        if not path.lower().endswith('.mp4'):
+            try:
+                registro = get_capture_catalog().obtener(path)
+            except Exception as e:
+                self.log_signal.emit(f"Error consultando catálogo de capturas: {e}")
+        if registro is not None:
+            loaded_metadata = metadata_para_ui(registro)
+        elif os.path.exists(metadata_path):
             try:
                 with open(metadata_path, "r", encoding="utf-8") as f:
                     data_from_file = json.load(f)
@@ -541,15 +814,16 @@ class ResumenDeteccionesWidget(QWidget):
 
     def handle_image_deleted(self, deleted_image_path):
         self.log_signal.emit(f"🖼️ Imagen {os.path.basename(deleted_image_path)} borrada.") 
-        if deleted_image_path in self.imagenes_totales:
-            self.imagenes_totales.remove(deleted_image_path)
-            total_imagenes = len(self.imagenes_totales)
+        self.cache_miniaturas.pop(deleted_image_path, None)
+        if self.indice is not None and self.indice.eliminar(deleted_image_path):
+            total_imagenes = self.indice.total
             if total_imagenes == 0:
                 self.pagina_actual = 0
             else:
                 max_pagina = (total_imagenes -1) // self.items_per_page
                 if self.pagina_actual > max_pagina:
                     self.pagina_actual = max_pagina
+            self._actualizar_conteos()
             self.mostrar_pagina() 
         else:
             self.log_signal.emit(f"⚠️ Imagen {os.path.basename(deleted_image_path)} no encontrada en la lista interna al intentar refrescar.")
\ No newline at end of file
@@ -3,6 +3,10 @@ import cv2
 import os
 
 class VideoSaverThread(QThread):
+    """
+    Recodifica una lista de frames BGR con mp4v. Para clips de alerta usar
+    core.event_clip_recorder.EventClipRecorder (copia de stream, sin frames en memoria).
+    """
     def __init__(self, frames, output_path, fps=10, parent=None):
         super().__init__(parent)
         self.frames = frames
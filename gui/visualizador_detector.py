@@ -21,6 +21,15 @@ try:
 except Exception:
     GST_BRIDGE_AVAILABLE = False
     print("⚠️ GStreamer Bridge no disponible")
+
+# Detectar soporte PyAV (decodificación en proceso)
+try:
+    from pyav_rtsp_bridge import PyAVRTSPReader
+    PYAV_BRIDGE_AVAILABLE = True
+    print("✅ PyAV Bridge disponible")
+except Exception:
+    PYAV_BRIDGE_AVAILABLE = False
+    print("⚠️ PyAV Bridge no disponible")
 
 from PyQt6.QtMultimedia import QMediaPlayer, QVideoSink, QVideoFrameFormat, QVideoFrame
 from PyQt6.QtCore import QObject, pyqtSignal, QUrl, QTimer
@@ -28,8 +37,14 @@ from PyQt6.QtGui import QImage, QPixmap
 import numpy as np
 import cv2
 
-from core.detector_worker import DetectorWorker, iou
+from core.detector_worker import DetectorWorker, iou, MODEL_CLASSES, CLASS_REMAP
 from core.advanced_tracker import AdvancedTracker
+from core.dual_stream import MainStreamGrabber, urls_dual_stream
+from core.event_clip_recorder import EventClipRecorder
+from core.recording import get_recording_manager
+from core.detection_store import get_detection_store
+from core.stream_registry import fabrica_lector, get_stream_registry, stream_key
+from core.adaptive_sampling import get_adaptive_controller
 
 from logging_utils import get_logger
 
@@ -87,8 +102,12 @@ class VisualizadorDetector(QObject):
         self.visual_fps = fps_config.get("visual_fps", 25)
         self.detection_fps = fps_config.get("detection_fps", cam_data.get("detection_fps", 8))
         
-        base_fps = 30
-        self.detector_frame_interval = max(1, int(base_fps / self.detection_fps))
+        self.base_fps = 30
+        # Modo solo keyframes (cámaras de baja prioridad): ~1 frame por GOP
+        self.keyframes_only = cam_data.get('keyframes_only', False)
+        if self.keyframes_only:
+            self.base_fps = cam_data.get('keyframe_fps', 1.0)
+        self.detector_frame_interval = max(1, int(self.base_fps / self.detection_fps))
         
         self.log_signal.emit(f"   📈 FPS Visual: {self.visual_fps}")
         self.log_signal.emit(f"   🤖 FPS Detección: {self.detection_fps} (intervalo: {self.detector_frame_interval})")
@@ -103,6 +122,14 @@ class VisualizadorDetector(QObject):
         self.gst_reader = None
         self.gst_thread = None
         self.using_gstreamer = False
+        # Variables PyAV
+        self.pyav_reader = None
+        self.pyav_thread = None
+        self.using_pyav = False
+        # Doble stream: sub-stream para detección, principal solo para capturas
+        self.main_stream = None
+        self.event_recorder = None
+        self.camara_grabando = None
         
         # Estadísticas
         self.stats = {
@@ -112,6 +139,7 @@ class VisualizadorDetector(QObject):
             'detection_frames': 0,
             'ffmpeg_frames': 0,
             'gst_frames': 0,
+            'pyav_frames': 0,
             'qt_frames': 0,
             'dropped_frames': 0,
             'last_fps_calculation': time.time(),
@@ -129,22 +157,24 @@ class VisualizadorDetector(QObject):
         
         self.log_signal.emit(f"   🎯 Device: {device}")
 
-        # Tracker
+        # Detectores
+        modelos = cam_data.get("modelos")
+        if not modelos:
+            modelo_single = cam_data.get("modelo", "Personas")
+            modelos = [modelo_single] if modelo_single else []
+
+        # Tracker con perfil por clase (tracker_config.py)
         self.tracker = AdvancedTracker(
             conf_threshold=cam_data.get("confianza", 0.5),
             device=device,
-            lost_ttl=cam_data.get("lost_ttl", 5),
+            lost_ttl=cam_data.get("lost_ttl"),
+            model_key=modelos[0] if modelos else None,
+            class_models=self._build_class_models(modelos),
         )
         self._pending_detections = {}
         self._last_frame = None
         self._current_frame_id = 0
 
-        # Detectores
-        modelos = cam_data.get("modelos")
-        if not modelos:
-            modelo_single = cam_data.get("modelo", "Personas")
-            modelos = [modelo_single] if modelo_single else []
-
         self.log_signal.emit(f"   🤖 Modelos a cargar: {modelos}")
 
         self.detectors = []
@@ -175,6 +205,16 @@ class VisualizadorDetector(QObject):
 
         self.log_signal.emit(f"✅ [{self.objectName()}] VisualizadorDetector completamente inicializado")
 
+    @staticmethod
+    def _build_class_models(modelos):
+        """Mapear clase final (tras CLASS_REMAP) -> modelo, para perfiles del tracker"""
+        class_models = {}
+        for modelo in modelos:
+            remap = CLASS_REMAP.get(modelo, {})
+            for cls in MODEL_CLASSES.get(modelo, [0]):
+                class_models.setdefault(remap.get(cls, cls), modelo)
+        return class_models
+
     def _check_nvidia_support(self):
         """Verificar soporte NVIDIA GPU"""
         try:
@@ -215,8 +255,27 @@ class VisualizadorDetector(QObject):
         self.log_signal.emit(f"🎬 [{self.objectName()}] Iniciando stream...")
         self.log_signal.emit(f"   🌐 URL: {rtsp_url[:60]}{'...' if len(rtsp_url) > 60 else ''}")
 
+        if self.cam_data.get('grabar_eventos'):
+            self._iniciar_grabador_eventos(rtsp_url)
+
+        if self.cam_data.get('grabacion_continua'):
+            self._iniciar_grabacion_continua(rtsp_url)
+
+        if self.cam_data.get('dual_stream'):
+            rtsp_url = self._configurar_dual_stream(rtsp_url)
+
         backend = (self.decoder_backend or 'auto').lower()
 
+        if backend == 'pyav':
+            if PYAV_BRIDGE_AVAILABLE:
+                self.log_signal.emit(f"🚀 [{self.objectName()}] Usando PyAV Bridge (en proceso)")
+                if self._start_pyav_bridge(rtsp_url):
+                    return
+                self.log_signal.emit(f"⚠️ [{self.objectName()}] PyAV falló, probando FFmpeg...")
+            else:
+                self.log_signal.emit(f"⚠️ [{self.objectName()}] PyAV no disponible, probando FFmpeg...")
+            backend = 'ffmpeg'
+
         if backend in ('gstreamer', 'auto') and GST_BRIDGE_AVAILABLE:
             self.log_signal.emit(f"🚀 [{self.objectName()}] Usando GStreamer Bridge")
             if self._start_gstreamer_bridge(rtsp_url):
@@ -234,6 +293,95 @@ class VisualizadorDetector(QObject):
         self.log_signal.emit(f"📺 [{self.objectName()}] Usando QMediaPlayer (compatibilidad)")
         self._start_qmediaplayer(rtsp_url)
 
+    def _configurar_dual_stream(self, rtsp_url):
+        """Usar el sub-stream para detección y dejar el principal bajo demanda"""
+        url_sub, url_main = urls_dual_stream(self.cam_data, rtsp_url)
+        if not url_sub or not url_main or url_sub == url_main:
+            self.log_signal.emit(f"⚠️ [{self.objectName()}] Doble stream sin URLs distintas, usando stream único")
+            return rtsp_url
+        self.main_stream = MainStreamGrabber(
+            url_main,
+            buffer_seconds=self.cam_data.get('main_stream_buffer_s', 2.0),
+            idle_timeout=self.cam_data.get('main_stream_idle_s', 30.0),
+            # Resolución nativa y todos los frames (size/fps None)
+            reader_factory=lambda url: get_stream_registry().subscribe(
+                self._stream_key(url, perfil='main', nativa=True),
+                fabrica_lector(FFmpegRTSPReader, url),
+                name=f"{self.objectName()}-main",
+            ),
+        )
+        self.log_signal.emit(f"🎞️ [{self.objectName()}] Doble stream: detección en sub-stream, capturas desde principal")
+        return url_sub
+
+    def _iniciar_grabador_eventos(self, rtsp_url):
+        """Buffer de paquetes codificados para clips de alerta (stream principal si hay doble stream)"""
+        recorder = EventClipRecorder(
+            self._url_grabacion(rtsp_url),
+            pre_roll=self.cam_data.get('clip_pre_roll_s', 10.0),
+            post_roll=self.cam_data.get('clip_post_roll_s', 5.0),
+            max_clip=self.cam_data.get('clip_max_s', 60.0),
+            max_buffer_mb=self.cam_data.get('clip_buffer_mb', 48),
+            nombre=self._nombre_camara(),
+        )
+        if recorder.start():
+            self.event_recorder = recorder
+            self.log_signal.emit(f"🎬 [{self.objectName()}] Clips de evento: pre-roll {recorder.pre_roll:.0f}s, post-roll {recorder.post_roll:.0f}s (copia de stream)")
+        else:
+            self.log_signal.emit(f"⚠️ [{self.objectName()}] Clips de evento no disponibles (PyAV)")
+
+    def _url_grabacion(self, rtsp_url):
+        """Grabar el stream principal si la detección usa el sub-stream"""
+        if self.cam_data.get('dual_stream'):
+            _, url_main = urls_dual_stream(self.cam_data, rtsp_url)
+            return url_main or rtsp_url
+        return rtsp_url
+
+    def camara_id(self):
+        """Identificador de la cámara en el almacén de detecciones y en el catálogo de capturas"""
+        return self.cam_data.get('ip') or self.objectName()
+
+    def _nombre_camara(self):
+        return self.cam_data.get('ip', '').replace('.', '_') or None
+
+    def _iniciar_grabacion_continua(self, rtsp_url):
+        """Segmentos por copia de stream con retención (compartido por el proceso)"""
+        camara = self._nombre_camara() or self.objectName()
+        if get_recording_manager().iniciar(
+            camara,
+            self._url_grabacion(rtsp_url),
+            segment_seconds=self.cam_data.get('segmento_s', 300),
+            formato=self.cam_data.get('formato_grabacion', 'mkv'),
+            retencion_dias=self.cam_data.get('retencion_dias'),
+        ):
+            self.camara_grabando = camara
+            self.log_signal.emit(f"⏺️ [{self.objectName()}] Grabación continua en segmentos de {self.cam_data.get('segmento_s', 300)}s")
+        else:
+            self.log_signal.emit(f"⚠️ [{self.objectName()}] Grabación continua no disponible")
+
+    def _stream_key(self, rtsp_url, perfil=None, nativa=False):
+        """
+        Clave del registro de streams: (ip, canal, perfil), la misma que usan
+        los demás consumidores de la cámara. La resolución y el FPS de este
+        visualizador van como requisitos de la suscripción, no en la clave;
+        ``nativa`` separa a los consumidores de resolución completa.
+        """
+        if 'ip' not in self.cam_data:
+            return (rtsp_url, 'nativa') if nativa else (rtsp_url,)
+        if perfil is None and self.main_stream:
+            perfil = self.cam_data.get('perfil_deteccion', 'sub')
+        return stream_key(self.cam_data, perfil, nativa=nativa)
+
+    def _suscribir(self, rtsp_url, reader_factory, width, height, fps):
+        """Suscripción al stream compartido de la cámara con la salida de este visualizador"""
+        return get_stream_registry().subscribe(
+            self._stream_key(rtsp_url),
+            reader_factory,
+            name=self.objectName() or None,
+            size=(width, height),
+            fps=None if self.keyframes_only else fps,
+            keyframes_only=self.keyframes_only,
+        )
+
     def _start_ffmpeg_bridge(self, rtsp_url):
         """FFmpeg Bridge optimizado"""
         try:
@@ -250,22 +398,38 @@ class VisualizadorDetector(QObject):
                 width, height = 640, 360  # Default
                 self.log_signal.emit(f"📐 [{ip}] Configuración: Default")
             
-            self.ffmpeg_reader = FFmpegRTSPReader(
-                rtsp_url, 
-                width=width,
-                height=height,
-                nvidia_decode=self.nvidia_enabled
+            # ffmpeg decima al FPS visual: el intervalo de detección se calcula sobre ese FPS
+            output_fps = self.cam_data.get('decode_fps', self.visual_fps)
+            # Sesión compartida: otros widgets de la misma cámara reutilizan este lector
+            self.ffmpeg_reader = self._suscribir(
+                rtsp_url,
+                lambda req: FFmpegRTSPReader(
+                    rtsp_url, 
+                    width=req['size'][0] if req['size'] else None,
+                    height=req['size'][1] if req['size'] else None,
+                    nvidia_decode=self.nvidia_enabled,
+                    hwaccel=self.cam_data.get('hwaccel', 'auto'),
+                    fps=req['fps'],
+                    threads=self.cam_data.get('decode_threads', 2),
+                    keyframes_only=req['keyframes_only'],
+                    stall_timeout=self.cam_data.get('stall_timeout', 15.0 if req['keyframes_only'] else 5.0)
+                ),
+                width, height, output_fps,
             )
             
             if self.ffmpeg_reader.start():
                 self.using_ffmpeg = True
-                strategy_used = getattr(self.ffmpeg_reader, 'stats', {}).get('command_used', 'Desconocida')
+                strategy_used = getattr(self.ffmpeg_reader, 'stats', {}).get('command_used') or 'se resuelve al conectar'
                 self.ffmpeg_strategy = strategy_used
                 
                 self.log_signal.emit(f"✅ [{self.objectName()}] FFmpeg Bridge ACTIVO")
                 self.log_signal.emit(f"   📋 Estrategia: {strategy_used}")
                 self.log_signal.emit(f"   📐 Resolución: {width}x{height}")
                 self.log_signal.emit(f"   🚀 NVIDIA: {self.nvidia_enabled}")
+                self.log_signal.emit(f"   🎛️ HW decode: {self.ffmpeg_reader.stats.get('hwaccel')}")
+                if output_fps and not self.keyframes_only:
+                    self.base_fps = output_fps
+                    self.detector_frame_interval = max(1, int(self.base_fps / self.detection_fps))
                 
                 # Thread de procesamiento
                 import threading
@@ -289,9 +453,23 @@ class VisualizadorDetector(QObject):
     def _start_gstreamer_bridge(self, rtsp_url):
         """Inicia lector GStreamer"""
         try:
-            self.gst_reader = GStreamerRTSPReader(rtsp_url)
+            output_fps = self.cam_data.get('decode_fps', self.visual_fps)
+            self.gst_reader = self._suscribir(
+                rtsp_url,
+                fabrica_lector(
+                    GStreamerRTSPReader, rtsp_url,
+                    latency=self.cam_data.get('gst_latency', 100),
+                    hw_decode=self.cam_data.get('gst_hw_decode'),
+                ),
+                self.cam_data.get('decode_width', 640),
+                self.cam_data.get('decode_height', 360),
+                output_fps,
+            )
             if self.gst_reader.start():
                 self.using_gstreamer = True
+                if output_fps and not self.keyframes_only:
+                    self.base_fps = output_fps
+                    self.detector_frame_interval = max(1, int(self.base_fps / self.detection_fps))
                 import threading
                 self.gst_thread = threading.Thread(
                     target=self._process_gstreamer_frames,
@@ -308,6 +486,42 @@ class VisualizadorDetector(QObject):
             self.stats['last_error'] = f"GStreamer: {e}"
             return False
 
+    def _start_pyav_bridge(self, rtsp_url):
+        """Inicia lector PyAV (demux/decodificación sin subproceso)"""
+        try:
+            # Detector, capturas y overlay trabajan en BGR: gray/nv12/rgb24 no sirven aquí
+            pix_fmt = self.cam_data.get('pyav_pix_fmt', 'bgr24')
+            if pix_fmt != 'bgr24':
+                self.log_signal.emit(f"⚠️ [{self.objectName()}] pyav_pix_fmt='{pix_fmt}' no admitido en el visualizador, usando bgr24")
+            self.pyav_reader = self._suscribir(
+                rtsp_url,
+                fabrica_lector(
+                    PyAVRTSPReader, rtsp_url, decima=False,
+                    pix_fmt='bgr24',
+                    threads=self.cam_data.get('decode_threads', 2),
+                ),
+                self.cam_data.get('decode_width', 640),
+                self.cam_data.get('decode_height', 360),
+                self.cam_data.get('decode_fps', self.visual_fps),
+            )
+            if self.pyav_reader.start():
+                self.using_pyav = True
+                import threading
+                self.pyav_thread = threading.Thread(
+                    target=self._process_pyav_frames,
+                    daemon=True
+                )
+                self.pyav_thread.start()
+                self.log_signal.emit(f"✅ [{self.objectName()}] PyAV Bridge ACTIVO")
+                return True
+            else:
+                return False
+        except Exception as e:
+            self.log_signal.emit(f"❌ [{self.objectName()}] Error PyAV Bridge: {e}")
+            self.stats['errors'] += 1
+            self.stats['last_error'] = f"PyAV: {e}"
+            return False
+
     def _start_qmediaplayer(self, rtsp_url):
         """QMediaPlayer como fallback"""
         try:
@@ -434,17 +648,75 @@ class VisualizadorDetector(QObject):
 
         self.log_signal.emit(f"🛑 [{self.objectName()}] Thread GStreamer terminado")
 
+    def _process_pyav_frames(self):
+        """Procesar frames desde PyAV"""
+        frame_count = 0
+        last_log_time = time.time()
+
+        self.log_signal.emit(f"🎬 [{self.objectName()}] Thread PyAV iniciado")
+
+        while (hasattr(self, 'pyav_reader') and
+               self.pyav_reader and
+               self.pyav_reader.isOpened()):
+
+            try:
+                ret, frame = self.pyav_reader.read()
+
+                if ret and frame is not None:
+                    frame_count += 1
+                    self.stats['pyav_frames'] += 1
+                    self.stats['total_frames'] += 1
+
+                    processing_time = self._process_frame_universal(
+                        frame, frame_count, source="pyav"
+                    )
+
+                    if processing_time:
+                        self.stats['processing_times'].append(processing_time)
+                        if len(self.stats['processing_times']) > 100:
+                            self.stats['processing_times'].pop(0)
+
+                        avg_time = sum(self.stats['processing_times']) / len(self.stats['processing_times'])
+                        self.stats['avg_processing_time'] = avg_time
+
+                    if self.debug_visual and frame_count % 3 == 0:
+                        self._emit_debug_frame(frame)
+
+                    if frame_count % 100 == 0 or time.time() - last_log_time > 10:
+                        elapsed = time.time() - self.stats['start_time']
+                        fps = self.stats['pyav_frames'] / elapsed if elapsed > 0 else 0
+
+                        self.log_signal.emit(
+                            f"📷 [{self.objectName()}] PyAV: {frame_count} frames "
+                            f"({fps:.1f} FPS) | Proc: {self.stats['avg_processing_time']*1000:.1f}ms"
+                        )
+                        last_log_time = time.time()
+
+                else:
+                    time.sleep(0.01)
+
+            except Exception as e:
+                self.log_signal.emit(f"❌ [{self.objectName()}] Error procesando frame PyAV: {e}")
+                self.stats['errors'] += 1
+                self.stats['last_error'] = f"PyAV processing: {e}"
+                break
+
+        self.log_signal.emit(f"🛑 [{self.objectName()}] Thread PyAV terminado")
+
     def _emit_debug_frame(self, frame):
         """Emitir frame para debug visual"""
         try:
             if frame is None or frame.size == 0:
                 return
                 
-            height, width, channel = frame.shape
+            height, width = frame.shape[:2]
             bytes_per_line = 3 * width
             
-            # Convertir BGR a RGB para Qt
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            # Convertir BGR (o gris, p.ej. PyAV con pix_fmt='gray') a RGB para Qt
+            if frame.ndim == 2:
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB)
+            else:
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             
             q_image = QImage(
                 rgb_frame.data, 
@@ -481,7 +753,9 @@ class VisualizadorDetector(QObject):
             painter.setPen(QColor(255, 255, 255))
             
             fps_text = f"FPS: {self.stats['current_fps']:.1f}"
-            if self.using_gstreamer:
+            if self.using_pyav:
+                source_lbl = 'PyAV'
+            elif self.using_gstreamer:
                 source_lbl = 'GStreamer'
             elif self.using_ffmpeg:
                 source_lbl = 'FFmpeg'
@@ -655,10 +929,33 @@ class VisualizadorDetector(QObject):
                 self.stats['current_fps'] = current_fps
                 self.stats['last_fps_calculation'] = current_time
                 self.stats['fps_window_frames'] = self.stats['total_frames']
+                self._sync_source_fps()
         
         except Exception as e:
             logger.error(f"Error updating statistics: {e}")
 
+    def _sync_source_fps(self):
+        """Propagar el FPS real del lector al intervalo de detección y al muestreo adaptativo"""
+        if self.using_pyav:
+            reader = self.pyav_reader
+        elif self.using_gstreamer:
+            reader = self.gst_reader
+        elif self.using_ffmpeg:
+            reader = self.ffmpeg_reader
+        else:
+            reader = None
+        effective_fps = getattr(reader, 'stats', {}).get('effective_fps') if reader else None
+        if not effective_fps:
+            return
+
+        if self.keyframes_only:
+            self.base_fps = effective_fps
+            self.detector_frame_interval = max(1, int(self.base_fps / self.detection_fps))
+
+        controller = get_adaptive_controller(self.cam_data.get('ip', ''))
+        if controller is not None:
+            controller.set_source_fps(effective_fps)
+
     def _emit_debug_stats(self):
         """Emitir estadísticas debug"""
         try:
@@ -673,10 +970,17 @@ class VisualizadorDetector(QObject):
                 'avg_fps': self.stats['total_frames'] / elapsed if elapsed > 0 else 0,
                 'ffmpeg_frames': self.stats['ffmpeg_frames'],
                 'gst_frames': self.stats['gst_frames'],
+                'pyav_frames': self.stats['pyav_frames'],
                 'qt_frames': self.stats['qt_frames'],
                 'using_ffmpeg': self.using_ffmpeg,
                 'using_gstreamer': self.using_gstreamer,
-                'ffmpeg_strategy': self.ffmpeg_strategy,
+                'using_pyav': self.using_pyav,
+                'ffmpeg_strategy': self.ffmpeg_strategy,
+                **self._ffmpeg_connection_stats(),
+                **self._gst_pipeline_stats(),
+                'keyframes_only': self.keyframes_only,
+                'source_fps': self.base_fps,
+                'detector_frame_interval': self.detector_frame_interval,
                 'nvidia_enabled': self.nvidia_enabled,
                 'avg_processing_time_ms': self.stats['avg_processing_time'] * 1000,
                 'errors': self.stats['errors'],
@@ -692,20 +996,49 @@ class VisualizadorDetector(QObject):
                     f"Frames: {self.stats['total_frames']} | "
                     f"FPS: {self.stats['current_fps']:.1f} | "
                     f"Source: "
-                    f"{'GStreamer' if self.using_gstreamer else ('FFmpeg' if self.using_ffmpeg else 'Qt')} | "
+                    f"{'PyAV' if self.using_pyav else ('GStreamer' if self.using_gstreamer else ('FFmpeg' if self.using_ffmpeg else 'Qt'))} | "
                     f"Errors: {self.stats['errors']}"
                 )
         
         except Exception as e:
             logger.error(f"Error emitting debug stats: {e}")
 
+    def _ffmpeg_connection_stats(self):
+        """Reconexiones y tiempo caído del lector FFmpeg supervisado"""
+        reader = self.ffmpeg_reader
+        if reader is None or not hasattr(reader, 'get_stats'):
+            return {}
+        conn = reader.get_stats()
+        return {
+            'ffmpeg_state': conn.get('state'),
+            'ffmpeg_reconnects': conn.get('reconnects', 0),
+            'ffmpeg_stalls': conn.get('stalls', 0),
+            'ffmpeg_downtime_seconds': conn.get('downtime_seconds', 0.0),
+            'ffmpeg_last_disconnect': conn.get('last_disconnect_reason'),
+            'stream_subscribers': conn.get('subscribers', 1),
+            'stream_frames_dropped': conn.get('frames_dropped', 0),
+            'stream_lag_seconds': conn.get('lag_seconds', 0.0),
+        }
+
+    def _gst_pipeline_stats(self):
+        """Estadísticas QoS del pipeline GStreamer (buffers tardíos/descartados)"""
+        reader = self.gst_reader
+        if reader is None or not hasattr(reader, 'get_stats'):
+            return {}
+        gst = reader.get_stats()
+        return {
+            'gst_decoder': gst.get('decoder'),
+            'gst_late_buffers': gst.get('late_buffers', 0),
+            'gst_qos_dropped': gst.get('qos_dropped', 0),
+            'gst_qos_processed': gst.get('qos_processed', 0),
+        }
+
     def update_fps_config(self, visual_fps=25, detection_fps=8):
         """Actualizar FPS"""
         self.visual_fps = visual_fps
         self.detection_fps = detection_fps
         
-        base_fps = 30
-        self.detector_frame_interval = max(1, int(base_fps / detection_fps))
+        self.detector_frame_interval = max(1, int(self.base_fps / detection_fps))
         
         self.log_signal.emit(
             f"🎯 [{self.objectName()}] FPS actualizado - "
@@ -756,6 +1089,7 @@ class VisualizadorDetector(QObject):
 
             if hasattr(self, 'tracker'):
                 tracked_results = self.tracker.update(merged, frame=self._last_frame)
+                self._registrar_detecciones(tracked_results)
                 
                 if self.log_frame_processing and len(tracked_results) > 0 and self._current_frame_id % 100 == 0:
                     active_tracks = len([t for t in tracked_results if t.get('track_id', -1) >= 0])
@@ -769,6 +1103,16 @@ class VisualizadorDetector(QObject):
 
             self._pending_detections = {}
 
+    def _registrar_detecciones(self, tracked_results):
+        """Muestrear los tracks en el almacén de la línea de tiempo"""
+        if not tracked_results or self._last_frame is None or not self.cam_data.get('registrar_detecciones', True):
+            return
+        try:
+            h, w = self._last_frame.shape[:2]
+            get_detection_store().registrar(self.camara_id(), tracked_results, (w, h))
+        except Exception as e:
+            logger.debug("No se pudieron registrar detecciones: %s", e)
+
     def stop(self):
         """🔥 CORREGIDO: Detener con fix del error wait()"""
         self.log_signal.emit(f"🛑 [{self.objectName()}] Deteniendo VisualizadorDetector...")
@@ -791,6 +1135,33 @@ class VisualizadorDetector(QObject):
             self.ffmpeg_thread.join(timeout=2)
             self.ffmpeg_thread = None
 
+        # Detener PyAV Bridge
+        if self.pyav_reader:
+            try:
+                self.log_signal.emit(f"🛑 [{self.objectName()}] Liberando PyAV Bridge...")
+                self.pyav_reader.release()
+            except Exception as e:
+                self.log_signal.emit(f"⚠️ [{self.objectName()}] Error liberando PyAV: {e}")
+            self.pyav_reader = None
+        if self.pyav_thread:
+            self.pyav_thread.join(timeout=2)
+            self.pyav_thread = None
+
+        # Liberar stream principal bajo demanda
+        if self.main_stream:
+            self.main_stream.release()
+            self.main_stream = None
+
+        # Cerrar el clip en curso y liberar el buffer de paquetes
+        if self.event_recorder:
+            self.event_recorder.release()
+            self.event_recorder = None
+
+        # Detener la grabación continua (cierra el segmento en curso)
+        if self.camara_grabando:
+            get_recording_manager().detener(self.camara_grabando)
+            self.camara_grabando = None
+
         # Detener GStreamer Bridge
         if self.gst_reader:
             try:
@@ -828,7 +1199,9 @@ class VisualizadorDetector(QObject):
         self.log_signal.emit(f"   ⏱️ Tiempo total: {final_stats['performance']['uptime_seconds']:.1f}s")
         self.log_signal.emit(f"   📷 Frames procesados: {final_stats['performance']['total_frames']}")
         self.log_signal.emit(f"   📈 FPS promedio: {final_stats['performance']['average_fps']:.1f}")
-        if self.using_gstreamer:
+        if self.using_pyav:
+            source_name = 'PyAV'
+        elif self.using_gstreamer:
             source_name = 'GStreamer'
         elif self.using_ffmpeg:
             source_name = 'FFmpeg'
@@ -863,9 +1236,13 @@ class VisualizadorDetector(QObject):
             'source_info': {
                 'using_ffmpeg': self.using_ffmpeg,
                 'using_gstreamer': self.using_gstreamer,
+                'using_pyav': self.using_pyav,
                 'ffmpeg_strategy': self.ffmpeg_strategy,
                 'ffmpeg_frames': self.stats['ffmpeg_frames'],
+                **self._ffmpeg_connection_stats(),
                 'gst_frames': self.stats['gst_frames'],
+                **self._gst_pipeline_stats(),
+                'pyav_frames': self.stats['pyav_frames'],
                 'qt_frames': self.stats['qt_frames'],
                 'nvidia_enabled': self.nvidia_enabled
             },
@@ -44,7 +44,8 @@ class VisualizadorDetector(QObject):
         self.tracker = AdvancedTracker(
             conf_threshold=cam_data.get("confianza", 0.5),
             device=device,
-            lost_ttl=cam_data.get("lost_ttl", 5),
+            lost_ttl=cam_data.get("lost_ttl"),
+            model_key=(cam_data.get("modelos") or [cam_data.get("modelo", "Personas")])[0],
         )
         self._pending_detections = {}
         self._last_frame = None
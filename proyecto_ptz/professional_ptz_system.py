@@ -29,6 +29,18 @@ import logging
 import os
 import socket
 
+try:
+    from core.ptz_command_actor import get_ptz_actor
+    PTZ_ACTOR_AVAILABLE = True
+except ImportError:
+    PTZ_ACTOR_AVAILABLE = False
+
+try:
+    from core.ptz_engine import get_ptz_engine
+    PTZ_ENGINE_AVAILABLE = True
+except ImportError:
+    PTZ_ENGINE_AVAILABLE = False
+
 # =====================================================================
 # CONFIGURACIÓN Y ESTRUCTURAS DE DATOS
 # =====================================================================
@@ -434,9 +446,16 @@ class ProfessionalPTZSystem:
         # Logging
         self._setup_logging()
         
-        # Hilo de control
+        # Lazo de control: paso periódico en el motor PTZ compartido
+        # (o hilo propio si el motor no está disponible)
         self.control_thread = None
+        self.control_interval = 0.1  # 10 FPS de control
         self.running = False
+        self.last_heartbeat = 0.0
+        self.heartbeat_interval = 30.0  # Heartbeat cada 30 segundos
+        
+        # Hilo de comandos ONVIF: el lazo de control no espera la respuesta SOAP
+        self.command_actor = get_ptz_actor(f"{camera_ip}:{port}") if PTZ_ACTOR_AVAILABLE else None
         
         # Sistema de alertas
         self.error_count = 0
@@ -608,9 +627,13 @@ class ProfessionalPTZSystem:
             'movements_skipped': 0
         })
         
-        # Iniciar hilo de control
-        self.control_thread = threading.Thread(target=self._control_loop, daemon=True)
-        self.control_thread.start()
+        # Iniciar lazo de control
+        self.last_heartbeat = time.time()
+        if PTZ_ENGINE_AVAILABLE:
+            get_ptz_engine().register(self, self.control_interval)
+        else:
+            self.control_thread = threading.Thread(target=self._control_loop, daemon=True)
+            self.control_thread.start()
         
         self.logger.info("✅ Sistema de seguimiento iniciado")
         return True
@@ -621,6 +644,8 @@ class ProfessionalPTZSystem:
         self.is_tracking = False
         self.running = False
         
+        if PTZ_ENGINE_AVAILABLE:
+            get_ptz_engine().unregister(self)
         if self.control_thread and self.control_thread.is_alive():
             self.control_thread.join(timeout=2.0)
         
@@ -666,41 +691,42 @@ class ProfessionalPTZSystem:
                 f"conf={confidence:.3f}"
             )
     
+    def step(self, current_time: float):
+        """Paso del lazo de control PTZ"""
+        if not self.running:
+            return
+        try:
+            # Heartbeat y estadísticas periódicas
+            if current_time - self.last_heartbeat > self.heartbeat_interval:
+                self._log_heartbeat()
+                self.last_heartbeat = current_time
+            
+            # Procesar seguimiento si hay objetivo
+            if self.target_detection and self.is_tracking:
+                self._process_tracking()
+            
+            # Verificar si el objetivo se perdió
+            elif self.detection_tracker.is_target_lost():
+                if self.target_detection:
+                    self.logger.info("👻 Objetivo perdido")
+                    self.target_detection = None
+                    
+        except Exception as e:
+            self.logger.error(f"❌ Error en bucle de control: {e}")
+            self.error_count += 1
+            if self.error_count > self.max_errors:
+                self.logger.critical("🚨 Demasiados errores, deteniendo sistema")
+                self.running = False
+                if PTZ_ENGINE_AVAILABLE:
+                    get_ptz_engine().unregister(self)
+    
     def _control_loop(self):
-        """Bucle principal de control PTZ"""
+        """Bucle de control propio (solo sin motor PTZ compartido)"""
         self.logger.info("🔄 Iniciando bucle de control PTZ")
         
-        last_heartbeat = time.time()
-        heartbeat_interval = 30.0  # Heartbeat cada 30 segundos
-        
         while self.running:
-            try:
-                current_time = time.time()
-                
-                # Heartbeat y estadísticas periódicas
-                if current_time - last_heartbeat > heartbeat_interval:
-                    self._log_heartbeat()
-                    last_heartbeat = current_time
-                
-                # Procesar seguimiento si hay objetivo
-                if self.target_detection and self.is_tracking:
-                    self._process_tracking()
-                
-                # Verificar si el objetivo se perdió
-                elif self.detection_tracker.is_target_lost():
-                    if self.target_detection:
-                        self.logger.info("👻 Objetivo perdido")
-                        self.target_detection = None
-                
-                time.sleep(0.1)  # 10 FPS de control
-                
-            except Exception as e:
-                self.logger.error(f"❌ Error en bucle de control: {e}")
-                self.error_count += 1
-                if self.error_count > self.max_errors:
-                    self.logger.critical("🚨 Demasiados errores, deteniendo sistema")
-                    break
-                time.sleep(0.5)
+            self.step(time.time())
+            time.sleep(self.control_interval)
         
         self.logger.info("🛑 Bucle de control terminado")
     
@@ -835,8 +861,11 @@ class ProfessionalPTZSystem:
                 'Zoom': {'x': float(zoom_speed)}
             }
             
-            # Ejecutar AbsoluteMove
-            self.ptz_service.AbsoluteMove(req)
+            # Ejecutar AbsoluteMove (en el actor si está disponible; gana la última posición)
+            if self.command_actor is not None:
+                self.command_actor.submit(self.ptz_service.AbsoluteMove, req)
+            else:
+                self.ptz_service.AbsoluteMove(req)
             return True
             
         except Exception as e:
@@ -887,7 +916,8 @@ class ProfessionalPTZSystem:
             'is_tracking': self.is_tracking,
             'has_target': self.target_detection is not None,
             'error_count': self.error_count,
-            'movement_statistics': movement_stats
+            'movement_statistics': movement_stats,
+            'ptz_commands': self.command_actor.get_stats() if self.command_actor else {}
         }
         
         # Agregar estadísticas del tracker de detecciones
@@ -0,0 +1,239 @@
+
+# ========================================================================================
+# CLASE PYAV BRIDGE - Demux y decodificación en proceso (sin subproceso ffmpeg)
+# ========================================================================================
+
+import random
+import threading
+import queue
+import time
+
+import av  # si PyAV no está instalado el import falla y el backend no se ofrece
+
+# Formatos de salida soportados y su número de canales
+PIX_FMT_CHANNELS = {
+    'bgr24': 3,
+    'rgb24': 3,
+    'gray': 1,
+    'nv12': None,  # plano Y + UV intercalado, shape (h * 3 / 2, w)
+}
+
+class PyAVRTSPReader:
+    """
+    Lector RTSP usando PyAV (libavformat/libavcodec dentro del proceso)
+
+    Evita el proceso ffmpeg por cámara y la copia extra de cada frame por el
+    pipe. ``pix_fmt`` permite decodificar directamente a 'gray' o 'nv12' solo
+    para consumidores que trabajan con esos formatos (el detector, las capturas
+    y el visualizador necesitan 'bgr24'); los frames se entregan con
+    ``VideoFrame.to_ndarray``.
+    Misma interfaz que ``FFmpegRTSPReader`` y ``GStreamerRTSPReader``
+    (start/read/isOpened/release) y la misma reconexión con backoff.
+    """
+
+    def __init__(self, rtsp_url, width=None, height=None, pix_fmt='bgr24', threads=None,
+                 keyframes_only=False, open_timeout=10.0, read_timeout=5.0,
+                 backoff_initial=1.0, backoff_max=30.0):
+        if pix_fmt not in PIX_FMT_CHANNELS:
+            raise ValueError(f"pix_fmt no soportado: {pix_fmt}")
+        self.rtsp_url = rtsp_url
+        self.width = width
+        self.height = height
+        self.pix_fmt = pix_fmt
+        self.threads = threads
+        self.keyframes_only = keyframes_only
+        self.open_timeout = open_timeout
+        self.read_timeout = read_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+
+        self.container = None
+        self.frame_queue = queue.Queue(maxsize=10)
+        self.running = False
+        self.thread = None
+        self._down_since = None
+        self._fps_window_start = None
+        self._fps_window_frames = 0
+
+        self.stats = {
+            'command_used': f"pyav {pix_fmt}",
+            'state': 'stopped',
+            'frames': 0,
+            'reconnects': 0,
+            'downtime_seconds': 0.0,
+            'last_disconnect_reason': None,
+            'source_resolution': None,
+            'source_pix_fmt': None,
+            'output_resolution': None,
+            'keyframes_only': keyframes_only,
+            'effective_fps': 0.0,
+        }
+
+    def _open(self):
+        """Abrir el contenedor RTSP y configurar el decodificador"""
+        container = av.open(
+            self.rtsp_url,
+            options={'rtsp_transport': 'tcp', 'fflags': 'nobuffer'},
+            timeout=(self.open_timeout, self.read_timeout),
+        )
+        stream = container.streams.video[0]
+        ctx = stream.codec_context
+        if self.threads:
+            ctx.thread_count = self.threads
+            ctx.thread_type = 'AUTO'
+        if self.keyframes_only:
+            ctx.skip_frame = 'NONKEY'
+        self.stats['source_resolution'] = f"{ctx.width}x{ctx.height}"
+        self.stats['source_pix_fmt'] = ctx.pix_fmt
+        self.container = container
+        return container, stream
+
+    def _close(self):
+        container, self.container = self.container, None
+        if container is not None:
+            try:
+                container.close()
+            except Exception:
+                pass
+
+    def start(self):
+        """
+        Iniciar captura de video sin bloquear: la primera apertura la hace el
+        hilo lector con la misma reconexión con backoff que tras una caída
+        """
+        if self.running:
+            return True
+        if self.thread is not None and self.thread.is_alive():
+            print("⚠️ PyAV: el hilo anterior aún no terminó")
+            return False
+
+        self.running = True
+        self.stats['state'] = 'connecting'
+        self.thread = threading.Thread(target=self._read_frames, daemon=True)
+        self.thread.start()
+        print(f"✅ PyAV bridge iniciado")
+        return True
+
+    def _convert(self, frame):
+        """Escalar/convertir en libswscale y devolver el ndarray"""
+        width = self.width or frame.width
+        height = self.height or frame.height
+        if (width, height, self.pix_fmt) != (frame.width, frame.height, frame.format.name):
+            frame = frame.reformat(width=width, height=height, format=self.pix_fmt)
+        if self.stats['output_resolution'] is None:
+            self.stats['output_resolution'] = f"{width}x{height}"
+        return frame.to_ndarray()
+
+    def _decode_stream(self, container, stream):
+        for frame in container.decode(stream):
+            if not self.running:
+                return 'stopped'
+            image = self._convert(frame)
+
+            now = time.time()
+            self.stats['frames'] += 1
+            self._update_effective_fps(now)
+            if self.stats['state'] != 'streaming':
+                self._mark_up()
+
+            try:
+                self.frame_queue.put_nowait(image)
+            except queue.Full:
+                try:
+                    self.frame_queue.get_nowait()
+                    self.frame_queue.put_nowait(image)
+                except queue.Empty:
+                    pass
+        return 'eof'
+
+    def _update_effective_fps(self, now, window=5.0):
+        if self._fps_window_start is None:
+            self._fps_window_start = now
+            self._fps_window_frames = 0
+        self._fps_window_frames += 1
+        elapsed = now - self._fps_window_start
+        if elapsed >= window:
+            self.stats['effective_fps'] = self._fps_window_frames / elapsed
+            self._fps_window_start = now
+            self._fps_window_frames = 0
+
+    def _mark_up(self):
+        self.stats['state'] = 'streaming'
+        if self._down_since is not None:
+            self.stats['downtime_seconds'] += time.time() - self._down_since
+            self._down_since = None
+            print(f"✅ PyAV reconectado (reconexiones: {self.stats['reconnects']})")
+
+    def _read_frames(self):
+        """Thread supervisor: decodifica y reabre el stream cuando cae"""
+        attempt = 0
+        while self.running:
+            frames_before = self.stats['frames']
+            try:
+                if self.container is None:
+                    self._open()
+                reason = self._decode_stream(self.container, self.container.streams.video[0])
+            except Exception as e:
+                reason = f"error: {e}"
+
+            self._close()
+            if not self.running:
+                break
+
+            if self._down_since is None:
+                self._down_since = time.time()
+            self.stats['state'] = 'reconnecting'
+            self.stats['last_disconnect_reason'] = reason
+            self._fps_window_start = None
+
+            if self.stats['frames'] > frames_before:
+                attempt = 0
+            delay = min(self.backoff_max, self.backoff_initial * (2 ** attempt))
+            delay = random.uniform(delay / 2, delay)
+            attempt += 1
+            print(f"🔄 PyAV reconectando en {delay:.1f}s (intento {attempt}, motivo: {reason})")
+
+            deadline = time.time() + delay
+            while self.running and time.time() < deadline:
+                time.sleep(0.1)
+            if self.running:
+                self.stats['reconnects'] += 1
+                self.stats['state'] = 'connecting'
+
+        self.stats['state'] = 'stopped'
+
+    def get_stats(self):
+        """Estadísticas de conexión (incluye el tiempo caído en curso)"""
+        stats = dict(self.stats)
+        if self._down_since is not None:
+            stats['downtime_seconds'] += time.time() - self._down_since
+        return stats
+
+    def read(self):
+        """Leer frame (compatible con cv2.VideoCapture)"""
+        if not self.running:
+            return False, None
+        try:
+            frame = self.frame_queue.get(timeout=1.0)
+            return True, frame
+        except queue.Empty:
+            return False, None
+
+    def isOpened(self):
+        """Verificar si está abierto (sigue abierto mientras reconecta)"""
+        return self.running
+
+    def release(self):
+        """
+        Liberar recursos sin esperar al hilo lector: sale con su próximo frame
+        (o al vencer ``read_timeout``) y él mismo cierra el contenedor. Desde
+        aquí solo se cierra si el hilo ya terminó.
+        """
+        self.running = False
+        if self.thread is None or not self.thread.is_alive():
+            self._close()
+        while not self.frame_queue.empty():
+            try:
+                self.frame_queue.get_nowait()
+            except queue.Empty:
+                break
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests de la selección de mejor toma por track (core/best_shot.py).
+Los frames son uniformes (nitidez 0), así la puntuación depende solo de la
+confianza y el orden es predecible.
+Ejecutar desde el directorio raíz del proyecto: python -m pytest test_best_shot.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('.'))
+
+import numpy as np
+
+from core.best_shot import BestShotSelector
+
+FRAME = np.full((360, 640, 3), 128, dtype=np.uint8)
+BBOX = (200, 100, 320, 260)
+T0 = 1000.0
+
+
+def _observar(selector, track_id, confianza, ts):
+    previo = selector.previo(track_id, BBOX, FRAME.shape, confianza, ts=ts)
+    if previo is None:
+        return False
+    return selector.agregar(track_id, previo, FRAME, BBOX, 0, confianza, ts=ts)
+
+
+def test_top_k_emite_la_mejor_al_terminar():
+    """Solo se guardan ``top_k`` recortes y al terminar el track sale el mejor"""
+    selector = BestShotSelector(top_k=2, max_dwell=60, track_timeout=3, min_confianza=0.5)
+    for i, confianza in enumerate([0.6, 0.9, 0.7, 0.8]):
+        _observar(selector, 1, confianza, T0 + i)
+    assert selector.get_stats()['buffer_bytes'] <= 2 * FRAME.nbytes
+
+    assert selector.recolectar(now=T0 + 4) == []   # visto hace 1 s
+    tomas = selector.recolectar(now=T0 + 6)
+    assert len(tomas) == 1
+    track_id, candidato, motivo = tomas[0]
+    assert (track_id, motivo) == (1, 'fin')
+    assert candidato.confianza == 0.9
+    assert candidato.crop.shape[:2] != FRAME.shape[:2]
+    assert selector.tracks_pendientes() == []
+
+
+def test_descarte_previo_sin_recorte():
+    """Con el top-k lleno, un frame que ni con nitidez perfecta lo supera no se recorta"""
+    pesos = {'confianza': 0.7, 'tamano': 0.1, 'nitidez': 0.1, 'borde': 0.1}
+    selector = BestShotSelector(top_k=1, max_dwell=60, track_timeout=3, min_confianza=0.5, pesos=pesos)
+    assert _observar(selector, 1, 0.95, T0)
+    assert not _observar(selector, 1, 0.55, T0 + 1)
+    assert selector.stats['descartes_previos'] == 1
+    assert selector.stats['recortes'] == 1
+
+
+def test_bajo_umbral_no_cuenta():
+    selector = BestShotSelector(min_confianza=0.5)
+    assert selector.previo(1, BBOX, FRAME.shape, 0.3, ts=T0) is None
+    assert selector.stats['bajo_umbral'] == 1
+    assert selector.recolectar(now=T0 + 10) == []
+
+
+def test_permanencia_emite_y_abre_ventana_nueva():
+    """Un track que sigue visible emite su mejor toma cada ``max_dwell`` segundos"""
+    selector = BestShotSelector(top_k=3, max_dwell=5, track_timeout=3, min_confianza=0.5)
+    for i in range(6):
+        _observar(selector, 7, 0.6 + i * 0.05, T0 + i)
+    tomas = selector.recolectar(now=T0 + 5)
+    assert [(t, m) for t, _, m in tomas] == [(7, 'permanencia')]
+    assert tomas[0][1].confianza == 0.6 + 5 * 0.05
+    assert selector.tracks_pendientes() == [7]
+
+    # Ventana nueva vacía: nada que emitir hasta que haya recortes
+    assert selector.recolectar(now=T0 + 5.5) == []
+    _observar(selector, 7, 0.7, T0 + 8)
+    tomas = selector.recolectar(now=T0 + 10)
+    assert [(t, c.confianza, m) for t, c, m in tomas] == [(7, 0.7, 'permanencia')]
+
+
+def test_vaciar_emite_todos_los_tracks():
+    selector = BestShotSelector(top_k=2, max_dwell=60, track_timeout=30, min_confianza=0.5)
+    _observar(selector, 1, 0.8, T0)
+    _observar(selector, 2, 0.7, T0)
+    tomas = selector.vaciar()
+    assert sorted(t for t, _, _ in tomas) == [1, 2]
+    assert all(m == 'fin' for _, _, m in tomas)
+    assert selector.tracks_pendientes() == []
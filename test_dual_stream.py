@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Tests del escalado de cajas entre sub-stream y stream principal
+(core/dual_stream.py: mapear_bbox).
+Ejecutar desde el directorio raíz del proyecto: python -m pytest test_dual_stream.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('.'))
+
+from core.dual_stream import mapear_bbox
+
+
+def test_escala_entre_resoluciones():
+    assert mapear_bbox((10, 20, 50, 60), (640, 360), (1280, 720)) == (20, 40, 100, 120)
+    assert mapear_bbox((100, 90, 300, 270), (640, 360), (1920, 1080)) == (300, 270, 900, 810)
+
+
+def test_recorta_a_los_bordes_del_destino():
+    assert mapear_bbox((-5, -5, 700, 400), (640, 360), (1280, 720)) == (0, 0, 1279, 719)
+
+
+def test_escala_distinta_por_eje():
+    """Sub-stream 4:3 y principal 16:9: cada eje usa su propio factor"""
+    assert mapear_bbox((320, 240, 640, 480), (640, 480), (1920, 1080)) == (960, 540, 1919, 1079)
+
+
+def test_origen_desconocido_devuelve_enteros():
+    assert mapear_bbox((10.7, 20.2, 50.9, 60.1), (0, 0), (1280, 720)) == (10, 20, 50, 60)
+
+
+def test_ignora_campos_extra():
+    assert mapear_bbox((10, 20, 50, 60, 0.9, 3), (640, 360), (1280, 720)) == (20, 40, 100, 120)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests de la normalización de detecciones del motor PTZ
+(core/ptz_engine.py: ObjectPosition.from_detection).
+Ejecutar desde el directorio raíz del proyecto: python -m pytest test_ptz_engine.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('.'))
+
+import pytest
+
+from core.ptz_engine import ObjectPosition
+
+
+def test_bbox_en_pixeles():
+    pos = ObjectPosition.from_detection(
+        {'bbox': [100, 100, 300, 200], 'confidence': 0.8, 'class': 'persona', 'track_id': 4},
+        frame_size=(1000, 500))
+    assert (pos.cx, pos.cy) == pytest.approx((0.2, 0.3))
+    assert (pos.width, pos.height) == pytest.approx((0.2, 0.2))
+    assert (pos.frame_w, pos.frame_h) == (1000, 500)
+    assert pos.confidence == 0.8
+    assert pos.object_class == 'persona'
+    assert pos.track_id == 4
+
+
+def test_coordenadas_sueltas_x1_y2():
+    pos = ObjectPosition.from_detection({'x1': 0, 'y1': 0, 'x2': 1920, 'y2': 1080, 'conf': 0.5})
+    assert (pos.cx, pos.cy, pos.width, pos.height) == pytest.approx((0.5, 0.5, 1.0, 1.0))
+    assert pos.confidence == 0.5
+
+
+def test_centro_normalizado_se_respeta():
+    pos = ObjectPosition.from_detection({'cx': 0.25, 'cy': 0.75, 'width': 0.1, 'height': 0.2},
+                                        frame_size=(640, 480))
+    assert (pos.cx, pos.cy, pos.width, pos.height) == pytest.approx((0.25, 0.75, 0.1, 0.2))
+
+
+def test_centro_en_pixeles_x_y():
+    pos = ObjectPosition.from_detection({'x': 320, 'y': 120, 'frame_w': 640, 'frame_h': 480})
+    assert (pos.cx, pos.cy) == pytest.approx((0.5, 0.25))
+    assert (pos.width, pos.height) == (0.0, 0.0)
+
+
+def test_frame_de_la_deteccion_tiene_prioridad():
+    pos = ObjectPosition.from_detection({'bbox': [0, 0, 320, 240], 'frame_w': 640, 'frame_h': 480},
+                                        frame_size=(1920, 1080))
+    assert (pos.cx, pos.cy) == pytest.approx((0.25, 0.25))
+
+
+def test_sin_coordenadas_devuelve_none():
+    assert ObjectPosition.from_detection({'confidence': 0.9}) is None
+    assert ObjectPosition.from_detection({'bbox': [1, 2, 3]}) is None
+
+
+def test_instancia_pasa_tal_cual():
+    pos = ObjectPosition(cx=0.5, cy=0.5, width=0.1, height=0.1, confidence=0.9)
+    assert ObjectPosition.from_detection(pos) is pos
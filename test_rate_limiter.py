@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Tests del limitador de capturas (core/rate_limiter.py): TokenBucket,
+CaptureRateLimiter y TTLMap. Son lógica pura con ``now`` inyectable.
+Ejecutar desde el directorio raíz del proyecto: python -m pytest test_rate_limiter.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('.'))
+
+from core.rate_limiter import TokenBucket, CaptureRateLimiter, TTLMap
+
+
+def test_token_bucket_rafaga_y_recarga():
+    """La ráfaga inicial se agota y se recarga a ``tasa`` tokens/segundo"""
+    bucket = TokenBucket(tasa=0.5, capacidad=3, now=100.0)
+    assert all(bucket.consumir(now=100.0) for _ in range(3))
+    assert not bucket.consumir(now=100.0)
+    assert bucket.espera(now=100.0) == 2.0
+
+    assert not bucket.consumir(now=101.0)   # medio token
+    assert bucket.consumir(now=102.0)       # uno entero
+    # La recarga no supera la capacidad
+    assert bucket.disponible(now=1000.0) == 3.0
+    assert bucket.espera(5, now=1000.0) == float('inf')
+
+
+def test_token_bucket_rechazo_no_consume():
+    bucket = TokenBucket(tasa=1.0, capacidad=2, now=0.0)
+    assert not bucket.consumir(3, now=0.0)
+    assert bucket.disponible(now=0.0) == 2.0
+
+
+def test_limitador_rafaga_por_clase():
+    """Cada (cámara, clase) tiene su propio bucket"""
+    limitador = CaptureRateLimiter(por_minuto=0.001, rafaga=3, rafaga_bytes=10 ** 9)
+    assert [limitador.permitir('cam1', 0, 100) for _ in range(4)] == [True, True, True, False]
+    assert limitador.stats['permitidas'] == 3
+    assert limitador.stats['rechazadas_clase'] == 1
+    # Otra clase y otra cámara conservan su cupo
+    assert limitador.permitir('cam1', 2, 100)
+    assert limitador.permitir('cam2', 0, 100)
+
+
+def test_limitador_rechazo_global_no_gasta_token_de_clase():
+    """Una captura rechazada por el presupuesto de disco no consume cupo de su clase"""
+    limitador = CaptureRateLimiter(por_minuto=0.001, rafaga=2, bytes_por_segundo=0, rafaga_bytes=100)
+    assert limitador.permitir('cam1', 0, 100)
+    disponible = limitador.disponible('cam1', 0)
+    assert 1.0 <= disponible < 1.01
+
+    assert not limitador.permitir('cam1', 0, 100)
+    assert limitador.stats['rechazadas_global'] == 1
+    assert limitador.stats['rechazadas_clase'] == 0
+    assert 1.0 <= limitador.disponible('cam1', 0) < 1.01
+
+
+def test_limitador_configurar_por_camara():
+    limitador = CaptureRateLimiter(por_minuto=0.001, rafaga=1, rafaga_bytes=10 ** 9)
+    limitador.configurar(camara='cam1', rafaga=3)
+    assert sum(limitador.permitir('cam1', 0, 1) for _ in range(5)) == 3
+    assert sum(limitador.permitir('cam2', 0, 1) for _ in range(5)) == 1
+
+
+def test_ttlmap_expiracion():
+    """Las entradas sin tocar en ``ttl`` segundos expiran; leer renueva el plazo"""
+    mapa = TTLMap(ttl=10, max_items=100)
+    mapa.set('a', 1, now=0.0)
+    mapa.set('b', 2, now=5.0)
+    assert mapa.get('a', now=9.0) == 1      # renueva 'a' hasta 19
+    mapa.set('c', 3, now=16.0)              # purga 'b' (visto en 5)
+    assert mapa.keys() == ['a', 'c']
+    assert mapa.expiradas == 1
+    assert mapa.get('a', 'nada', now=19.5) == 'nada'
+    assert mapa.purgar(now=30.0) == 0
+
+
+def test_ttlmap_desalojo_lru():
+    """Al superar ``max_items`` sale la entrada usada hace más tiempo"""
+    mapa = TTLMap(ttl=100, max_items=2)
+    mapa.set('x', 1, now=0.0)
+    mapa.set('y', 2, now=1.0)
+    mapa.get('x', now=2.0)
+    mapa.set('z', 3, now=3.0)
+    assert mapa.keys() == ['x', 'z']
+    assert mapa.desalojadas == 1
+
+
+def test_ttlmap_factory():
+    mapa = TTLMap(ttl=100, factory=list)
+    mapa['t1'].append(0.9)
+    mapa['t1'].append(0.8)
+    assert mapa['t1'] == [0.9, 0.8]
+    assert mapa.pop('t1') == [0.9, 0.8]
+    assert len(mapa) == 0
+
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests de la combinación de requisitos del registro de streams compartidos
+(core/stream_registry.py): qué salida necesita el lector para servir a todos
+los suscriptores y cuándo el lector actual ya alcanza.
+Ejecutar desde el directorio raíz del proyecto: python -m pytest test_stream_registry.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('.'))
+
+from core.stream_registry import requisitos, combinar_requisitos, _cubre
+
+
+def test_combinar_toma_el_maximo():
+    combinado = combinar_requisitos([
+        requisitos((640, 360), 5, keyframes_only=True),
+        requisitos((1280, 720), 10),
+    ])
+    assert combinado == requisitos((1280, 720), 10, keyframes_only=False)
+
+
+def test_combinar_nativa_y_todos_los_frames_ganan():
+    """Un suscriptor sin ``size``/``fps`` obliga a la resolución y los FPS nativos"""
+    combinado = combinar_requisitos([requisitos((640, 360), 5), requisitos(None, None)])
+    assert combinado['size'] is None
+    assert combinado['fps'] is None
+
+
+def test_combinar_solo_keyframes_si_todos_lo_piden():
+    ambos = [requisitos((640, 360), 2, keyframes_only=True), requisitos((320, 180), 1, keyframes_only=True)]
+    assert combinar_requisitos(ambos)['keyframes_only']
+    assert combinar_requisitos([]) == requisitos()
+
+
+def test_cubre_lector_nativo():
+    nativo = requisitos()
+    assert _cubre(nativo, requisitos((640, 360), 5))
+    assert _cubre(nativo, requisitos())
+    assert _cubre(nativo, requisitos((640, 360), 5, keyframes_only=True))
+
+
+def test_cubre_rechaza_salida_menor():
+    actual = requisitos((640, 360), 5)
+    assert _cubre(actual, requisitos((640, 360), 5))
+    assert _cubre(actual, requisitos((320, 180), 2))
+    assert not _cubre(actual, requisitos((1280, 720), 5))
+    assert not _cubre(actual, requisitos((640, 360), 10))
+    assert not _cubre(actual, requisitos(None, 5))
+    assert not _cubre(actual, requisitos((640, 360), None))
+
+
+def test_cubre_keyframes_no_sirve_a_decodificacion_completa():
+    solo_keyframes = requisitos(keyframes_only=True)
+    assert _cubre(solo_keyframes, requisitos(keyframes_only=True))
+    assert not _cubre(solo_keyframes, requisitos())
+
+
+def test_combinado_cubre_a_cada_suscriptor():
+    lista = [requisitos((640, 360), 5), requisitos((1280, 720), 2, keyframes_only=True), requisitos((320, 240), 15)]
+    combinado = combinar_requisitos(lista)
+    assert all(_cubre(combinado, r) for r in lista)
@@ -1,8 +1,9 @@
-from PyQt6.QtCore import QThread, pyqtSignal, QUrl
-from PyQt6.QtMultimedia import QMediaPlayer, QVideoSink, QVideoFrame, QVideoFrameFormat
-from PyQt6.QtGui import QImage
+from PyQt6.QtCore import QThread, pyqtSignal
 from urllib.parse import quote
-import numpy as np
+import cv2
+
+from core.stream_registry import fabrica_lector, get_stream_registry, stream_key
+from ffmpeg_rtsp_bridge import FFmpegRTSPReader
 
 class CamaraSecundariaWorker(QThread):
     frame_ready = pyqtSignal(object)
@@ -11,8 +12,8 @@ class CamaraSecundariaWorker(QThread):
     def __init__(self, cam_data, parent=None):
         super().__init__(parent)
         self.cam_data = cam_data
-        self.video_player = None
-        self.video_sink = None
+        self.subscription = None
+        self.running = False
 
     def run(self):
         ip = self.cam_data['ip']
@@ -42,85 +43,29 @@ class CamaraSecundariaWorker(QThread):
 
         self.log_signal.emit(f"🎬 Cámara secundaria conectando a: {rtsp_url}")
 
-        self.video_player = QMediaPlayer()
-        self.video_sink = QVideoSink()
-        self.video_player.setVideoSink(self.video_sink)
-        self.video_sink.videoFrameChanged.connect(self.on_frame)
-
-        self.video_player.setSource(QUrl(rtsp_url))
-        self.video_player.play()
+        # Sesión de resolución nativa de la cámara: se comparte con otros consumidores
+        # nativos, no con la sesión escalada de la detección (que seguiría a 640x360)
+        self.subscription = get_stream_registry().subscribe(
+            stream_key({**self.cam_data, 'canal': canal}, perfil, nativa=True),
+            fabrica_lector(FFmpegRTSPReader, rtsp_url),
+            name=f"secundaria-{ip}",
+        )
+        if not self.subscription.start():
+            self.log_signal.emit(f"❌ Cámara secundaria no pudo abrir {ip}")
+            self.subscription = None
+            return
 
-        self.exec()
+        self.running = True
+        while self.running and self.subscription.isOpened():
+            ret, frame = self.subscription.read(timeout=0.5)
+            if ret and frame is not None:
+                # Los frames son compartidos: cvtColor devuelve una copia
+                self.frame_ready.emit(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
 
-        if self.video_player:
-            try:
-                self.video_sink.videoFrameChanged.disconnect(self.on_frame)
-            except Exception:
-                pass
-            self.video_player.stop()
-            self.video_player.setVideoSink(None)
-            self.video_player.deleteLater()
-            self.video_player = None
-            self.video_sink = None
+        self.subscription.release()
+        self.subscription = None
         self.log_signal.emit("🛑 Cámara secundaria detenida")
 
     def stop(self):
-        if self.video_player:
-            self.video_player.stop()
-        self.quit()
+        self.running = False
         self.wait()
-
-    def on_frame(self, frame: QVideoFrame):
-        if not frame.isValid():
-            return
-        qimg = self._qimage_from_frame(frame)
-        if qimg is None:
-            return
-        if qimg.format() != QImage.Format.Format_RGB888:
-            img_converted = qimg.convertToFormat(QImage.Format.Format_RGB888)
-        else:
-            img_converted = qimg
-
-        buffer = img_converted.constBits()
-        bytes_per_pixel = img_converted.depth() // 8
-        buffer.setsize(img_converted.height() * img_converted.width() * bytes_per_pixel)
-        arr = (
-            np.frombuffer(buffer, dtype=np.uint8)
-            .reshape((img_converted.height(), img_converted.width(), bytes_per_pixel))
-            .copy()
-        )
-        self.frame_ready.emit(arr)
-
-    def _qimage_from_frame(self, frame: QVideoFrame) -> QImage | None:
-        if frame.map(QVideoFrame.MapMode.ReadOnly):
-            try:
-                pf = frame.pixelFormat()
-                rgb_formats = {
-                    getattr(QVideoFrameFormat.PixelFormat, name)
-                    for name in [
-                        "Format_RGB24",
-                        "Format_RGB32",
-                        "Format_BGR24",
-                        "Format_BGR32",
-                        "Format_RGBX8888",
-                        "Format_RGBA8888",
-                        "Format_BGRX8888",
-                        "Format_BGRA8888",
-                        "Format_ARGB32",
-                    ]
-                    if hasattr(QVideoFrameFormat.PixelFormat, name)
-                }
-                if pf in rgb_formats:
-                    img_format = QVideoFrameFormat.imageFormatFromPixelFormat(pf)
-                    if img_format != QImage.Format.Format_Invalid:
-                        return QImage(
-                            frame.bits(),
-                            frame.width(),
-                            frame.height(),
-                            frame.bytesPerLine(),
-                            img_format,
-                        ).copy()
-            finally:
-                frame.unmap()
-        image = frame.toImage()
-        return image if not image.isNull() else None
\ No newline at end of file
@@ -25,6 +25,14 @@ from datetime import datetime
 from dataclasses import dataclass, asdict
 from pathlib import Path
 
+from core.ptz_engine import ControlStrategy, ConfidenceTargetSelector
+
+try:
+    from core.multi_object_ptz_system import MultiObjectPTZTracker, MultiObjectConfig
+    MULTI_OBJECT_AVAILABLE = True
+except ImportError:
+    MULTI_OBJECT_AVAILABLE = False
+
 # =================== MODELOS DE DATOS ===================
 
 @dataclass
@@ -61,8 +69,13 @@ class WorkingArea:
 
 # =================== SISTEMA PTZ AREA TRACKER ===================
 
-class PTZAreaTracker:
-    """Sistema de seguimiento PTZ con área de trabajo definida"""
+class PTZAreaTracker(ControlStrategy):
+    """
+    Sistema de seguimiento PTZ con área de trabajo definida.
+
+    También es la estrategia de control del motor PTZ mientras el seguimiento
+    del diálogo está activo (``compute``).
+    """
     
     def __init__(self, camera_ip: str, frame_width: int = 1280, frame_height: int = 720):
         self.camera_ip = camera_ip
@@ -164,6 +177,18 @@ class PTZAreaTracker:
         
         return (pan_speed, tilt_speed, zoom_target)
     
+    def compute(self, target, position, tracker) -> Tuple[float, float]:
+        """Velocidades para el motor PTZ según el área calibrada"""
+        self.frame_width, self.frame_height = position.frame_w, position.frame_h
+        pan_speed, tilt_speed, _zoom = self.calculate_tracking_movement(
+            int(position.cx * position.frame_w), int(position.cy * position.frame_h)
+        )
+        return float(pan_speed), float(tilt_speed)
+    
+    def reset(self):
+        self.last_pan_speed = 0.0
+        self.last_tilt_speed = 0.0
+    
     def _calculate_optimal_zoom(self, ptz_point: PTZPoint) -> float:
         """Calcular zoom óptimo basado en la posición"""
         if not self.working_area:
@@ -459,6 +484,8 @@ class EnhancedMultiObjectPTZDialog(QDialog):
         self.camera_list = camera_list or []
         self.current_camera_data = None
         self.current_tracker: Optional[PTZAreaTracker] = None
+        # Tracker en el motor PTZ compartido mientras el seguimiento está activo
+        self.engine_tracker = None
         self.tracking_active = False
         self.status_thread = None
         
@@ -1133,6 +1160,7 @@ class EnhancedMultiObjectPTZDialog(QDialog):
         self.tracking_active = True
         self.btn_start_tracking.setEnabled(False)
         self.btn_stop_tracking.setEnabled(True)
+        self._start_engine_tracker()
         
         # Iniciar hilo de estado
         self.status_thread = StatusUpdateThread(self.current_tracker)
@@ -1143,9 +1171,37 @@ class EnhancedMultiObjectPTZDialog(QDialog):
         self.tracking_started.emit()
         self._update_status()
     
+    def _start_engine_tracker(self):
+        """Registrar la cámara en el motor PTZ con el área como estrategia de control"""
+        if not MULTI_OBJECT_AVAILABLE or not self.current_camera_data:
+            return
+        
+        camera_data = self.current_camera_data
+        tracker = MultiObjectPTZTracker(
+            camera_data['ip'],
+            int(camera_data.get('puerto', 80)),
+            camera_data.get('usuario', 'admin'),
+            camera_data.get('contrasena', 'admin'),
+            multi_config=MultiObjectConfig(
+                alternating_enabled=False,
+                min_confidence_threshold=0.0,
+                min_object_size=0.0
+            ),
+            target_selector=ConfidenceTargetSelector(),
+            control_strategy=self.current_tracker
+        )
+        if tracker.start_tracking():
+            self.engine_tracker = tracker
+            self._log("🔗 Seguimiento en el motor PTZ compartido")
+        else:
+            self._log("⚠️ Motor PTZ no disponible, se usará el movimiento directo")
+    
     def _stop_tracking(self):
         """Detener seguimiento automático"""
         self.tracking_active = False
+        if self.engine_tracker:
+            self.engine_tracker.stop_tracking()
+            self.engine_tracker = None
         self.btn_start_tracking.setEnabled(True)
         self.btn_stop_tracking.setEnabled(False)
         
@@ -1344,6 +1400,11 @@ class EnhancedMultiObjectPTZDialog(QDialog):
         if not detections:
             return False
         
+        # Con el motor PTZ activo: conversión única y publicación sin bloquear la UI
+        if self.engine_tracker:
+            self._update_tracker_settings()
+            return self.engine_tracker.update_detections(detections, frame_size)
+        
         # Usar la detección con mayor confianza
         best_detection = max(detections, key=lambda d: d.get('confidence', 0))
         
@@ -38,6 +38,8 @@ from ui.config_modal import ConfiguracionDialog
 from ui.fps_config_dialog import FPSConfigDialog
 from ui.camera_manager import guardar_camaras, cargar_camaras_guardadas
 from core.rtsp_builder import generar_rtsp
+from core.stream_registry import get_stream_registry
+from core.camera_prober import CameraProber
 import os
 import cProfile
 import pstats
@@ -1696,22 +1698,11 @@ el rendimiento basado en la actividad de la escena."""
         # Thread para no bloquear la UI
         def run_diagnosis():
             try:
-                # 1. Ping test
+                # 1. Puerto, handshake RTSP y endpoints ONVIF/LAPI (sin decodificar)
                 self.append_debug(f"📡 Probando conectividad...")
-                if self._test_ping(ip):
-                    self.append_debug(f"✅ Ping exitoso a {ip}")
-                else:
-                    self.append_debug(f"❌ No se puede hacer ping a {ip}")
-                
-                # 2. Puerto RTSP
-                puerto = int(cam_data.get('puerto', 554))
-                self.append_debug(f"🔌 Probando puerto {puerto}...")
-                if self._test_port(ip, puerto):
-                    self.append_debug(f"✅ Puerto {puerto} accesible")
-                else:
-                    self.append_debug(f"❌ Puerto {puerto} no accesible")
+                self._log_probe_result(CameraProber().probe_all_sync([cam_data])[0])
                 
-                # 3. Test RTSP con OpenCV
+                # 2. Test RTSP con OpenCV
                 if rtsp_url:
                     self.append_debug(f"📹 Probando stream RTSP...")
                     success, frames, error = self._test_rtsp_stream(rtsp_url)
@@ -1755,6 +1746,13 @@ el rendimiento basado en la actividad de la escena."""
     
     def _test_rtsp_stream(self, rtsp_url, timeout=10):
         """Test de stream RTSP con OpenCV"""
+        # Si la cámara ya está abierta no se abre otra sesión (los NVR limitan sesiones)
+        shared = get_stream_registry().find_by_url(rtsp_url)
+        if shared is not None:
+            if shared.frames > 0:
+                return True, shared.frames, None
+            return False, 0, "Stream compartido activo sin frames"
+
         try:
             cap = cv2.VideoCapture(rtsp_url)
             
@@ -1792,50 +1790,47 @@ el rendimiento basado en la actividad de la escena."""
             return
         
         def run_tests():
-            success_count = 0
             total_count = len(self.camera_data_list)
+            self.append_debug(f"🔍 Sondeando {total_count} cámaras en paralelo...")
+            start_time = time.time()
             
-            for i, cam_data in enumerate(self.camera_data_list, 1):
-                ip = cam_data.get('ip', f'cam_{i}')
-                self.append_debug(f"🔍 [{i}/{total_count}] Probando {ip}...")
-                
-                try:
-                    # Test básico de conectividad
-                    if self._test_ping(ip):
-                        self.append_debug(f"  ✅ Ping OK")
-                        
-                        # Test puerto RTSP
-                        puerto = int(cam_data.get('puerto', 554))
-                        if self._test_port(ip, puerto):
-                            self.append_debug(f"  ✅ Puerto {puerto} OK")
-                            
-                            # Test stream RTSP
-                            rtsp_url = cam_data.get('rtsp')
-                            if rtsp_url:
-                                success, frames, error = self._test_rtsp_stream(rtsp_url, timeout=5)
-                                if success:
-                                    self.append_debug(f"  ✅ Stream OK ({frames} frames)")
-                                    success_count += 1
-                                else:
-                                    self.append_debug(f"  ❌ Stream Error: {error}")
-                            else:
-                                self.append_debug(f"  ⚠️ URL RTSP no configurada")
-                        else:
-                            self.append_debug(f"  ❌ Puerto {puerto} no accesible")
-                    else:
-                        self.append_debug(f"  ❌ No hay conectividad de red")
-                        
-                except Exception as e:
-                    self.append_debug(f"  ❌ Error: {e}")
-                
-                time.sleep(0.5)  # Pausa entre tests
+            # Puerto + handshake RTSP (sin decodificar) + ONVIF/LAPI, todas a la vez
+            try:
+                results = CameraProber().probe_all_sync(
+                    self.camera_data_list,
+                    on_result=lambda cam_data, result: self._log_probe_result(result)
+                )
+            except Exception as e:
+                self.append_debug(f"❌ Error sondeando cámaras: {e}")
+                return
             
-            self.append_debug(f"📊 RESULTADO: {success_count}/{total_count} cámaras funcionando")
+            success_count = sum(1 for result in results if result.get('ok'))
+            self.append_debug(
+                f"📊 RESULTADO: {success_count}/{total_count} cámaras funcionando "
+                f"({time.time() - start_time:.1f}s)"
+            )
         
         # Ejecutar en thread separado
         thread = threading.Thread(target=run_tests, daemon=True)
         thread.start()
     
+    def _log_probe_result(self, result):
+        """Resumen de una cámara sondeada por CameraProber"""
+        ip = result.get('ip')
+        if result.get('error'):
+            self.append_debug(f"  ❌ {ip}: {result['error']}")
+            return
+        port = result.get('port', {})
+        rtsp = result.get('rtsp', {})
+        partes = [f"puerto {'OK' if port.get('ok') else 'KO'} ({port.get('latency_ms')} ms)"]
+        if rtsp:
+            partes.append(f"RTSP {'OK' if rtsp.get('ok') else rtsp.get('error')}")
+        for servicio in ('onvif', 'lapi'):
+            if servicio in result:
+                partes.append(f"{servicio.upper()} {'OK' if result[servicio].get('ok') else 'KO'}")
+        estado = '✅' if result.get('ok') else '❌'
+        self.append_debug(f"  {estado} {ip}: " + " | ".join(partes))
+    
     def open_rtsp_monitor(self):
         """Abrir monitor RTSP en tiempo real"""
         if not RTSP_MONITOR_AVAILABLE:
@@ -1940,22 +1935,11 @@ el rendimiento basado en la actividad de la escena."""
         # Thread para no bloquear la UI
         def run_diagnosis():
             try:
-                # 1. Ping test
+                # 1. Puerto, handshake RTSP y endpoints ONVIF/LAPI (sin decodificar)
                 self.append_debug(f"📡 Probando conectividad...")
-                if self._test_ping(ip):
-                    self.append_debug(f"✅ Ping exitoso a {ip}")
-                else:
-                    self.append_debug(f"❌ No se puede hacer ping a {ip}")
-                
-                # 2. Puerto RTSP
-                puerto = int(cam_data.get('puerto', 554))
-                self.append_debug(f"🔌 Probando puerto {puerto}...")
-                if self._test_port(ip, puerto):
-                    self.append_debug(f"✅ Puerto {puerto} accesible")
-                else:
-                    self.append_debug(f"❌ Puerto {puerto} no accesible")
+                self._log_probe_result(CameraProber().probe_all_sync([cam_data])[0])
                 
-                # 3. Test RTSP con OpenCV
+                # 2. Test RTSP con OpenCV
                 if rtsp_url:
                     self.append_debug(f"📹 Probando stream RTSP...")
                     success, frames, error = self._test_rtsp_stream(rtsp_url)
@@ -1999,6 +1983,13 @@ el rendimiento basado en la actividad de la escena."""
     
     def _test_rtsp_stream(self, rtsp_url, timeout=10):
         """Test de stream RTSP con OpenCV"""
+        # Si la cámara ya está abierta no se abre otra sesión (los NVR limitan sesiones)
+        shared = get_stream_registry().find_by_url(rtsp_url)
+        if shared is not None:
+            if shared.frames > 0:
+                return True, shared.frames, None
+            return False, 0, "Stream compartido activo sin frames"
+
         try:
             cap = cv2.VideoCapture(rtsp_url)
             
@@ -2036,50 +2027,47 @@ el rendimiento basado en la actividad de la escena."""
             return
         
         def run_tests():
-            success_count = 0
             total_count = len(self.camera_data_list)
+            self.append_debug(f"🔍 Sondeando {total_count} cámaras en paralelo...")
+            start_time = time.time()
             
-            for i, cam_data in enumerate(self.camera_data_list, 1):
-                ip = cam_data.get('ip', f'cam_{i}')
-                self.append_debug(f"🔍 [{i}/{total_count}] Probando {ip}...")
-                
-                try:
-                    # Test básico de conectividad
-                    if self._test_ping(ip):
-                        self.append_debug(f"  ✅ Ping OK")
-                        
-                        # Test puerto RTSP
-                        puerto = int(cam_data.get('puerto', 554))
-                        if self._test_port(ip, puerto):
-                            self.append_debug(f"  ✅ Puerto {puerto} OK")
-                            
-                            # Test stream RTSP
-                            rtsp_url = cam_data.get('rtsp')
-                            if rtsp_url:
-                                success, frames, error = self._test_rtsp_stream(rtsp_url, timeout=5)
-                                if success:
-                                    self.append_debug(f"  ✅ Stream OK ({frames} frames)")
-                                    success_count += 1
-                                else:
-                                    self.append_debug(f"  ❌ Stream Error: {error}")
-                            else:
-                                self.append_debug(f"  ⚠️ URL RTSP no configurada")
-                        else:
-                            self.append_debug(f"  ❌ Puerto {puerto} no accesible")
-                    else:
-                        self.append_debug(f"  ❌ No hay conectividad de red")
-                        
-                except Exception as e:
-                    self.append_debug(f"  ❌ Error: {e}")
-                
-                time.sleep(0.5)  # Pausa entre tests
+            # Puerto + handshake RTSP (sin decodificar) + ONVIF/LAPI, todas a la vez
+            try:
+                results = CameraProber().probe_all_sync(
+                    self.camera_data_list,
+                    on_result=lambda cam_data, result: self._log_probe_result(result)
+                )
+            except Exception as e:
+                self.append_debug(f"❌ Error sondeando cámaras: {e}")
+                return
             
-            self.append_debug(f"📊 RESULTADO: {success_count}/{total_count} cámaras funcionando")
+            success_count = sum(1 for result in results if result.get('ok'))
+            self.append_debug(
+                f"📊 RESULTADO: {success_count}/{total_count} cámaras funcionando "
+                f"({time.time() - start_time:.1f}s)"
+            )
         
         # Ejecutar en thread separado
         thread = threading.Thread(target=run_tests, daemon=True)
         thread.start()
     
+    def _log_probe_result(self, result):
+        """Resumen de una cámara sondeada por CameraProber"""
+        ip = result.get('ip')
+        if result.get('error'):
+            self.append_debug(f"  ❌ {ip}: {result['error']}")
+            return
+        port = result.get('port', {})
+        rtsp = result.get('rtsp', {})
+        partes = [f"puerto {'OK' if port.get('ok') else 'KO'} ({port.get('latency_ms')} ms)"]
+        if rtsp:
+            partes.append(f"RTSP {'OK' if rtsp.get('ok') else rtsp.get('error')}")
+        for servicio in ('onvif', 'lapi'):
+            if servicio in result:
+                partes.append(f"{servicio.upper()} {'OK' if result[servicio].get('ok') else 'KO'}")
+        estado = '✅' if result.get('ok') else '❌'
+        self.append_debug(f"  {estado} {ip}: " + " | ".join(partes))
+    
     def open_rtsp_monitor(self):
         """Abrir monitor RTSP en tiempo real"""
         if not RTSP_MONITOR_AVAILABLE: